@@ -0,0 +1,100 @@
+# benchmarks/bench_busqueda_fts.py
+"""
+Compara la búsqueda de variantes por ILIKE (listar_todas_las_variantes) con la
+búsqueda por prefijos en el índice FTS5 (buscar_variantes) sobre catálogos
+sintéticos de distinto tamaño. Las variantes se insertan con los triggers del
+índice activos, así que también se informa el coste de mantenerlo.
+
+Uso:
+    python benchmarks/bench_busqueda_fts.py [--tamanos 10000,100000,1000000] [--repeticiones 5]
+"""
+import sys
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+try:
+    ruta_raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for ruta in (ruta_raiz, os.path.join(ruta_raiz, "src")):
+        if ruta not in sys.path:
+            sys.path.append(ruta)
+except NameError:
+    sys.path.extend([os.path.abspath('.'), os.path.abspath('src')])
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base, crear_engine
+from modules.usuarios.usuarios_model import Usuario
+from modules.perfil.perfil_model import Perfil
+from modules.roles.roles_model import Rol
+from modules.productos.models import ProductoPlantilla, Producto
+from modules.productos.producto_controller import ProductoController
+
+PALABRAS = ["Camisa", "Pantalón", "Zapato", "Gorra", "Chaqueta", "Calcetín", "Bolso", "Cinturón", "Bufanda", "Vestido"]
+ADJETIVOS = ["Oxford", "Lino", "Deportivo", "Clásico", "Urbano", "Premium", "Básico", "Invierno", "Verano", "Slim"]
+VARIANTES_POR_PLANTILLA = 10
+TERMINOS = ["cami", "oxford lin", "zap dep", "SKU-0001234", "premium", "bufanda inv"]
+
+
+def poblar_catalogo(db, num_variantes: int, semilla: int = 7) -> float:
+    """Inserta 'num_variantes' variantes repartidas en plantillas; devuelve los segundos empleados."""
+    rnd = random.Random(semilla)
+    inicio = time.perf_counter()
+    num_plantillas = max(1, num_variantes // VARIANTES_POR_PLANTILLA)
+    for base in range(0, num_plantillas, 5000):
+        plantillas = [
+            {"id": i + 1, "nombre": f"{rnd.choice(PALABRAS)} {rnd.choice(ADJETIVOS)} {i:07d}"}
+            for i in range(base, min(base + 5000, num_plantillas))
+        ]
+        db.execute(insert(ProductoPlantilla), plantillas)
+        db.execute(insert(Producto), [
+            {"plantilla_id": p["id"], "sku": f"SKU-{(p['id'] - 1) * VARIANTES_POR_PLANTILLA + v:07d}",
+             "stock": 10, "precio_venta": 9.99}
+            for p in plantillas for v in range(VARIANTES_POR_PLANTILLA)
+        ])
+    db.commit()
+    return time.perf_counter() - inicio
+
+
+def medir(funcion, repeticiones: int):
+    tiempos, filas = [], 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        filas = len(funcion())
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos), filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tamanos", default="10000,100000", help="Variantes por catálogo, separadas por comas (p. ej. 10000,100000,1000000)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'variantes':>10} | {'término':<14} | {'ILIKE ms':>9} {'filas':>7} | {'FTS5 ms':>8} {'filas':>6} | {'x':>6}")
+    print("-" * 76)
+    for tamano in (int(t) for t in args.tamanos.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", perfil="rendimiento", config={})
+            Base.metadata.create_all(engine)
+            db = sessionmaker(bind=engine, autoflush=False)()
+            segundos = poblar_catalogo(db, tamano)
+            print(f"{tamano:>10,} | alta con índice: {tamano / segundos:,.0f} variantes/seg")
+            ctrl = ProductoController(db)
+
+            for termino in TERMINOS:
+                ms_ilike, filas_ilike = medir(lambda: ctrl.listar_todas_las_variantes(filtro=termino), args.repeticiones)
+                db.expunge_all()
+                ms_fts, filas_fts = medir(lambda: ctrl.buscar_variantes(termino), args.repeticiones)
+                db.expunge_all()
+                print(f"{tamano:>10,} | {termino:<14} | {ms_ilike:>9.1f} {filas_ilike:>7,} | {ms_fts:>8.1f} {filas_fts:>6,} | {ms_ilike / ms_fts:>5.1f}x")
+            db.close()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# benchmarks/bench_checkout.py
+"""
+Mide tickets/seg de VentasController.finalizar_venta para tickets de 1, 10 y
+100 líneas, comparando el cierre en una sola transacción contra el camino
+anterior (un ajustar_stock con commit por línea).
+
+Uso:
+    python benchmarks/bench_checkout.py [--tickets 50] [--lineas 1 10 100] [--perfil rendimiento]
+"""
+import sys
+import os
+import time
+import argparse
+import tempfile
+
+try:
+    ruta_src = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+    if ruta_src not in sys.path:
+        sys.path.append(ruta_src)
+except NameError:
+    sys.path.append(os.path.abspath('src'))
+
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base, crear_engine
+from modules.usuarios.usuarios_model import Usuario
+from modules.perfil.perfil_model import Perfil
+from modules.roles.roles_model import Rol
+from modules.clientes.cliente_model import Cliente
+from modules.productos.models import Producto, ProductoPlantilla, TipoAjusteStock
+from modules.productos.producto_controller import ProductoController
+from modules.contabilidad.contabilidad_controller import ContabilidadController
+from modules.contabilidad.contabilidad_model import TipoMovimiento
+from modules.clientes.cliente_controller import ClienteController
+from modules.ventas.ventas_controller import VentasController
+from modules.ventas.ventas_model import Venta, VentaDetalle, EstadoVenta
+from modules.ventas.carrito import Carrito, LineaCarrito, AlmacenCarritos
+
+
+def _preparar(db, num_productos: int) -> list:
+    plantilla = ProductoPlantilla(nombre="Bench")
+    db.add(plantilla)
+    db.flush()
+    productos = [Producto(plantilla_id=plantilla.id, sku=f"BENCH-{i}", precio_venta=10.0, stock=10**9) for i in range(num_productos)]
+    db.add_all(productos)
+    db.add(Usuario(nombre="Bench", usuario="bench", contrasena="x"))
+    db.commit()
+    return [p.id for p in productos]
+
+
+def _crear_ticket(usuario_id: int, producto_ids: list) -> Carrito:
+    carrito = Carrito(usuario_id=usuario_id)
+    for pid in producto_ids:
+        carrito.lineas[pid] = LineaCarrito(producto_id=pid, sku=f"BENCH-{pid}", descripcion="Bench", cantidad=1, precio_unitario=10.0)
+    return carrito
+
+
+def _finalizar_por_linea(ventas_ctrl: VentasController, carrito: Carrito, pagos: list):
+    """Reproduce el camino anterior: la venta ya escrita, un commit por línea más los commits contable y de venta."""
+    venta = Venta(usuario_id=carrito.usuario_id, subtotal=carrito.total, total=carrito.total)
+    for linea in carrito.detalles:
+        venta.detalles.append(VentaDetalle(producto_id=linea.producto_id, cantidad=linea.cantidad, precio_unitario=linea.precio_unitario, subtotal_linea=linea.subtotal_linea))
+    ventas_ctrl.db.add(venta)
+    ventas_ctrl.db.commit()
+    for detalle in venta.detalles:
+        ventas_ctrl.producto_ctrl.ajustar_stock(detalle.producto_id, -detalle.cantidad, TipoAjusteStock.SALIDA_VENTA, f"Venta #{venta.id}", venta.usuario_id)
+    ventas_ctrl.contabilidad_ctrl.agregar_movimiento(TipoMovimiento.INGRESO, f"Ingreso por Venta #{venta.id}", venta.total)
+    venta.estado = EstadoVenta.COMPLETADA
+    ventas_ctrl.db.commit()
+
+
+def medir(num_lineas: int, num_tickets: int, perfil: str) -> dict:
+    resultados = {}
+    for modo in ("por_linea", "lote"):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", perfil=perfil, config={})
+            Base.metadata.create_all(engine)
+            db = sessionmaker(bind=engine, autoflush=False)()
+            producto_ids = _preparar(db, num_lineas)
+            usuario_id = db.query(Usuario.id).scalar()
+            producto_ctrl = ProductoController(db)
+            contabilidad_ctrl = ContabilidadController(db)
+            ventas_ctrl = VentasController(db, producto_ctrl, contabilidad_ctrl, ClienteController(db), AlmacenCarritos(os.path.join(tmp, "carritos")))
+
+            tickets = [_crear_ticket(usuario_id, producto_ids) for _ in range(num_tickets)]
+            inicio = time.perf_counter()
+            for venta in tickets:
+                pagos = [{"metodo": "Efectivo", "monto": venta.total}]
+                if modo == "lote":
+                    ventas_ctrl.finalizar_venta(venta, pagos)
+                else:
+                    _finalizar_por_linea(ventas_ctrl, venta, pagos)
+            resultados[modo] = num_tickets / (time.perf_counter() - inicio)
+            db.close()
+            engine.dispose()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tickets", type=int, default=50)
+    parser.add_argument("--lineas", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--perfil", default="rendimiento")
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.tickets} tickets por tamaño (perfil '{args.perfil}')")
+    print(f"{'Líneas':>8}{'por línea t/s':>16}{'lote t/s':>12}{'mejora':>10}")
+    for n in args.lineas:
+        r = medir(n, args.tickets, args.perfil)
+        print(f"{n:>8}{r['por_linea']:>16.1f}{r['lote']:>12.1f}{r['lote'] / r['por_linea']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_db_commits.py
+"""
+Mide commits/seg de ProductoController.ajustar_stock con cada perfil de motor
+SQLite definido en core.db, mientras una hebra lectora simula al dashboard.
+
+Uso:
+    python benchmarks/bench_db_commits.py [--commits 500] [--perfiles legacy rendimiento]
+"""
+import sys
+import os
+import time
+import argparse
+import tempfile
+import threading
+
+try:
+    ruta_src = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+    if ruta_src not in sys.path:
+        sys.path.append(ruta_src)
+except NameError:
+    sys.path.append(os.path.abspath('src'))
+
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base, crear_engine, PERFILES_DB
+from modules.usuarios.usuarios_model import Usuario
+from modules.perfil.perfil_model import Perfil
+from modules.roles.roles_model import Rol
+from modules.productos.models import Producto, ProductoPlantilla, TipoAjusteStock
+from modules.productos.producto_controller import ProductoController
+
+
+def medir_perfil(perfil: str, num_commits: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = crear_engine(url, perfil=perfil, config={})
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine, autoflush=False)
+
+        db = Session()
+        plantilla = ProductoPlantilla(nombre="Bench")
+        db.add(plantilla)
+        db.flush()
+        producto = Producto(plantilla_id=plantilla.id, sku="BENCH-1", precio_venta=1.0, stock=0)
+        db.add(producto)
+        db.commit()
+        producto_id = producto.id
+
+        detener = threading.Event()
+        lecturas = [0]
+
+        def lector():
+            lector_db = Session()
+            while not detener.is_set():
+                lector_db.query(func.sum(Producto.stock)).scalar()
+                lector_db.rollback()
+                lecturas[0] += 1
+            lector_db.close()
+
+        hilo = threading.Thread(target=lector, daemon=True)
+        hilo.start()
+
+        ctrl = ProductoController(db)
+        inicio = time.perf_counter()
+        for _ in range(num_commits):
+            ctrl.ajustar_stock(producto_id, 1, TipoAjusteStock.ENTRADA_MANUAL, "bench", None)
+        duracion = time.perf_counter() - inicio
+
+        detener.set()
+        hilo.join()
+        db.close()
+        engine.dispose()
+        return {"perfil": perfil, "commits_seg": num_commits / duracion, "lecturas_seg": lecturas[0] / duracion}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--perfiles", nargs="+", default=list(PERFILES_DB))
+    args = parser.parse_args()
+
+    print(f"⏱️  {args.commits} commits por perfil (con un lector concurrente)")
+    print(f"{'Perfil':<14}{'commits/seg':>14}{'lecturas/seg':>16}")
+    for perfil in args.perfiles:
+        r = medir_perfil(perfil, args.commits)
+        print(f"{r['perfil']:<14}{r['commits_seg']:>14.1f}{r['lecturas_seg']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
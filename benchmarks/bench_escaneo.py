@@ -0,0 +1,152 @@
+# benchmarks/bench_escaneo.py
+"""
+Latencia de escanear un código (SKU, EAN o UPC) y llevarlo al ticket sobre un
+catálogo sintético, comparando:
+
+- dict:     solo la consulta al diccionario (código → id)
+- índice:   ProductoController.buscar_por_codigo (diccionario en memoria + get por PK)
+- sql:      la misma búsqueda con una consulta a las columnas indexadas
+- diálogo:  listar_todas_las_variantes(filtro), lo que hacía el diálogo de selección
+- escanear: VentasController.escanear_item completo (carrito en memoria + instantánea)
+
+También informa lo que tarda y ocupa la carga del índice.
+
+Uso:
+    python benchmarks/bench_escaneo.py [--variantes 1000000] [--escaneos 2000] [--repeticiones-dialogo 3]
+"""
+import sys
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+try:
+    ruta_raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for ruta in (ruta_raiz, os.path.join(ruta_raiz, "src")):
+        if ruta not in sys.path:
+            sys.path.append(ruta)
+except NameError:
+    sys.path.extend([os.path.abspath('.'), os.path.abspath('src')])
+
+from sqlalchemy import insert, or_, select
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base, crear_engine
+from modules.usuarios.usuarios_model import Usuario
+from modules.perfil.perfil_model import Perfil
+from modules.roles.roles_model import Rol
+from modules.productos.models import ProductoPlantilla, Producto
+from modules.productos import indice_busqueda, indice_codigos
+from modules.productos.producto_controller import ProductoController
+from modules.contabilidad.contabilidad_controller import ContabilidadController
+from modules.clientes.cliente_controller import ClienteController
+from modules.ventas.ventas_controller import VentasController
+from modules.ventas.carrito import AlmacenCarritos
+
+VARIANTES_POR_PLANTILLA = 10
+TAMANO_LOTE = 10000
+
+
+def poblar_catalogo(db, num_variantes: int) -> None:
+    """Variantes con SKU y EAN; una de cada tres con UPC. Sin índice FTS5 (no interviene aquí)."""
+    indice_busqueda.eliminar_indice_busqueda(db.connection())
+    num_plantillas = max(1, num_variantes // VARIANTES_POR_PLANTILLA)
+    for base in range(0, num_plantillas, TAMANO_LOTE // VARIANTES_POR_PLANTILLA):
+        ids = range(base + 1, min(base + TAMANO_LOTE // VARIANTES_POR_PLANTILLA, num_plantillas) + 1)
+        db.execute(insert(ProductoPlantilla), [{"id": i, "nombre": f"Plantilla {i:07d}"} for i in ids])
+        filas = []
+        for plantilla_id in ids:
+            for v in range(VARIANTES_POR_PLANTILLA):
+                n = (plantilla_id - 1) * VARIANTES_POR_PLANTILLA + v
+                filas.append({
+                    "plantilla_id": plantilla_id, "sku": f"SKU-{n:07d}", "stock": 10**6, "precio_venta": 9.99,
+                    "codigo_barras_ean": f"750{n:010d}", "codigo_barras_upc": f"0{n:011d}" if n % 3 == 0 else None,
+                })
+        db.execute(insert(Producto), filas)
+    db.add(Usuario(nombre="Bench", usuario="bench", contrasena="x"))
+    db.commit()
+
+
+def codigos_aleatorios(num_variantes: int, cantidad: int, semilla: int = 11) -> list:
+    rnd = random.Random(semilla)
+    codigos = []
+    for _ in range(cantidad):
+        n = rnd.randrange(max(1, num_variantes // VARIANTES_POR_PLANTILLA) * VARIANTES_POR_PLANTILLA)
+        tipo = rnd.choice(("sku", "ean", "upc") if n % 3 == 0 else ("sku", "ean"))
+        codigos.append({"sku": f"sku-{n:07d}", "ean": f"750{n:010d}", "upc": f"0{n:011d}"}[tipo])
+    return codigos
+
+
+def latencias(funcion, codigos: list, db, vaciar_sesion: bool = True) -> tuple:
+    tiempos = []
+    for codigo in codigos:
+        if vaciar_sesion:
+            db.expunge_all()  # cada escaneo parte de una sesión sin la variante cargada
+        inicio = time.perf_counter()
+        if funcion(codigo) is None:
+            raise RuntimeError(f"Código no encontrado: {codigo}")
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return statistics.median(tiempos), tiempos[int(len(tiempos) * 0.99) - 1 if len(tiempos) > 1 else 0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--variantes", type=int, default=1_000_000)
+    parser.add_argument("--escaneos", type=int, default=2000)
+    parser.add_argument("--repeticiones-dialogo", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", perfil="rendimiento", config={})
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+
+        inicio = time.perf_counter()
+        poblar_catalogo(db, args.variantes)
+        print(f"📦 {args.variantes:,} variantes creadas en {time.perf_counter() - inicio:.1f} s")
+
+        indice = indice_codigos.indice_para(engine)
+        inicio = time.perf_counter()
+        with engine.connect() as conexion:
+            total = indice.cargar(conexion)
+        carga_s = time.perf_counter() - inicio
+        # Segunda carga solo para medir la memoria (tracemalloc ralentiza la primera medición)
+        indice.invalidar()
+        tracemalloc.start()
+        with engine.connect() as conexion:
+            indice.cargar(conexion)
+        memoria_mb = tracemalloc.get_traced_memory()[0] / 2**20
+        tracemalloc.stop()
+        print(f"🏷️ Índice: {total:,} códigos cargados en {carga_s:.2f} s, {memoria_mb:.0f} MB")
+
+        producto_ctrl = ProductoController(db)
+        ventas_ctrl = VentasController(db, producto_ctrl, ContabilidadController(db), ClienteController(db), AlmacenCarritos(os.path.join(tmp, "carritos")))
+        codigos = codigos_aleatorios(args.variantes, args.escaneos)
+        consulta_sql = lambda codigo: db.scalars(select(Producto).where(or_(
+            Producto.sku.collate("NOCASE") == codigo, Producto.codigo_barras_ean == codigo, Producto.codigo_barras_upc == codigo,
+        )).limit(1)).first()
+        dialogo = lambda codigo: (producto_ctrl.listar_todas_las_variantes(filtro=codigo) or None)
+
+        resultados = [
+            ("dict", latencias(indice.producto_id, codigos, db, vaciar_sesion=False)),
+            ("índice", latencias(producto_ctrl.buscar_por_codigo, codigos, db)),
+            ("sql", latencias(consulta_sql, codigos, db)),
+            ("diálogo", latencias(dialogo, [c for c in codigos if c.startswith("sku")][:args.repeticiones_dialogo], db)),
+        ]
+        usuario_id = db.query(Usuario.id).scalar()
+        venta = ventas_ctrl.crear_nueva_venta(usuario_id)
+        resultados.append(("escanear", latencias(lambda codigo: ventas_ctrl.escanear_item(venta, codigo), codigos[:200], db, vaciar_sesion=False)))
+        db.close()
+        engine.dispose()
+
+    print(f"{'camino':<10}{'p50 ms':>10}{'p99 ms':>10}")
+    for nombre, (p50, p99) in resultados:
+        print(f"{nombre:<10}{p50:>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
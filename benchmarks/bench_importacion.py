@@ -0,0 +1,62 @@
+# benchmarks/bench_importacion.py
+"""
+Mide filas/seg del análisis y la importación masiva de PlantillaController
+sobre el catálogo sintético de generador_csv.generar_csv_benchmark.
+La segunda pasada reimporta el mismo archivo, ejercitando el camino de actualización.
+
+Uso:
+    python benchmarks/bench_importacion.py [--filas 100000]
+"""
+import sys
+import os
+import time
+import argparse
+import tempfile
+
+try:
+    ruta_raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for ruta in (ruta_raiz, os.path.join(ruta_raiz, "src")):
+        if ruta not in sys.path:
+            sys.path.append(ruta)
+except NameError:
+    sys.path.extend([os.path.abspath('.'), os.path.abspath('src')])
+
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base, crear_engine, seed_initial_data
+from modules.usuarios.usuarios_model import Usuario
+from modules.perfil.perfil_model import Perfil
+from modules.roles.roles_model import Rol
+from modules.productos.plantilla_controller import PlantillaController
+from generador_csv import generar_csv_benchmark
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--perfil", default="rendimiento")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta_csv = generar_csv_benchmark(args.filas, os.path.join(tmp, "catalogo.csv"))
+        engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", perfil=args.perfil, config={})
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        seed_initial_data(db)
+        ctrl = PlantillaController(db)
+
+        for pasada in ("alta", "actualización"):
+            inicio = time.perf_counter()
+            analisis = ctrl.analizar_csv_para_importacion(ruta_csv)
+            t_analisis = time.perf_counter() - inicio
+            validas = [r for r in analisis if r['estado'] != 'ERROR']
+            stats = ctrl.ejecutar_importacion(validas, usuario_id=None)
+            print(f"[{pasada}] análisis: {len(analisis) / t_analisis:,.0f} filas/seg | "
+                  f"importación: {stats['filas_por_segundo']:,.0f} filas/seg "
+                  f"({stats['variantes_creadas']:,} nuevas, {stats['variantes_actualizadas']:,} actualizadas)")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
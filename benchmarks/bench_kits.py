@@ -0,0 +1,123 @@
+# benchmarks/bench_kits.py
+"""
+Coste de mantener el stock de los kits al ajustar el stock de un componente,
+sobre un catálogo sintético (kits de N componentes, un nivel de kits de kits):
+
+- completo:     recalcular todos los kits (lo que equivale a derivarlos en cada lectura)
+- incremental:  ajustar_stock con el recálculo de los kits afectados (índice inverso)
+- lectura:      obtener_stock_kit (valor guardado en kit_stock)
+
+Uso:
+    python benchmarks/bench_kits.py [--componentes 20000] [--kits 5000] [--por-kit 4] [--ajustes 300]
+"""
+import sys
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+try:
+    ruta_raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for ruta in (ruta_raiz, os.path.join(ruta_raiz, "src")):
+        if ruta not in sys.path:
+            sys.path.append(ruta)
+except NameError:
+    sys.path.extend([os.path.abspath('.'), os.path.abspath('src')])
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base, crear_engine
+from modules.usuarios.usuarios_model import Usuario
+from modules.perfil.perfil_model import Perfil
+from modules.roles.roles_model import Rol
+from modules.productos.models import ProductoPlantilla, Producto, KitComponente, TipoAjusteStock
+from modules.productos import indice_busqueda, stock_kits
+from modules.productos.producto_controller import ProductoController
+from modules.productos.plantilla_controller import PlantillaController
+
+
+def poblar(db, num_componentes: int, num_kits: int, por_kit: int, semilla: int = 5) -> tuple:
+    """Componentes simples, kits de 'por_kit' componentes y un kit de kits por cada diez kits."""
+    rnd = random.Random(semilla)
+    indice_busqueda.eliminar_indice_busqueda(db.connection())
+    db.execute(insert(ProductoPlantilla), [{"id": i, "nombre": f"Componente {i}"} for i in range(1, num_componentes + 1)])
+    db.execute(insert(Producto), [{"id": i, "plantilla_id": i, "sku": f"C-{i}", "stock": rnd.randint(0, 500), "precio_venta": 1.0} for i in range(1, num_componentes + 1)])
+
+    num_packs = num_kits // 10
+    kit_ids = range(num_componentes + 1, num_componentes + num_kits + num_packs + 1)
+    db.execute(insert(ProductoPlantilla), [{"id": i, "nombre": f"Kit {i}"} for i in kit_ids])
+    db.execute(insert(Producto), [{"id": i, "plantilla_id": i, "sku": f"K-{i}", "stock": 0, "precio_venta": 5.0} for i in kit_ids])
+    componentes = []
+    for kit_id in kit_ids[:num_kits]:
+        for componente_id in rnd.sample(range(1, num_componentes + 1), por_kit):
+            componentes.append({"kit_plantilla_id": kit_id, "componente_id": componente_id, "cantidad": rnd.randint(1, 3)})
+    for pack_id in kit_ids[num_kits:]:
+        for kit_id in rnd.sample(kit_ids[:num_kits], 2):
+            componentes.append({"kit_plantilla_id": pack_id, "componente_id": kit_id, "cantidad": 1})
+    db.execute(insert(KitComponente), componentes)
+    db.add(Usuario(nombre="Bench", usuario="bench", contrasena="x"))
+    db.commit()
+    return list(range(1, num_componentes + 1)), list(kit_ids)
+
+
+def percentiles(tiempos: list) -> tuple:
+    tiempos.sort()
+    return statistics.median(tiempos), tiempos[int(len(tiempos) * 0.99) - 1 if len(tiempos) > 1 else 0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--componentes", type=int, default=20000)
+    parser.add_argument("--kits", type=int, default=5000)
+    parser.add_argument("--por-kit", type=int, default=4)
+    parser.add_argument("--ajustes", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", perfil="rendimiento", config={})
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        componente_ids, kit_ids = poblar(db, args.componentes, args.kits, args.por_kit)
+        usuario_id = db.query(Usuario.id).scalar()
+        producto_ctrl = ProductoController(db)
+        plantilla_ctrl = PlantillaController(db)
+
+        tiempos_completo = []
+        for _ in range(3):
+            inicio = time.perf_counter()
+            stock_kits.reconstruir_stock_kits(db)
+            db.commit()
+            tiempos_completo.append((time.perf_counter() - inicio) * 1000)
+
+        rnd = random.Random(7)
+        tiempos_incremental = []
+        for _ in range(args.ajustes):
+            componente_id = rnd.choice(componente_ids)
+            inicio = time.perf_counter()
+            producto_ctrl.ajustar_stock(componente_id, 1, TipoAjusteStock.ENTRADA_MANUAL, "Bench", usuario_id)
+            tiempos_incremental.append((time.perf_counter() - inicio) * 1000)
+
+        tiempos_lectura = []
+        for kit_id in rnd.sample(kit_ids, min(args.ajustes, len(kit_ids))):
+            inicio = time.perf_counter()
+            plantilla_ctrl.obtener_stock_kit(kit_id)
+            tiempos_lectura.append((time.perf_counter() - inicio) * 1000)
+
+        # El valor mantenido debe coincidir con el recálculo completo
+        memo = {}
+        desajustes = sum(1 for kit_id in kit_ids if plantilla_ctrl.obtener_stock_kit(kit_id) != stock_kits.calcular_stock_kit(db, kit_id, memo))
+        db.close()
+        engine.dispose()
+
+    print(f"🧩 {args.componentes:,} componentes, {len(kit_ids):,} kits ({args.kits:,} simples + {len(kit_ids) - args.kits:,} kits de kits), {desajustes} desajustes")
+    print(f"{'camino':<13}{'p50 ms':>10}{'p99 ms':>10}")
+    for nombre, tiempos in (("completo", tiempos_completo), ("incremental", tiempos_incremental), ("lectura", tiempos_lectura)):
+        p50, p99 = percentiles(tiempos)
+        print(f"{nombre:<13}{p50:>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
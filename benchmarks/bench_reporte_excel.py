@@ -0,0 +1,97 @@
+# benchmarks/bench_reporte_excel.py
+"""
+Compara la exportación a Excel con un libro normal de openpyxl (todas las
+celdas en memoria, como se hacía antes) con la exportación en flujo de
+generar_reporte_excel (hojas de solo escritura). Informa filas por segundo y
+pico de memoria (RSS), midiendo cada caso en un subproceso aparte.
+
+Uso:
+    python benchmarks/bench_reporte_excel.py [--filas 100000,500000,1000000] [--limite-libro-normal 500000]
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+try:
+    ruta_raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for ruta in (ruta_raiz, os.path.join(ruta_raiz, "src")):
+        if ruta not in sys.path:
+            sys.path.append(ruta)
+except NameError:
+    sys.path.extend([os.path.abspath('.'), os.path.abspath('src')])
+
+import openpyxl
+
+from utils.excel_reporter import generar_reporte_excel
+
+HEADERS = ["ID Venta", "Fecha", "Cliente", "Producto", "Cantidad", "Total"]
+
+
+def generar_filas(num_filas: int):
+    inicio = datetime(2025, 1, 1)
+    for i in range(num_filas):
+        yield [i + 1, inicio + timedelta(minutes=i), f"Cliente {i % 500}", f"Producto {i % 2000}", 1 + i % 5, 10.0 + i % 90]
+
+
+def libro_normal(ruta: str, num_filas: int) -> None:
+    """La exportación anterior: lista completa de filas y Workbook normal."""
+    data = list(generar_filas(num_filas))
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(HEADERS)
+    for fila in data:
+        sheet.append(fila)
+    workbook.save(ruta)
+
+
+def medir_en_este_proceso(modo: str, num_filas: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "reporte.xlsx")
+        inicio = time.perf_counter()
+        if modo == "en_flujo":
+            generar_reporte_excel(ruta, "Reporte de Ventas", HEADERS, generar_filas(num_filas), columnas_moneda=[5])
+        else:
+            libro_normal(ruta, num_filas)
+        segundos = time.perf_counter() - inicio
+    # En Linux ru_maxrss viene en KiB
+    return {"segundos": segundos, "pico_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def medir_en_subproceso(modo: str, num_filas: int) -> dict:
+    salida = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--interno", modo, str(num_filas)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", default="100000,500000,1000000", help="Filas por reporte, separadas por comas")
+    parser.add_argument("--limite-libro-normal", type=int, default=500000, help="Tamaño máximo para medir el libro normal")
+    parser.add_argument("--interno", nargs=2, metavar=("MODO", "FILAS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.interno:
+        print(json.dumps(medir_en_este_proceso(args.interno[0], int(args.interno[1]))))
+        return
+
+    print(f"{'filas':>10} | {'modo':<13} | {'segundos':>9} | {'filas/seg':>10} | {'pico RSS MB':>11}")
+    print("-" * 64)
+    for num_filas in (int(f) for f in args.filas.split(",")):
+        for modo in ("libro_normal", "en_flujo"):
+            if modo == "libro_normal" and num_filas > args.limite_libro_normal:
+                print(f"{num_filas:>10,} | {modo:<13} | {'(omitido, ver --limite-libro-normal)':>36}")
+                continue
+            r = medir_en_subproceso(modo, num_filas)
+            print(f"{num_filas:>10,} | {modo:<13} | {r['segundos']:>9.1f} | {num_filas / r['segundos']:>10,.0f} | {r['pico_mb']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
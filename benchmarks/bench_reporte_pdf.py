@@ -0,0 +1,100 @@
+# benchmarks/bench_reporte_pdf.py
+"""
+Mide el reporte PDF por bloques de LongTable (escribir_reporte_pdf) frente a
+una única Table con todas las filas, como se generaba antes. Informa páginas
+por segundo y pico de memoria (RSS) del proceso. Cada medición se hace en un
+subproceso aparte para que el pico de memoria no se arrastre entre tamaños.
+
+Uso:
+    python benchmarks/bench_reporte_pdf.py [--filas 10000,100000,500000] [--limite-tabla-unica 10000]
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+try:
+    ruta_raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for ruta in (ruta_raiz, os.path.join(ruta_raiz, "src")):
+        if ruta not in sys.path:
+            sys.path.append(ruta)
+except NameError:
+    sys.path.extend([os.path.abspath('.'), os.path.abspath('src')])
+
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table
+
+from utils.reporter import escribir_reporte_pdf, ESTILO_BLOQUE
+
+HEADERS = ["ID Venta", "Fecha", "Cliente", "Producto", "Cantidad", "Total"]
+
+
+def generar_filas(num_filas: int):
+    inicio = datetime(2025, 1, 1)
+    for i in range(num_filas):
+        yield [i + 1, inicio + timedelta(minutes=i), f"Cliente {i % 500}", f"Producto {i % 2000}", 1 + i % 5, 10.0 + i % 90]
+
+
+def tabla_unica(ruta: str, num_filas: int) -> int:
+    """El reporte anterior: una sola Table con todas las filas y GRID sobre todo el rango."""
+    datos = [HEADERS] + [[str(v) for v in fila] for fila in generar_filas(num_filas)]
+    tabla = Table(datos)
+    tabla.setStyle(ESTILO_BLOQUE)
+    doc = SimpleDocTemplate(ruta, pagesize=letter)
+    doc.build([tabla])
+    return doc.page
+
+
+def medir_en_este_proceso(modo: str, num_filas: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "reporte.pdf")
+        inicio = time.perf_counter()
+        if modo == "bloques":
+            paginas = escribir_reporte_pdf(ruta, "Reporte de Ventas", HEADERS, generar_filas(num_filas),
+                                           columnas_total=[5], columnas_moneda=[5])["paginas"]
+        else:
+            paginas = tabla_unica(ruta, num_filas)
+        segundos = time.perf_counter() - inicio
+    # En Linux ru_maxrss viene en KiB
+    pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"paginas": paginas, "segundos": segundos, "pico_mb": pico_mb}
+
+
+def medir_en_subproceso(modo: str, num_filas: int) -> dict:
+    salida = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--interno", modo, str(num_filas)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", default="10000,100000,500000", help="Filas por reporte, separadas por comas")
+    parser.add_argument("--limite-tabla-unica", type=int, default=10000, help="Tamaño máximo para medir la tabla única")
+    parser.add_argument("--interno", nargs=2, metavar=("MODO", "FILAS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.interno:
+        print(json.dumps(medir_en_este_proceso(args.interno[0], int(args.interno[1]))))
+        return
+
+    print(f"{'filas':>9} | {'modo':<12} | {'páginas':>8} | {'segundos':>9} | {'págs/seg':>9} | {'pico RSS MB':>11}")
+    print("-" * 72)
+    for num_filas in (int(f) for f in args.filas.split(",")):
+        for modo in ("tabla_unica", "bloques"):
+            if modo == "tabla_unica" and num_filas > args.limite_tabla_unica:
+                print(f"{num_filas:>9,} | {modo:<12} | {'(omitido, ver --limite-tabla-unica)':>46}")
+                continue
+            r = medir_en_subproceso(modo, num_filas)
+            print(f"{num_filas:>9,} | {modo:<12} | {r['paginas']:>8,} | {r['segundos']:>9.1f} | "
+                  f"{r['paginas'] / r['segundos']:>9.1f} | {r['pico_mb']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
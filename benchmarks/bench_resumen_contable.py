@@ -0,0 +1,101 @@
+# benchmarks/bench_resumen_contable.py
+"""
+Compara los totales contables calculados recorriendo movimientos_contables
+(SUM sobre todo el libro) con los que salen del resumen diario y del último
+cierre, para libros de distinto tamaño repartidos en un año.
+
+Uso:
+    python benchmarks/bench_resumen_contable.py [--movimientos 100000,1000000] [--repeticiones 5]
+"""
+import sys
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta, timezone
+
+try:
+    ruta_raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for ruta in (ruta_raiz, os.path.join(ruta_raiz, "src")):
+        if ruta not in sys.path:
+            sys.path.append(ruta)
+except NameError:
+    sys.path.extend([os.path.abspath('.'), os.path.abspath('src')])
+
+from sqlalchemy import insert, func
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base, crear_engine
+from modules.usuarios.usuarios_model import Usuario
+from modules.perfil.perfil_model import Perfil
+from modules.roles.roles_model import Rol
+from modules.contabilidad.contabilidad_model import MovimientoContable, TipoMovimiento
+from modules.contabilidad.contabilidad_controller import ContabilidadController
+
+CATEGORIAS = ["Ventas", "Compras", "Servicios", "Nómina", None]
+
+
+def poblar_libro(db, num_movimientos: int, semilla: int = 11) -> None:
+    rnd = random.Random(semilla)
+    ahora = datetime.now(timezone.utc)
+    for base in range(0, num_movimientos, 20_000):
+        db.execute(insert(MovimientoContable), [
+            {
+                "tipo": TipoMovimiento.INGRESO if rnd.random() < 0.7 else TipoMovimiento.EGRESO,
+                "concepto": f"Movimiento {i}", "monto": round(rnd.uniform(1, 1000), 2),
+                "fecha": ahora - timedelta(minutes=rnd.randint(0, 365 * 24 * 60)),
+                "categoria": rnd.choice(CATEGORIAS),
+            }
+            for i in range(base, min(base + 20_000, num_movimientos))
+        ])
+    db.commit()
+
+
+def resumen_por_escaneo(db):
+    """El cálculo anterior: dos SUM sobre todo el libro."""
+    ingresos = db.query(func.sum(MovimientoContable.monto)).filter(MovimientoContable.tipo == TipoMovimiento.INGRESO).scalar() or 0.0
+    egresos = db.query(func.sum(MovimientoContable.monto)).filter(MovimientoContable.tipo == TipoMovimiento.EGRESO).scalar() or 0.0
+    return {"total_ingresos": ingresos, "total_egresos": egresos, "balance": ingresos - egresos}
+
+
+def medir(funcion, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movimientos", default="100000,1000000", help="Tamaños del libro, separados por comas")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'movimientos':>12} | {'escaneo ms':>10} | {'resumen ms':>10} | {'con cierre ms':>13} | {'gráfica 15d ms':>14}")
+    print("-" * 72)
+    for tamano in (int(t) for t in args.movimientos.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", perfil="rendimiento", config={})
+            Base.metadata.create_all(engine)
+            db = sessionmaker(bind=engine, autoflush=False)()
+            poblar_libro(db, tamano)
+            ctrl = ContabilidadController(db)
+            ctrl.reconstruir_resumen_diario()
+
+            ms_escaneo = medir(lambda: resumen_por_escaneo(db), args.repeticiones)
+            ms_resumen = medir(ctrl.obtener_resumen, args.repeticiones)
+            ctrl.cerrar_periodo()
+            ms_cierre = medir(ctrl.obtener_resumen, args.repeticiones)
+            ms_grafica = medir(lambda: ctrl.obtener_resumen_diario(15), args.repeticiones)
+            assert abs(resumen_por_escaneo(db)["balance"] - ctrl.obtener_resumen()["balance"]) < 0.01
+            print(f"{tamano:>12,} | {ms_escaneo:>10.1f} | {ms_resumen:>10.2f} | {ms_cierre:>13.2f} | {ms_grafica:>14.2f}")
+            db.close()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
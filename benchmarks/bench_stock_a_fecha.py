@@ -0,0 +1,163 @@
+# benchmarks/bench_stock_a_fecha.py
+"""
+Stock a una fecha sobre un historial sintético de movimientos, comparando:
+
+- historial:    sumar todos los movimientos hasta la fecha
+- sin cortes:   obtener_stock_a_fecha sin cortes (desde el inicio del historial o
+                desde el stock actual hacia atrás, lo que quede más cerca)
+- cortes:       obtener_stock_a_fecha con cortes mensuales (corte más cercano + movimientos del tramo)
+
+para todo el catálogo y para un solo SKU. También informa lo que tarda y ocupa
+un corte.
+
+Uso:
+    python benchmarks/bench_stock_a_fecha.py [--movimientos 10000000] [--variantes 100000] [--dias 365] [--consultas 5]
+"""
+import sys
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta, timezone
+
+try:
+    ruta_raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for ruta in (ruta_raiz, os.path.join(ruta_raiz, "src")):
+        if ruta not in sys.path:
+            sys.path.append(ruta)
+except NameError:
+    sys.path.extend([os.path.abspath('.'), os.path.abspath('src')])
+
+from sqlalchemy import insert, select, func
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base, crear_engine
+from modules.usuarios.usuarios_model import Usuario
+from modules.perfil.perfil_model import Perfil
+from modules.roles.roles_model import Rol
+from modules.productos.models import ProductoPlantilla, Producto, MovimientoStock, InstantaneaStock
+from modules.productos import indice_busqueda
+from modules.productos.producto_controller import ProductoController
+
+TAMANO_LOTE = 100_000
+
+
+def poblar(db, num_variantes: int, num_movimientos: int, num_dias: int, semilla: int = 3) -> datetime:
+    """Movimientos en orden cronológico repartidos en 'num_dias' días que terminan ayer. Devuelve el primer día."""
+    rnd = random.Random(semilla)
+    indice_busqueda.eliminar_indice_busqueda(db.connection())
+    db.execute(insert(ProductoPlantilla), [{"id": i, "nombre": f"Plantilla {i}"} for i in range(1, num_variantes + 1)])
+    db.execute(insert(Producto), [{"id": i, "plantilla_id": i, "sku": f"SKU-{i}", "stock": 0, "precio_venta": 1.0} for i in range(1, num_variantes + 1)])
+    db.commit()
+
+    # Los índices de movimientos se crean al final: insertar con ellos es varias veces más lento
+    indices = list(MovimientoStock.__table__.indexes)
+    for indice in indices:
+        indice.drop(bind=db.connection())
+    inicio = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=num_dias)
+    segundos_por_movimiento = num_dias * 86400 / num_movimientos
+    stock = [0] * (num_variantes + 1)
+
+    def filas():
+        for n in range(num_movimientos):
+            producto_id = rnd.randint(1, num_variantes)
+            anterior = stock[producto_id]
+            cantidad = rnd.randint(1, 50) if anterior < 5 or rnd.random() < 0.3 else -rnd.randint(1, min(anterior, 10))
+            stock[producto_id] = anterior + cantidad
+            fecha = inicio + timedelta(seconds=n * segundos_por_movimiento)
+            yield (producto_id, fecha.strftime("%Y-%m-%d %H:%M:%S.%f"), "AJUSTE_CONTEO_POSITIVO" if cantidad > 0 else "SALIDA_VENTA",
+                   cantidad, anterior, anterior + cantidad)
+
+    cursor = db.connection().connection.driver_connection.cursor()
+    generador = filas()
+    while True:
+        lote = [fila for _, fila in zip(range(TAMANO_LOTE), generador)]
+        if not lote:
+            break
+        cursor.executemany(
+            "INSERT INTO movimientos_stock (producto_id, fecha, tipo_ajuste, cantidad, stock_anterior, stock_nuevo) VALUES (?, ?, ?, ?, ?, ?)", lote)
+    cursor.executemany("UPDATE productos SET stock = ? WHERE id = ?", [(s, i) for i, s in enumerate(stock) if i and s])
+    for indice in indices:
+        indice.create(bind=db.connection())
+    db.commit()
+    db.connection().exec_driver_sql("ANALYZE")
+    return inicio
+
+
+def historial_completo(db, dia, producto_id=None) -> dict:
+    """Lo que costaba sin cortes: reproducir desde el primer movimiento."""
+    consulta = select(MovimientoStock.producto_id, func.sum(MovimientoStock.cantidad)).where(MovimientoStock.fecha < ProductoController._fin_del_dia(dia))
+    if producto_id:
+        consulta = consulta.where(MovimientoStock.producto_id == producto_id)
+    return {pid: suma for pid, suma in db.execute(consulta.group_by(MovimientoStock.producto_id)) if suma}
+
+
+def medir(funcion, argumentos: list) -> tuple:
+    tiempos, resultados = [], []
+    for args in argumentos:
+        inicio = time.perf_counter()
+        resultados.append(funcion(*args))
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos), resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movimientos", type=int, default=10_000_000)
+    parser.add_argument("--variantes", type=int, default=100_000)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--consultas", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", perfil="rendimiento", config={})
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        db.add(Usuario(nombre="Bench", usuario="bench", contrasena="x"))
+        db.commit()
+
+        inicio = time.perf_counter()
+        primer_dia = poblar(db, args.variantes, args.movimientos, args.dias).date()
+        print(f"📦 {args.movimientos:,} movimientos de {args.variantes:,} variantes en {args.dias} días, creados en {time.perf_counter() - inicio:.1f} s")
+
+        producto_ctrl = ProductoController(db)
+        rnd = random.Random(9)
+        dias = [primer_dia + timedelta(days=rnd.randrange(args.dias)) for _ in range(args.consultas)]
+        skus = [(dia, rnd.randint(1, args.variantes)) for dia in dias for _ in range(20)]
+
+        filas = []
+        p50, esperado = medir(lambda dia: historial_completo(db, dia), [(d,) for d in dias])
+        p50_sku, esperado_sku = medir(lambda dia, pid: historial_completo(db, dia, pid).get(pid, 0), skus)
+        filas.append(("historial", p50, p50_sku))
+        p50, actual = medir(producto_ctrl.obtener_stock_a_fecha, [(d,) for d in dias])
+        p50_sku, actual_sku = medir(lambda dia, pid: producto_ctrl.obtener_stock_variante_a_fecha(pid, dia), skus)
+        filas.append(("sin cortes", p50, p50_sku))
+
+        # Un corte por fin de mes del periodo
+        tiempos_corte = []
+        dia = primer_dia
+        while dia < datetime.now(timezone.utc).date() - timedelta(days=1):
+            if (dia + timedelta(days=1)).day == 1:
+                inicio = time.perf_counter()
+                producto_ctrl.crear_corte_stock(dia)
+                tiempos_corte.append(time.perf_counter() - inicio)
+            dia += timedelta(days=1)
+        filas_corte = db.scalar(select(func.count()).select_from(InstantaneaStock))
+        p50, con_cortes = medir(producto_ctrl.obtener_stock_a_fecha, [(d,) for d in dias])
+        p50_sku, con_cortes_sku = medir(lambda dia, pid: producto_ctrl.obtener_stock_variante_a_fecha(pid, dia), skus)
+        filas.append(("cortes", p50, p50_sku))
+        coinciden = esperado == actual == con_cortes and esperado_sku == actual_sku == con_cortes_sku
+        db.close()
+        engine.dispose()
+
+    print(f"📸 {len(tiempos_corte)} cortes mensuales, {filas_corte / max(1, len(tiempos_corte)):,.0f} filas y "
+          f"{statistics.median(tiempos_corte) if tiempos_corte else 0:.2f} s por corte (mediana); resultados {'iguales' if coinciden else 'DISTINTOS'}")
+    print(f"{'camino':<11}{'catálogo p50 ms':>17}{'SKU p50 ms':>13}")
+    for nombre, catalogo, sku in filas:
+        print(f"{nombre:<11}{catalogo:>17.1f}{sku:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
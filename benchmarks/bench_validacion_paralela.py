@@ -0,0 +1,67 @@
+# benchmarks/bench_validacion_paralela.py
+"""
+Mide el escalamiento de la validación de CSV de importación con 1, 2, 4 y 8
+procesos (PlantillaController.analizar_csv_en_paralelo) frente al modo secuencial.
+
+Uso:
+    python benchmarks/bench_validacion_paralela.py [--filas 200000] [--procesos 1 2 4 8]
+"""
+import sys
+import os
+import time
+import argparse
+import tempfile
+
+try:
+    ruta_raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for ruta in (ruta_raiz, os.path.join(ruta_raiz, "src")):
+        if ruta not in sys.path:
+            sys.path.append(ruta)
+except NameError:
+    sys.path.extend([os.path.abspath('.'), os.path.abspath('src')])
+
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base, crear_engine, seed_initial_data
+from modules.usuarios.usuarios_model import Usuario
+from modules.perfil.perfil_model import Perfil
+from modules.roles.roles_model import Rol
+from modules.productos.plantilla_controller import PlantillaController
+from generador_csv import generar_csv_benchmark
+
+
+def _contar(generador) -> int:
+    return sum(len(lote) for lote in generador)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, default=200_000)
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta_csv = generar_csv_benchmark(args.filas, os.path.join(tmp, "catalogo.csv"))
+        engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", config={})
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        seed_initial_data(db)
+        ctrl = PlantillaController(db)
+
+        inicio = time.perf_counter()
+        filas = _contar(ctrl.analizar_csv_en_lotes(ruta_csv))
+        base = time.perf_counter() - inicio
+        print(f"{'Modo':<14}{'filas/seg':>14}{'aceleración':>14}")
+        print(f"{'secuencial':<14}{filas / base:>14,.0f}{1.0:>13.2f}x")
+
+        for n in args.procesos:
+            inicio = time.perf_counter()
+            filas = _contar(ctrl.analizar_csv_en_paralelo(ruta_csv, procesos=n))
+            duracion = time.perf_counter() - inicio
+            print(f"{f'{n} procesos':<14}{filas / duracion:>14,.0f}{base / duracion:>13.2f}x")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
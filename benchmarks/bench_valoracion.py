@@ -0,0 +1,213 @@
+# benchmarks/bench_valoracion.py
+"""
+Valoración del inventario y costo de lo vendido de un periodo (costo medio y
+FIFO) sobre un historial sintético de movimientos con compras a costos distintos:
+
+- bucle:      recorrer el libro movimiento a movimiento en Python (capas en listas por variante)
+- numpy:      valorar_libro, pasadas vectorizadas sobre los mismos arrays
+- completo:   valoracion.costo_de_ventas, incluida la lectura del libro desde SQLite
+
+También mide lo que añade la valoración incremental a una venta
+(ajustar_stock_lote con SALIDA_VENTA) y comprueba que todo coincide.
+
+Uso:
+    python benchmarks/bench_valoracion.py [--movimientos 2000000] [--variantes 50000] [--dias 365] [--ventas 300]
+"""
+import sys
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta, timezone
+
+try:
+    ruta_raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    for ruta in (ruta_raiz, os.path.join(ruta_raiz, "src")):
+        if ruta not in sys.path:
+            sys.path.append(ruta)
+except NameError:
+    sys.path.extend([os.path.abspath('.'), os.path.abspath('src')])
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base, crear_engine
+from modules.usuarios.usuarios_model import Usuario
+from modules.perfil.perfil_model import Perfil
+from modules.roles.roles_model import Rol
+from modules.productos.models import ProductoPlantilla, Producto, MovimientoStock, TipoAjusteStock
+from modules.productos import indice_busqueda, valoracion
+from modules.productos.producto_controller import ProductoController
+
+TAMANO_LOTE = 100_000
+
+
+def poblar(db, num_variantes: int, num_movimientos: int, num_dias: int, semilla: int = 11) -> datetime:
+    """Compras (con costo) y ventas en orden cronológico en 'num_dias' días que terminan ayer. Devuelve el primer día."""
+    rnd = random.Random(semilla)
+    indice_busqueda.eliminar_indice_busqueda(db.connection())
+    db.execute(insert(ProductoPlantilla), [{"id": i, "nombre": f"Plantilla {i}"} for i in range(1, num_variantes + 1)])
+    db.execute(insert(Producto), [{"id": i, "plantilla_id": i, "sku": f"SKU-{i}", "stock": 0, "precio_venta": 10.0,
+                                   "costo_compra": 5.0} for i in range(1, num_variantes + 1)])
+    db.commit()
+
+    indices = list(MovimientoStock.__table__.indexes)
+    for indice in indices:
+        indice.drop(bind=db.connection())
+    inicio = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=num_dias)
+    segundos_por_movimiento = num_dias * 86400 / num_movimientos
+    stock = [0] * (num_variantes + 1)
+
+    def filas():
+        for n in range(num_movimientos):
+            producto_id = rnd.randint(1, num_variantes)
+            anterior = stock[producto_id]
+            fecha = (inicio + timedelta(seconds=n * segundos_por_movimiento)).strftime("%Y-%m-%d %H:%M:%S.%f")
+            if anterior < 5 or rnd.random() < 0.3:
+                cantidad = rnd.randint(1, 50)
+                fila = (producto_id, fecha, "ENTRADA_COMPRA", cantidad, anterior, anterior + cantidad, round(rnd.uniform(3, 8), 2))
+            else:
+                cantidad = -rnd.randint(1, min(anterior, 10))
+                fila = (producto_id, fecha, "SALIDA_VENTA", cantidad, anterior, anterior + cantidad, None)
+            stock[producto_id] = anterior + cantidad
+            yield fila
+
+    cursor = db.connection().connection.driver_connection.cursor()
+    generador = filas()
+    while True:
+        lote = [fila for _, fila in zip(range(TAMANO_LOTE), generador)]
+        if not lote:
+            break
+        cursor.executemany(
+            "INSERT INTO movimientos_stock (producto_id, fecha, tipo_ajuste, cantidad, stock_anterior, stock_nuevo, costo_unitario) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", lote)
+    cursor.executemany("UPDATE productos SET stock = ? WHERE id = ?", [(s, i) for i, s in enumerate(stock) if i and s])
+    for indice in indices:
+        indice.create(bind=db.connection())
+    db.commit()
+    db.connection().exec_driver_sql("ANALYZE")
+    return inicio
+
+
+def valorar_con_bucle(libro: dict) -> tuple:
+    """Lo que costaría sin vectorizar: un recorrido en Python con el estado de cada variante."""
+    promedio_ventas = fifo_ventas = valor_promedio = valor_fifo = 0.0
+    filas = zip(libro["producto"].tolist(), libro["cantidad"].tolist(), libro["stock_anterior"].tolist(),
+                libro["costo"].tolist(), libro["costo_base"].tolist(), libro["venta"].tolist())
+    actual, promedio, capas, stock = None, 0.0, [], 0
+    for producto, cantidad, anterior, costo, base, venta in filas:
+        if producto != actual:
+            if actual is not None:
+                valor_promedio += stock * promedio
+                valor_fifo += sum(c[0] * c[1] for c in capas)
+            actual, promedio, capas = producto, base, ([[anterior, base]] if anterior > 0 else [])
+        if cantidad > 0:
+            costo = promedio if costo != costo else costo  # NaN: entra al costo medio
+            promedio = (anterior * promedio + cantidad * costo) / (anterior + cantidad)
+            capas.append([cantidad, costo])
+        else:
+            pendiente, importe = -cantidad, 0.0
+            while pendiente:
+                gasto = min(pendiente, capas[0][0])
+                importe += gasto * capas[0][1]
+                capas[0][0] -= gasto
+                pendiente -= gasto
+                if not capas[0][0]:
+                    capas.pop(0)
+            if venta:
+                promedio_ventas += -cantidad * promedio
+                fifo_ventas += importe
+        stock = anterior + cantidad
+    if actual is not None:
+        valor_promedio += stock * promedio
+        valor_fifo += sum(c[0] * c[1] for c in capas)
+    return promedio_ventas, fifo_ventas, valor_promedio, valor_fifo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movimientos", type=int, default=2_000_000)
+    parser.add_argument("--variantes", type=int, default=50_000)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--ventas", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = crear_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", perfil="rendimiento", config={})
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        db.add(Usuario(nombre="Bench", usuario="bench", contrasena="x"))
+        db.commit()
+        usuario_id = db.query(Usuario.id).scalar()
+
+        inicio = time.perf_counter()
+        primer_dia = poblar(db, args.variantes, args.movimientos, args.dias)
+        print(f"📦 {args.movimientos:,} movimientos de {args.variantes:,} variantes en {args.dias} días, creados en {time.perf_counter() - inicio:.1f} s")
+
+        # Costo de lo vendido del último trimestre (y valor al final del periodo)
+        hasta = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        desde = max(primer_dia, hasta - timedelta(days=90))
+        filas = []
+        inicio = time.perf_counter()
+        libro = valoracion.cargar_libro(db, hasta, desde)
+        carga = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        esperado = valorar_con_bucle(libro)
+        filas.append(("bucle", (time.perf_counter() - inicio) * 1000))
+
+        tiempos = []
+        for _ in range(3):
+            inicio = time.perf_counter()
+            r = valoracion.valorar_libro(libro["producto"], libro["cantidad"], libro["stock_anterior"], libro["costo"],
+                                         libro["costo_base"], libro["venta"])
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        filas.append(("numpy", statistics.median(tiempos)))
+        obtenido = (r["costo_ventas_promedio"].sum(), r["costo_ventas_fifo"].sum(), r["valor_promedio"].sum(), r["valor_fifo"].sum())
+
+        inicio = time.perf_counter()
+        completo = valoracion.costo_de_ventas(db, desde, hasta)
+        filas.append(("completo", (time.perf_counter() - inicio) * 1000))
+        coinciden = np.allclose(esperado, obtenido, rtol=1e-9) and np.isclose(completo["fifo"], obtenido[1], rtol=1e-9)
+
+        # Valoración incremental de una venta: estado al día y ventas de 1-3 líneas
+        inicio = time.perf_counter()
+        valoracion.reconstruir_valoracion(db)
+        db.commit()
+        reconstruccion = time.perf_counter() - inicio
+        producto_ctrl = ProductoController(db)
+        rnd = random.Random(5)
+        con_stock = [pid for pid, s in zip(r["producto_id"].tolist(), r["stock"].tolist()) if s >= args.ventas]
+        # Se mide aparte lo que tarda valorar_ajustes dentro de cada venta
+        valorar_ajustes, tiempos_valorar = valoracion.valorar_ajustes, []
+
+        def valorar_ajustes_medido(*a, **kw):
+            inicio_valorar = time.perf_counter()
+            valorar_ajustes(*a, **kw)
+            tiempos_valorar.append((time.perf_counter() - inicio_valorar) * 1000)
+
+        valoracion.valorar_ajustes = valorar_ajustes_medido
+        tiempos_venta = []
+        for _ in range(args.ventas):
+            lineas = [{"producto_id": pid, "cantidad": -1} for pid in rnd.sample(con_stock, rnd.randint(1, 3))]
+            inicio = time.perf_counter()
+            producto_ctrl.ajustar_stock_lote(lineas, TipoAjusteStock.SALIDA_VENTA, "Bench", usuario_id)
+            tiempos_venta.append((time.perf_counter() - inicio) * 1000)
+        valoracion.valorar_ajustes = valorar_ajustes
+        db.close()
+        engine.dispose()
+
+    print(f"📚 Libro de {len(libro['producto']):,} movimientos leído en {carga:.2f} s; reconstrucción del estado en {reconstruccion:.2f} s; "
+          f"resultados {'iguales' if coinciden else 'DISTINTOS'}")
+    print(f"🧾 Costo de lo vendido del periodo: costo medio {obtenido[0]:,.2f}, FIFO {obtenido[1]:,.2f}")
+    print(f"{'camino':<10}{'ms':>12}")
+    for nombre, ms in filas:
+        print(f"{nombre:<10}{ms:>12.1f}")
+    print(f"🛒 Venta (1-3 líneas): p50 {statistics.median(tiempos_venta):.3f} ms, de ellos valoración incremental "
+          f"p50 {statistics.median(tiempos_valorar):.3f} ms")
+
+if __name__ == "__main__":
+    main()
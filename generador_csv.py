@@ -1,6 +1,8 @@
 import sys
 import os
 import csv
+import random
+import argparse
 
 # Añadimos la ruta de la carpeta 'src' al path de Python
 try:
@@ -25,6 +27,15 @@ from modules.roles.roles_model import Rol
 
 # --- CONFIGURACIÓN ---
 NOMBRE_ARCHIVO_SALIDA = "muestra_para_importar.csv"
+NOMBRE_ARCHIVO_BENCHMARK = "benchmark_importacion.csv"
+ENCABEZADO_CSV = [
+    'plantilla_nombre', 'categoria_ruta', 'proveedor_nombre', 'tipo_producto',
+    'variante_sku', 'variante_precio', 'variante_costo', 'variante_stock',
+    'variante_atributos', 'kit_componentes'
+]
+# Valores sembrados por core.db.seed_initial_data, así el archivo valida sin datos extra.
+TALLAS_SEMBRADAS = ["XS", "S", "M", "L", "XL", "XXL"]
+COLORES_SEMBRADOS = ["Rojo", "Verde", "Azul", "Negro", "Blanco", "Amarillo", "Gris"]
 
 def generar_csv_de_prueba():
     """
@@ -45,12 +56,7 @@ def generar_csv_de_prueba():
 
     # 2. Preparamos los datos para el CSV
     filas_csv = []
-    encabezado = [
-        'plantilla_nombre', 'categoria_ruta', 'proveedor_nombre', 'tipo_producto',
-        'variante_sku', 'variante_precio', 'variante_costo', 'variante_stock',
-        'variante_atributos', 'kit_componentes'
-    ]
-    filas_csv.append(encabezado)
+    filas_csv.append(ENCABEZADO_CSV)
 
     # --- Producto Simple con datos existentes ---
     cat_nombre = categorias_existentes[0].nombre if categorias_existentes else ""
@@ -88,5 +94,35 @@ def generar_csv_de_prueba():
     except Exception as e:
         print(f"❌ Error al escribir el archivo: {e}")
 
+def generar_csv_benchmark(num_filas: int = 100_000, ruta_salida: str = NOMBRE_ARCHIVO_BENCHMARK, variantes_por_plantilla: int = 12, semilla: int = 42) -> str:
+    """
+    Genera un catálogo sintético de 'num_filas' variantes para medir la importación
+    masiva. No consulta la base de datos: usa sólo los atributos sembrados
+    (Talla/Color) y deja categoría y proveedor vacíos para que todas las filas validen.
+    """
+    rng = random.Random(semilla)
+    combinaciones = [(t, c) for t in TALLAS_SEMBRADAS for c in COLORES_SEMBRADOS]
+    with open(ruta_salida, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(ENCABEZADO_CSV)
+        for i in range(num_filas):
+            num_plantilla, num_variante = divmod(i, variantes_por_plantilla)
+            talla, color = combinaciones[num_variante % len(combinaciones)]
+            costo = round(rng.uniform(5, 500), 2)
+            escritor.writerow([
+                f"Producto Benchmark {num_plantilla:07d}", "", "", "Variante",
+                f"BM-{num_plantilla:07d}-{num_variante:02d}", round(costo * 1.4, 2), costo,
+                rng.randint(0, 200), f"Talla:{talla} | Color:{color}", ""
+            ])
+    print(f"✅ Archivo de benchmark '{ruta_salida}' con {num_filas:,} filas generado.")
+    return ruta_salida
+
 if __name__ == "__main__":
-    generar_csv_de_prueba()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generador de CSV de prueba para la importación de productos.")
+    parser.add_argument("--benchmark", type=int, metavar="FILAS", help="Genera un catálogo sintético con FILAS variantes (p. ej. 100000).")
+    parser.add_argument("--salida", default=None, help="Ruta del archivo de salida.")
+    args = parser.parse_args()
+    if args.benchmark:
+        generar_csv_benchmark(args.benchmark, args.salida or NOMBRE_ARCHIVO_BENCHMARK)
+    else:
+        generar_csv_de_prueba()
\ No newline at end of file
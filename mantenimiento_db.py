@@ -0,0 +1,106 @@
+# mantenimiento_db.py
+"""
+Tareas de mantenimiento de la base de datos de S.I.B.O.R.S.
+
+Uso:
+    python mantenimiento_db.py resumen-contable           # Reconstruye el resumen contable diario
+    python mantenimiento_db.py cerrar-periodo [--hasta AAAA-MM-DD]
+    python mantenimiento_db.py indice-busqueda            # Reconstruye el índice FTS5 de productos
+    python mantenimiento_db.py jerarquia-categorias       # Reconstruye la tabla de clausura de categorías
+    python mantenimiento_db.py corte-stock [--dia AAAA-MM-DD]
+    python mantenimiento_db.py stock-a-fecha --dia AAAA-MM-DD [--sku SKU]
+    python mantenimiento_db.py valoracion [--dia AAAA-MM-DD] [--desde AAAA-MM-DD --hasta AAAA-MM-DD] [--reconstruir]
+    python mantenimiento_db.py claves-foraneas            # Informa las filas huérfanas antes de activar foreign_keys
+"""
+import sys
+import os
+import argparse
+from datetime import date
+
+try:
+    ruta_src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+    if ruta_src not in sys.path:
+        sys.path.append(ruta_src)
+except NameError:
+    sys.path.append(os.path.abspath('src'))
+
+from core.db import init_db, DBSession, revisar_claves_foraneas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tareas de mantenimiento de la base de datos.")
+    subparsers = parser.add_subparsers(dest="tarea", required=True)
+    subparsers.add_parser("resumen-contable", help="Regenera el resumen contable diario desde los movimientos.")
+    cierre = subparsers.add_parser("cerrar-periodo", help="Guarda la foto de los totales contables hasta una fecha.")
+    cierre.add_argument("--hasta", type=date.fromisoformat, default=None, help="Último día incluido, ya terminado en UTC (por defecto, ayer).")
+    subparsers.add_parser("indice-busqueda", help="Regenera el índice de búsqueda de productos.")
+    subparsers.add_parser("jerarquia-categorias", help="Regenera la jerarquía de categorías.")
+    corte = subparsers.add_parser("corte-stock", help="Guarda la foto del stock de todas las variantes al final de un día.")
+    corte.add_argument("--dia", type=date.fromisoformat, default=None, help="Día del corte (por defecto, ayer).")
+    a_fecha = subparsers.add_parser("stock-a-fecha", help="Stock al final de un día, de una variante o de todo el catálogo.")
+    a_fecha.add_argument("--dia", type=date.fromisoformat, required=True)
+    a_fecha.add_argument("--sku", default=None)
+    valoracion = subparsers.add_parser("valoracion", help="Valor del inventario (costo medio y FIFO) y costo de lo vendido de un periodo.")
+    valoracion.add_argument("--dia", type=date.fromisoformat, default=None, help="Valorar al final de ese día (por defecto, el actual).")
+    valoracion.add_argument("--desde", type=date.fromisoformat, default=None, help="Primer día del costo de lo vendido.")
+    valoracion.add_argument("--hasta", type=date.fromisoformat, default=None, help="Último día del costo de lo vendido (por defecto, hoy).")
+    valoracion.add_argument("--reconstruir", action="store_true", help="Recalcula antes el costo medio y las capas FIFO desde el historial.")
+    subparsers.add_parser("claves-foraneas", help="Cuenta las filas huérfanas que impedirían activar foreign_keys.")
+    args = parser.parse_args()
+
+    init_db()
+    db = DBSession()
+    try:
+        if args.tarea == "resumen-contable":
+            from modules.contabilidad.contabilidad_controller import ContabilidadController
+            ContabilidadController(db).reconstruir_resumen_diario()
+        elif args.tarea == "cerrar-periodo":
+            from modules.contabilidad.contabilidad_controller import ContabilidadController
+            ContabilidadController(db).cerrar_periodo(args.hasta)
+        elif args.tarea == "indice-busqueda":
+            from modules.productos import indice_busqueda
+            print(f"🔍 {indice_busqueda.reconstruir_indice_busqueda(db)} variantes indexadas.")
+        elif args.tarea == "jerarquia-categorias":
+            from modules.categorias.categoria_controller import CategoriaController
+            print(f"🌳 {CategoriaController(db).reconstruir_jerarquia()} filas en la jerarquía.")
+        elif args.tarea == "corte-stock":
+            from modules.productos.producto_controller import ProductoController
+            ProductoController(db).crear_corte_stock(args.dia)
+        elif args.tarea == "stock-a-fecha":
+            from modules.productos.producto_controller import ProductoController
+            producto_ctrl = ProductoController(db)
+            if args.sku:
+                producto = producto_ctrl.buscar_por_codigo(args.sku)
+                if not producto: raise ValueError(f"No hay ninguna variante con el SKU '{args.sku}'.")
+                print(f"📦 {producto.sku} al final del {args.dia:%Y-%m-%d}: {producto_ctrl.obtener_stock_variante_a_fecha(producto.id, args.dia)}")
+            else:
+                existencias = producto_ctrl.obtener_stock_a_fecha(args.dia)
+                print(f"📦 Al final del {args.dia:%Y-%m-%d}: {len(existencias)} variantes con existencias, {sum(existencias.values())} unidades.")
+        elif args.tarea == "valoracion":
+            from modules.productos.producto_controller import ProductoController
+            producto_ctrl = ProductoController(db)
+            if args.reconstruir:
+                producto_ctrl.reconstruir_valoracion()
+            inventario = producto_ctrl.valorar_inventario(args.dia)
+            momento = f"al final del {args.dia:%Y-%m-%d}" if args.dia else "actual"
+            print(f"💰 Inventario {momento}: {inventario['unidades']} unidades; costo medio {inventario['promedio']:.2f}, FIFO {inventario['fifo']:.2f}")
+            if args.desde:
+                hasta = args.hasta or date.today()
+                ventas = producto_ctrl.calcular_costo_de_ventas(args.desde, hasta)
+                print(f"🧾 Costo de lo vendido del {args.desde:%Y-%m-%d} al {hasta:%Y-%m-%d}: {ventas['unidades']} unidades; "
+                      f"costo medio {ventas['promedio']:.2f}, FIFO {ventas['fifo']:.2f}")
+        elif args.tarea == "claves-foraneas":
+            huerfanas = revisar_claves_foraneas(db.connection())
+            for relacion, filas in huerfanas.items():
+                print(f"⚠️ {filas} filas de {relacion} apuntan a registros que ya no existen.")
+            if not huerfanas:
+                print("🔗 Sin filas huérfanas: se puede activar foreign_keys (perfil 'seguro').")
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
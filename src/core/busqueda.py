@@ -0,0 +1,115 @@
+# src/core/busqueda.py
+
+import time
+from typing import Any, Callable, Optional
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal
+from sqlalchemy.orm import Session, sessionmaker
+
+# Milisegundos sin teclear antes de lanzar la consulta.
+RETARDO_BUSQUEDA_MS = 250
+
+
+def fabrica_sesiones_para(sesion: Session) -> sessionmaker:
+    """Crea sesiones nuevas sobre el mismo engine que 'sesion', para usarlas fuera del hilo de la GUI."""
+    return sessionmaker(bind=sesion.get_bind(), autocommit=False, autoflush=False)
+
+
+class _SenalesTarea(QObject):
+    terminada = Signal(int, object, float)
+    fallida = Signal(int, str)
+
+
+class _TareaBusqueda(QRunnable):
+    """Ejecuta una consulta en un hilo del pool con su propia sesión, que se cierra al terminar."""
+
+    def __init__(self, controlador: "ControladorBusqueda", generacion: int, criterios: Any):
+        super().__init__()
+        self.controlador = controlador
+        self.generacion = generacion
+        self.criterios = criterios
+        self.senales = _SenalesTarea()
+
+    def run(self):
+        # Si mientras esperaba en la cola llegó una búsqueda más nueva, ni siquiera consultamos.
+        if self.generacion != self.controlador.generacion_actual:
+            return
+        inicio = time.perf_counter()
+        sesion = self.controlador.fabrica_sesiones()
+        try:
+            resultados = self.controlador.funcion_busqueda(sesion, self.criterios)
+        except Exception as e:
+            self.senales.fallida.emit(self.generacion, str(e))
+            return
+        finally:
+            sesion.close()
+        self.senales.terminada.emit(self.generacion, resultados, (time.perf_counter() - inicio) * 1000)
+
+
+class ControladorBusqueda(QObject):
+    """
+    Búsqueda compartida por los cuadros de búsqueda de la aplicación.
+
+    'solicitar' reinicia un temporizador (debounce); al vencer, la consulta
+    'funcion_busqueda(sesion, criterios)' se ejecuta en un hilo de trabajo con
+    una sesión propia. Solo se emiten los resultados de la búsqueda más reciente:
+    los de consultas que fueron reemplazadas mientras se ejecutaban se descartan.
+    La función debe devolver datos que se puedan usar con la sesión ya cerrada
+    (diccionarios u objetos con sus atributos cargados).
+    """
+    resultados_listos = Signal(object, float)  # resultados, latencia en ms
+    busqueda_fallida = Signal(str)
+
+    def __init__(self, funcion_busqueda: Callable[[Session, Any], Any], fabrica_sesiones: Callable[[], Session],
+                 retardo_ms: int = RETARDO_BUSQUEDA_MS, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.funcion_busqueda = funcion_busqueda
+        self.fabrica_sesiones = fabrica_sesiones
+        self.generacion_actual = 0
+        self.ultima_latencia_ms: Optional[float] = None
+        self._criterios_pendientes: Any = None
+
+        # Un único hilo por cuadro de búsqueda: las consultas no compiten entre sí.
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+        self._temporizador = QTimer(self)
+        self._temporizador.setSingleShot(True)
+        self._temporizador.setInterval(retardo_ms)
+        self._temporizador.timeout.connect(lambda: self.buscar_ahora(self._criterios_pendientes))
+
+    def solicitar(self, criterios: Any):
+        """Programa una búsqueda; cada llamada dentro del retardo reemplaza a la anterior."""
+        self._criterios_pendientes = criterios
+        self._temporizador.start()
+
+    def buscar_ahora(self, criterios: Any):
+        """Lanza la búsqueda sin esperar el retardo (p. ej. la carga inicial de una vista)."""
+        self._temporizador.stop()
+        self.generacion_actual += 1
+        self._pool.clear()  # Las tareas que aún no empezaron ya no sirven
+        tarea = _TareaBusqueda(self, self.generacion_actual, criterios)
+        tarea.senales.terminada.connect(self._al_terminar)
+        tarea.senales.fallida.connect(self._al_fallar)
+        self._pool.start(tarea)
+
+    def cancelar(self):
+        """Descarta la búsqueda pendiente y los resultados de la que esté en curso."""
+        self._temporizador.stop()
+        self.generacion_actual += 1
+        self._pool.clear()
+
+    def esperar(self, timeout_ms: int = -1) -> bool:
+        """Bloquea hasta que termine la consulta en curso. Pensado para pruebas y para el cierre."""
+        return self._pool.waitForDone(timeout_ms)
+
+    def _al_terminar(self, generacion: int, resultados: Any, latencia_ms: float):
+        if generacion != self.generacion_actual:
+            return
+        self.ultima_latencia_ms = latencia_ms
+        self.resultados_listos.emit(resultados, latencia_ms)
+
+    def _al_fallar(self, generacion: int, mensaje: str):
+        if generacion != self.generacion_actual:
+            return
+        print(f"❌ Error en la búsqueda: {mensaje}")
+        self.busqueda_fallida.emit(mensaje)
@@ -0,0 +1,20 @@
+# src/core/config.py
+
+import os
+import json
+from typing import Any, Dict
+
+CONFIG_FILE = "config.json"
+
+def cargar_seccion_config(seccion: str, ruta_config: str = CONFIG_FILE) -> Dict[str, Any]:
+    """
+    Devuelve una sección de config.json (p. ej. "db" o "importacion").
+    Si el archivo no existe, es inválido o no tiene la sección, devuelve un diccionario vacío.
+    """
+    try:
+        if os.path.exists(ruta_config):
+            with open(ruta_config, 'r') as f:
+                return json.load(f).get(seccion, {}) or {}
+    except Exception as e:
+        print(f"⚠️ No se pudo leer la sección '{seccion}' de {ruta_config}: {e}")
+    return {}
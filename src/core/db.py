@@ -1,13 +1,122 @@
 # src/core/db.py
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy.pool import StaticPool
+from typing import Any, Dict, Optional
 import os
 import traceback
 
+from core.config import CONFIG_FILE, cargar_seccion_config
+
 DB_FILENAME = "sibors.db"
 DB_URL = f"sqlite:///{DB_FILENAME}"
-engine = create_engine(DB_URL, echo=False)
+
+# --- Perfiles del motor SQLite ---
+# Cada perfil es un conjunto de PRAGMAs que se aplican a cada conexión nueva
+# del pool. "legacy" reproduce el comportamiento original (journal de rollback,
+# sin PRAGMAs); "rendimiento" activa WAL para que las escrituras del punto de
+# venta no bloqueen a los lectores (dashboard, reportes). La comprobación de
+# claves foráneas es opcional ("seguro", o "foreign_keys": "ON" en los pragmas de
+# config.json): una base antigua puede tener filas huérfanas que entonces harían
+# fallar escrituras y borrados. La migración v8 y 'mantenimiento_db.py
+# claves-foraneas' las informan (revisar_claves_foraneas).
+PERFILES_DB: Dict[str, Dict[str, Any]] = {
+    "legacy": {},
+    "rendimiento": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,      # Negativo = KiB (≈ 64 MB)
+        "mmap_size": 268435456,    # 256 MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,      # ms
+    },
+    "seguro": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16000,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+        "foreign_keys": "ON",
+    },
+}
+PERFIL_DB_POR_DEFECTO = "rendimiento"
+
+# Orden en que se aplican los PRAGMAs: busy_timeout primero para que el cambio
+# de journal_mode espere si otro proceso tiene la base bloqueada.
+_ORDEN_PRAGMAS = ["busy_timeout", "journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "foreign_keys"]
+
+def cargar_configuracion_db(ruta_config: str = CONFIG_FILE) -> Dict[str, Any]:
+    """
+    Lee la sección "db" de config.json. Ejemplo:
+        {"db": {"perfil": "rendimiento", "pragmas": {"cache_size": -32000}, "pool_size": 5}}
+    """
+    return cargar_seccion_config("db", ruta_config)
+
+def resolver_pragmas(perfil: Optional[str] = None, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Combina los PRAGMAs de un perfil con los ajustes puntuales de config.json."""
+    nombre = perfil or PERFIL_DB_POR_DEFECTO
+    if nombre not in PERFILES_DB:
+        raise ValueError(f"El perfil de base de datos '{nombre}' no existe. Opciones: {', '.join(PERFILES_DB)}")
+    pragmas = dict(PERFILES_DB[nombre])
+    pragmas.update(overrides or {})
+    return pragmas
+
+def revisar_claves_foraneas(conexion) -> Dict[str, int]:
+    """
+    Filas huérfanas según PRAGMA foreign_key_check (funciona aunque foreign_keys
+    esté desactivado), contadas por relación: {"tabla -> tabla_padre": filas}.
+    """
+    huerfanas: Dict[str, int] = {}
+    for tabla, _rowid, padre, _fkid in conexion.exec_driver_sql("PRAGMA foreign_key_check"):
+        relacion = f"{tabla} -> {padre}"
+        huerfanas[relacion] = huerfanas.get(relacion, 0) + 1
+    return huerfanas
+
+def _registrar_pragmas(engine: Engine, pragmas: Dict[str, Any]) -> None:
+    """Aplica los PRAGMAs en cada conexión DBAPI que abre el pool."""
+    if not pragmas:
+        return
+    ordenados = sorted(pragmas.items(), key=lambda kv: _ORDEN_PRAGMAS.index(kv[0]) if kv[0] in _ORDEN_PRAGMAS else len(_ORDEN_PRAGMAS))
+
+    @event.listens_for(engine, "connect")
+    def _aplicar_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for nombre, valor in ordenados:
+                cursor.execute(f"PRAGMA {nombre}={valor}")
+        finally:
+            cursor.close()
+
+def crear_engine(url: str = DB_URL, perfil: Optional[str] = None, config: Optional[Dict[str, Any]] = None) -> Engine:
+    """
+    Construye el motor de SQLAlchemy según el perfil indicado (o el de config.json).
+    El motor usa un QueuePool con check_same_thread=False, de modo que varias
+    hebras (p. ej. búsquedas en segundo plano) pueden tener su propia sesión.
+    """
+    config = cargar_configuracion_db() if config is None else config
+    pragmas = resolver_pragmas(perfil or config.get("perfil"), config.get("pragmas"))
+
+    en_memoria = url in ("sqlite://", "sqlite:///:memory:")
+    if en_memoria:
+        # Una base en memoria solo existe dentro de su conexión: se comparte una única conexión.
+        nuevo_engine = create_engine(url, echo=False, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        pragmas.pop("journal_mode", None)
+        pragmas.pop("mmap_size", None)
+    else:
+        nuevo_engine = create_engine(
+            url,
+            echo=False,
+            connect_args={"check_same_thread": False},
+            pool_size=int(config.get("pool_size", 5)),
+            max_overflow=int(config.get("max_overflow", 10)),
+            pool_pre_ping=True,
+        )
+    _registrar_pragmas(nuevo_engine, pragmas)
+    return nuevo_engine
+
+engine = crear_engine(DB_URL)
 DBSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -55,31 +164,54 @@ def seed_initial_data(db: Session):
     
     db.commit()
 
-def init_db() -> None:
+def crear_indices_faltantes(bind) -> int:
+    """
+    Crea los índices declarados en los modelos que aún no existen. create_all
+    omite las tablas que ya están creadas, así que en bases anteriores a un
+    índice nuevo este no aparecería. Devuelve cuántos índices se crearon.
+    """
+    creados = 0
+    with bind.begin() as conexion:
+        existentes = set(conexion.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'").scalars())
+        for tabla in Base.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                if indice.name not in existentes:
+                    indice.create(bind=conexion)
+                    creados += 1
+    if creados:
+        print(f"🗂️ Creados {creados} índices nuevos.")
+    return creados
+
+def importar_modelos() -> None:
+    """Importa todos los modelos para que queden registrados en Base.metadata."""
+    from modules.empresa.empresa_model import Empresa
+    from modules.usuarios.usuarios_model import Usuario
+    from modules.perfil.perfil_model import Perfil
+    from modules.productos.models import (
+        ProductoPlantilla, Producto, ProductoImagen, KitComponente, MovimientoStock, CorteStock, InstantaneaStock, CapaCosto
+    )
+    from modules.variantes.variantes_model import Atributo, AtributoValor
+    from modules.ventas.ventas_model import Venta
+    from modules.contabilidad.contabilidad_model import MovimientoContable, ResumenContableDiario, CierreContable
+    from modules.clientes.cliente_model import Cliente
+    from modules.proveedores.proveedor_model import Proveedor
+    from modules.compras.compra_model import OrdenCompra, DetalleCompra
+    from modules.roles.roles_model import Rol
+    from modules.categorias.categoria_model import Categoria, CategoriaJerarquia
+    from modules.auditorias.auditoria_model import Auditoria, AuditoriaDetalle
+
+def init_db() -> int:
+    """
+    Lleva la base al esquema actual con las migraciones de core.migraciones. Si
+    ya está al día solo se lee PRAGMA user_version. Devuelve cuántas migraciones
+    se aplicaron, para que el arranque sepa si debe revisar el usuario admin.
+    """
     try:
-        from modules.empresa.empresa_model import Empresa
-        from modules.usuarios.usuarios_model import Usuario
-        from modules.perfil.perfil_model import Perfil
-        from modules.productos.models import (
-            ProductoPlantilla, Producto, ProductoImagen, KitComponente, MovimientoStock
-        )
-        from modules.variantes.variantes_model import Atributo, AtributoValor
-        from modules.ventas.ventas_model import Venta
-        from modules.contabilidad.contabilidad_model import MovimientoContable
-        from modules.clientes.cliente_model import Cliente
-        from modules.proveedores.proveedor_model import Proveedor
-        from modules.compras.compra_model import OrdenCompra, DetalleCompra
-        from modules.roles.roles_model import Rol
-        from modules.categorias.categoria_model import Categoria
-        from modules.auditorias.auditoria_model import Auditoria, AuditoriaDetalle
-        
-        Base.metadata.create_all(bind=engine)
-        print(f"📦 Base de datos inicializada en: {os.path.abspath(DB_FILENAME)}")
-        
-        # Llamamos a la función de sembrado después de crear las tablas
-        db = DBSession()
-        seed_initial_data(db)
-        db.close()
+        from core.migraciones import aplicar_migraciones
+        aplicadas = aplicar_migraciones(engine)
+        if aplicadas:
+            print(f"📦 Base de datos actualizada ({aplicadas} migraciones) en: {os.path.abspath(DB_FILENAME)}")
+        return aplicadas
 
     except Exception as e:
         print(f"❌ Error CRÍTICO al inicializar la base de datos. El programa se detendrá.")
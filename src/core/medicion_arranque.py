@@ -0,0 +1,302 @@
+# src/core/medicion_arranque.py
+"""
+Medición del arranque (python src/main.py --profile-startup[=informe.json]).
+
+Registra, por fase, el tiempo de reloj y la memoria asignada (tracemalloc), y el
+tiempo de importación de cada módulo (propio y acumulado, como -X importtime).
+Al terminar escribe un informe JSON y, junto a él, un archivo .folded con las
+pilas colapsadas ("fase;subfase;modulo microsegundos") que entienden
+flamegraph.pl y speedscope, e imprime un resumen.
+
+Sin la bandera todo es un no-op: `fase()` devuelve un contexto vacío. Este
+módulo solo usa la biblioteca estándar para poder activarse antes de importar
+PySide6 o SQLAlchemy.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional
+
+BANDERA = "--profile-startup"
+# Cierra la aplicación en cuanto la ventana de login está lista (para medir en lote).
+BANDERA_SALIR = "--profile-startup-quit"
+# Alternativa a la bandera: "1" o la ruta del informe.
+VARIABLE_ENTORNO = "SIBORS_PROFILE_STARTUP"
+
+# Filas de cada tabla del resumen impreso.
+FILAS_RESUMEN = 12
+
+
+def ruta_solicitada(argv: List[str], entorno=os.environ) -> Optional[str]:
+    """Ruta del informe si se pidió la medición por argumento o variable de entorno; None si no."""
+    valor = None
+    for argumento in argv[1:]:
+        if argumento in (BANDERA, BANDERA_SALIR):
+            valor = valor or "1"
+        elif argumento.startswith(BANDERA + "="):
+            valor = argumento.split("=", 1)[1]
+    valor = valor or entorno.get(VARIABLE_ENTORNO)
+    if not valor or valor == "0":
+        return None
+    if valor == "1":
+        return f"informe_arranque_{datetime.now():%Y%m%d_%H%M%S}.json"
+    return valor
+
+
+def quitar_banderas(argv: List[str]) -> List[str]:
+    return [a for a in argv if a != BANDERA_SALIR and a != BANDERA and not a.startswith(BANDERA + "=")]
+
+
+class MedidorArranque:
+    def __init__(self, ruta_informe: str):
+        self.ruta_informe = ruta_informe
+        self.inicio = time.perf_counter()
+        self.fases: List[Dict] = []
+        self.hitos: Dict[str, float] = {}
+        self.importaciones: Dict[str, Dict] = {}
+        self._pila_fases: List[Dict] = []
+        self._pila_importaciones: List[Dict] = []
+        self._buscador: Optional["_BuscadorMedido"] = None
+
+    def _ms(self, instante: float) -> float:
+        return (instante - self.inicio) * 1000
+
+    # --- Fases ---
+
+    @contextmanager
+    def fase(self, nombre: str):
+        actual, pico = tracemalloc.get_traced_memory()
+        if self._pila_fases:
+            self._pila_fases[-1]["pico"] = max(self._pila_fases[-1]["pico"], pico)
+        tracemalloc.reset_peak()
+        registro = {"nombre": nombre, "t0": time.perf_counter(), "memoria0": actual, "pico": actual}
+        self._pila_fases.append(registro)
+        try:
+            yield
+        finally:
+            actual, pico = tracemalloc.get_traced_memory()
+            self._pila_fases.pop()
+            registro["pico"] = max(registro["pico"], pico)
+            if self._pila_fases:
+                self._pila_fases[-1]["pico"] = max(self._pila_fases[-1]["pico"], registro["pico"])
+            ruta = ";".join([f["nombre"] for f in self._pila_fases] + [nombre])
+            self.fases.append({
+                "ruta": ruta,
+                "inicio_ms": round(self._ms(registro["t0"]), 3),
+                "duracion_ms": round((time.perf_counter() - registro["t0"]) * 1000, 3),
+                "asignado_kb": round((actual - registro["memoria0"]) / 1024, 1),
+                "pico_kb": round((registro["pico"] - registro["memoria0"]) / 1024, 1),
+            })
+
+    def hito(self, nombre: str) -> float:
+        """Guarda el instante (ms desde el inicio de la medición) de un momento del arranque."""
+        self.hitos[nombre] = round(self._ms(time.perf_counter()), 3)
+        return self.hitos[nombre]
+
+    # --- Importaciones ---
+
+    def instalar_medicion_importaciones(self) -> None:
+        # Buscador al frente de sys.meta_path (no un reemplazo de builtins.__import__,
+        # que shiboken sustituye mientras se importan los módulos de PySide6).
+        if self._buscador is None:
+            self._buscador = _BuscadorMedido(self)
+            sys.meta_path.insert(0, self._buscador)
+
+    def desinstalar_medicion_importaciones(self) -> None:
+        if self._buscador is not None:
+            self._buscador.activo = False
+            if self._buscador in sys.meta_path:
+                sys.meta_path.remove(self._buscador)
+            self._buscador = None
+
+    def _inicio_importacion(self, modulo: str, busqueda_s: float) -> None:
+        self._pila_importaciones.append({"modulo": modulo, "t0": time.perf_counter() - busqueda_s, "hijos_s": 0.0})
+
+    def _fin_importacion(self) -> None:
+        registro = self._pila_importaciones.pop()
+        duracion = time.perf_counter() - registro["t0"]
+        if self._pila_importaciones:
+            self._pila_importaciones[-1]["hijos_s"] += duracion
+        self.importaciones.setdefault(registro["modulo"], {
+            "acumulado_ms": round(duracion * 1000, 3),
+            "propio_ms": round((duracion - registro["hijos_s"]) * 1000, 3),
+            "fase": ";".join(f["nombre"] for f in self._pila_fases),
+            # Cadena de importaciones que llevó hasta este módulo
+            "importado_por": [r["modulo"] for r in self._pila_importaciones],
+        })
+
+    # --- Informe ---
+
+    def informe(self) -> Dict:
+        return {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "plataforma": platform.platform(),
+            "total_ms": round(self._ms(time.perf_counter()), 3),
+            "hitos": self.hitos,
+            "fases": sorted(self.fases, key=lambda f: f["inicio_ms"]),
+            "importaciones": [
+                {"modulo": modulo, **datos}
+                for modulo, datos in sorted(self.importaciones.items(), key=lambda kv: -kv[1]["acumulado_ms"])
+            ],
+        }
+
+    def pilas_colapsadas(self) -> List[str]:
+        """
+        Líneas "a;b;c microsegundos" con el tiempo propio de cada fase y de cada
+        importación (colgada de su fase y de los módulos que la importaron).
+        """
+        hijos: Dict[str, float] = {}
+        for f in self.fases:
+            padre = f["ruta"].rpartition(";")[0]
+            if padre:
+                hijos[padre] = hijos.get(padre, 0.0) + f["duracion_ms"]
+        for datos in self.importaciones.values():
+            if datos["fase"] and not datos["importado_por"]:
+                hijos[datos["fase"]] = hijos.get(datos["fase"], 0.0) + datos["acumulado_ms"]
+
+        lineas = [
+            f"{f['ruta']} {max(int((f['duracion_ms'] - hijos.get(f['ruta'], 0.0)) * 1000), 0)}"
+            for f in self.fases
+        ]
+        for modulo, datos in self.importaciones.items():
+            ruta = ([datos["fase"]] if datos["fase"] else []) + [f"import {m}" for m in datos["importado_por"] + [modulo]]
+            lineas.append(f"{';'.join(ruta)} {max(int(datos['propio_ms'] * 1000), 0)}")
+        return lineas
+
+    def escribir_informe(self) -> Dict:
+        datos = self.informe()
+        with open(self.ruta_informe, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2)
+        with open(os.path.splitext(self.ruta_informe)[0] + ".folded", "w", encoding="utf-8") as f:
+            f.write("\n".join(self.pilas_colapsadas()) + "\n")
+        self.imprimir_resumen(datos)
+        return datos
+
+    def imprimir_resumen(self, datos: Dict) -> None:
+        print(f"\n⏱️ Arranque: {datos['total_ms']:.0f} ms (informe en {os.path.abspath(self.ruta_informe)})")
+        for nombre, ms in datos["hitos"].items():
+            print(f"   {nombre:<40} {ms:>9.0f} ms")
+        print(f"   {'fase':<40} {'ms':>9} {'KB asignados':>13} {'KB pico':>9}")
+        for f in sorted(datos["fases"], key=lambda f: -f["duracion_ms"])[:FILAS_RESUMEN]:
+            print(f"   {f['ruta'][-40:]:<40} {f['duracion_ms']:>9.1f} {f['asignado_kb']:>13,.0f} {f['pico_kb']:>9,.0f}")
+        print(f"   {'importación (acumulado)':<40} {'ms':>9} {'propio ms':>13}")
+        for i in datos["importaciones"][:FILAS_RESUMEN]:
+            print(f"   {i['modulo'][-40:]:<40} {i['acumulado_ms']:>9.1f} {i['propio_ms']:>13.1f}")
+
+
+class _BuscadorMedido:
+    """
+    Delega la búsqueda en el resto de sys.meta_path y envuelve el cargador del
+    módulo encontrado para medir su carga (create_module + exec_module).
+    """
+
+    def __init__(self, medidor: MedidorArranque):
+        self.medidor = medidor
+        self.activo = True
+        self._buscando = False
+
+    def find_spec(self, nombre, ruta=None, objetivo=None):
+        if self._buscando or not self.activo:
+            return None
+        self._buscando = True
+        t0 = time.perf_counter()
+        try:
+            for buscador in sys.meta_path:
+                if buscador is self or not hasattr(buscador, "find_spec"):
+                    continue
+                spec = buscador.find_spec(nombre, ruta, objetivo)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._buscando = False
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _CargadorMedido(spec.loader, self, time.perf_counter() - t0)
+        return spec
+
+
+class _CargadorMedido:
+    def __init__(self, cargador, buscador: _BuscadorMedido, busqueda_s: float):
+        self._cargador = cargador
+        self._buscador = buscador
+        self._busqueda_s = busqueda_s
+        self._midiendo = False
+
+    def __getattr__(self, nombre):
+        # get_source, get_resource_reader, is_package... del cargador real
+        return getattr(self._cargador, nombre)
+
+    def create_module(self, spec):
+        if self._buscador.activo:
+            self._buscador.medidor._inicio_importacion(spec.name, self._busqueda_s)
+            self._midiendo = True
+        try:
+            crear = getattr(self._cargador, "create_module", None)
+            return crear(spec) if crear else None
+        except BaseException:
+            self._terminar()
+            raise
+
+    def exec_module(self, modulo):
+        try:
+            self._cargador.exec_module(modulo)
+        finally:
+            self._terminar()
+
+    def _terminar(self) -> None:
+        if self._midiendo:
+            self._midiendo = False
+            if self._buscador.activo:
+                self._buscador.medidor._fin_importacion()
+
+
+_medidor: Optional[MedidorArranque] = None
+
+
+def iniciar(ruta_informe: str) -> MedidorArranque:
+    """Activa la medición: tracemalloc y el registro de importaciones desde este momento."""
+    global _medidor
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _medidor = MedidorArranque(ruta_informe)
+    _medidor.instalar_medicion_importaciones()
+    return _medidor
+
+
+def guardar_informe() -> Optional[Dict]:
+    """Escribe el informe con lo medido hasta ahora, sin dejar de medir."""
+    return _medidor.escribir_informe() if _medidor else None
+
+
+def detener() -> Optional[Dict]:
+    """Escribe el informe final y desactiva la medición. Devuelve el informe (None si no estaba activa)."""
+    global _medidor
+    if _medidor is None:
+        return None
+    _medidor.desinstalar_medicion_importaciones()
+    datos = _medidor.escribir_informe()
+    tracemalloc.stop()
+    _medidor = None
+    return datos
+
+
+def medidor() -> Optional[MedidorArranque]:
+    return _medidor
+
+
+def fase(nombre: str):
+    """Contexto que mide una fase si la medición está activa; si no, no hace nada."""
+    return _medidor.fase(nombre) if _medidor else nullcontext()
+
+
+def hito(nombre: str) -> None:
+    if _medidor:
+        _medidor.hito(nombre)
@@ -0,0 +1,209 @@
+# src/core/migraciones.py
+"""
+Migraciones versionadas del esquema de SQLite.
+
+La versión del esquema se guarda en la cabecera de la base (PRAGMA user_version),
+así que comprobar si hay algo pendiente cuesta una sola lectura: si la base está
+al día no se refleja ninguna tabla ni se siembran datos.
+
+- Base nueva (sin tablas): create_all con el esquema actual, datos iniciales y
+  se marca directamente la última versión.
+- Base existente: se aplican en orden los pasos con versión mayor que la
+  guardada, y la versión se actualiza tras cada paso.
+
+Los pasos reciben el engine y deben poder repetirse sin daño (comprobar antes
+de crear o alterar), porque en SQLite el DDL no siempre queda dentro de la
+transacción y un paso interrumpido se vuelve a ejecutar en el siguiente arranque.
+Para añadir un cambio de esquema: declarar el cambio en el modelo y registrar
+aquí un paso nuevo con la siguiente versión.
+"""
+
+from typing import Callable, List, Tuple
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from core.medicion_arranque import fase
+
+# (versión, descripción, paso) en orden de versión.
+MIGRACIONES: List[Tuple[int, str, Callable[[Engine], None]]] = []
+
+
+def migracion(version: int, descripcion: str):
+    """Registra una función como paso de migración a 'version'."""
+    def registrar(paso: Callable[[Engine], None]):
+        if MIGRACIONES and version != MIGRACIONES[-1][0] + 1:
+            raise ValueError(f"La migración {version} no sigue a la {MIGRACIONES[-1][0]}.")
+        MIGRACIONES.append((version, descripcion, paso))
+        return paso
+    return registrar
+
+
+def version_esquema() -> int:
+    """Versión que tendrá la base después de aplicar todas las migraciones."""
+    return MIGRACIONES[-1][0] if MIGRACIONES else 0
+
+
+def leer_version(engine: Engine) -> int:
+    with engine.connect() as conexion:
+        return conexion.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def _guardar_version(engine: Engine, version: int) -> None:
+    with engine.begin() as conexion:
+        conexion.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+
+
+def _base_vacia(engine: Engine) -> bool:
+    with engine.connect() as conexion:
+        return not conexion.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' LIMIT 1"
+        ).first()
+
+
+def agregar_columna(engine: Engine, tabla: str, columna: str, definicion: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN si la columna no existe. Devuelve True si la añadió."""
+    with engine.begin() as conexion:
+        existentes = {fila[1] for fila in conexion.exec_driver_sql(f"PRAGMA table_info({tabla})")}
+        if columna in existentes:
+            return False
+        conexion.exec_driver_sql(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+    return True
+
+
+def aplicar_migraciones(engine: Engine) -> int:
+    """
+    Lleva la base a la versión actual del esquema. Devuelve cuántos pasos se
+    aplicaron (0 si ya estaba al día).
+    """
+    objetivo = version_esquema()
+    actual = leer_version(engine)
+    if actual == objetivo:
+        return 0
+    if actual > objetivo:
+        raise RuntimeError(f"La base de datos tiene el esquema v{actual}, más nuevo que el de esta versión del programa (v{objetivo}).")
+
+    from core.db import Base, importar_modelos, seed_initial_data
+    with fase("importar modelos"):
+        importar_modelos()
+
+    if actual == 0 and _base_vacia(engine):
+        print(f"📦 Creando el esquema v{objetivo} en una base nueva...")
+        with fase("create_all"):
+            Base.metadata.create_all(bind=engine)
+        with fase("datos iniciales"), Session(bind=engine) as db:
+            seed_initial_data(db)
+        _guardar_version(engine, objetivo)
+        return len(MIGRACIONES)
+
+    aplicadas = 0
+    for version, descripcion, paso in MIGRACIONES:
+        if version <= actual:
+            continue
+        print(f"🛠️ Migración v{version}: {descripcion}...")
+        with fase(f"migración v{version}"):
+            paso(engine)
+        _guardar_version(engine, version)
+        aplicadas += 1
+    return aplicadas
+
+
+# --- Pasos ---
+
+@migracion(1, "Tablas que falten y datos iniciales")
+def _esquema_base(engine: Engine) -> None:
+    # Bases creadas con create_all antes de que existieran las migraciones.
+    from core.db import Base, seed_initial_data
+    Base.metadata.create_all(bind=engine)
+    with Session(bind=engine) as db:
+        seed_initial_data(db)
+
+
+@migracion(2, "Índices compuestos y NOCASE de las tablas más consultadas")
+def _indices_tablas_calientes(engine: Engine) -> None:
+    from core.db import crear_indices_faltantes
+    crear_indices_faltantes(engine)
+
+
+@migracion(3, "Poblar la jerarquía de categorías, el índice de búsqueda y el resumen contable")
+def _poblar_tablas_derivadas(engine: Engine) -> None:
+    from modules.categorias.categoria_controller import CategoriaController
+    from modules.productos import indice_busqueda
+    from modules.contabilidad.contabilidad_controller import ContabilidadController
+
+    with Session(bind=engine) as db:
+        categoria_ctrl = CategoriaController(db)
+        if categoria_ctrl.jerarquia_desincronizada():
+            print("🌳 Reconstruyendo la jerarquía de categorías...")
+            categoria_ctrl.reconstruir_jerarquia()
+        if indice_busqueda.indice_busqueda_desincronizado(db):
+            print("🔍 Reconstruyendo el índice de búsqueda de productos...")
+            indice_busqueda.reconstruir_indice_busqueda(db)
+        contabilidad_ctrl = ContabilidadController(db)
+        if contabilidad_ctrl.resumen_diario_desincronizado():
+            print("📒 Reconstruyendo el resumen contable diario...")
+            contabilidad_ctrl.reconstruir_resumen_diario()
+
+
+@migracion(4, "Stock de los kits guardado en producto_plantillas.kit_stock")
+def _stock_de_kits(engine: Engine) -> None:
+    from modules.productos import stock_kits
+
+    agregar_columna(engine, "producto_plantillas", "kit_stock", "INTEGER")
+    with Session(bind=engine) as db:
+        kits = stock_kits.reconstruir_stock_kits(db)
+        db.commit()
+    print(f"🧩 Stock calculado para {kits} kits.")
+
+
+@migracion(5, "Cortes de stock e índice de movimientos por fecha")
+def _cortes_stock(engine: Engine) -> None:
+    from core.db import Base, crear_indices_faltantes
+    from modules.productos.models import CorteStock, InstantaneaStock
+
+    Base.metadata.create_all(bind=engine, tables=[CorteStock.__table__, InstantaneaStock.__table__])
+    crear_indices_faltantes(engine)
+
+
+@migracion(6, "Valoración del inventario: costos en los movimientos, costo medio y capas FIFO")
+def _valoracion_inventario(engine: Engine) -> None:
+    from core.db import Base
+    from modules.productos.models import CapaCosto
+    from modules.productos import valoracion
+
+    agregar_columna(engine, "movimientos_stock", "costo_unitario", "FLOAT")
+    agregar_columna(engine, "movimientos_stock", "costo_fifo", "FLOAT")
+    agregar_columna(engine, "productos", "costo_promedio", "FLOAT")
+    Base.metadata.create_all(bind=engine, tables=[CapaCosto.__table__])
+    with Session(bind=engine) as db:
+        variantes = valoracion.reconstruir_valoracion(db)
+        db.commit()
+    print(f"💰 Costo medio y capas FIFO calculados para {variantes} variantes.")
+
+
+@migracion(7, "Triggers de alta del índice de búsqueda con indexación diferida por conexión")
+def _triggers_indexacion_diferida(engine: Engine) -> None:
+    from modules.productos import indice_busqueda
+
+    with engine.begin() as conexion:
+        indice_busqueda.actualizar_triggers_de_alta(conexion)
+    # Variantes que quedaron sin indexar mientras una importación tenía los triggers borrados
+    with Session(bind=engine) as db:
+        if indice_busqueda.indice_busqueda_desincronizado(db):
+            print("🔍 Reconstruyendo el índice de búsqueda de productos...")
+            indice_busqueda.reconstruir_indice_busqueda(db)
+
+
+@migracion(8, "Revisión de claves foráneas huérfanas")
+def _revision_claves_foraneas(engine: Engine) -> None:
+    # Solo informa: las filas huérfanas no se tocan (pueden ser historial de ventas o compras).
+    from core.db import revisar_claves_foraneas
+
+    with engine.connect() as conexion:
+        huerfanas = revisar_claves_foraneas(conexion)
+    if not huerfanas:
+        print("🔗 Sin filas huérfanas: se puede activar foreign_keys (perfil 'seguro').")
+        return
+    for relacion, filas in huerfanas.items():
+        print(f"⚠️ {filas} filas de {relacion} apuntan a registros que ya no existen.")
+    print("⚠️ Con foreign_keys activado esas filas harán fallar algunas escrituras; revísalas antes de usar el perfil 'seguro'.")
@@ -0,0 +1,58 @@
+# src/core/tareas.py
+
+import threading
+from typing import Any, Callable, Optional
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+
+class TareaCancelada(Exception):
+    """La lanza una tarea en segundo plano cuando detecta que se pidió cancelarla."""
+
+
+class _SenalesTarea(QObject):
+    progreso = Signal(int, int)  # hechos, total (0 si se desconoce)
+    terminada = Signal(object)
+    fallida = Signal(str)
+    cancelada = Signal()
+
+
+class TareaSegundoPlano(QRunnable):
+    """
+    Ejecuta 'funcion(progreso, cancelado)' en el pool global de Qt.
+
+    La función informa su avance llamando a progreso(hechos, total) y debe
+    consultar cancelado() con regularidad; si devuelve True, lo esperado es que
+    limpie lo que haya dejado a medias y lance TareaCancelada. Las señales llegan
+    al hilo de la GUI, así que se pueden conectar directamente a widgets.
+    """
+
+    def __init__(self, funcion: Callable[[Callable[[int, int], None], Callable[[], bool]], Any]):
+        super().__init__()
+        self.funcion = funcion
+        self.senales = _SenalesTarea()
+        self._cancelar = threading.Event()
+
+    def cancelar(self):
+        self._cancelar.set()
+
+    def esta_cancelada(self) -> bool:
+        return self._cancelar.is_set()
+
+    def run(self):
+        try:
+            resultado = self.funcion(self.senales.progreso.emit, self.esta_cancelada)
+        except TareaCancelada:
+            print("⏹️ Tarea en segundo plano cancelada.")
+            self.senales.cancelada.emit()
+            return
+        except Exception as e:
+            print(f"❌ Error en tarea en segundo plano: {e}")
+            self.senales.fallida.emit(str(e))
+            return
+        self.senales.terminada.emit(resultado)
+
+    def iniciar(self, pool: Optional[QThreadPool] = None) -> "TareaSegundoPlano":
+        # Las señales viven en el hilo que crea la tarea; el QRunnable no debe borrarse antes de emitirlas.
+        self.setAutoDelete(False)
+        (pool or QThreadPool.globalInstance()).start(self)
+        return self
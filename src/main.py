@@ -2,6 +2,7 @@
 import sys
 import os
 import json
+import multiprocessing
 
 print("🚀 Iniciando S.I.B.O.R.S, por favor espere...")
 
@@ -14,22 +15,32 @@ except NameError:
     # Fallback para algunos entornos
     sys.path.append(os.path.abspath('.'))
 
-from PySide6.QtWidgets import QApplication
+# Medición del arranque (--profile-startup): se activa antes de importar PySide6 y el resto.
+from core import medicion_arranque
+from core.medicion_arranque import fase
+_ruta_informe_arranque = medicion_arranque.ruta_solicitada(sys.argv)
+if _ruta_informe_arranque and __name__ == "__main__":
+    medicion_arranque.iniciar(_ruta_informe_arranque)
 
-# --- INICIO DE LA MODIFICACIÓN ---
-# El 'orm' y la 'Session' para type-hinting vienen de sqlalchemy, no de PySide6.
-from sqlalchemy.orm import Session as SQLAlchemySession
-# --- FIN DE LA MODIFICACIÓN ---
+with fase("importar PySide6"):
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtCore import QTimer
 
-from core.db import init_db, DBSession 
-from modules.usuarios.usuarios_model import Usuario
-from modules.roles.roles_model import Rol
-from modules.roles.roles_ui import MODULOS_DISPONIBLES
-from ui.theme_manager import ThemeManager
-from modules.usuarios.usuarios_controller import UsuariosController
-from ui.login_ui import LoginWindow
-from modules.empresa.empresa_model import Empresa
-from ui.main_window import MainWindow
+with fase("importar aplicación"):
+    # --- INICIO DE LA MODIFICACIÓN ---
+    # El 'orm' y la 'Session' para type-hinting vienen de sqlalchemy, no de PySide6.
+    from sqlalchemy.orm import Session as SQLAlchemySession
+    # --- FIN DE LA MODIFICACIÓN ---
+
+    from core.db import init_db, DBSession 
+    from modules.usuarios.usuarios_model import Usuario
+    from modules.roles.roles_model import Rol
+    from modules.roles.roles_ui import MODULOS_DISPONIBLES
+    from ui.theme_manager import ThemeManager
+    from modules.usuarios.usuarios_controller import UsuariosController
+    from ui.login_ui import LoginWindow
+    from modules.empresa.empresa_model import Empresa
+    from ui.main_window import MainWindow
 
 def crear_admin_si_no_existe(db: SQLAlchemySession) -> None:
     """
@@ -61,38 +72,65 @@ def crear_admin_si_no_existe(db: SQLAlchemySession) -> None:
         db.commit()
 
 def main():
-    app = QApplication(sys.argv)
-    app.theme_manager = ThemeManager(app)
+    salir_tras_login = medicion_arranque.BANDERA_SALIR in sys.argv
+    with fase("QApplication"):
+        app = QApplication(medicion_arranque.quitar_banderas(sys.argv))
+    with fase("tema"):
+        app.theme_manager = ThemeManager(app)
     
-    # 1. Inicializa la estructura de la DB (crea las tablas si no existen)
-    init_db()
+    # 1. Aplica las migraciones pendientes (con la base al día solo lee PRAGMA user_version)
+    with fase("init_db"):
+        migraciones_aplicadas = init_db()
     
     # 2. Creamos UNA SOLA credencial de base de datos para todas las operaciones de arranque
     db_session = DBSession()
     
     try:
-        # 3. Le pasamos esa credencial a la función que crea el admin
-        crear_admin_si_no_existe(db_session)
+        # 3. Le pasamos esa credencial a la función que crea el admin; solo hace
+        #    falta cuando el esquema cambió (base nueva o migraciones aplicadas).
+        if migraciones_aplicadas:
+            with fase("crear_admin_si_no_existe"):
+                crear_admin_si_no_existe(db_session)
         
         # 4. Usamos la misma credencial para las demás tareas
-        usuarios_controller = UsuariosController(db_session)
-        empresa = db_session.query(Empresa).first()
-        nombre_empresa = empresa.nombre if empresa else "S.I.B.O.R.S"
+        with fase("datos de empresa"):
+            usuarios_controller = UsuariosController(db_session)
+            empresa = db_session.query(Empresa).first()
+            nombre_empresa = empresa.nombre if empresa else "S.I.B.O.R.S"
         
         main_window_instance = None
 
+        def principal_interactiva(_ms):
+            medicion_arranque.hito("ventana principal interactiva")
+            medicion_arranque.detener()
+
         def open_main_window(usuario_autenticado):
             nonlocal main_window_instance
             if usuario_autenticado:
+                medicion_arranque.hito("login correcto")
                 # La ventana principal también podría necesitar la sesión en el futuro
-                main_window_instance = MainWindow(usuario_autenticado, db_session)
-                main_window_instance.showMaximized()
+                with fase("ventana principal"):
+                    main_window_instance = MainWindow(usuario_autenticado, db_session)
+                    main_window_instance.interactiva.connect(principal_interactiva)
+                    main_window_instance.showMaximized()
         
-        login_window = LoginWindow(usuarios_controller, nombre_empresa)
-        login_window.login_success.connect(open_main_window)
-        
-        print("✅ Sistema listo. Mostrando ventana de login.")
-        login_window.show()
+        with fase("ventana de login"):
+            login_window = LoginWindow(usuarios_controller, nombre_empresa)
+            login_window.login_success.connect(open_main_window)
+            
+            print("✅ Sistema listo. Mostrando ventana de login.")
+            login_window.show()
+
+        if medicion_arranque.medidor():
+            # El temporizador a 0 ms corre cuando el login ya se pintó y atiende eventos.
+            def login_interactivo():
+                medicion_arranque.hito("login interactivo")
+                if salir_tras_login:
+                    medicion_arranque.detener()
+                    app.quit()
+                else:
+                    medicion_arranque.guardar_informe()
+            QTimer.singleShot(0, login_interactivo)
         
         app.exec()
 
@@ -103,4 +141,6 @@ def main():
         sys.exit()
 
 if __name__ == "__main__":
+    # Necesario para la validación multiproceso del importador en ejecutables congelados (Windows).
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
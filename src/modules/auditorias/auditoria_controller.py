@@ -10,6 +10,7 @@ from modules.productos.producto_controller import ProductoController
 # --- INICIO DE LA MODIFICACIÓN ---
 # Apuntamos al nuevo 'models.py' unificado para obtener las definiciones.
 from modules.productos.models import TipoAjusteStock, Producto
+from modules.productos import stock_kits
 # --- FIN DE LA MODIFICACIÓN ---
 
 class AuditoriaController:
@@ -53,6 +54,9 @@ class AuditoriaController:
         producto = self.db.get(Producto, producto_id)
         if not producto:
             raise ValueError("El producto especificado no existe.")
+        # Un kit no se cuenta: al finalizar, su ajuste sería rechazado (ver ProductoController.ajustar_stock)
+        if stock_kits.es_variante_de_kit(self.db, producto_id):
+            raise ValueError(f"'{producto.sku}' es un kit: cuenta sus componentes en su lugar.")
 
         stock_sistema = producto.stock
         diferencia = conteo_fisico - stock_sistema
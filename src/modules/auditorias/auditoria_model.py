@@ -2,7 +2,7 @@
 
 import enum
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, DateTime, Text, Enum as SQLAlchemyEnum, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, Enum as SQLAlchemyEnum, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from core.db import Base
 
@@ -56,5 +56,10 @@ class AuditoriaDetalle(Base):
     stock_fisico = Column(Integer, nullable=False)   # El stock que se contó realmente
     diferencia = Column(Integer, nullable=False)     # stock_fisico - stock_sistema
 
+    __table_args__ = (
+        # Conteo de un producto dentro de una auditoría (y detalles de la auditoría por el prefijo)
+        Index("ix_auditoria_detalles_auditoria_producto", "auditoria_id", "producto_id"),
+    )
+
     def __repr__(self):
         return f"<AuditoriaDetalle(id={self.id}, producto_id={self.producto_id}, diferencia={self.diferencia})>"
\ No newline at end of file
@@ -1,10 +1,10 @@
 # src/modules/categorias/categoria_controller.py
 
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import exc, distinct
-from typing import List, Optional
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy import exc, distinct, select, insert, delete, func, literal, true
+from typing import List, Optional, Dict, Set
 
-from .categoria_model import Categoria
+from .categoria_model import Categoria, CategoriaJerarquia
 # --- INICIO DE LA MODIFICACIÓN ---
 # Esta es la importación absoluta correcta desde el módulo de productos
 from modules.productos.models import ProductoPlantilla
@@ -26,6 +26,8 @@ class CategoriaController:
 
         nueva_categoria = Categoria(nombre=nombre.strip(), categoria_padre_id=padre_id)
         self.db.add(nueva_categoria)
+        self.db.flush()
+        self._enlazar_en_jerarquia(nueva_categoria.id, padre_id)
         self.db.commit()
         self.db.refresh(nueva_categoria)
         return nueva_categoria
@@ -39,11 +41,8 @@ class CategoriaController:
             if categoria_id == padre_id:
                 raise ValueError("Una categoría no puede ser su propio padre.")
             
-            descendiente = self.db.get(Categoria, padre_id)
-            while descendiente:
-                if descendiente.categoria_padre_id == categoria_id:
-                    raise ValueError("No se puede mover una categoría a una de sus propias subcategorías.")
-                descendiente = descendiente.padre
+            if self.es_descendiente(padre_id, categoria_id):
+                raise ValueError("No se puede mover una categoría a una de sus propias subcategorías.")
 
         if nombre:
             nombre_existente = self.db.query(Categoria).filter(Categoria.nombre.ilike(nombre), Categoria.id != categoria_id).first()
@@ -51,6 +50,8 @@ class CategoriaController:
                 raise ValueError(f"La categoría '{nombre}' ya existe.")
             categoria.nombre = nombre.strip()
 
+        if categoria.categoria_padre_id != padre_id:
+            self._mover_en_jerarquia(categoria_id, padre_id)
         categoria.categoria_padre_id = padre_id
         
         self.db.commit()
@@ -68,6 +69,9 @@ class CategoriaController:
         if self.db.query(ProductoPlantilla).filter(ProductoPlantilla.categoria_id == categoria_id).first():
             raise ValueError("No se puede eliminar la categoría porque tiene productos asociados.")
 
+        self.db.execute(delete(CategoriaJerarquia).where(
+            (CategoriaJerarquia.ancestro_id == categoria_id) | (CategoriaJerarquia.descendiente_id == categoria_id)
+        ))
         self.db.delete(categoria)
         self.db.commit()
         return True
@@ -82,4 +86,94 @@ class CategoriaController:
         return self.db.query(Categoria).join(ProductoPlantilla).distinct().order_by(Categoria.nombre).all()
 
     def obtener_categoria_por_id(self, categoria_id: int) -> Optional[Categoria]:
-        return self.db.query(Categoria).options(joinedload(Categoria.plantillas)).filter(Categoria.id == categoria_id).first()
\ No newline at end of file
+        return self.db.query(Categoria).options(joinedload(Categoria.plantillas)).filter(Categoria.id == categoria_id).first()
+
+    # --- Consultas sobre la tabla de clausura ---
+
+    @staticmethod
+    def subconsulta_subarbol(categoria_id: int):
+        """SELECT con los IDs de la categoría y todos sus descendientes, para usar en un IN/JOIN."""
+        return select(CategoriaJerarquia.descendiente_id).where(CategoriaJerarquia.ancestro_id == categoria_id)
+
+    def obtener_ids_subarbol(self, categoria_id: int) -> List[int]:
+        return list(self.db.scalars(self.subconsulta_subarbol(categoria_id)))
+
+    def es_descendiente(self, categoria_id: int, posible_ancestro_id: int) -> bool:
+        """True si 'categoria_id' está en el subárbol de 'posible_ancestro_id' (o es la misma)."""
+        return self.db.query(CategoriaJerarquia).filter_by(ancestro_id=posible_ancestro_id, descendiente_id=categoria_id).first() is not None
+
+    def buscar_ids_visibles(self, texto: str) -> Set[int]:
+        """IDs de las categorías cuyo nombre contiene 'texto', junto con todos sus ancestros."""
+        consulta = (
+            select(distinct(CategoriaJerarquia.ancestro_id))
+            .join(Categoria, Categoria.id == CategoriaJerarquia.descendiente_id)
+            .where(Categoria.nombre.ilike(f"%{texto.strip()}%"))
+        )
+        return set(self.db.scalars(consulta))
+
+    def obtener_ruta_categoria(self, categoria_id: int, separador: str = " / ") -> str:
+        """Ruta completa 'Raíz / ... / Categoría' resuelta con una sola consulta indexada."""
+        nombres = self.db.scalars(
+            select(Categoria.nombre)
+            .join(CategoriaJerarquia, CategoriaJerarquia.ancestro_id == Categoria.id)
+            .where(CategoriaJerarquia.descendiente_id == categoria_id)
+            .order_by(CategoriaJerarquia.profundidad.desc())
+        ).all()
+        return separador.join(nombres)
+
+    # --- Mantenimiento de la tabla de clausura ---
+
+    def _enlazar_en_jerarquia(self, categoria_id: int, padre_id: Optional[int]) -> None:
+        """Agrega la fila propia de una categoría nueva y una por cada ancestro de su padre."""
+        self.db.execute(insert(CategoriaJerarquia).values(ancestro_id=categoria_id, descendiente_id=categoria_id, profundidad=0))
+        if padre_id:
+            ancestros = select(CategoriaJerarquia.ancestro_id, literal(categoria_id), CategoriaJerarquia.profundidad + 1).where(CategoriaJerarquia.descendiente_id == padre_id)
+            self.db.execute(insert(CategoriaJerarquia).from_select(["ancestro_id", "descendiente_id", "profundidad"], ancestros))
+
+    def _mover_en_jerarquia(self, categoria_id: int, nuevo_padre_id: Optional[int]) -> None:
+        """Reubica el subárbol de 'categoria_id' bajo 'nuevo_padre_id' (o en la raíz)."""
+        subarbol = select(CategoriaJerarquia.descendiente_id).where(CategoriaJerarquia.ancestro_id == categoria_id)
+        ancestros_externos = select(CategoriaJerarquia.ancestro_id).where(
+            CategoriaJerarquia.descendiente_id == categoria_id, CategoriaJerarquia.ancestro_id != categoria_id
+        )
+        # 1. Se cortan los enlaces entre los ancestros anteriores y todo el subárbol
+        self.db.execute(delete(CategoriaJerarquia).where(
+            CategoriaJerarquia.descendiente_id.in_(subarbol),
+            CategoriaJerarquia.ancestro_id.in_(ancestros_externos)
+        ).execution_options(synchronize_session=False))
+        # 2. Se enlaza cada ancestro del nuevo padre con cada nodo del subárbol
+        if nuevo_padre_id:
+            sobre = aliased(CategoriaJerarquia)
+            bajo = aliased(CategoriaJerarquia)
+            producto_cartesiano = (
+                select(sobre.ancestro_id, bajo.descendiente_id, sobre.profundidad + bajo.profundidad + 1)
+                .select_from(sobre).join(bajo, true())
+                .where(sobre.descendiente_id == nuevo_padre_id, bajo.ancestro_id == categoria_id)
+            )
+            self.db.execute(insert(CategoriaJerarquia).from_select(["ancestro_id", "descendiente_id", "profundidad"], producto_cartesiano))
+
+    def reconstruir_jerarquia(self) -> int:
+        """
+        Regenera la tabla de clausura desde categorias.categoria_padre_id. Se usa
+        para poblarla en bases existentes o repararla. Devuelve las filas creadas.
+        """
+        padres: Dict[int, Optional[int]] = dict(self.db.execute(select(Categoria.id, Categoria.categoria_padre_id)).all())
+        filas = []
+        for categoria_id in padres:
+            actual, profundidad, visitados = categoria_id, 0, set()
+            while actual is not None and actual in padres and actual not in visitados:
+                visitados.add(actual)
+                filas.append({"ancestro_id": actual, "descendiente_id": categoria_id, "profundidad": profundidad})
+                actual = padres[actual]
+                profundidad += 1
+        self.db.execute(delete(CategoriaJerarquia))
+        if filas:
+            self.db.execute(insert(CategoriaJerarquia), filas)
+        self.db.commit()
+        return len(filas)
+
+    def jerarquia_desincronizada(self) -> bool:
+        """True si alguna categoría no tiene su fila propia en la tabla de clausura."""
+        num_categorias = self.db.query(func.count(Categoria.id)).scalar()
+        num_propias = self.db.query(func.count()).select_from(CategoriaJerarquia).filter(CategoriaJerarquia.profundidad == 0).scalar()
+        return num_categorias != num_propias
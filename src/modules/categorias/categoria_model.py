@@ -1,6 +1,6 @@
 # src/modules/categorias/categoria_model.py
 
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from core.db import Base
 
@@ -22,4 +22,24 @@ class Categoria(Base):
     # --- FIN DE LA CORRECCIÓN ---
 
     def __repr__(self):
-        return f"<Categoria(id={self.id}, nombre='{self.nombre}')>"
\ No newline at end of file
+        return f"<Categoria(id={self.id}, nombre='{self.nombre}')>"
+
+class CategoriaJerarquia(Base):
+    """
+    Tabla de clausura del árbol de categorías: una fila por cada par
+    (ancestro, descendiente), incluida la fila de la categoría consigo misma
+    con profundidad 0. La mantiene CategoriaController y permite resolver
+    subárboles, rutas y ciclos con una sola consulta indexada.
+    """
+    __tablename__ = "categoria_jerarquia"
+
+    ancestro_id = Column(Integer, ForeignKey("categorias.id", ondelete="CASCADE"), primary_key=True)
+    descendiente_id = Column(Integer, ForeignKey("categorias.id", ondelete="CASCADE"), primary_key=True)
+    profundidad = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_categoria_jerarquia_descendiente", "descendiente_id", "profundidad"),
+    )
+
+    def __repr__(self):
+        return f"<CategoriaJerarquia(ancestro={self.ancestro_id}, descendiente={self.descendiente_id}, profundidad={self.profundidad})>"
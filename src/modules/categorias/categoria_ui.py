@@ -7,15 +7,21 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtGui import QStandardItemModel, QStandardItem
 from PySide6.QtCore import Qt
-from typing import Optional
+from typing import Optional, Set
+from core.busqueda import ControladorBusqueda, fabrica_sesiones_para
 from .categoria_controller import CategoriaController
 from .categoria_model import Categoria
 from .categoria_dialog import CategoriaDialog
 
+def _buscar_categorias(sesion, texto: str) -> Set[int]:
+    return CategoriaController(sesion).buscar_ids_visibles(texto)
+
 class CategoriaWidget(QWidget):
     def __init__(self, categoria_controller: CategoriaController, parent=None):
         super().__init__(parent)
         self.controller = categoria_controller
+        self.busqueda = ControladorBusqueda(_buscar_categorias, fabrica_sesiones_para(categoria_controller.db), parent=self)
+        self.busqueda.resultados_listos.connect(lambda ids, _: self._aplicar_filtro_arbol(ids))
         self._setup_ui()
         self.actualizar_vista()
 
@@ -116,11 +122,11 @@ class CategoriaWidget(QWidget):
             
         self.tabla_productos.setRowCount(len(categoria_con_plantillas.plantillas))
         for row, plantilla in enumerate(categoria_con_plantillas.plantillas):
-            # Calculamos el stock total sumando el de todas sus variantes
-            stock_total = sum(v.stock for v in plantilla.variantes)
+            # Calculamos el stock total sumando el de todas sus variantes (los kits guardan el suyo en kit_stock)
+            stock_total = plantilla.kit_stock if plantilla.kit_stock is not None else sum(v.stock for v in plantilla.variantes)
             
             # Determinamos el tipo de producto
-            if plantilla.componentes:
+            if plantilla.kit_stock is not None:
                 tipo = "Kit / Compuesto"
             elif len(plantilla.variantes) > 1:
                 tipo = "Con Variantes"
@@ -186,21 +192,23 @@ class CategoriaWidget(QWidget):
                 QMessageBox.critical(self, "Error Inesperado", f"Ocurrió un error: {e}")
 
     def _filtrar_arbol(self, texto: str):
-        texto_busqueda = texto.strip().lower()
+        if not texto.strip():
+            self.busqueda.cancelar()
+            self._aplicar_filtro_arbol(None)
+            return
+        self.busqueda.solicitar(texto)
+
+    def _aplicar_filtro_arbol(self, ids_visibles: Optional[Set[int]]):
+        """Muestra solo las categorías en 'ids_visibles' (coincidencias y sus ancestros); None muestra todo."""
         root = self.tree_model.invisibleRootItem()
         for i in range(root.rowCount()):
-            self._filtrar_item(root.child(i), texto_busqueda)
+            self._filtrar_item(root.child(i), ids_visibles)
 
-    def _filtrar_item(self, item: QStandardItem, texto: str) -> bool:
-        coincide_item_actual = texto in item.text().lower()
-        visible = coincide_item_actual
+    def _filtrar_item(self, item: QStandardItem, ids_visibles: Optional[Set[int]]):
+        categoria = item.data(Qt.ItemDataRole.UserRole)
+        visible = ids_visibles is None or categoria.id in ids_visibles
         for i in range(item.rowCount()):
-            hijo = item.child(i)
-            if self._filtrar_item(hijo, texto):
-                visible = True
+            self._filtrar_item(item.child(i), ids_visibles)
         self.tree_view.setRowHidden(item.row(), item.parent().index() if item.parent() else self.tree_model.invisibleRootItem().index(), not visible)
-        if not coincide_item_actual and visible:
-            self.tree_view.expand(item.index())
-        elif not texto:
-            self.tree_view.expand(item.index())
-        return visible
\ No newline at end of file
+        if visible:
+            self.tree_view.expand(item.index())
\ No newline at end of file
@@ -8,19 +8,27 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Qt
 from typing import List, Optional
 
+from core.busqueda import ControladorBusqueda, fabrica_sesiones_para
 from .cliente_controller import ClienteController
 from .cliente_model import Cliente, EstadoCliente
 from .cliente_dialog import ClienteDialog
 from modules.ventas.ventas_model import Venta
 
+def _buscar_clientes(sesion, termino: str) -> List[Cliente]:
+    # Los clientes se devuelven desligados de la sesión; la tabla solo usa columnas ya cargadas.
+    return ClienteController(sesion).buscar_clientes(termino)
+
 class ClienteWidget(QWidget):
     def __init__(self, controller: ClienteController, parent=None):
         super().__init__(parent)
         self.controller = controller
+        self.busqueda = ControladorBusqueda(_buscar_clientes, fabrica_sesiones_para(controller.db), parent=self)
+        self.busqueda.resultados_listos.connect(lambda clientes, _: self._cargar_tabla_clientes(clientes))
+        self.busqueda.busqueda_fallida.connect(lambda msg: QMessageBox.critical(self, "Error", f"No se pudo filtrar la lista: {msg}"))
         self._setup_ui()
 
     def actualizar_vista(self):
-        self._filtrar_tabla()
+        self.busqueda.buscar_ahora(self.input_busqueda.text())
         self._actualizar_botones()
 
     def _setup_ui(self):
@@ -87,12 +95,7 @@ class ClienteWidget(QWidget):
         layout_principal.addLayout(main_content_layout)
         
     def _filtrar_tabla(self):
-        termino = self.input_busqueda.text()
-        try:
-            clientes = self.controller.buscar_clientes(termino)
-            self._cargar_tabla_clientes(clientes)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"No se pudo filtrar la lista: {e}")
+        self.busqueda.solicitar(self.input_busqueda.text())
 
     def _cargar_tabla_clientes(self, clientes: List[Cliente]):
         self.tabla_clientes.setRowCount(len(clientes))
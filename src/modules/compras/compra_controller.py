@@ -43,25 +43,39 @@ class CompraController:
         if not orden: raise ValueError("La orden de compra no existe.")
         if orden.estado != EstadoOrdenCompra.PENDIENTE: raise ValueError(f"La orden ya está en estado '{orden.estado.value}'.")
 
-        for detalle in orden.detalles:
-            self.producto_ctrl.ajustar_stock(
-                producto_id=detalle.producto_id,
-                cantidad_ajuste=detalle.cantidad,
+        try:
+            self.producto_ctrl.ajustar_stock_lote(
+                [{"producto_id": d.producto_id, "cantidad": d.cantidad} for d in orden.detalles],
                 tipo_ajuste=TipoAjusteStock.ENTRADA_COMPRA,
                 motivo=f"Recepción de Orden de Compra #{orden.id}",
-                usuario_id=usuario_id
+                usuario_id=usuario_id,
+                commit=False,
+                costos=self._costos_por_producto(orden)
             )
-        
-        concepto = f"Compra a proveedor: {orden.proveedor.nombre_empresa} (Orden #{orden.id})"
-        self.contabilidad_ctrl.agregar_movimiento(
-            tipo=TipoMovimiento.EGRESO, concepto=concepto, monto=orden.total, categoria="Compras"
-        )
 
-        orden.estado = EstadoOrdenCompra.RECIBIDA
-        orden.fecha_recepcion = datetime.now(timezone.utc)
-        self.db.commit()
+            concepto = f"Compra a proveedor: {orden.proveedor.nombre_empresa} (Orden #{orden.id})"
+            self.contabilidad_ctrl.agregar_movimiento(
+                tipo=TipoMovimiento.EGRESO, concepto=concepto, monto=orden.total, categoria="Compras", commit=False
+            )
+
+            orden.estado = EstadoOrdenCompra.RECIBIDA
+            orden.fecha_recepcion = datetime.now(timezone.utc)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
         self.db.refresh(orden)
         return orden
 
+    @staticmethod
+    def _costos_por_producto(orden: OrdenCompra) -> Dict[int, float]:
+        """Costo unitario de cada producto de la orden (media ponderada si aparece en varias líneas)."""
+        unidades: Dict[int, int] = {}
+        importes: Dict[int, float] = {}
+        for d in orden.detalles:
+            unidades[d.producto_id] = unidades.get(d.producto_id, 0) + d.cantidad
+            importes[d.producto_id] = importes.get(d.producto_id, 0.0) + d.cantidad * d.costo_unitario
+        return {pid: importes[pid] / unidades[pid] for pid in unidades if unidades[pid] > 0}
+
     def listar_ordenes_compra(self) -> List[OrdenCompra]:
         return self.db.query(OrdenCompra).options(joinedload(OrdenCompra.proveedor)).order_by(OrdenCompra.fecha_emision.desc()).all()
\ No newline at end of file
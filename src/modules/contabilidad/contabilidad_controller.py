@@ -1,39 +1,167 @@
 # src/modules/contabilidad/contabilidad_controller.py
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta, timezone
-from sqlalchemy import func, case
+from datetime import datetime, timedelta, timezone, date
+from sqlalchemy import func, case, select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from .contabilidad_model import TipoMovimiento, MovimientoContable
+from .contabilidad_model import TipoMovimiento, MovimientoContable, ResumenContableDiario, CierreContable
 from utils.validators import validar_longitud
 
 class ContabilidadController:
     def __init__(self, db_session: Session):
         self.db = db_session
 
-    def agregar_movimiento(self, tipo: TipoMovimiento, concepto: str, monto: float, descripcion: str = "", categoria: str = None):
+    def agregar_movimiento(self, tipo: TipoMovimiento, concepto: str, monto: float, descripcion: str = "", categoria: str = None, commit: bool = True):
         if not validar_longitud(concepto, 3):
             raise ValueError("El concepto debe tener al menos 3 caracteres.")
         if monto <= 0:
             raise ValueError("El monto debe ser mayor a 0.")
-        
+
+        fecha = datetime.now(timezone.utc)
         nuevo_movimiento = MovimientoContable(
-            tipo=tipo, 
-            concepto=concepto.strip(), 
+            tipo=tipo,
+            concepto=concepto.strip(),
             monto=monto,
             descripcion=descripcion.strip(),
-            categoria=categoria.strip() if categoria else None
+            categoria=categoria.strip() if categoria else None,
+            fecha=fecha
         )
         self.db.add(nuevo_movimiento)
-        self.db.commit()
+        self._acumular_en_resumen(fecha.date(), tipo, nuevo_movimiento.categoria, monto)
+        if commit:
+            self.db.commit()
         return nuevo_movimiento
 
+    def _acumular_en_resumen(self, dia: date, tipo: TipoMovimiento, categoria: Optional[str], monto: float) -> None:
+        """Suma el movimiento a su fila del resumen diario (upsert), dentro de la transacción en curso."""
+        sentencia = sqlite_insert(ResumenContableDiario).values(dia=dia, tipo=tipo, categoria=categoria or "", cantidad=1, total=monto)
+        self.db.execute(sentencia.on_conflict_do_update(
+            index_elements=[ResumenContableDiario.dia, ResumenContableDiario.tipo, ResumenContableDiario.categoria],
+            set_={"cantidad": ResumenContableDiario.cantidad + 1, "total": ResumenContableDiario.total + monto},
+        ))
+
     def obtener_todos_movimientos(self) -> List[MovimientoContable]:
         return self.db.query(MovimientoContable).order_by(MovimientoContable.fecha.desc()).all()
 
     def obtener_resumen(self) -> Dict[str, float]:
-        total_ingresos = self.db.query(func.sum(MovimientoContable.monto)).filter(MovimientoContable.tipo == TipoMovimiento.INGRESO).scalar() or 0.0
-        total_egresos = self.db.query(func.sum(MovimientoContable.monto)).filter(MovimientoContable.tipo == TipoMovimiento.EGRESO).scalar() or 0.0
+        """
+        Totales del libro: la foto del último cierre más lo acumulado en el resumen
+        diario desde entonces, sin recorrer los movimientos.
+        """
+        ultimo_cierre = self.obtener_ultimo_cierre()
+        desde = ultimo_cierre.fecha_cierre if ultimo_cierre else None
+        totales = self._totales_resumen(desde=desde)
+        total_ingresos = totales[TipoMovimiento.INGRESO] + (ultimo_cierre.total_ingresos if ultimo_cierre else 0.0)
+        total_egresos = totales[TipoMovimiento.EGRESO] + (ultimo_cierre.total_egresos if ultimo_cierre else 0.0)
         balance = total_ingresos - total_egresos
-        return {"total_ingresos": total_ingresos, "total_egresos": total_egresos, "balance": balance}
\ No newline at end of file
+        return {"total_ingresos": total_ingresos, "total_egresos": total_egresos, "balance": balance}
+
+    def obtener_resumen_diario(self, dias: int = 15) -> List[Dict[str, Any]]:
+        """
+        Ingresos y egresos por día de los últimos 'dias' días (incluido hoy, en UTC),
+        con los días sin movimientos en cero. Lee como mucho dias x tipos x categorías filas.
+        """
+        hoy = datetime.now(timezone.utc).date()
+        inicio = hoy - timedelta(days=dias - 1)
+        filas = self.db.execute(
+            select(ResumenContableDiario.dia, ResumenContableDiario.tipo, func.sum(ResumenContableDiario.total))
+            .where(ResumenContableDiario.dia >= inicio)
+            .group_by(ResumenContableDiario.dia, ResumenContableDiario.tipo)
+        )
+        por_dia = {inicio + timedelta(days=i): {TipoMovimiento.INGRESO: 0.0, TipoMovimiento.EGRESO: 0.0} for i in range(dias)}
+        for dia, tipo, total in filas:
+            if dia in por_dia:
+                por_dia[dia][tipo] = total or 0.0
+        return [
+            {
+                "fecha": dia,
+                "dia": dia.strftime("%d/%m"),
+                "total_ingresos": totales[TipoMovimiento.INGRESO],
+                "total_egresos": totales[TipoMovimiento.EGRESO],
+            }
+            for dia, totales in sorted(por_dia.items())
+        ]
+
+    def obtener_ultimo_cierre(self) -> Optional[CierreContable]:
+        return self.db.query(CierreContable).order_by(CierreContable.fecha_cierre.desc()).first()
+
+    def cerrar_periodo(self, hasta: Optional[date] = None) -> CierreContable:
+        """
+        Guarda la foto de los totales acumulados hasta el final de 'hasta' (por
+        defecto, ayer en UTC). A partir de entonces obtener_resumen solo suma el
+        resumen diario posterior al cierre, así que solo se cierran días UTC ya
+        terminados: un movimiento posterior caería en un día ya cerrado.
+        """
+        hoy = datetime.now(timezone.utc).date()
+        hasta = hasta or (hoy - timedelta(days=1))
+        if hasta >= hoy:
+            raise ValueError(f"Solo se pueden cerrar días ya terminados (hasta {hoy - timedelta(days=1):%Y-%m-%d} en UTC).")
+        ultimo_cierre = self.obtener_ultimo_cierre()
+        if ultimo_cierre and hasta <= ultimo_cierre.fecha_cierre:
+            raise ValueError(f"El periodo hasta {ultimo_cierre.fecha_cierre:%Y-%m-%d} ya está cerrado.")
+
+        desde = ultimo_cierre.fecha_cierre if ultimo_cierre else None
+        totales = self._totales_resumen(desde=desde, hasta=hasta)
+        cierre = CierreContable(
+            fecha_cierre=hasta,
+            total_ingresos=totales[TipoMovimiento.INGRESO] + (ultimo_cierre.total_ingresos if ultimo_cierre else 0.0),
+            total_egresos=totales[TipoMovimiento.EGRESO] + (ultimo_cierre.total_egresos if ultimo_cierre else 0.0),
+            cantidad_movimientos=totales["cantidad"] + (ultimo_cierre.cantidad_movimientos if ultimo_cierre else 0),
+        )
+        self.db.add(cierre)
+        self.db.commit()
+        print(f"📒 Periodo contable cerrado hasta {hasta:%Y-%m-%d}: {cierre.cantidad_movimientos} movimientos acumulados.")
+        return cierre
+
+    def _totales_resumen(self, desde: Optional[date] = None, hasta: Optional[date] = None) -> Dict[Any, Any]:
+        """Suma el resumen diario en el rango (desde, hasta]: total por tipo y número de movimientos."""
+        consulta = select(
+            func.coalesce(func.sum(case((ResumenContableDiario.tipo == TipoMovimiento.INGRESO, ResumenContableDiario.total), else_=0.0)), 0.0),
+            func.coalesce(func.sum(case((ResumenContableDiario.tipo == TipoMovimiento.EGRESO, ResumenContableDiario.total), else_=0.0)), 0.0),
+            func.coalesce(func.sum(ResumenContableDiario.cantidad), 0),
+        )
+        if desde:
+            consulta = consulta.where(ResumenContableDiario.dia > desde)
+        if hasta:
+            consulta = consulta.where(ResumenContableDiario.dia <= hasta)
+        ingresos, egresos, cantidad = self.db.execute(consulta).one()
+        return {TipoMovimiento.INGRESO: ingresos, TipoMovimiento.EGRESO: egresos, "cantidad": cantidad}
+
+    def reconstruir_resumen_diario(self) -> int:
+        """
+        Regenera el resumen diario desde movimientos_contables y recalcula las fotos
+        de los cierres existentes. Sirve para poblar libros anteriores al resumen o
+        para repararlo. Devuelve el número de filas del resumen.
+        """
+        try:
+            self.db.execute(delete(ResumenContableDiario))
+            filas = self.db.execute(
+                select(
+                    func.date(MovimientoContable.fecha), MovimientoContable.tipo,
+                    func.coalesce(MovimientoContable.categoria, ""),
+                    func.count(), func.sum(MovimientoContable.monto),
+                ).group_by(func.date(MovimientoContable.fecha), MovimientoContable.tipo, func.coalesce(MovimientoContable.categoria, ""))
+            ).all()
+            if filas:
+                self.db.execute(sqlite_insert(ResumenContableDiario), [
+                    {"dia": date.fromisoformat(dia), "tipo": tipo, "categoria": categoria, "cantidad": cantidad, "total": total}
+                    for dia, tipo, categoria, cantidad, total in filas
+                ])
+            for cierre in self.db.query(CierreContable).all():
+                totales = self._totales_resumen(hasta=cierre.fecha_cierre)
+                cierre.total_ingresos = totales[TipoMovimiento.INGRESO]
+                cierre.total_egresos = totales[TipoMovimiento.EGRESO]
+                cierre.cantidad_movimientos = totales["cantidad"]
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        print(f"📒 Resumen contable diario reconstruido: {len(filas)} filas.")
+        return len(filas)
+
+    def resumen_diario_desincronizado(self) -> bool:
+        """True si el resumen no cuadra con el número de movimientos (p. ej. en bases anteriores al resumen)."""
+        en_resumen = self.db.query(func.coalesce(func.sum(ResumenContableDiario.cantidad), 0)).scalar()
+        return en_resumen != self.db.query(func.count(MovimientoContable.id)).scalar()
@@ -1,7 +1,7 @@
 # src/modules/contabilidad/contabilidad_model.py
 
 import enum
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, func, case
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Enum, Index, func, case
 from typing import List, Optional, Dict, Any
 from core.db import Base
 # --- INICIO DE LA CORRECCIÓN ---
@@ -25,5 +25,34 @@ class MovimientoContable(Base):
     # --- FIN DE LA CORRECCIÓN ---
     categoria = Column(String)
 
+    __table_args__ = (
+        # Listado del libro por fecha y filtros por tipo dentro de un rango
+        Index("ix_movimientos_contables_fecha", "fecha"),
+        Index("ix_movimientos_contables_tipo_fecha", "tipo", "fecha"),
+    )
+
+class ResumenContableDiario(Base):
+    """
+    Acumulado por día, tipo y categoría de los movimientos contables. Lo mantiene
+    ContabilidadController.agregar_movimiento en la misma transacción que el
+    movimiento, para que los totales y las gráficas no recorran todo el libro.
+    """
+    __tablename__ = "resumen_contable_diario"
+    dia = Column(Date, primary_key=True)  # Día UTC del movimiento
+    tipo = Column(Enum(TipoMovimiento), primary_key=True)
+    categoria = Column(String, primary_key=True, default="")  # "" agrupa los movimientos sin categoría
+    cantidad = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0.0)
+
+class CierreContable(Base):
+    """ Foto de los totales acumulados del libro hasta el final de 'fecha_cierre' (inclusive). """
+    __tablename__ = "cierres_contables"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fecha_cierre = Column(Date, nullable=False, unique=True)
+    total_ingresos = Column(Float, nullable=False, default=0.0)
+    total_egresos = Column(Float, nullable=False, default=0.0)
+    cantidad_movimientos = Column(Integer, nullable=False, default=0)
+    creado_en = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
 # El resto del archivo (clase ContabilidadRepository) no necesita cambios.
 # ...
\ No newline at end of file
@@ -1,41 +1,57 @@
 # src/modules/dashboard/dashboard_controller.py
 
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session, sessionmaker
+from core.busqueda import fabrica_sesiones_para
 from modules.contabilidad.contabilidad_controller import ContabilidadController
 from modules.ventas.ventas_controller import VentasController
 # --- INICIO DE LA CORRECCIÓN ---
 from modules.productos.producto_controller import ProductoController
 # --- FIN DE LA CORRECCIÓN ---
+from .kpi_service import ServicioKPI
+
+# Valores mostrados cuando no se pueden calcular los KPIs.
+KPIS_VACIOS = {
+    "ingresos_totales": 0.0, "ventas_totales": 0, "productos_en_stock": 0,
+    "ticket_promedio": 0.0, "margen_bruto": 0.0, "margen_porcentaje": 0.0, "productos_stock_bajo": 0,
+}
 
 class DashboardController:
     # --- INICIO DE LA CORRECCIÓN ---
-    def __init__(self, contabilidad_ctrl: ContabilidadController, ventas_ctrl: VentasController, producto_ctrl: ProductoController):
+    def __init__(self, contabilidad_ctrl: ContabilidadController, ventas_ctrl: VentasController, producto_ctrl: ProductoController,
+                 kpi_service: Optional[ServicioKPI] = None):
         self.contabilidad_ctrl = contabilidad_ctrl
         self.ventas_ctrl = ventas_ctrl
         self.producto_ctrl = producto_ctrl
+        self.kpi_service = kpi_service or ServicioKPI(contabilidad_ctrl.db)
     # --- FIN DE LA CORRECCIÓN ---
 
-    def obtener_kpis_principales(self) -> Dict:
+    def obtener_kpis_principales(self, dias: Optional[int] = None) -> Dict:
+        """KPIs calculados con agregados SQL y cacheados hasta el siguiente commit que los afecte."""
         try:
-            resumen_contable = self.contabilidad_ctrl.obtener_resumen()
-            ventas_totales = len(self.ventas_ctrl.listar_ventas())
-            # --- INICIO DE LA CORRECCIÓN ---
-            productos = self.producto_ctrl.listar_productos()
-            # --- FIN DE LA CORRECCIÓN ---
-            stock_total = sum(p.stock for p in productos)
-
-            return {
-                "ingresos_totales": resumen_contable.get("total_ingresos", 0.0),
-                "ventas_totales": ventas_totales,
-                "productos_en_stock": stock_total,
-            }
+            return {**KPIS_VACIOS, **self.kpi_service.obtener_kpis(dias)}
         except Exception as e:
             print(f"Error al obtener KPIs para el Dashboard: {e}")
-            return {"ingresos_totales": 0.0, "ventas_totales": 0, "productos_en_stock": 0}
+            return dict(KPIS_VACIOS)
+
+    def obtener_datos_dashboard(self, sesion: Session, dias_grafico: int = 15) -> Dict[str, Any]:
+        """
+        KPIs y datos del gráfico en una sola llamada, con la sesión indicada. Pensado
+        para ejecutarse en un hilo de trabajo (ver ControladorBusqueda); los errores
+        se propagan para que la vista decida cómo mostrarlos.
+        """
+        return {
+            "kpis": {**KPIS_VACIOS, **self.kpi_service.obtener_kpis(sesion=sesion)},
+            "grafico": ContabilidadController(sesion).obtener_resumen_diario(dias_grafico),
+        }
+
+    def fabrica_sesiones(self) -> sessionmaker:
+        """Sesiones independientes sobre la base de datos del dashboard, para los hilos de trabajo."""
+        return fabrica_sesiones_para(self.kpi_service.db)
 
     def obtener_datos_grafico_financiero(self, dias: int = 15) -> List[Dict]:
         try:
             return self.contabilidad_ctrl.obtener_resumen_diario(dias)
         except Exception as e:
             print(f"Error al obtener datos del gráfico financiero: {e}")
-            return []
\ No newline at end of file
+            return []
@@ -9,22 +9,50 @@ from PySide6.QtCharts import (
     QChartView, QChart, QBarSeries, QBarSet, 
     QBarCategoryAxis, QValueAxis
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer, QDateTime
 from PySide6.QtGui import QFont, QPainter
 
+from core.busqueda import ControladorBusqueda
+from core.config import cargar_seccion_config
 from .dashboard_controller import DashboardController
 
+# Días que muestra el gráfico financiero.
+DIAS_GRAFICO = 15
+# Segundos entre actualizaciones automáticas mientras el dashboard está visible (0 las desactiva).
+INTERVALO_ACTUALIZACION_S = 60
+
 class DashboardUI(QWidget):
     def __init__(self, controller: DashboardController, parent=None):
         super().__init__(parent)
         self.controller = controller
         self.setWindowTitle("Dashboard")
+        self._ultimos_datos_grafico = None
+
+        # Las consultas se hacen en un hilo de trabajo; solo se aplica el resultado más reciente.
+        self.cargador = ControladorBusqueda(self.controller.obtener_datos_dashboard, self.controller.fabrica_sesiones(), retardo_ms=0, parent=self)
+        self.cargador.resultados_listos.connect(self._aplicar_datos)
+        self.cargador.busqueda_fallida.connect(self._mostrar_error_carga)
+
+        intervalo_s = int(cargar_seccion_config("dashboard").get("intervalo_actualizacion_s", INTERVALO_ACTUALIZACION_S))
+        self.temporizador_actualizacion = QTimer(self)
+        self.temporizador_actualizacion.setInterval(max(intervalo_s, 0) * 1000)
+        self.temporizador_actualizacion.timeout.connect(self.actualizar_vista)
+
         self._setup_ui()
 
     def actualizar_vista(self):
+        """Pide KPIs y gráfico al hilo de trabajo; la GUI no espera a la consulta."""
         print("Actualizando vista del Dashboard...")
-        self._actualizar_kpis()
-        self._actualizar_grafico()
+        self.cargador.buscar_ahora(DIAS_GRAFICO)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.temporizador_actualizacion.interval() > 0:
+            self.temporizador_actualizacion.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.temporizador_actualizacion.stop()
 
     def _setup_ui(self):
         main_layout = QVBoxLayout(self)
@@ -38,23 +66,62 @@ class DashboardUI(QWidget):
         # Panel de KPIs
         kpi_layout = QGridLayout()
         self.kpi_ingresos = self._crear_kpi_box("Ingresos Totales", "$0.00")
-        self.kpi_ventas = self._crear_kpi_box("Ventas Totales (Unidades)", "0")
+        self.kpi_ventas = self._crear_kpi_box("Ventas Completadas", "0")
         self.kpi_stock = self. _crear_kpi_box("Productos en Stock", "0")
         
         kpi_layout.addWidget(self.kpi_ingresos, 0, 0)
         kpi_layout.addWidget(self.kpi_ventas, 0, 1)
         kpi_layout.addWidget(self.kpi_stock, 0, 2)
+
+        self.kpi_ticket = self._crear_kpi_box("Ticket Promedio", "$0.00")
+        self.kpi_margen = self._crear_kpi_box("Margen Bruto", "$0.00")
+        self.kpi_stock_bajo = self._crear_kpi_box("Productos con Stock Bajo", "0")
+        kpi_layout.addWidget(self.kpi_ticket, 1, 0)
+        kpi_layout.addWidget(self.kpi_margen, 1, 1)
+        kpi_layout.addWidget(self.kpi_stock_bajo, 1, 2)
         main_layout.addLayout(kpi_layout)
 
+        self.estado_label = QLabel("")
+        self.estado_label.setObjectName("dashboardStatus")
+        self.estado_label.setAlignment(Qt.AlignmentFlag.AlignRight)
+        main_layout.addWidget(self.estado_label)
+
         # Gráfico
         chart_group = QFrame()
         chart_group.setObjectName("chartGroup")
         chart_layout = QVBoxLayout(chart_group)
         self.chart_view = QChartView()
         self.chart_view.setRenderHint(QPainter.RenderHint.Antialiasing)
+        self.chart_view.setChart(self._crear_grafico())
         chart_layout.addWidget(self.chart_view)
         main_layout.addWidget(chart_group)
 
+    def _crear_grafico(self) -> QChart:
+        """Crea una sola vez el gráfico, sus series y ejes; después solo se actualizan sus valores."""
+        self.set_ingresos = QBarSet("Ingresos")
+        self.set_egresos = QBarSet("Egresos")
+        self.series = QBarSeries()
+        self.series.append(self.set_ingresos)
+        self.series.append(self.set_egresos)
+
+        chart = QChart()
+        chart.addSeries(self.series)
+        chart.setTitle(f"Resumen Financiero de los Últimos {DIAS_GRAFICO} Días")
+        chart.legend().setVisible(True)
+        chart.legend().setAlignment(Qt.AlignmentFlag.AlignBottom)
+
+        self.axis_x = QBarCategoryAxis()
+        chart.addAxis(self.axis_x, Qt.AlignmentFlag.AlignBottom)
+        self.series.attachAxis(self.axis_x)
+
+        self.axis_y = QValueAxis()
+        self.axis_y.setLabelFormat("$%.2f")
+        self.axis_y.setRange(0, 100)
+        chart.addAxis(self.axis_y, Qt.AlignmentFlag.AlignLeft)
+        self.series.attachAxis(self.axis_y)
+        self.chart = chart
+        return chart
+
     def _crear_kpi_box(self, titulo: str, valor_inicial: str) -> QFrame:
         frame = QFrame()
         frame.setObjectName("kpiBox")
@@ -73,56 +140,45 @@ class DashboardUI(QWidget):
         
         return frame
 
-    def _actualizar_kpis(self):
-        try:
-            kpis = self.controller.obtener_kpis_principales()
-            self.kpi_ingresos.findChild(QLabel, "kpiValue").setText(f"${kpis['ingresos_totales']:,.2f}")
-            self.kpi_ventas.findChild(QLabel, "kpiValue").setText(f"{kpis['ventas_totales']:,}")
-            self.kpi_stock.findChild(QLabel, "kpiValue").setText(f"{kpis['productos_en_stock']:,}")
-        except Exception as e:
-            QMessageBox.warning(self, "Error de KPIs", f"No se pudieron cargar los indicadores: {e}")
-
-    def _actualizar_grafico(self):
-        try:
-            datos_grafico = self.controller.obtener_datos_grafico_financiero(dias=15)
-        except Exception as e:
-            QMessageBox.warning(self, "Error de Gráfico", f"No se pudieron cargar los datos del gráfico: {e}")
+    def _aplicar_datos(self, datos: dict, latencia_ms: float):
+        self._actualizar_kpis(datos["kpis"])
+        self._actualizar_grafico(datos["grafico"])
+        hora = QDateTime.currentDateTime().toString("HH:mm:ss")
+        self.estado_label.setText(f"Actualizado a las {hora} ({latencia_ms:.0f} ms)")
+
+    def _mostrar_error_carga(self, mensaje: str):
+        # Sin ventanas modales: la actualización automática no debe interrumpir al usuario.
+        self.estado_label.setText(f"No se pudieron cargar los indicadores: {mensaje}")
+
+    def _actualizar_kpis(self, kpis: dict):
+        self.kpi_ingresos.findChild(QLabel, "kpiValue").setText(f"${kpis['ingresos_totales']:,.2f}")
+        self.kpi_ventas.findChild(QLabel, "kpiValue").setText(f"{kpis['ventas_totales']:,}")
+        self.kpi_stock.findChild(QLabel, "kpiValue").setText(f"{kpis['productos_en_stock']:,}")
+        self.kpi_ticket.findChild(QLabel, "kpiValue").setText(f"${kpis['ticket_promedio']:,.2f}")
+        self.kpi_margen.findChild(QLabel, "kpiValue").setText(f"${kpis['margen_bruto']:,.2f} ({kpis['margen_porcentaje']:.1f}%)")
+        self.kpi_stock_bajo.findChild(QLabel, "kpiValue").setText(f"{kpis['productos_stock_bajo']:,}")
+
+    def _actualizar_grafico(self, datos_grafico: list):
+        """Actualiza en su sitio las barras y ejes; si los datos no cambiaron no toca el gráfico (ni anima)."""
+        datos = [(item["dia"], item.get("total_ingresos", 0), item.get("total_egresos", 0)) for item in datos_grafico]
+        if datos == self._ultimos_datos_grafico:
             return
-
-        set_ingresos = QBarSet("Ingresos")
-        set_egresos = QBarSet("Egresos")
-        
-        categorias_fechas = []
-        max_valor = 0
-
-        for item in datos_grafico:
-            ingreso = item.get("total_ingresos", 0)
-            egreso = item.get("total_egresos", 0)
-            set_ingresos.append(ingreso)
-            set_egresos.append(egreso)
-            categorias_fechas.append(item["dia"])
-            max_valor = max(max_valor, ingreso, egreso)
-
-        series = QBarSeries()
-        series.append(set_ingresos)
-        series.append(set_egresos)
-        
-        chart = QChart()
-        chart.addSeries(series)
-        chart.setTitle("Resumen Financiero de los Últimos 15 Días")
-        chart.setAnimationOptions(QChart.AnimationOption.SeriesAnimations)
-        chart.legend().setVisible(True)
-        chart.legend().setAlignment(Qt.AlignmentFlag.AlignBottom)
-
-        axis_x = QBarCategoryAxis()
-        axis_x.append(categorias_fechas)
-        chart.addAxis(axis_x, Qt.AlignmentFlag.AlignBottom)
-        series.attachAxis(axis_x)
-
-        axis_y = QValueAxis()
-        axis_y.setLabelFormat("$%.2f")
-        axis_y.setRange(0, max_valor * 1.1 if max_valor > 0 else 100) 
-        chart.addAxis(axis_y, Qt.AlignmentFlag.AlignLeft)
-        series.attachAxis(axis_y)
-
-        self.chart_view.setChart(chart)
\ No newline at end of file
+        # La primera carga se pinta sin animación; los cambios posteriores sí se animan.
+        animar = self._ultimos_datos_grafico is not None
+        self.chart.setAnimationOptions(QChart.AnimationOption.SeriesAnimations if animar else QChart.AnimationOption.NoAnimation)
+        self._ultimos_datos_grafico = datos
+
+        categorias = [dia for dia, _, _ in datos]
+        if self.axis_x.categories() != categorias:
+            self.axis_x.setCategories(categorias)
+        for barras, valores in ((self.set_ingresos, [i for _, i, _ in datos]), (self.set_egresos, [e for _, _, e in datos])):
+            if barras.count() != len(valores):
+                barras.remove(0, barras.count())
+                barras.append(valores)
+            else:
+                for indice, valor in enumerate(valores):
+                    if barras.at(indice) != valor:
+                        barras.replace(indice, valor)
+
+        max_valor = max((max(i, e) for _, i, e in datos), default=0)
+        self.axis_y.setRange(0, max_valor * 1.1 if max_valor > 0 else 100)
@@ -0,0 +1,198 @@
+# src/modules/dashboard/kpi_service.py
+
+import itertools
+import time
+import weakref
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Set
+
+from sqlalchemy import event, func, case, select
+from sqlalchemy.orm import Session
+
+from modules.contabilidad.contabilidad_controller import ContabilidadController
+from modules.contabilidad.contabilidad_model import MovimientoContable
+from modules.productos.models import Producto, MovimientoStock
+from modules.ventas.ventas_model import Venta, VentaDetalle, EstadoVenta
+
+# Stock a partir del cual (inclusive) una variante cuenta como "stock bajo".
+UMBRAL_STOCK_BAJO = 5
+
+# Tablas cuyas escrituras invalidan cada grupo de KPIs.
+TABLAS_POR_GRUPO = {
+    "ventas": {"ventas", "venta_detalles", "productos"},  # productos: el costo entra en el margen
+    "inventario": {"productos"},
+    "contabilidad": {"movimientos_contables", "resumen_contable_diario"},
+}
+
+# Segundos que un KPI se sirve de la caché como máximo: cubre los cambios de otras
+# conexiones que la marca de cambios no refleja (p. ej. el costo de una variante).
+TTL_CACHE_KPIS = 300
+
+# Eventos de la sesión vigilada y el método de ServicioKPI que los atiende.
+_OYENTES = {
+    "after_flush": "_registrar_flush",
+    "do_orm_execute": "_registrar_sentencia",
+    "after_commit": "_invalidar_tras_commit",
+    "after_rollback": "_descartar_cambios",
+}
+
+
+def _oyente_debil(servicio: "ServicioKPI", metodo: str) -> Callable:
+    """Oyente que no mantiene vivo al servicio: si ya se descartó, no hace nada."""
+    referencia = weakref.ref(servicio)
+
+    def oyente(*args):
+        vivo = referencia()
+        if vivo is not None:
+            getattr(vivo, metodo)(*args)
+    return oyente
+
+
+def _quitar_oyentes(sesion: Session, oyentes: Dict[str, Callable]) -> None:
+    for evento, oyente in oyentes.items():
+        if event.contains(sesion, evento, oyente):
+            event.remove(sesion, evento, oyente)
+
+
+class ServicioKPI:
+    """
+    Calcula los indicadores del dashboard con agregados SQL (COUNT/SUM) y los
+    guarda en caché. La caché de cada grupo se invalida cuando la sesión
+    confirma (commit) escrituras sobre alguna de sus tablas, ya sea por el ORM
+    o por sentencias UPDATE/INSERT masivas ejecutadas con la misma sesión.
+
+    Los KPIs se pueden calcular con otra sesión (p. ej. desde un hilo de trabajo)
+    sin dejar de compartir la caché: un resultado solo se guarda si ningún commit
+    la invalidó mientras se calculaba.
+
+    Las escrituras de otras sesiones o procesos (otra caja sobre el mismo archivo,
+    las sesiones de los hilos de trabajo) no pasan por esos eventos: antes de usar
+    la caché se compara una marca de cambios barata (el último id de ventas,
+    movimientos de stock y movimientos contables) y cada entrada caduca a los
+    TTL_CACHE_KPIS segundos. Los oyentes se quitan con cerrar() o al descartar el servicio.
+    """
+
+    def __init__(self, db_session: Session, umbral_stock_bajo: int = UMBRAL_STOCK_BAJO):
+        self.db = db_session
+        self.umbral_stock_bajo = umbral_stock_bajo
+        self._cache: Dict[str, Dict[Any, tuple]] = {grupo: {} for grupo in TABLAS_POR_GRUPO}  # clave -> (valores, instante)
+        self._tablas_modificadas: Set[str] = set()
+        self._version = 0  # Aumenta con cada invalidación
+        self._marca_cambios: Optional[tuple] = None
+        oyentes = {evento: _oyente_debil(self, metodo) for evento, metodo in _OYENTES.items()}
+        for evento, oyente in oyentes.items():
+            event.listen(self.db, evento, oyente)
+        self._quitar_oyentes = weakref.finalize(self, _quitar_oyentes, self.db, oyentes)
+
+    def cerrar(self) -> None:
+        """Deja de vigilar la sesión (también ocurre solo al descartar el servicio)."""
+        self._quitar_oyentes()
+
+    # --- KPIs ---
+
+    def obtener_kpis(self, dias: Optional[int] = None, sesion: Optional[Session] = None) -> Dict[str, Any]:
+        """
+        KPIs del dashboard; con 'dias' las cifras de ventas se limitan a los últimos
+        N días. 'sesion' permite consultar con una sesión distinta de la vigilada.
+        """
+        sesion = sesion or self.db
+        marca = self._leer_marca_cambios(sesion)
+        if marca != self._marca_cambios:
+            self.invalidar()
+            self._marca_cambios = marca
+        kpis: Dict[str, Any] = {}
+        kpis.update(self._en_cache("contabilidad", None, lambda: self._kpis_contabilidad(sesion)))
+        kpis.update(self._en_cache("ventas", dias, lambda: self._kpis_ventas(sesion, dias)))
+        kpis.update(self._en_cache("inventario", self.umbral_stock_bajo, lambda: self._kpis_inventario(sesion)))
+        return kpis
+
+    def _kpis_contabilidad(self, sesion: Session) -> Dict[str, Any]:
+        resumen = ContabilidadController(sesion).obtener_resumen()
+        return {"ingresos_totales": resumen["total_ingresos"], "balance": resumen["balance"]}
+
+    def _kpis_ventas(self, sesion: Session, dias: Optional[int]) -> Dict[str, Any]:
+        """
+        Número de ventas completadas, importe, ticket promedio y margen bruto.
+        El margen usa el costo de compra actual de cada variante.
+        """
+        filtros = [Venta.estado == EstadoVenta.COMPLETADA]
+        if dias:
+            filtros.append(Venta.fecha >= datetime.now(timezone.utc) - timedelta(days=dias))
+
+        num_ventas, importe = sesion.execute(
+            select(func.count(Venta.id), func.coalesce(func.sum(Venta.total), 0.0)).where(*filtros)
+        ).one()
+        ingresos_lineas, costo = sesion.execute(
+            select(
+                func.coalesce(func.sum(VentaDetalle.subtotal_linea), 0.0),
+                func.coalesce(func.sum(VentaDetalle.cantidad * func.coalesce(Producto.costo_compra, 0.0)), 0.0),
+            )
+            .join(Venta, Venta.id == VentaDetalle.venta_id)
+            .join(Producto, Producto.id == VentaDetalle.producto_id)
+            .where(*filtros)
+        ).one()
+        margen = ingresos_lineas - costo
+        return {
+            "ventas_totales": num_ventas,
+            "importe_ventas": importe,
+            "ticket_promedio": importe / num_ventas if num_ventas else 0.0,
+            "margen_bruto": margen,
+            "margen_porcentaje": (margen / ingresos_lineas * 100) if ingresos_lineas else 0.0,
+        }
+
+    def _kpis_inventario(self, sesion: Session) -> Dict[str, Any]:
+        stock_total, stock_bajo = sesion.execute(
+            select(
+                func.coalesce(func.sum(Producto.stock), 0),
+                func.count(case((Producto.stock <= self.umbral_stock_bajo, 1))),
+            )
+        ).one()
+        return {"productos_en_stock": stock_total, "productos_stock_bajo": stock_bajo}
+
+    # --- Caché ---
+
+    @staticmethod
+    def _leer_marca_cambios(sesion: Session) -> tuple:
+        """Último id de las tablas que crecen con cada venta, ajuste o asiento: tres búsquedas por índice."""
+        return sesion.execute(select(
+            select(func.max(Venta.id)).scalar_subquery(),
+            select(func.max(MovimientoStock.id)).scalar_subquery(),
+            select(func.max(MovimientoContable.id)).scalar_subquery(),
+        )).one()
+
+    def _en_cache(self, grupo: str, clave: Any, calcular: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        cache_grupo = self._cache[grupo]
+        entrada = cache_grupo.get(clave)
+        if entrada is not None and time.monotonic() - entrada[1] < TTL_CACHE_KPIS:
+            return entrada[0]
+        version = self._version
+        valores = calcular()
+        if version == self._version:
+            cache_grupo[clave] = (valores, time.monotonic())
+        return valores
+
+    def invalidar(self, grupos: Optional[Set[str]] = None) -> None:
+        self._version += 1
+        for grupo in (grupos or TABLAS_POR_GRUPO.keys()):
+            self._cache[grupo].clear()
+
+    def _registrar_flush(self, session, flush_context):
+        for obj in itertools.chain(session.new, session.dirty, session.deleted):
+            tabla = getattr(obj, "__tablename__", None)
+            if tabla:
+                self._tablas_modificadas.add(tabla)
+
+    def _registrar_sentencia(self, estado):
+        if estado.is_insert or estado.is_update or estado.is_delete:
+            tabla = getattr(estado.statement, "table", None)
+            if tabla is not None:
+                self._tablas_modificadas.add(tabla.name)
+
+    def _invalidar_tras_commit(self, session):
+        if not self._tablas_modificadas:
+            return
+        self.invalidar({g for g, tablas in TABLAS_POR_GRUPO.items() if tablas & self._tablas_modificadas})
+        self._tablas_modificadas.clear()
+
+    def _descartar_cambios(self, session):
+        self._tablas_modificadas.clear()
@@ -2,24 +2,49 @@
 
 from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QDialogButtonBox
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QDialogButtonBox,
+    QMessageBox
 )
 from PySide6.QtGui import QColor, QBrush
-from PySide6.QtCore import Qt
-from typing import List, Dict
+from PySide6.QtCore import Qt, QTimer
+from typing import List, Dict, Iterable, Union
+
+# Máximo de filas que se dibujan en la vista previa. Pasado ese límite solo se
+# siguen agregando las filas con error (hasta el mismo número); el resto solo se cuenta.
+MAX_FILAS_PREVIEW = 2000
 
 class ImportAssistantDialog(QDialog):
-    def __init__(self, analisis_resultado: List[Dict], parent=None):
+    def __init__(self, analisis_resultado: Union[List[Dict], Iterable[List[Dict]]], parent=None):
+        """
+        :param analisis_resultado: La lista completa de filas analizadas, o un iterable
+            de lotes (PlantillaController.analizar_csv_en_lotes). Con lotes, la tabla
+            se va llenando conforme llegan sin bloquear la interfaz. Solo se guardan
+            los contadores y las filas de la vista previa: tras confirmar, el CSV se
+            vuelve a leer en streaming para importarlo (PlantillaController.importar_csv).
+        """
         super().__init__(parent)
         self.setWindowTitle("Asistente de Importación de Productos")
         self.setMinimumSize(900, 600)
         self.setModal(True)
 
-        self.resultado = analisis_resultado
-        self.filas_validas = [r for r in self.resultado if r['estado'] != 'ERROR']
+        if isinstance(analisis_resultado, list):
+            self._lotes = iter([analisis_resultado])
+        else:
+            self._lotes = iter(analisis_resultado)
+        self.error_count = 0
+        self.crear_count = 0
+        self.actualizar_count = 0
+        self.errores_mostrados = 0
+        self.analisis_terminado = False
+
+        # Colores para los estados
+        self.color_error = QBrush(QColor("#FFDDDD"))  # Rojo claro
+        self.color_ok = QBrush(QColor("#DDFFDD"))     # Verde claro
+        self.color_update = QBrush(QColor("#DDDDFF")) # Azul claro
 
         self._setup_ui()
-        self._populate_table()
+        self.import_button.setEnabled(False)
+        QTimer.singleShot(0, self._procesar_siguiente_lote)
 
     def _setup_ui(self):
         layout = QVBoxLayout(self)
@@ -63,67 +88,93 @@ class ImportAssistantDialog(QDialog):
         
         layout.addWidget(self.button_box)
 
-    def _populate_table(self):
-        """Llena la tabla con los resultados del análisis del CSV."""
-        self.tabla_preview.setRowCount(len(self.resultado))
-        
-        error_count = 0
-        crear_count = 0
-        actualizar_count = 0
+    def _procesar_siguiente_lote(self):
+        """Consume un lote del análisis, lo agrega a la tabla y agenda el siguiente."""
+        try:
+            lote = next(self._lotes)
+        except StopIteration:
+            self._finalizar_analisis()
+            return
+        except Exception as e:
+            QMessageBox.critical(self, "Error de Importación", str(e))
+            self.reject()
+            return
 
-        # Colores para los estados
-        color_error = QBrush(QColor("#FFDDDD"))  # Rojo claro
-        color_ok = QBrush(QColor("#DDFFDD"))     # Verde claro
-        color_update = QBrush(QColor("#DDDDFF")) # Azul claro
-
-        for row_index, item in enumerate(self.resultado):
-            # Columna 0: Número de Fila en el CSV
-            self.tabla_preview.setItem(row_index, 0, QTableWidgetItem(str(item['numero_fila'])))
-            
-            # Columna 1: SKU
-            self.tabla_preview.setItem(row_index, 1, QTableWidgetItem(item['datos'].get('variante_sku', '')))
-            
-            # Columna 2: Nombre del Producto
-            self.tabla_preview.setItem(row_index, 2, QTableWidgetItem(item['datos'].get('plantilla_nombre', '')))
-            
-            # Columna 3 y 4: Estado y Errores
-            estado_item = QTableWidgetItem()
-            detalles_item = QTableWidgetItem()
-            
+        self._agregar_lote(lote)
+        self._actualizar_resumen()
+        QTimer.singleShot(0, self._procesar_siguiente_lote)
+
+    def _agregar_lote(self, lote: List[Dict]):
+        """Agrega un lote de resultados del análisis a la tabla y a los contadores."""
+        for item in lote:
             if item['estado'] == 'ERROR':
-                estado_item.setText("❌ Error")
-                detalles_item.setText(" | ".join(item['error_res']))
-                background_color = color_error
-                error_count += 1
+                self.error_count += 1
             elif item['estado'] == 'OK_NUEVO':
-                estado_item.setText("✅ OK para Crear")
-                background_color = color_ok
-                crear_count += 1
+                self.crear_count += 1
             elif item['estado'] == 'OK_ACTUALIZAR':
-                estado_item.setText("🔄 OK para Actualizar")
-                background_color = color_update
-                actualizar_count += 1
-            
-            self.tabla_preview.setItem(row_index, 3, estado_item)
-            self.tabla_preview.setItem(row_index, 4, detalles_item)
-            
-            # Aplicar color de fondo a toda la fila
-            for col_index in range(self.tabla_preview.columnCount()):
-                self.tabla_preview.item(row_index, col_index).setBackground(background_color)
+                self.actualizar_count += 1
+
+            es_error = item['estado'] == 'ERROR'
+            if self.tabla_preview.rowCount() < MAX_FILAS_PREVIEW or (es_error and self.errores_mostrados < MAX_FILAS_PREVIEW):
+                self._agregar_fila_tabla(item)
+                if es_error:
+                    self.errores_mostrados += 1
+
+    def _agregar_fila_tabla(self, item: Dict):
+        row_index = self.tabla_preview.rowCount()
+        self.tabla_preview.insertRow(row_index)
+
+        # Columna 0: Número de Fila en el CSV
+        self.tabla_preview.setItem(row_index, 0, QTableWidgetItem(str(item['numero_fila'])))
         
-        # Actualizar el resumen
+        # Columna 1: SKU
+        self.tabla_preview.setItem(row_index, 1, QTableWidgetItem(item['datos'].get('variante_sku', '')))
+        
+        # Columna 2: Nombre del Producto
+        self.tabla_preview.setItem(row_index, 2, QTableWidgetItem(item['datos'].get('plantilla_nombre', '')))
+        
+        # Columna 3 y 4: Estado y Errores
+        estado_item = QTableWidgetItem()
+        detalles_item = QTableWidgetItem()
+        
+        if item['estado'] == 'ERROR':
+            estado_item.setText("❌ Error")
+            detalles_item.setText(" | ".join(item['errores']))
+            background_color = self.color_error
+        elif item['estado'] == 'OK_NUEVO':
+            estado_item.setText("✅ OK para Crear")
+            background_color = self.color_ok
+        else:
+            estado_item.setText("🔄 OK para Actualizar")
+            background_color = self.color_update
+        
+        self.tabla_preview.setItem(row_index, 3, estado_item)
+        self.tabla_preview.setItem(row_index, 4, detalles_item)
+        
+        # Aplicar color de fondo a toda la fila
+        for col_index in range(self.tabla_preview.columnCount()):
+            self.tabla_preview.item(row_index, col_index).setBackground(background_color)
+
+    def _actualizar_resumen(self):
+        total = self.error_count + self.crear_count + self.actualizar_count
+        estado = "" if self.analisis_terminado else " <i>(analizando...)</i>"
+        mostradas = self.tabla_preview.rowCount()
+        nota_preview = f" | mostrando {mostradas:,} de {total:,} filas" if mostradas < total else ""
         summary_text = (
-            f"<b>Resumen:</b>   <font color='green'>{crear_count} productos para crear</font> | "
-            f"<font color='blue'>{actualizar_count} productos para actualizar</font> | "
-            f"<font color='red'>{error_count} filas con errores</font>"
+            f"<b>Resumen:</b>   <font color='green'>{self.crear_count:,} productos para crear</font> | "
+            f"<font color='blue'>{self.actualizar_count:,} productos para actualizar</font> | "
+            f"<font color='red'>{self.error_count:,} filas con errores</font>{nota_preview}{estado}"
         )
         self.summary_label.setText(summary_text)
 
-        # Deshabilitar el botón de importar si hay errores
-        if error_count > 0:
-            self.import_button.setEnabled(False)
-            self.import_button.setToolTip("No se puede importar porque se encontraron errores en el archivo. Por favor, corrígelos y vuelve a intentarlo.")
+    def _finalizar_analisis(self):
+        self.analisis_terminado = True
+        self._actualizar_resumen()
 
-    def get_filas_validas(self) -> List[Dict]:
-        """Devuelve solo las filas que están listas para ser importadas."""
-        return self.filas_validas
\ No newline at end of file
+        # Deshabilitar el botón de importar si hay errores o si no hay nada que importar
+        if self.error_count > 0:
+            self.import_button.setToolTip("No se puede importar porque se encontraron errores en el archivo. Por favor, corrígelos y vuelve a intentarlo.")
+        elif not (self.crear_count or self.actualizar_count):
+            self.import_button.setToolTip("El archivo no contiene filas para importar.")
+        else:
+            self.import_button.setEnabled(True)
\ No newline at end of file
@@ -0,0 +1,225 @@
+# src/modules/productos/indice_busqueda.py
+"""
+Índice de texto completo (SQLite FTS5) para buscar variantes por SKU, nombre de
+la plantilla, ruta de categoría, proveedor, códigos de barras y valores de atributo.
+
+El índice vive en la tabla virtual 'productos_fts' (rowid = productos.id) y se
+mantiene con triggers de SQLite, de modo que también lo actualizan las escrituras
+masivas que no pasan por el ORM. Si la versión de SQLite no trae FTS5 las
+búsquedas vuelven al filtro ILIKE de siempre.
+"""
+
+import re
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy import bindparam, event, exc, select, text, Integer, Float
+from sqlalchemy.orm import Session
+
+from core.db import Base
+
+TABLA_FTS = "productos_fts"
+
+# Variantes que se reindexan por sentencia en las reindexaciones por lotes.
+TAMANO_LOTE_REINDEXADO = 5000
+
+# Peso de cada columna en el ranking bm25 (sku, nombre, categoria, proveedor, codigos, atributos).
+PESOS_BM25 = (10.0, 5.0, 1.0, 1.0, 8.0, 2.0)
+
+# Documento indexado de cada variante; {condicion} filtra qué variantes se (re)indexan.
+_INSERTAR_DOCUMENTOS = f"""
+INSERT INTO {TABLA_FTS} (rowid, sku, nombre, categoria, proveedor, codigos, atributos)
+SELECT p.id, p.sku, pl.nombre,
+    COALESCE((SELECT group_concat(c.nombre, ' ') FROM categoria_jerarquia j
+              JOIN categorias c ON c.id = j.ancestro_id
+              WHERE j.descendiente_id = pl.categoria_id), ''),
+    COALESCE(pr.nombre_empresa, ''),
+    TRIM(COALESCE(p.codigo_barras_upc, '') || ' ' || COALESCE(p.codigo_barras_ean, '')),
+    COALESCE((SELECT group_concat(av.valor, ' ') FROM variante_valor_association a
+              JOIN atributo_valores av ON av.id = a.atributo_valor_id
+              WHERE a.producto_id = p.id), '')
+FROM productos p
+JOIN producto_plantillas pl ON pl.id = p.plantilla_id
+LEFT JOIN proveedores pr ON pr.id = pl.proveedor_id
+WHERE {{condicion}}
+"""
+
+
+# Tabla temporal cuya existencia en la conexión suspende los triggers de alta (ver indexacion_diferida).
+TABLA_INDEXACION_DIFERIDA = "fts_indexacion_diferida"
+
+# Los triggers de 'main' no pueden nombrar tablas de 'temp', pero sí consultar pragma_table_info.
+_SIN_INDEXACION_DIFERIDA = f"WHEN NOT EXISTS (SELECT 1 FROM pragma_table_info('{TABLA_INDEXACION_DIFERIDA}', 'temp'))"
+
+
+def _reindexar(condicion: str) -> str:
+    """Sentencias de trigger que borran y vuelven a insertar los documentos de las variantes que cumplen 'condicion'."""
+    return (
+        f"DELETE FROM {TABLA_FTS} WHERE rowid IN (SELECT p.id FROM productos p WHERE {condicion});\n"
+        + _INSERTAR_DOCUMENTOS.format(condicion=condicion) + ";"
+    )
+
+
+_TRIGGERS = {
+    "fts_productos_ai": (f"AFTER INSERT ON productos {_SIN_INDEXACION_DIFERIDA}", _INSERTAR_DOCUMENTOS.format(condicion="p.id = NEW.id") + ";"),
+    # El stock no forma parte del documento: las ventas no tocan el índice.
+    "fts_productos_au": ("AFTER UPDATE OF sku, plantilla_id, codigo_barras_upc, codigo_barras_ean ON productos",
+                         f"DELETE FROM {TABLA_FTS} WHERE rowid = OLD.id;\n" + _INSERTAR_DOCUMENTOS.format(condicion="p.id = NEW.id") + ";"),
+    "fts_productos_ad": ("AFTER DELETE ON productos", f"DELETE FROM {TABLA_FTS} WHERE rowid = OLD.id;"),
+    "fts_plantillas_au": ("AFTER UPDATE OF nombre, categoria_id, proveedor_id ON producto_plantillas",
+                          _reindexar("p.plantilla_id = NEW.id")),
+    "fts_valores_ai": (f"AFTER INSERT ON variante_valor_association {_SIN_INDEXACION_DIFERIDA}", _reindexar("p.id = NEW.producto_id")),
+    "fts_valores_ad": ("AFTER DELETE ON variante_valor_association", _reindexar("p.id = OLD.producto_id")),
+    "fts_atributo_valores_au": ("AFTER UPDATE OF valor ON atributo_valores",
+                                _reindexar("p.id IN (SELECT producto_id FROM variante_valor_association WHERE atributo_valor_id = NEW.id)")),
+    "fts_proveedores_au": ("AFTER UPDATE OF nombre_empresa ON proveedores",
+                           _reindexar("p.plantilla_id IN (SELECT id FROM producto_plantillas WHERE proveedor_id = NEW.id)")),
+    "fts_categorias_au": ("AFTER UPDATE OF nombre ON categorias",
+                          _reindexar("p.plantilla_id IN (SELECT pl.id FROM producto_plantillas pl JOIN categoria_jerarquia j "
+                                     "ON j.descendiente_id = pl.categoria_id WHERE j.ancestro_id = NEW.id)")),
+    # Mover una categoría cambia la ruta de todas las variantes de su subárbol.
+    "fts_jerarquia_ai": ("AFTER INSERT ON categoria_jerarquia",
+                         _reindexar("p.plantilla_id IN (SELECT id FROM producto_plantillas WHERE categoria_id = NEW.descendiente_id)")),
+    "fts_jerarquia_ad": ("AFTER DELETE ON categoria_jerarquia",
+                         _reindexar("p.plantilla_id IN (SELECT id FROM producto_plantillas WHERE categoria_id = OLD.descendiente_id)")),
+}
+
+
+def crear_indice_busqueda(conexion) -> bool:
+    """Crea la tabla FTS5 y sus triggers si no existen. Devuelve False si SQLite no soporta FTS5."""
+    try:
+        conexion.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+            "sku, nombre, categoria, proveedor, codigos, atributos, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    except exc.OperationalError as e:
+        print(f"⚠️ FTS5 no disponible, la búsqueda de productos usará ILIKE: {e}")
+        return False
+    for nombre, (evento, cuerpo) in _TRIGGERS.items():
+        conexion.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {nombre} {evento} BEGIN\n{cuerpo}\nEND")
+    return True
+
+
+def eliminar_indice_busqueda(conexion) -> None:
+    for nombre in _TRIGGERS:
+        conexion.exec_driver_sql(f"DROP TRIGGER IF EXISTS {nombre}")
+    conexion.exec_driver_sql(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _crear_indice_tras_create_all(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        crear_indice_busqueda(connection)
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def _eliminar_indice_antes_de_drop_all(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        eliminar_indice_busqueda(connection)
+
+
+def indice_busqueda_disponible(db: Session) -> bool:
+    return db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nombre"), {"nombre": TABLA_FTS}
+    ).first() is not None
+
+
+def indice_busqueda_desincronizado(db: Session) -> bool:
+    """True si el índice existe pero no tiene un documento por variante (p. ej. en bases creadas antes del índice)."""
+    if not indice_busqueda_disponible(db):
+        return False
+    en_indice = db.execute(text(f"SELECT count(*) FROM {TABLA_FTS}")).scalar()
+    return en_indice != db.execute(text("SELECT count(*) FROM productos")).scalar()
+
+
+def reconstruir_indice_busqueda(db: Session) -> int:
+    """Vuelve a generar todos los documentos del índice. Devuelve el número de variantes indexadas."""
+    db.execute(text(f"DELETE FROM {TABLA_FTS}"))
+    db.execute(text(_INSERTAR_DOCUMENTOS.format(condicion="1 = 1")))
+    db.execute(text(f"INSERT INTO {TABLA_FTS} ({TABLA_FTS}) VALUES ('optimize')"))
+    db.commit()
+    return db.execute(text(f"SELECT count(*) FROM {TABLA_FTS}")).scalar()
+
+
+def reindexar_productos(db: Session, producto_ids: Iterable[int]) -> None:
+    """Regenera los documentos de las variantes indicadas, por lotes."""
+    ids = list(producto_ids)
+    borrar = text(f"DELETE FROM {TABLA_FTS} WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True))
+    insertar = text(_INSERTAR_DOCUMENTOS.format(condicion="p.id IN :ids")).bindparams(bindparam("ids", expanding=True))
+    for i in range(0, len(ids), TAMANO_LOTE_REINDEXADO):
+        lote = ids[i:i + TAMANO_LOTE_REINDEXADO]
+        db.execute(borrar, {"ids": lote})
+        db.execute(insertar, {"ids": lote})
+
+
+# Triggers que se disparan una vez por fila en las altas masivas.
+_TRIGGERS_DE_ALTA = ("fts_productos_ai", "fts_valores_ai")
+
+
+def actualizar_triggers_de_alta(conexion) -> None:
+    """Vuelve a crear los triggers de alta (bases anteriores a la indexación diferida por conexión, o que los perdieron)."""
+    for nombre in _TRIGGERS_DE_ALTA:
+        conexion.exec_driver_sql(f"DROP TRIGGER IF EXISTS {nombre}")
+    crear_indice_busqueda(conexion)
+
+
+@contextmanager
+def indexacion_diferida(db: Session) -> Iterator[Set[int]]:
+    """
+    Para importaciones masivas: suspende los triggers de alta solo en la conexión
+    de 'db' y, al salir, indexa de una vez las variantes que el llamador haya
+    añadido al conjunto devuelto. Los triggers no se tocan: la marca es una tabla
+    temporal, que las demás conexiones no ven y que desaparece con la conexión.
+    Se crea dentro de la transacción, así que un rollback tampoco la deja puesta.
+    """
+    pendientes: Set[int] = set()
+    if not indice_busqueda_disponible(db):
+        yield pendientes
+        return
+    conexion = db.connection().connection.driver_connection
+    if not conexion.in_transaction:
+        # pysqlite no abre la transacción antes de un DDL: sin esto la marca se confirmaría sola
+        conexion.execute("BEGIN")
+    db.execute(text(f"CREATE TEMP TABLE IF NOT EXISTS {TABLA_INDEXACION_DIFERIDA} (marca INTEGER)"))
+    try:
+        yield pendientes
+    finally:
+        db.execute(text(f"DROP TABLE IF EXISTS temp.{TABLA_INDEXACION_DIFERIDA}"))
+    reindexar_productos(db, sorted(pendientes))
+
+
+def construir_consulta_fts(texto: Optional[str]) -> Optional[str]:
+    """
+    Convierte lo que escribe el usuario en una consulta FTS5 de prefijos: cada
+    palabra se cita (así '-' o ':' no se interpretan como operadores) y se le
+    añade '*'. Todas las palabras deben aparecer. None si no queda nada que buscar.
+    """
+    terminos = [t.replace('"', '') for t in re.split(r"\s+", texto or "")]
+    terminos = [t for t in terminos if re.search(r"\w", t)]
+    if not terminos:
+        return None
+    return " ".join(f'"{t}"*' for t in terminos)
+
+
+def subconsulta_coincidencias(consulta_fts: str):
+    """Subconsulta (producto_id, puntuacion) con las variantes que coinciden; menor puntuación = más relevante."""
+    pesos = ", ".join(str(p) for p in PESOS_BM25)
+    return (
+        text(f"SELECT rowid AS producto_id, bm25({TABLA_FTS}, {pesos}) AS puntuacion "
+             f"FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH :consulta_fts")
+        .bindparams(consulta_fts=consulta_fts)
+        .columns(producto_id=Integer, puntuacion=Float)
+        .subquery("coincidencias_fts")
+    )
+
+
+def buscar_ids_productos(db: Session, texto: str, limite: int = 50) -> List[int]:
+    """IDs de variantes ordenados por relevancia. Lista vacía si no hay consulta o índice."""
+    consulta = construir_consulta_fts(texto)
+    if not consulta or not indice_busqueda_disponible(db):
+        return []
+    coincidencias = subconsulta_coincidencias(consulta)
+    return list(db.scalars(
+        select(coincidencias.c.producto_id).order_by(coincidencias.c.puntuacion).limit(limite)
+    ))
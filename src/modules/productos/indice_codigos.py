@@ -0,0 +1,173 @@
+# src/modules/productos/indice_codigos.py
+"""
+Índice en memoria código → variante para el escaneo en el punto de venta.
+
+Se carga una vez por base de datos con (id, SKU, EAN, UPC) de todas las
+variantes y a partir de ahí cada escaneo es una consulta a un diccionario. Las
+altas, bajas y cambios de código que pasan por el ORM lo actualizan con eventos
+del mapper. Lo que no pasa por el ORM (importaciones masivas, otra instancia del
+programa) se corrige solo: cada acierto se comprueba contra la variante cargada
+y cada fallo se busca en la base (columnas con índice) y se añade.
+"""
+
+import threading
+import weakref
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from core.db import Base
+from .models import Producto
+
+# Columnas por las que se puede escanear; el SKU tiene prioridad si un código coincide con dos variantes.
+COLUMNAS_CODIGO = ("sku", "codigo_barras_ean", "codigo_barras_upc")
+
+
+def normalizar_codigo(codigo: Optional[str]) -> str:
+    """Los SKU se comparan sin distinguir mayúsculas (como en la base, COLLATE NOCASE)."""
+    return (codigo or "").strip().upper()
+
+
+def codigos_de(producto: Producto) -> List[str]:
+    codigos = (normalizar_codigo(getattr(producto, columna)) for columna in COLUMNAS_CODIGO)
+    return [c for c in codigos if c]
+
+
+class IndiceCodigos:
+    def __init__(self):
+        self._ids: Optional[Dict[str, int]] = None
+        self._bloqueo = threading.Lock()
+
+    def cargado(self) -> bool:
+        return self._ids is not None
+
+    def __len__(self) -> int:
+        return len(self._ids or {})
+
+    def cargar(self, conexion) -> int:
+        """
+        Lee los códigos de todas las variantes con una sola consulta. 'conexion'
+        puede ser una Session o una Connection propia (para cargar en segundo plano).
+        Devuelve el número de códigos indexados.
+        """
+        ids: Dict[str, int] = {}
+        filas = conexion.execute(select(Producto.id, Producto.sku, Producto.codigo_barras_ean, Producto.codigo_barras_upc))
+        for producto_id, sku, ean, upc in filas:
+            if ean:
+                ids.setdefault(ean.strip().upper(), producto_id)
+            if upc:
+                ids.setdefault(upc.strip().upper(), producto_id)
+            ids[sku.strip().upper()] = producto_id
+        with self._bloqueo:
+            self._ids = ids
+        return len(ids)
+
+    def invalidar(self) -> None:
+        with self._bloqueo:
+            self._ids = None
+
+    def producto_id(self, codigo: str) -> Optional[int]:
+        ids = self._ids
+        return ids.get(normalizar_codigo(codigo)) if ids is not None else None
+
+    def agregar(self, producto_id: int, codigos: List[str]) -> None:
+        with self._bloqueo:
+            if self._ids is None:
+                return
+            for codigo in codigos:
+                self._ids[codigo] = producto_id
+
+    def quitar(self, producto_id: int, codigos: List[str]) -> None:
+        with self._bloqueo:
+            if self._ids is None:
+                return
+            for codigo in codigos:
+                if self._ids.get(codigo) == producto_id:
+                    del self._ids[codigo]
+
+    def buscar(self, db: Session, codigo: str) -> Optional[Producto]:
+        """
+        Variante con ese SKU, EAN o UPC. Con el índice cargado y la variante ya en
+        la sesión no se ejecuta ninguna consulta.
+        """
+        codigo = normalizar_codigo(codigo)
+        if not codigo:
+            return None
+        if self._ids is None:
+            self.cargar(db)
+
+        producto_id = self._ids.get(codigo)
+        if producto_id is not None:
+            producto = db.get(Producto, producto_id)
+            if producto is not None and codigo in codigos_de(producto):
+                return producto
+            # El código cambió o la variante se borró sin pasar por el ORM
+            self.quitar(producto_id, [codigo])
+
+        producto = db.scalars(select(Producto).where(or_(
+            Producto.sku.collate("NOCASE") == codigo,
+            Producto.codigo_barras_ean == codigo,
+            Producto.codigo_barras_upc == codigo,
+        )).order_by(Producto.sku.collate("NOCASE") != codigo).limit(1)).first()
+        if producto is not None:
+            self.agregar(producto.id, codigos_de(producto))
+        return producto
+
+
+# Un índice por engine: cada base de datos tiene el suyo.
+_indices: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def indice_para(bind) -> IndiceCodigos:
+    """Índice de la base a la que apunta 'bind' (Engine, Connection o Session)."""
+    if isinstance(bind, Session):
+        bind = bind.get_bind()
+    engine = getattr(bind, "engine", bind)
+    indice = _indices.get(engine)
+    if indice is None:
+        indice = _indices[engine] = IndiceCodigos()
+    return indice
+
+
+def _indice_existente(conexion) -> Optional[IndiceCodigos]:
+    return _indices.get(conexion.engine)
+
+
+@event.listens_for(Producto, "after_insert")
+def _tras_insertar(mapper, conexion, producto):
+    indice = _indice_existente(conexion)
+    if indice is not None:
+        indice.agregar(producto.id, codigos_de(producto))
+
+
+@event.listens_for(Producto, "after_update")
+def _tras_actualizar(mapper, conexion, producto):
+    indice = _indice_existente(conexion)
+    if indice is None:
+        return
+    estado = inspect(producto)
+    anteriores, hubo_cambios = [], False
+    for columna in COLUMNAS_CODIGO:
+        historial = estado.attrs[columna].history
+        if historial.has_changes():
+            hubo_cambios = True
+            anteriores.extend(normalizar_codigo(c) for c in historial.deleted if c)
+    if hubo_cambios:
+        indice.quitar(producto.id, anteriores)
+        indice.agregar(producto.id, codigos_de(producto))
+
+
+@event.listens_for(Producto, "after_delete")
+def _tras_borrar(mapper, conexion, producto):
+    indice = _indice_existente(conexion)
+    if indice is not None:
+        indice.quitar(producto.id, codigos_de(producto))
+
+
+@event.listens_for(Base.metadata, "after_create")
+@event.listens_for(Base.metadata, "after_drop")
+def _invalidar_tras_ddl(target, connection, **kw):
+    indice = _indice_existente(connection)
+    if indice is not None:
+        indice.invalidar()
@@ -4,7 +4,7 @@ import enum
 from datetime import datetime, timezone
 
 from sqlalchemy import (Column, Integer, String, Text, Boolean, Float,
-                        ForeignKey, DateTime, Enum, Table)
+                        ForeignKey, Date, DateTime, Enum, Table, Index)
 from sqlalchemy.orm import relationship
 
 from core.db import Base
@@ -40,6 +40,8 @@ class ProductoPlantilla(Base):
 
     categoria_id = Column(Integer, ForeignKey("categorias.id"), nullable=True)
     proveedor_id = Column(Integer, ForeignKey("proveedores.id"), nullable=True)
+    # Unidades armables si es un kit (mantenido por stock_kits.py); NULL si no lo es
+    kit_stock = Column(Integer, nullable=True)
 
     # Relaciones
     categoria = relationship("Categoria", back_populates="plantillas")
@@ -50,6 +52,11 @@ class ProductoPlantilla(Base):
     # Relación para cuando la plantilla es un Kit
     componentes = relationship("KitComponente", foreign_keys='KitComponente.kit_plantilla_id', cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Comprobación de nombre duplicado sin distinguir mayúsculas (nombre COLLATE NOCASE = ?)
+        Index("ix_producto_plantillas_nombre_nocase", nombre.collate("NOCASE")),
+    )
+
     def __repr__(self):
         return f"<ProductoPlantilla(id={self.id}, nombre='{self.nombre}')>"
 
@@ -69,11 +76,21 @@ class Producto(Base):
     stock = Column(Integer, nullable=False, default=0)
     precio_venta = Column(Float, nullable=False)
     costo_compra = Column(Float, nullable=True)
+    # Costo medio ponderado de las existencias (lo mantiene valoracion.py al mover stock)
+    costo_promedio = Column(Float, nullable=True)
     
     # Relaciones
     plantilla = relationship("ProductoPlantilla", back_populates="variantes")
     valores = relationship("AtributoValor", secondary=variante_valor_association)
     historial_stock = relationship("MovimientoStock", back_populates="producto", cascade="all, delete-orphan")
+    # Se borran desde el ORM: el ON DELETE CASCADE solo actúa con foreign_keys activado
+    capas_costo = relationship("CapaCosto", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_productos_plantilla", "plantilla_id"),
+        # Búsqueda exacta de SKU sin distinguir mayúsculas (sku COLLATE NOCASE = ?)
+        Index("ix_productos_sku_nocase", sku.collate("NOCASE")),
+    )
 
 # --- Modelos de Soporte ---
 
@@ -103,6 +120,12 @@ class KitComponente(Base):
     # Relación para acceder fácilmente al producto componente
     componente = relationship("Producto")
 
+    __table_args__ = (
+        Index("ix_kit_componentes_kit", "kit_plantilla_id"),
+        # Kits que usan una variante (p. ej. para recalcular su stock al venderla)
+        Index("ix_kit_componentes_componente", "componente_id"),
+    )
+
 # --- Modelos para Historial y Control ---
 
 class TipoAjusteStock(str, enum.Enum):
@@ -129,7 +152,63 @@ class MovimientoStock(Base):
     motivo = Column(Text, nullable=True)
     stock_anterior = Column(Integer, nullable=False)
     stock_nuevo = Column(Integer, nullable=False)
+    # Entradas: costo de cada unidad. Salidas: costo medio ponderado que se les aplicó.
+    costo_unitario = Column(Float, nullable=True)
+    costo_fifo = Column(Float, nullable=True) # Salidas: importe de las capas FIFO consumidas
     
     # Relaciones
     producto = relationship("Producto", back_populates="historial_stock")
-    usuario = relationship("Usuario")
\ No newline at end of file
+    usuario = relationship("Usuario")
+
+    __table_args__ = (
+        # Historial de una variante ordenado por fecha
+        Index("ix_movimientos_stock_producto_fecha", "producto_id", "fecha"),
+        # Reproducción de los movimientos de un rango de fechas sin leer la tabla (cubre la suma por variante)
+        Index("ix_movimientos_stock_fecha", "fecha", "producto_id", "cantidad"),
+    )
+
+class CorteStock(Base):
+    """ Foto del stock de todas las variantes al final de 'fecha_corte' (día UTC, inclusive). """
+    __tablename__ = "cortes_stock"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fecha_corte = Column(Date, nullable=False, unique=True)
+    cantidad_variantes = Column(Integer, nullable=False, default=0)  # Variantes con stock distinto de cero
+    creado_en = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    existencias = relationship("InstantaneaStock", cascade="all, delete-orphan", passive_deletes=True)
+
+class InstantaneaStock(Base):
+    """
+    Stock de una variante en un corte. Solo se guardan las variantes con stock
+    distinto de cero (la ausencia equivale a 0). Sin clave foránea a productos:
+    el corte conserva el stock de variantes que después se eliminen.
+    """
+    __tablename__ = "instantaneas_stock"
+    corte_id = Column(Integer, ForeignKey("cortes_stock.id", ondelete="CASCADE"), primary_key=True)
+    producto_id = Column(Integer, primary_key=True)
+    stock = Column(Integer, nullable=False)
+
+    # Sin rowid: la fila vive en el propio índice de la clave primaria
+    __table_args__ = {"sqlite_with_rowid": False}
+
+class CapaCosto(Base):
+    """
+    Lote de entrada de una variante que aún no se ha consumido, para valorar por
+    FIFO: las salidas gastan primero las capas más antiguas (menor id).
+    """
+    __tablename__ = "capas_costo"
+    id = Column(Integer, primary_key=True)
+    producto_id = Column(Integer, ForeignKey("productos.id", ondelete="CASCADE"), nullable=False)
+    cantidad_restante = Column(Integer, nullable=False)
+    costo_unitario = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # Capas de una variante en orden de entrada
+        Index("ix_capas_costo_producto", "producto_id", "id"),
+    )
+
+
+# El índice FTS5 de búsqueda se crea junto con las tablas (ver indice_busqueda.py).
+from . import indice_busqueda  # noqa: E402,F401
+# Eventos que mantienen el índice de códigos para el escaneo (ver indice_codigos.py).
+from . import indice_codigos  # noqa: E402,F401
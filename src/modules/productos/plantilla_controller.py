@@ -1,23 +1,158 @@
 # src/modules/productos/plantilla_controller.py
 
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import distinct
-from typing import List, Dict, Any, Optional, Set, Tuple
+from sqlalchemy.orm import Session, joinedload, selectinload, aliased
+from sqlalchemy import distinct, select, insert, update, func, cast, String, case, exists, and_, or_
+from typing import List, Dict, Any, Optional, Set, Tuple, Iterator, Iterable
 import os
+import io
 import shutil
 import csv
-from datetime import datetime
+import gzip
+import time
+import multiprocessing
+from datetime import datetime, timezone
 from collections import defaultdict
+from itertools import islice
 import math
 
 from .models import (
     ProductoPlantilla, Producto, MovimientoStock, TipoAjusteStock,
-    ProductoImagen, KitComponente
+    ProductoImagen, KitComponente, variante_valor_association
 )
 from modules.variantes.variantes_model import Atributo, AtributoValor
-from modules.categorias.categoria_model import Categoria
+from modules.categorias.categoria_model import Categoria, CategoriaJerarquia
 from modules.proveedores.proveedor_model import Proveedor
 from utils import validators
+from . import indice_busqueda
+from . import stock_kits
+from . import valoracion
+
+# Número de filas por executemany durante la importación masiva.
+TAMANO_LOTE_IMPORTACION = 5000
+# Número de filas validadas que se entregan por lote durante el análisis en streaming.
+TAMANO_LOTE_ANALISIS = 1000
+# Bytes del CSV que valida cada tarea en el análisis multiproceso.
+TAMANO_RANGO_PARALELO = 2 * 1024 * 1024
+# Filas que se leen del cursor y se escriben por bloque durante la exportación.
+TAMANO_LOTE_EXPORTACION = 2000
+# Separador interno de group_concat; no aparece en nombres de atributos ni SKUs.
+SEPARADOR_EXPORTACION = "\x1f"
+# Filas por página que pide la tabla de productos al hacer scroll.
+TAMANO_PAGINA_PLANTILLAS = 200
+
+def validar_fila_importacion(fila: Dict, cache: Dict) -> Tuple[Dict, List[str]]:
+    """
+    Valida y normaliza una fila del CSV de importación. Es una función pura de
+    (fila, cache) para poder ejecutarse en procesos de trabajo.
+    """
+    errores = []
+    
+    nombre_plantilla = fila.get('plantilla_nombre', '').strip()
+    sku_variante = fila.get('variante_sku', '').strip()
+    
+    fila['plantilla_nombre'] = nombre_plantilla
+    fila['variante_sku'] = sku_variante
+
+    if not nombre_plantilla: errores.append("El 'plantilla_nombre' es obligatorio.")
+    if not sku_variante: errores.append("El 'variante_sku' es obligatorio.")
+    
+    try:
+        fila['variante_precio'] = float(fila.get('variante_precio', 0.0))
+        fila['variante_stock'] = int(fila.get('variante_stock', 0))
+        costo_str = fila.get('variante_costo')
+        fila['variante_costo'] = float(costo_str) if costo_str else None
+    except (ValueError, TypeError):
+        errores.append("Precio, costo o stock tienen un formato numérico inválido.")
+        
+    ruta_cat = fila.get('categoria_ruta', '').strip()
+    if ruta_cat:
+        nombre_cat_final = ruta_cat.split('/')[-1].strip().lower()
+        if nombre_cat_final not in cache['categorias']:
+            errores.append(f"La categoría '{ruta_cat.split('/')[-1].strip()}' no fue encontrada.")
+
+    nombre_prov = fila.get('proveedor_nombre', '').strip()
+    if nombre_prov and nombre_prov.lower() not in cache['proveedores']:
+        errores.append(f"El proveedor '{nombre_prov}' no fue encontrado.")
+        
+    atributos_str = fila.get('variante_atributos', '').strip()
+    if atributos_str:
+        pares = [par.strip() for par in atributos_str.split('|')]
+        for par in pares:
+            if ':' not in par:
+                errores.append(f"El formato del atributo '{par}' es inválido (debe ser 'Nombre:Valor').")
+                continue
+            nombre_attr, valor_attr = [p.strip() for p in par.split(':', 1)]
+            
+            if nombre_attr.lower() not in cache['atributos']:
+                errores.append(f"El atributo '{nombre_attr}' no existe.")
+            elif valor_attr.lower() not in cache['atributos'][nombre_attr.lower()]:
+                errores.append(f"El valor '{valor_attr}' no existe para el atributo '{nombre_attr}'.")
+
+    return fila, errores
+
+def analizar_fila_importacion(numero_fila: int, fila: Dict, cache: Dict) -> Dict:
+    datos_fila, errores = validar_fila_importacion(fila, cache)
+    estado = 'ERROR'
+    if not errores:
+        sku_lower = datos_fila.get('variante_sku', '').lower()
+        estado = 'OK_ACTUALIZAR' if sku_lower in cache['skus'] else 'OK_NUEVO'
+    return {"numero_fila": numero_fila, "datos": datos_fila, "estado": estado, "errores": errores}
+
+def _tiene_saltos_de_linea_entrecomillados(ruta_archivo: str) -> bool:
+    """
+    True si algún campo entrecomillado contiene un salto de línea: una línea física
+    que termina con un número impar de comillas acumuladas deja un campo abierto
+    (las comillas escapadas "" no cambian la paridad).
+    """
+    comillas = 0
+    with open(ruta_archivo, 'rb') as f:
+        for linea in f:
+            comillas += linea.count(b'"')
+            if comillas % 2:
+                return True
+    return False
+
+def _dividir_csv_en_rangos(ruta_archivo: str, tamano_rango: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """
+    Lee el encabezado y divide el resto del archivo en rangos de bytes que
+    terminan en un salto de línea. Supone que los campos no contienen saltos
+    de línea entrecomillados (ver _tiene_saltos_de_linea_entrecomillados).
+    """
+    rangos = []
+    with open(ruta_archivo, 'rb') as f:
+        linea_encabezado = f.readline()
+        encabezado = next(csv.reader([linea_encabezado.decode('utf-8-sig')]))
+        inicio = f.tell()
+        tamano_total = os.fstat(f.fileno()).st_size
+        while inicio < tamano_total:
+            f.seek(min(inicio + tamano_rango, tamano_total))
+            f.readline()  # Avanzamos hasta el final de la línea actual
+            fin = min(f.tell(), tamano_total)
+            rangos.append((inicio, fin))
+            inicio = fin
+    return encabezado, rangos
+
+# Caché de búsquedas y encabezado del CSV de cada proceso de trabajo; los fija
+# _iniciar_proceso_analisis una sola vez por proceso.
+_cache_proceso: Optional[Dict] = None
+_encabezado_proceso: Optional[List[str]] = None
+
+def _iniciar_proceso_analisis(cache: Dict, encabezado: List[str]) -> None:
+    global _cache_proceso, _encabezado_proceso
+    _cache_proceso, _encabezado_proceso = cache, encabezado
+
+def _analizar_rango_csv(args: Tuple[str, int, int]) -> List[Dict]:
+    """
+    Tarea de un proceso de trabajo: valida las filas del rango (ruta, desplazamiento,
+    longitud en bytes). Los 'numero_fila' devueltos son relativos al rango (empiezan
+    en 0); el proceso principal les suma el desplazamiento al unir los resultados en orden.
+    """
+    ruta_archivo, inicio, longitud = args
+    with open(ruta_archivo, 'rb') as f:
+        f.seek(inicio)
+        texto = f.read(longitud).decode('utf-8')
+    lector = csv.DictReader(io.StringIO(texto), fieldnames=_encabezado_proceso)
+    return [analizar_fila_importacion(i, fila, _cache_proceso) for i, fila in enumerate(lector)]
 
 class PlantillaController:
     def __init__(self, db_session: Session):
@@ -26,24 +161,13 @@ class PlantillaController:
         os.makedirs(self.imagenes_dir, exist_ok=True)
 
     def calcular_stock_disponible_kit(self, plantilla_id: int) -> int:
-        plantilla = self.db.query(ProductoPlantilla).options(
-            joinedload(ProductoPlantilla.componentes).joinedload(KitComponente.componente)
-        ).filter(ProductoPlantilla.id == plantilla_id).first()
-
-        if not plantilla or not plantilla.componentes:
-            return 0
-
-        kits_posibles = []
-        for item_kit in plantilla.componentes:
-            if not item_kit.componente or item_kit.cantidad <= 0:
-                return 0
-            
-            stock_componente = item_kit.componente.stock
-            cantidad_necesaria = item_kit.cantidad
-            
-            kits_posibles.append(stock_componente // cantidad_necesaria)
+        """Recalcula desde los componentes (también los kits anidados) el stock armable del kit."""
+        return stock_kits.calcular_stock_kit(self.db, plantilla_id)
 
-        return min(kits_posibles) if kits_posibles else 0
+    def obtener_stock_kit(self, plantilla_id: int) -> int:
+        """Stock del kit guardado en kit_stock (se mantiene al ajustar el stock de sus componentes)."""
+        stock = self.db.scalar(select(ProductoPlantilla.kit_stock).where(ProductoPlantilla.id == plantilla_id))
+        return self.calcular_stock_disponible_kit(plantilla_id) if stock is None else stock
 
     def listar_plantillas(self, filtro: Optional[str] = None, categoria_id: Optional[int] = None) -> List[ProductoPlantilla]:
         query = self.db.query(ProductoPlantilla).options(
@@ -57,14 +181,86 @@ class PlantillaController:
             termino_busqueda = f"%{filtro.lower()}%"
             query = query.filter(ProductoPlantilla.nombre.ilike(termino_busqueda))
         if categoria_id:
-            ids_a_filtrar = self._get_all_child_category_ids(categoria_id)
-            query = query.filter(ProductoPlantilla.categoria_id.in_(ids_a_filtrar))
+            query = query.join(CategoriaJerarquia, CategoriaJerarquia.descendiente_id == ProductoPlantilla.categoria_id).filter(CategoriaJerarquia.ancestro_id == categoria_id)
             
         return query.order_by(ProductoPlantilla.nombre).all()
 
+    def listar_plantillas_paginadas(self, filtro: Optional[str] = None, categoria_id: Optional[int] = None,
+                                    despues_de: Optional[Tuple[str, int]] = None,
+                                    limite: int = TAMANO_PAGINA_PLANTILLAS) -> List[Dict[str, Any]]:
+        """
+        Devuelve una página de plantillas para la tabla de productos, ordenada por
+        (nombre, id) y paginada por clave: `despues_de` es el (nombre, id) de la
+        última fila ya cargada. El stock se agrega en SQL (suma de variantes, o el
+        kit_stock guardado si es un kit), así que no se carga ninguna relación.
+        """
+        es_kit = ProductoPlantilla.kit_stock.is_not(None)
+        stock_variantes = (
+            select(func.coalesce(func.sum(Producto.stock), 0))
+            .where(Producto.plantilla_id == ProductoPlantilla.id)
+            .correlate(ProductoPlantilla)
+            .scalar_subquery()
+        )
+
+        consulta = (
+            select(
+                ProductoPlantilla.id,
+                ProductoPlantilla.nombre,
+                Categoria.nombre.label("categoria"),
+                es_kit.label("es_kit"),
+                case((es_kit, ProductoPlantilla.kit_stock), else_=stock_variantes).label("stock_total"),
+            )
+            .outerjoin(Categoria, Categoria.id == ProductoPlantilla.categoria_id)
+        )
+        if filtro:
+            consulta = consulta.where(self._condicion_busqueda(filtro))
+        if categoria_id:
+            consulta = consulta.join(CategoriaJerarquia, CategoriaJerarquia.descendiente_id == ProductoPlantilla.categoria_id).where(CategoriaJerarquia.ancestro_id == categoria_id)
+        if despues_de:
+            ultimo_nombre, ultimo_id = despues_de
+            consulta = consulta.where(or_(
+                ProductoPlantilla.nombre > ultimo_nombre,
+                and_(ProductoPlantilla.nombre == ultimo_nombre, ProductoPlantilla.id > ultimo_id),
+            ))
+
+        consulta = consulta.order_by(ProductoPlantilla.nombre, ProductoPlantilla.id).limit(limite)
+        return [
+            {
+                "id": fila.id,
+                "nombre": fila.nombre,
+                "categoria": fila.categoria,
+                "es_kit": bool(fila.es_kit),
+                "stock_total": int(fila.stock_total or 0),
+            }
+            for fila in self.db.execute(consulta)
+        ]
+
+    def _condicion_busqueda(self, filtro: str):
+        """
+        Plantillas con alguna variante que coincide en el índice FTS5; si no hay
+        índice (o el texto no tiene palabras) se filtra por nombre con ILIKE.
+        """
+        consulta_fts = indice_busqueda.construir_consulta_fts(filtro)
+        if not consulta_fts or not indice_busqueda.indice_busqueda_disponible(self.db):
+            return ProductoPlantilla.nombre.ilike(f"%{filtro.lower()}%")
+        coincidencias = indice_busqueda.subconsulta_coincidencias(consulta_fts)
+        return ProductoPlantilla.id.in_(
+            select(Producto.plantilla_id).join(coincidencias, coincidencias.c.producto_id == Producto.id)
+        )
+
+    def obtener_plantilla_detalle(self, plantilla_id: int) -> Optional[ProductoPlantilla]:
+        """Carga una plantilla con las relaciones que necesitan el panel de detalles y los diálogos."""
+        return self.db.query(ProductoPlantilla).options(
+            joinedload(ProductoPlantilla.categoria),
+            joinedload(ProductoPlantilla.proveedor),
+            selectinload(ProductoPlantilla.variantes),
+            selectinload(ProductoPlantilla.imagenes),
+            selectinload(ProductoPlantilla.componentes).joinedload(KitComponente.componente)
+        ).filter(ProductoPlantilla.id == plantilla_id).first()
+
     def crear_plantilla_con_variantes(self, datos_plantilla: Dict[str, Any], lista_variantes: List[Dict[str, Any]], usuario_id: int, componentes: List[Dict] = []):
         if not datos_plantilla.get("nombre"): raise ValueError("El nombre del producto es obligatorio.")
-        if self.db.query(ProductoPlantilla).filter(ProductoPlantilla.nombre.ilike(datos_plantilla["nombre"])).first(): raise ValueError(f"Ya existe un producto con el nombre '{datos_plantilla['nombre']}'.")
+        if self.db.query(ProductoPlantilla).filter(ProductoPlantilla.nombre.collate("NOCASE") == datos_plantilla["nombre"]).first(): raise ValueError(f"Ya existe un producto con el nombre '{datos_plantilla['nombre']}'.")
         try:
             imagenes_a_agregar = datos_plantilla.pop("imagenes_a_agregar", [])
             imagenes_a_eliminar = datos_plantilla.pop("imagenes_a_eliminar", [])
@@ -75,7 +271,7 @@ class PlantillaController:
             for datos_variante in lista_variantes:
                 sku = datos_variante.get("sku")
                 if not sku: raise ValueError("Todas las variantes activadas deben tener un SKU.")
-                if self.db.query(Producto).filter(Producto.sku.ilike(sku)).first(): raise ValueError(f"El SKU '{sku}' ya está en uso.")
+                if self.db.query(Producto).filter(Producto.sku.collate("NOCASE") == sku).first(): raise ValueError(f"El SKU '{sku}' ya está en uso.")
                 stock_inicial = int(datos_variante.get("stock", 0))
 
                 nueva_variante = Producto(
@@ -92,14 +288,13 @@ class PlantillaController:
                     if len(valores_obj) != len(ids_valores): raise ValueError("Uno o más valores de atributo no son válidos.")
                     nueva_variante.valores.extend(valores_obj)
                 self.db.add(nueva_variante)
-                if stock_inicial > 0:
-                    self.db.flush()
-                    movimiento = MovimientoStock(producto_id=nueva_variante.id, usuario_id=usuario_id, tipo_ajuste=TipoAjusteStock.ENTRADA_MANUAL, cantidad=stock_inicial, motivo="Stock Inicial de Creación de Producto", stock_anterior=0, stock_nuevo=stock_inicial)
-                    self.db.add(movimiento)
+                self._registrar_stock_inicial(nueva_variante, usuario_id)
             if componentes:
                 for comp_data in componentes:
                     componente = KitComponente(kit_plantilla_id=nueva_plantilla.id, componente_id=comp_data["componente_id"], cantidad=comp_data["cantidad"])
                     self.db.add(componente)
+                self.db.flush()
+                stock_kits.actualizar_kit_y_dependientes(self.db, nueva_plantilla.id)
             self.db.commit()
             self.db.refresh(nueva_plantilla)
             return nueva_plantilla
@@ -107,16 +302,43 @@ class PlantillaController:
             self.db.rollback()
             raise e
 
-    def exportar_plantillas_a_csv(self, ruta_archivo: str):
+    def _registrar_stock_inicial(self, variante: Producto, usuario_id: Optional[int]) -> None:
+        """
+        Registra el movimiento de entrada de una variante que se crea con stock, para
+        que el historial de movimientos explique todo el stock (ver obtener_stock_a_fecha).
+        El stock inicial entra a su costo de compra (costo medio y primera capa FIFO).
+        """
+        if not variante.stock or variante.stock <= 0:
+            return
+        self.db.flush()
+        ajuste = {"producto_id": variante.id, "cantidad": variante.stock, "stock_anterior": 0, "stock_nuevo": variante.stock}
+        valoracion.valorar_ajustes(self.db, [ajuste], {variante.id: variante.costo_compra})
+        self.db.add(MovimientoStock(
+            producto_id=variante.id, usuario_id=usuario_id, tipo_ajuste=TipoAjusteStock.ENTRADA_MANUAL, cantidad=variante.stock,
+            motivo="Stock Inicial de Creación de Producto", stock_anterior=0, stock_nuevo=variante.stock, costo_unitario=ajuste["costo_unitario"]
+        ))
+
+    def exportar_plantillas_a_csv(self, ruta_archivo: str, comprimir: Optional[bool] = None, tamano_lote: int = TAMANO_LOTE_EXPORTACION) -> int:
+        """
+        Exporta el catálogo completo (una fila por variante) a CSV.
+
+        Las filas salen de una única consulta plana de Core que se lee con
+        stream_results/yield_per y se escribe por bloques, así la memoria no
+        depende del tamaño del catálogo. Los atributos, la composición de los kits
+        y el número de variantes se agregan en SQL; las rutas de categoría se
+        precalculan con una sola lectura de la tabla de categorías.
+
+        :param comprimir: Escribe el archivo con gzip. Por defecto se activa si la ruta termina en '.gz'.
+        :return: Número de variantes exportadas.
+        """
+        if comprimir is None:
+            comprimir = ruta_archivo.lower().endswith('.gz')
         try:
-            plantillas = self.db.query(ProductoPlantilla).options(
-                joinedload(ProductoPlantilla.categoria),
-                joinedload(ProductoPlantilla.proveedor),
-                joinedload(ProductoPlantilla.variantes).joinedload(Producto.valores).joinedload(AtributoValor.atributo),
-                joinedload(ProductoPlantilla.componentes).joinedload(KitComponente.componente)
-            ).order_by(ProductoPlantilla.nombre).all()
-
-            with open(ruta_archivo, 'w', newline='', encoding='utf-8-sig') as archivo_csv:
+            rutas_categoria = self._mapa_rutas_categorias()
+            stmt = self._consulta_exportacion().execution_options(stream_results=True, yield_per=tamano_lote)
+            abrir = gzip.open if comprimir else open
+            total = 0
+            with abrir(ruta_archivo, 'wt', newline='', encoding='utf-8-sig') as archivo_csv:
                 escritor = csv.writer(archivo_csv)
                 encabezado = [
                     'plantilla_nombre', 'categoria_ruta', 'proveedor_nombre', 'tipo_producto',
@@ -125,194 +347,364 @@ class PlantillaController:
                 ]
                 escritor.writerow(encabezado)
 
-                for p in plantillas:
-                    for v in p.variantes:
-                        if p.componentes: tipo_producto = "Kit"
-                        elif len(p.variantes) > 1: tipo_producto = "Variante"
+                for particion in self.db.execute(stmt).partitions():
+                    filas = []
+                    for r in particion:
+                        if r.es_kit: tipo_producto = "Kit"
+                        elif r.num_variantes > 1: tipo_producto = "Variante"
                         else: tipo_producto = "Simple"
-
-                        categoria_ruta = self._get_ruta_categoria(p.categoria) if p.categoria else ""
-                        atributos = " | ".join(sorted([f"{val.atributo.nombre}:{val.valor}" for val in v.valores]))
-                        
-                        componentes_kit = " | ".join(sorted([f"{comp.componente.sku}:{comp.cantidad}" for comp in p.componentes if comp.componente is not None])) if tipo_producto == "Kit" else ""
-
-                        fila = [
-                            p.nombre,
-                            categoria_ruta,
-                            p.proveedor.nombre_empresa if p.proveedor else "",
+                        filas.append([
+                            r.plantilla_nombre,
+                            rutas_categoria.get(r.categoria_id, ""),
+                            r.proveedor_nombre or "",
                             tipo_producto,
-                            v.sku,
-                            v.precio_venta,
-                            v.costo_compra if v.costo_compra is not None else "",
-                            v.stock,
-                            atributos,
-                            componentes_kit
-                        ]
-                        escritor.writerow(fila)
-            print(f"Exportación completada exitosamente en: {ruta_archivo}")
+                            r.sku,
+                            r.precio_venta,
+                            r.costo_compra if r.costo_compra is not None else "",
+                            r.stock,
+                            " | ".join(sorted(r.atributos.split(SEPARADOR_EXPORTACION))) if r.atributos else "",
+                            " | ".join(sorted(r.componentes.split(SEPARADOR_EXPORTACION))) if r.es_kit and r.componentes else "",
+                        ])
+                    escritor.writerows(filas)
+                    total += len(filas)
+            print(f"Exportación completada exitosamente en: {ruta_archivo} ({total} variantes)")
+            return total
 
         except Exception as e:
             print(f"Error durante la exportación a CSV: {e}")
             raise
 
+    def _consulta_exportacion(self):
+        """SELECT plano de variantes con sus agregados, ordenado como el catálogo."""
+        atributos = (
+            select(
+                variante_valor_association.c.producto_id,
+                func.group_concat(Atributo.nombre + ':' + AtributoValor.valor, SEPARADOR_EXPORTACION).label("atributos"),
+            )
+            .join(AtributoValor, AtributoValor.id == variante_valor_association.c.atributo_valor_id)
+            .join(Atributo, Atributo.id == AtributoValor.atributo_id)
+            .group_by(variante_valor_association.c.producto_id)
+            .subquery()
+        )
+        componente = aliased(Producto)
+        kits = (
+            select(
+                KitComponente.kit_plantilla_id,
+                func.group_concat(componente.sku + ':' + cast(KitComponente.cantidad, String), SEPARADOR_EXPORTACION).label("componentes"),
+            )
+            .outerjoin(componente, componente.id == KitComponente.componente_id)
+            .group_by(KitComponente.kit_plantilla_id)
+            .subquery()
+        )
+        num_variantes = (
+            select(Producto.plantilla_id, func.count(Producto.id).label("num_variantes"))
+            .group_by(Producto.plantilla_id)
+            .subquery()
+        )
+        return (
+            select(
+                ProductoPlantilla.nombre.label("plantilla_nombre"),
+                ProductoPlantilla.categoria_id,
+                Proveedor.nombre_empresa.label("proveedor_nombre"),
+                num_variantes.c.num_variantes,
+                kits.c.kit_plantilla_id.isnot(None).label("es_kit"),
+                kits.c.componentes,
+                Producto.sku,
+                Producto.precio_venta,
+                Producto.costo_compra,
+                Producto.stock,
+                atributos.c.atributos,
+            )
+            .select_from(Producto)
+            .join(ProductoPlantilla, ProductoPlantilla.id == Producto.plantilla_id)
+            .join(num_variantes, num_variantes.c.plantilla_id == ProductoPlantilla.id)
+            .outerjoin(Proveedor, Proveedor.id == ProductoPlantilla.proveedor_id)
+            .outerjoin(kits, kits.c.kit_plantilla_id == ProductoPlantilla.id)
+            .outerjoin(atributos, atributos.c.producto_id == Producto.id)
+            .order_by(ProductoPlantilla.nombre, Producto.id)
+        )
+
+    def _mapa_rutas_categorias(self) -> Dict[int, str]:
+        """Calcula la ruta 'Padre / Hija' de todas las categorías con una sola consulta."""
+        padres = {cid: (nombre, padre_id) for cid, nombre, padre_id in self.db.execute(select(Categoria.id, Categoria.nombre, Categoria.categoria_padre_id))}
+        rutas: Dict[int, str] = {}
+
+        def ruta_de(cid: int) -> str:
+            if cid in rutas:
+                return rutas[cid]
+            partes, actual, visitados = [], cid, set()
+            while actual is not None and actual in padres and actual not in visitados:
+                if actual in rutas:
+                    partes.append(rutas[actual])
+                    break
+                visitados.add(actual)
+                nombre, padre_id = padres[actual]
+                partes.append(nombre)
+                actual = padre_id
+            rutas[cid] = " / ".join(reversed(partes))
+            return rutas[cid]
+
+        for cid in padres:
+            ruta_de(cid)
+        return rutas
+
     def analizar_csv_para_importacion(self, ruta_archivo: str) -> List[Dict]:
+        """Analiza el archivo completo y devuelve todas las filas validadas en una lista."""
         resultados = []
+        for lote in self.analizar_csv_en_lotes(ruta_archivo):
+            resultados.extend(lote)
+        return resultados
+
+    def analizar_csv_en_lotes(self, ruta_archivo: str, tamano_lote: int = TAMANO_LOTE_ANALISIS, procesos: int = 1) -> Iterator[List[Dict]]:
+        """
+        Generador que lee el CSV en streaming y produce las filas validadas en lotes
+        de 'tamano_lote', de modo que la UI puede mostrarlas conforme llegan y la
+        memoria del análisis no depende del tamaño del archivo.
+
+        :param procesos: Con un valor mayor a 1 se usa analizar_csv_en_paralelo.
+        """
+        if procesos > 1:
+            yield from self.analizar_csv_en_paralelo(ruta_archivo, procesos)
+            return
         try:
+            cache = self._construir_cache_importacion()
             with open(ruta_archivo, mode='r', encoding='utf-8-sig') as archivo_csv:
                 lector = csv.DictReader(archivo_csv)
-                
-                categorias_db = self.db.query(Categoria).all()
-                proveedores_db = self.db.query(Proveedor).all()
-                
-                cache = {
-                    'categorias': {cat.nombre.lower(): cat for cat in categorias_db},
-                    'proveedores': {prov.nombre_empresa.lower(): prov for prov in proveedores_db},
-                    'skus': {p.sku.lower() for p in self.db.query(Producto).all()},
-                    'atributos': {attr.nombre.lower(): attr for attr in self.db.query(Atributo).options(joinedload(Atributo.valores)).all()}
-                }
-                
+                lote = []
                 for i, fila in enumerate(lector):
-                    datos_fila, errores = self._validar_fila_importacion(fila, cache)
-                    estado = 'ERROR'
-                    if not errores:
-                        sku_lower = datos_fila.get('variante_sku', '').lower()
-                        if sku_lower in cache['skus']:
-                            estado = 'OK_ACTUALIZAR'
-                        else:
-                            estado = 'OK_NUEVO'
-                    
-                    resultados.append({"numero_fila": i + 2, "datos": datos_fila, "estado": estado, "errores": errores})
-            return resultados
+                    lote.append(analizar_fila_importacion(i + 2, fila, cache))
+                    if len(lote) >= tamano_lote:
+                        yield lote
+                        lote = []
+                if lote:
+                    yield lote
         except Exception as e:
             raise ValueError(f"Error al leer o procesar el archivo CSV: {e}")
 
-    def _validar_fila_importacion(self, fila: Dict, cache: Dict) -> Tuple[Dict, List[str]]:
-        errores = []
-        
-        nombre_plantilla = fila.get('plantilla_nombre', '').strip()
-        sku_variante = fila.get('variante_sku', '').strip()
-        
-        fila['plantilla_nombre'] = nombre_plantilla
-        fila['variante_sku'] = sku_variante
-
-        if not nombre_plantilla: errores.append("El 'plantilla_nombre' es obligatorio.")
-        if not sku_variante: errores.append("El 'variante_sku' es obligatorio.")
-        
+    def analizar_csv_en_paralelo(self, ruta_archivo: str, procesos: Optional[int] = None, tamano_rango: int = TAMANO_RANGO_PARALELO) -> Iterator[List[Dict]]:
+        """
+        Variante opcional de analizar_csv_en_lotes para catálogos muy grandes: divide
+        el archivo en rangos de bytes y valida cada uno en un proceso distinto. La
+        caché de búsquedas y el encabezado se envían una vez por proceso (initializer
+        del Pool); cada tarea solo lleva la ruta, el desplazamiento y la longitud.
+        Los lotes se entregan en el orden del archivo y con la misma numeración de
+        filas que el modo secuencial. Si algún campo entrecomillado tiene saltos de
+        línea, los rangos podrían partir un registro: se usa el análisis secuencial.
+        """
+        if _tiene_saltos_de_linea_entrecomillados(ruta_archivo):
+            print("⚠️ El CSV tiene campos con saltos de línea; se analiza en un solo proceso.")
+            yield from self.analizar_csv_en_lotes(ruta_archivo)
+            return
+        procesos = procesos or os.cpu_count() or 1
         try:
-            fila['variante_precio'] = float(fila.get('variante_precio', 0.0))
-            fila['variante_stock'] = int(fila.get('variante_stock', 0))
-            costo_str = fila.get('variante_costo')
-            fila['variante_costo'] = float(costo_str) if costo_str else None
-        except (ValueError, TypeError):
-            errores.append("Precio, costo o stock tienen un formato numérico inválido.")
-            
-        ruta_cat = fila.get('categoria_ruta', '').strip()
-        if ruta_cat:
-            nombre_cat_final = ruta_cat.split('/')[-1].strip().lower()
-            if nombre_cat_final not in cache['categorias']:
-                errores.append(f"La categoría '{ruta_cat.split('/')[-1].strip()}' no fue encontrada.")
-
-        nombre_prov = fila.get('proveedor_nombre', '').strip()
-        if nombre_prov and nombre_prov.lower() not in cache['proveedores']:
-            errores.append(f"El proveedor '{nombre_prov}' no fue encontrado.")
-            
-        atributos_str = fila.get('variante_atributos', '').strip()
-        if atributos_str:
-            pares = [par.strip() for par in atributos_str.split('|')]
-            for par in pares:
-                if ':' not in par:
-                    errores.append(f"El formato del atributo '{par}' es inválido (debe ser 'Nombre:Valor').")
-                    continue
-                nombre_attr, valor_attr = [p.strip() for p in par.split(':', 1)]
-                
-                if nombre_attr.lower() not in cache['atributos']:
-                    errores.append(f"El atributo '{nombre_attr}' no existe.")
-                else:
-                    attr_obj = cache['atributos'][nombre_attr.lower()]
-                    valores_existentes = {v.valor.lower() for v in attr_obj.valores}
-                    if valor_attr.lower() not in valores_existentes:
-                        errores.append(f"El valor '{valor_attr}' no existe para el atributo '{nombre_attr}'.")
-
-        return fila, errores
-    
-    def _find_category_by_path(self, ruta_completa: str) -> Optional[Categoria]:
-        nombre_final = ruta_completa.split('/')[-1].strip()
-        return self.db.query(Categoria).filter(Categoria.nombre.ilike(nombre_final)).first()
-
-    def _find_provider_by_name(self, nombre: str) -> Optional[Proveedor]:
-        if not nombre:
-            return None
-        return self.db.query(Proveedor).filter(Proveedor.nombre_empresa.ilike(nombre)).first()
-        
-    def ejecutar_importacion(self, filas_validadas: List[Dict], usuario_id: int):
-        plantillas_a_procesar = defaultdict(list)
-        for fila in filas_validadas:
-            plantillas_a_procesar[fila['datos']['plantilla_nombre']].append(fila)
+            cache = self._construir_cache_importacion()
+            encabezado, rangos = _dividir_csv_en_rangos(ruta_archivo, tamano_rango)
+            tareas = [(ruta_archivo, inicio, fin - inicio) for inicio, fin in rangos]
+            siguiente_fila = 2
+            with multiprocessing.get_context("spawn").Pool(processes=procesos, initializer=_iniciar_proceso_analisis, initargs=(cache, encabezado)) as pool:
+                for resultados in pool.imap(_analizar_rango_csv, tareas):
+                    for item in resultados:
+                        item["numero_fila"] += siguiente_fila
+                    siguiente_fila += len(resultados)
+                    if resultados:
+                        yield resultados
+        except Exception as e:
+            raise ValueError(f"Error al leer o procesar el archivo CSV: {e}")
+
+    def _construir_cache_importacion(self) -> Dict[str, Any]:
+        """
+        Precarga las búsquedas de la validación con consultas de columnas (sin objetos ORM).
+        Los valores de cada atributo se guardan ya normalizados en un set.
+        """
+        valores_por_atributo: Dict[str, Set[str]] = defaultdict(set)
+        for nombre_attr, valor in self.db.execute(select(Atributo.nombre, AtributoValor.valor).outerjoin(AtributoValor, AtributoValor.atributo_id == Atributo.id)):
+            valores = valores_por_atributo[nombre_attr.lower()]
+            if valor is not None:
+                valores.add(valor.lower())
+        return {
+            'categorias': {nombre.lower(): cid for cid, nombre in self.db.execute(select(Categoria.id, Categoria.nombre))},
+            'proveedores': {nombre.lower(): pid for pid, nombre in self.db.execute(select(Proveedor.id, Proveedor.nombre_empresa))},
+            'skus': {sku.lower() for sku in self.db.scalars(select(Producto.sku))},
+            'atributos': dict(valores_por_atributo),
+        }
+
+    def _validar_fila_importacion(self, fila: Dict, cache: Dict) -> Tuple[Dict, List[str]]:
+        return validar_fila_importacion(fila, cache)
+
+    def importar_csv(self, ruta_archivo: str, usuario_id: int, procesos: int = 1) -> Dict[str, Any]:
+        """
+        Vuelve a leer y validar el CSV en streaming e importa sus filas válidas (ver
+        ejecutar_importacion). Es lo que usa el asistente tras la vista previa, que
+        solo guarda contadores y errores: nunca está el archivo entero en memoria.
+        """
+        filas_validas = (
+            item for lote in self.analizar_csv_en_lotes(ruta_archivo, procesos=procesos)
+            for item in lote if item['estado'] != 'ERROR'
+        )
+        return self.ejecutar_importacion(filas_validas, usuario_id)
+
+    def ejecutar_importacion(self, filas_validadas: Iterable[Dict], usuario_id: int) -> Dict[str, Any]:
+        """
+        Importa las filas validadas con operaciones por lotes: se precargan una sola
+        vez las plantillas, SKUs, categorías, proveedores y valores de atributo en
+        diccionarios, y luego cada bloque de TAMANO_LOTE_IMPORTACION filas inserta sus
+        plantillas nuevas, variantes, asociaciones de atributos y movimientos de stock
+        con executemany de Core. Las variantes existentes se actualizan con un
+        UPDATE masivo por clave primaria. 'filas_validadas' puede ser un generador
+        (ver importar_csv): solo se tiene en memoria un bloque. Todo ocurre en una
+        única transacción.
+
+        :return: Estadísticas de la importación, incluidas las filas por segundo.
+        """
+        inicio = time.perf_counter()
+        estadisticas = dict.fromkeys(("filas", "plantillas_creadas", "variantes_creadas", "variantes_actualizadas", "movimientos_stock"), 0)
+        variantes_movidas: Set[int] = set()
+        variantes_con_stock_cambiado: Set[int] = set()
         try:
-            for nombre_plantilla, filas_variantes in plantillas_a_procesar.items():
-                primera_fila = filas_variantes[0]['datos']
-                plantilla_existente = self.db.query(ProductoPlantilla).filter(ProductoPlantilla.nombre.ilike(nombre_plantilla)).first()
-                if not plantilla_existente:
-                    categoria_obj = self._find_category_by_path(primera_fila['categoria_ruta'])
-                    proveedor_obj = self._find_provider_by_name(primera_fila['proveedor_nombre'])
-                    plantilla_obj = ProductoPlantilla(nombre=nombre_plantilla, categoria_id=categoria_obj.id if categoria_obj else None, proveedor_id=proveedor_obj.id if proveedor_obj else None)
-                    self.db.add(plantilla_obj)
-                    self.db.flush()
-                else:
-                    plantilla_obj = plantilla_existente
-                
-                for fila_variante_data in filas_variantes:
-                    if fila_variante_data['datos']['plantilla_nombre'] != nombre_plantilla:
-                        continue
-
-                    estado = fila_variante_data['estado']
-                    datos = fila_variante_data['datos']
-                    sku = datos['variante_sku']
-                    if estado == 'OK_NUEVO':
-                        nueva_variante = Producto(plantilla_id=plantilla_obj.id, sku=sku, precio_venta=datos['variante_precio'], costo_compra=datos['variante_costo'], stock=datos['variante_stock'])
-                        self.db.add(nueva_variante)
-                        if datos['variante_stock'] > 0:
-                            self.db.flush()
-                            mov = MovimientoStock(producto_id=nueva_variante.id, usuario_id=usuario_id, tipo_ajuste=TipoAjusteStock.ENTRADA_MANUAL, cantidad=datos['variante_stock'], motivo=f"Importación masiva desde CSV", stock_anterior=0, stock_nuevo=datos['variante_stock'])
-                            self.db.add(mov)
-                    elif estado == 'OK_ACTUALIZAR':
-                        variante_a_actualizar = self.db.query(Producto).filter(Producto.sku.ilike(sku)).one()
-                        stock_anterior = variante_a_actualizar.stock
-                        nuevo_stock = datos['variante_stock']
-                        variante_a_actualizar.precio_venta = datos['variante_precio']
-                        variante_a_actualizar.costo_compra = datos['variante_costo']
-                        if nuevo_stock != stock_anterior:
-                            variante_a_actualizar.stock = nuevo_stock
-                            mov = MovimientoStock(producto_id=variante_a_actualizar.id, usuario_id=usuario_id, tipo_ajuste=TipoAjusteStock.AJUSTE_CONTEO_POSITIVO, cantidad=(nuevo_stock - stock_anterior), motivo=f"Ajuste por importación masiva desde CSV", stock_anterior=stock_anterior, stock_nuevo=nuevo_stock)
-                            self.db.add(mov)
+            plantillas_db = {nombre.lower(): pid for pid, nombre in self.db.execute(select(ProductoPlantilla.id, ProductoPlantilla.nombre))}
+            skus_db = {sku.lower(): (pid, stock) for pid, sku, stock in self.db.execute(select(Producto.id, Producto.sku, Producto.stock))}
+            categorias_db = {nombre.lower(): cid for cid, nombre in self.db.execute(select(Categoria.id, Categoria.nombre))}
+            proveedores_db = {nombre.lower(): pid for pid, nombre in self.db.execute(select(Proveedor.id, Proveedor.nombre_empresa))}
+            valores_db = {
+                (nombre_attr.lower(), valor.lower()): vid
+                for vid, valor, nombre_attr in self.db.execute(
+                    select(AtributoValor.id, AtributoValor.valor, Atributo.nombre).join(Atributo, AtributoValor.atributo_id == Atributo.id)
+                )
+            }
+            ahora = datetime.now(timezone.utc)
+
+            # El índice de búsqueda se actualiza una sola vez al final, no fila a fila.
+            with indice_busqueda.indexacion_diferida(self.db) as variantes_a_indexar:
+                for bloque in self._en_lotes(filas_validadas):
+                    estadisticas["filas"] += len(bloque)
+
+                    # 1. Plantillas nuevas (la primera fila de cada una decide su categoría y proveedor)
+                    nuevas_plantillas: Dict[str, Dict] = {}
+                    for fila in bloque:
+                        datos = fila['datos']
+                        clave = datos['plantilla_nombre'].lower()
+                        if clave in plantillas_db or clave in nuevas_plantillas:
+                            continue
+                        nombre_cat = (datos.get('categoria_ruta') or '').split('/')[-1].strip().lower()
+                        nombre_prov = (datos.get('proveedor_nombre') or '').strip().lower()
+                        nuevas_plantillas[clave] = {
+                            "nombre": datos['plantilla_nombre'],
+                            "activo": True,
+                            "categoria_id": categorias_db.get(nombre_cat),
+                            "proveedor_id": proveedores_db.get(nombre_prov),
+                        }
+                    if nuevas_plantillas:
+                        for pid, nombre in self.db.execute(insert(ProductoPlantilla).returning(ProductoPlantilla.id, ProductoPlantilla.nombre), list(nuevas_plantillas.values())):
+                            plantillas_db[nombre.lower()] = pid
+                        estadisticas["plantillas_creadas"] += len(nuevas_plantillas)
+
+                    # 2. Variantes nuevas y actualizaciones
+                    nuevas_variantes, actualizaciones, movimientos, asociaciones = [], [], [], []
+                    atributos_por_sku: Dict[str, List[int]] = {}
+                    for fila in bloque:
+                        datos = fila['datos']
+                        sku = datos['variante_sku']
+                        if fila['estado'] == 'OK_NUEVO':
+                            nuevas_variantes.append({
+                                "plantilla_id": plantillas_db[datos['plantilla_nombre'].lower()], "sku": sku, "precio_venta": datos['variante_precio'],
+                                "costo_compra": datos['variante_costo'], "stock": datos['variante_stock'],
+                            })
+                            atributos_por_sku[sku.lower()] = self._ids_valores_de_fila(datos.get('variante_atributos', ''), valores_db)
+                        elif fila['estado'] == 'OK_ACTUALIZAR':
+                            variante_id, stock_anterior = skus_db[sku.lower()]
+                            nuevo_stock = datos['variante_stock']
+                            cambios = {"id": variante_id, "precio_venta": datos['variante_precio'], "costo_compra": datos['variante_costo']}
+                            if nuevo_stock != stock_anterior:
+                                cambios["stock"] = nuevo_stock
+                                diferencia = nuevo_stock - stock_anterior
+                                movimientos.append({
+                                    "producto_id": variante_id, "usuario_id": usuario_id, "fecha": ahora,
+                                    "tipo_ajuste": TipoAjusteStock.AJUSTE_CONTEO_POSITIVO if diferencia > 0 else TipoAjusteStock.AJUSTE_CONTEO_NEGATIVO,
+                                    "cantidad": diferencia, "motivo": "Ajuste por importación masiva desde CSV",
+                                    "stock_anterior": stock_anterior, "stock_nuevo": nuevo_stock, "costo_unitario": None,
+                                })
+                                variantes_con_stock_cambiado.add(variante_id)
+                            actualizaciones.append(cambios)
+
+                    if nuevas_variantes:
+                        variantes_por_sku = {v["sku"].lower(): v for v in nuevas_variantes}
+                        for variante_id, sku in self.db.execute(insert(Producto).returning(Producto.id, Producto.sku), nuevas_variantes):
+                            variantes_a_indexar.add(variante_id)
+                            variante = variantes_por_sku[sku.lower()]
+                            if variante["stock"] > 0:
+                                # El stock inicial entra a su costo de compra, como al crear la variante a mano
+                                movimientos.append({
+                                    "producto_id": variante_id, "usuario_id": usuario_id, "fecha": ahora,
+                                    "tipo_ajuste": TipoAjusteStock.ENTRADA_MANUAL, "cantidad": variante["stock"],
+                                    "motivo": "Importación masiva desde CSV", "stock_anterior": 0, "stock_nuevo": variante["stock"],
+                                    "costo_unitario": variante["costo_compra"],
+                                })
+                            asociaciones.extend({"producto_id": variante_id, "atributo_valor_id": vid} for vid in atributos_por_sku.get(sku.lower(), []))
+
+                    # Las filas con y sin "stock" llevan columnas distintas: se actualizan por separado.
+                    for con_stock in (True, False):
+                        grupo = [a for a in actualizaciones if ("stock" in a) == con_stock]
+                        if grupo:
+                            self.db.execute(update(Producto), grupo)
+                    if asociaciones:
+                        self.db.execute(insert(variante_valor_association), asociaciones)
+                    if movimientos:
+                        self.db.execute(insert(MovimientoStock), movimientos)
+                    variantes_movidas.update(m["producto_id"] for m in movimientos)
+                    estadisticas["variantes_creadas"] += len(nuevas_variantes)
+                    estadisticas["variantes_actualizadas"] += len(actualizaciones)
+                    estadisticas["movimientos_stock"] += len(movimientos)
+
+            # Solo los kits que usan variantes cuyo stock cambió
+            stock_kits.actualizar_kits_de_componentes(self.db, variantes_con_stock_cambiado)
+            # Los movimientos del CSV no llevan costo: se revalora desde el historial a las variantes movidas
+            valoracion.reconstruir_valoracion(self.db, variantes_movidas)
             self.db.commit()
+            self.db.expire_all()
         except Exception as e:
             self.db.rollback()
             print(f"ERROR FATAL DURANTE LA IMPORTACIÓN, SE HA HECHO ROLLBACK: {e}")
             raise ValueError(f"No se pudo completar la importación. Error: {e}")
 
+        duracion = time.perf_counter() - inicio
+        estadisticas["segundos"] = duracion
+        estadisticas["filas_por_segundo"] = estadisticas["filas"] / duracion if duracion > 0 else 0.0
+        print(f"📥 Importación completada: {estadisticas['filas']} filas en {duracion:.2f}s ({estadisticas['filas_por_segundo']:,.0f} filas/seg)")
+        return estadisticas
+
+    @staticmethod
+    def _en_lotes(filas: Iterable[Dict], tamano: int = TAMANO_LOTE_IMPORTACION) -> Iterator[List[Dict]]:
+        """Agrupa en listas de 'tamano' una lista o un generador, sin materializarlo entero."""
+        iterador = iter(filas)
+        while lote := list(islice(iterador, tamano)):
+            yield lote
+
+    @staticmethod
+    def _ids_valores_de_fila(atributos_str: str, valores_db: Dict[Tuple[str, str], int]) -> List[int]:
+        """Convierte 'Talla:M | Color:Rojo' en los IDs de AtributoValor correspondientes."""
+        ids = []
+        for par in (atributos_str or '').split('|'):
+            if ':' not in par:
+                continue
+            nombre_attr, valor_attr = [p.strip().lower() for p in par.split(':', 1)]
+            valor_id = valores_db.get((nombre_attr, valor_attr))
+            if valor_id is not None and valor_id not in ids:
+                ids.append(valor_id)
+        return ids
+
     def get_ids_de_categorias_relevantes(self) -> Set[int]:
-        categorias_con_productos_directos = self.db.query(distinct(ProductoPlantilla.categoria_id)).filter(ProductoPlantilla.categoria_id.isnot(None)).all()
-        ids_con_productos = {id[0] for id in categorias_con_productos_directos}
-        todas_las_categorias = self.db.query(Categoria).all()
-        mapa_categorias = {cat.id: cat for cat in todas_las_categorias}
-        ids_relevantes = set(ids_con_productos)
-        for cat_id in ids_con_productos:
-            actual = mapa_categorias.get(cat_id)
-            while actual and actual.categoria_padre_id:
-                ids_relevantes.add(actual.categoria_padre_id)
-                actual = mapa_categorias.get(actual.categoria_padre_id)
-        return ids_relevantes
+        """IDs de las categorías con productos y de todos sus ancestros, en una sola consulta."""
+        consulta = (
+            select(distinct(CategoriaJerarquia.ancestro_id))
+            .join(ProductoPlantilla, ProductoPlantilla.categoria_id == CategoriaJerarquia.descendiente_id)
+        )
+        return set(self.db.scalars(consulta))
         
     def _get_all_child_category_ids(self, categoria_id: int) -> List[int]:
-        ids = {categoria_id}
-        categoria = self.db.query(Categoria).options(joinedload(Categoria.subcategorias)).get(categoria_id)
-        if categoria:
-            for sub_cat in categoria.subcategorias:
-                ids.update(self._get_all_child_category_ids(sub_cat.id))
-        return list(ids)
+        return list(self.db.scalars(select(CategoriaJerarquia.descendiente_id).where(CategoriaJerarquia.ancestro_id == categoria_id)))
     
-    def actualizar_plantilla_con_variantes(self, plantilla_id: int, datos_plantilla: Dict[str, Any], lista_variantes_ui: List[Dict[str, Any]], componentes: List[Dict] = []):
+    def actualizar_plantilla_con_variantes(self, plantilla_id: int, datos_plantilla: Dict[str, Any], lista_variantes_ui: List[Dict[str, Any]], componentes: List[Dict] = [],
+                                           usuario_id: Optional[int] = None):
         try:
             plantilla = self.db.query(ProductoPlantilla).options(joinedload(ProductoPlantilla.variantes), joinedload(ProductoPlantilla.componentes)).filter_by(id=plantilla_id).first()
             if not plantilla: raise ValueError("La plantilla del producto no fue encontrada.")
@@ -333,7 +725,7 @@ class PlantillaController:
                 sku = datos_variante["sku"]
                 if not sku: raise ValueError("El SKU es obligatorio para todas las variantes.")
                 
-                conflicting_sku = self.db.query(Producto).filter(Producto.sku.ilike(sku), Producto.id != variante_id).first()
+                conflicting_sku = self.db.query(Producto).filter(Producto.sku.collate("NOCASE") == sku, Producto.id != variante_id).first()
                 if conflicting_sku: raise ValueError(f"El SKU '{sku}' ya está en uso por otro producto.")
 
                 if variante_id in variantes_en_db_map:
@@ -348,11 +740,14 @@ class PlantillaController:
                         valores_obj = self.db.query(AtributoValor).filter(AtributoValor.id.in_(ids_valores)).all()
                         nueva_variante.valores.extend(valores_obj)
                     self.db.add(nueva_variante)
+                    self._registrar_stock_inicial(nueva_variante, usuario_id)
 
+            variantes_eliminadas = set()
             for id_db, variante_db in variantes_en_db_map.items():
                 if id_db not in ids_variantes_ui:
                     if variante_db.stock > 0: raise ValueError(f"No se puede eliminar la variante con SKU '{variante_db.sku}' porque tiene stock.")
                     self.db.delete(variante_db)
+                    variantes_eliminadas.add(id_db)
 
             plantilla.componentes.clear()
             self.db.flush()
@@ -360,7 +755,11 @@ class PlantillaController:
                 for comp_data in componentes:
                     componente_obj = KitComponente(kit_plantilla_id=plantilla.id, componente_id=comp_data["componente_id"], cantidad=comp_data["cantidad"])
                     self.db.add(componente_obj)
-            
+            self.db.flush()
+            stock_kits.actualizar_kit_y_dependientes(self.db, plantilla.id)
+            # Los kits que usaban una variante eliminada quedan sin poder armarse
+            stock_kits.actualizar_kits_de_componentes(self.db, variantes_eliminadas)
+
             self.db.commit()
             self.db.refresh(plantilla)
             return plantilla
@@ -399,7 +798,7 @@ class PlantillaController:
         # Se corrige la referencia de self.componentes a plantilla.componentes
         stock_total = 0
         if plantilla.componentes: # Si es un kit, el stock es calculado.
-            stock_total = self.calcular_stock_disponible_kit(plantilla.id)
+            stock_total = self.obtener_stock_kit(plantilla.id)
         else: # Si no es un kit, es la suma del stock de sus variantes
             stock_total = sum(variante.stock for variante in plantilla.variantes)
         # --- FIN DE LA MODIFICACIÓN ---
@@ -413,14 +812,9 @@ class PlantillaController:
                 except OSError as e:
                     print(f"No se pudo eliminar la imagen {img.ruta_imagen}: {e}")
 
+        kits_que_la_usan = stock_kits.kits_afectados(self.db, [v.id for v in plantilla.variantes]) - {plantilla.id}
         self.db.delete(plantilla)
+        self.db.flush()
+        stock_kits.guardar_stock_kits(self.db, kits_que_la_usan)
         self.db.commit()
         return True
-
-    def _get_ruta_categoria(self, categoria: Categoria) -> str:
-        partes_ruta = []
-        actual = categoria
-        while actual:
-            partes_ruta.append(actual.nombre)
-            actual = actual.padre
-        return " / ".join(reversed(partes_ruta))
\ No newline at end of file
@@ -0,0 +1,103 @@
+# src/modules/productos/plantilla_table_model.py
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+from typing import Any, Dict, List, Optional
+
+from .plantilla_controller import PlantillaController, TAMANO_PAGINA_PLANTILLAS
+
+
+class PlantillaTableModel(QAbstractTableModel):
+    """
+    Modelo de la tabla de productos. Carga las plantillas por páginas desde SQL
+    (paginación por clave) a medida que la vista hace scroll, en lugar de
+    materializar todo el catálogo en cada búsqueda.
+    """
+    ENCABEZADOS = ["ID", "Nombre del Producto", "Categoría", "Stock Total"]
+
+    def __init__(self, plantilla_ctrl: PlantillaController, tamano_pagina: int = TAMANO_PAGINA_PLANTILLAS, parent=None):
+        super().__init__(parent)
+        self.plantilla_controller = plantilla_ctrl
+        self.tamano_pagina = tamano_pagina
+        self._filas: List[Dict[str, Any]] = []
+        self._filtro: Optional[str] = None
+        self._categoria_id: Optional[int] = None
+        self._hay_mas = False
+
+    def recargar(self, filtro: Optional[str] = None, categoria_id: Optional[int] = None):
+        """Descarta las filas cargadas y pide la primera página con los nuevos filtros."""
+        self._filtro = filtro or None
+        self._categoria_id = categoria_id
+        self.cargar_primera_pagina(self._pedir_pagina(None), filtro, categoria_id)
+
+    def cargar_primera_pagina(self, filas: List[Dict[str, Any]], filtro: Optional[str] = None, categoria_id: Optional[int] = None):
+        """Sustituye el contenido por una primera página ya consultada (p. ej. desde un hilo de búsqueda)."""
+        self.beginResetModel()
+        self._filtro = filtro or None
+        self._categoria_id = categoria_id
+        self._filas = list(filas)
+        self._hay_mas = len(self._filas) == self.tamano_pagina
+        self.endResetModel()
+
+    def _pedir_pagina(self, despues_de) -> List[Dict[str, Any]]:
+        return self.plantilla_controller.listar_plantillas_paginadas(
+            filtro=self._filtro, categoria_id=self._categoria_id,
+            despues_de=despues_de, limite=self.tamano_pagina
+        )
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._filas)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.ENCABEZADOS)
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and self._hay_mas
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self._filas:
+            return
+        ultima = self._filas[-1]
+        nuevas = self._pedir_pagina((ultima["nombre"], ultima["id"]))
+        self._hay_mas = len(nuevas) == self.tamano_pagina
+        if not nuevas:
+            return
+        inicio = len(self._filas)
+        self.beginInsertRows(QModelIndex(), inicio, inicio + len(nuevas) - 1)
+        self._filas.extend(nuevas)
+        self.endInsertRows()
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        fila = self._filas[index.row()]
+        if role == Qt.ItemDataRole.UserRole:
+            return fila["id"]
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+
+        columna = index.column()
+        if columna == 0:
+            return str(fila["id"])
+        if columna == 1:
+            return fila["nombre"]
+        if columna == 2:
+            return fila["categoria"] or "N/A"
+        if columna == 3:
+            # El asterisco indica que el stock del kit es calculado a partir de sus componentes
+            return f"{fila['stock_total']}*" if fila["es_kit"] else str(fila["stock_total"])
+        return None
+
+    def headerData(self, section: int, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.ENCABEZADOS[section]
+        return None
+
+    def plantilla_id_en(self, fila: int) -> Optional[int]:
+        return self._filas[fila]["id"] if 0 <= fila < len(self._filas) else None
+
+    def fila_de_plantilla(self, plantilla_id: int) -> int:
+        """Fila de la plantilla entre las ya cargadas, o -1 si no está en las páginas cargadas."""
+        for i, fila in enumerate(self._filas):
+            if fila["id"] == plantilla_id:
+                return i
+        return -1
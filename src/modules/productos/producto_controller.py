@@ -2,17 +2,31 @@
 
 import os
 import shutil
-from datetime import datetime
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
+from datetime import datetime, date, time, timedelta, timezone
+from typing import List, Optional, Dict, Any, Set, Iterable
+from collections import OrderedDict
+from sqlalchemy.orm import Session, joinedload, contains_eager, selectinload
+from sqlalchemy import or_, update, insert, select, func
 
 # --- ESTA ES LA LÍNEA CORRECTA ---
-from .models import Producto, MovimientoStock, TipoAjusteStock, ProductoPlantilla
+from .models import Producto, MovimientoStock, TipoAjusteStock, ProductoPlantilla, CorteStock, InstantaneaStock
 # --- FIN DE LA LÍNEA CORRECTA ---
 
 from modules.variantes.variantes_model import AtributoValor
+from modules.categorias.categoria_model import CategoriaJerarquia
+from core.config import cargar_seccion_config
 from utils import validators
+from . import indice_busqueda
+from . import indice_codigos
+from . import stock_kits
+from . import valoracion
+
+# Máximo de variantes que devuelve la búsqueda por relevancia.
+LIMITE_BUSQUEDA_VARIANTES = 200
+# Cada cuánto se guarda un corte de stock al abrir el programa: "diaria", "mensual" o "ninguna".
+PERIODICIDAD_CORTES_STOCK = "mensual"
+# Filas por executemany al guardar un corte de stock.
+TAMANO_LOTE_CORTE_STOCK = 5000
 
 class ProductoController:
     def __init__(self, db_session: Session):
@@ -22,18 +36,25 @@ class ProductoController:
         ))
         os.makedirs(self.imagenes_dir, exist_ok=True)
         
-    def ajustar_stock(self, producto_id: int, cantidad_ajuste: int, tipo_ajuste: TipoAjusteStock, motivo: str, usuario_id: Optional[int]) -> MovimientoStock:
+    def ajustar_stock(self, producto_id: int, cantidad_ajuste: int, tipo_ajuste: TipoAjusteStock, motivo: str, usuario_id: Optional[int],
+                      costo_unitario: Optional[float] = None) -> MovimientoStock:
         """
-        Ajusta el stock de una VARIANTE de producto específica.
+        Ajusta el stock de una VARIANTE de producto específica. Las variantes de kit
+        no tienen stock propio (se arma con sus componentes): se rechazan.
+        'costo_unitario' es el costo de las unidades que entran (ver valoracion.py).
         """
         producto = self.db.get(Producto, producto_id)
         if not producto: raise ValueError(f"La variante de producto con ID {producto_id} no existe.")
+        if stock_kits.es_variante_de_kit(self.db, producto_id):
+            raise ValueError(f"'{producto.sku}' es un kit: su stock sale de sus componentes, ajusta el de estos.")
         
         stock_anterior = producto.stock
         stock_nuevo = stock_anterior + cantidad_ajuste
         if stock_nuevo < 0: raise ValueError("El ajuste resultaría en stock negativo.")
         
         producto.stock = stock_nuevo
+        ajuste = {"producto_id": producto_id, "cantidad": cantidad_ajuste, "stock_anterior": stock_anterior, "stock_nuevo": stock_nuevo}
+        valoracion.valorar_ajustes(self.db, [ajuste], {producto_id: costo_unitario})
         
         movimiento = MovimientoStock(
             producto_id=producto_id, 
@@ -42,14 +63,265 @@ class ProductoController:
             cantidad=cantidad_ajuste, 
             motivo=motivo.strip(), 
             stock_anterior=stock_anterior, 
-            stock_nuevo=stock_nuevo
+            stock_nuevo=stock_nuevo,
+            costo_unitario=ajuste["costo_unitario"],
+            costo_fifo=ajuste["costo_fifo"]
         )
         self.db.add(movimiento)
+        self.db.flush()
+        stock_kits.actualizar_kits_de_componentes(self.db, {producto_id})
         self.db.commit()
         self.db.refresh(producto)
         self.db.refresh(movimiento)
         return movimiento
 
+    def ajustar_stock_lote(self, ajustes: List[Dict[str, int]], tipo_ajuste: TipoAjusteStock, motivo: str, usuario_id: Optional[int], commit: bool = True,
+                           costos: Optional[Dict[int, float]] = None) -> List[Dict[str, Any]]:
+        """
+        Aplica varios ajustes de stock en una sola transacción.
+
+        Cada ajuste es un dict {"producto_id": int, "cantidad": int} (negativo para salidas).
+        Las líneas de variantes de kit se sustituyen por las de sus componentes
+        (ver stock_kits.expandir_kits), de modo que vender un kit descuenta sus
+        componentes en el mismo lote. Las cantidades de un mismo producto se
+        agrupan y se aplica un único UPDATE ... WHERE stock + cantidad >= 0 por
+        SKU, de modo que la validación de stock y el descuento son atómicos. Los
+        MovimientoStock se insertan con un solo executemany, con el costo que les
+        asigna la valoración del inventario (ver valoracion.py). Si algún producto
+        no existe o no tiene stock suficiente se hace rollback y se lanza ValueError.
+
+        :param commit: Si es False, el llamador es responsable del commit (p. ej. finalizar_venta).
+        :param costos: Costo unitario de las entradas por producto_id (p. ej. el de la
+                       orden de compra); las demás entran al costo medio vigente. Los
+                       componentes de un kit desglosado entran al suyo.
+        :return: Lista de dicts con producto_id, cantidad, stock_anterior, stock_nuevo,
+                 costo_unitario y costo_fifo (de las variantes físicas, ya desglosados los kits).
+        """
+        cantidades: "OrderedDict[int, int]" = OrderedDict()
+        for ajuste in stock_kits.expandir_kits(self.db, ajustes):
+            producto_id = ajuste["producto_id"]
+            cantidades[producto_id] = cantidades.get(producto_id, 0) + int(ajuste["cantidad"])
+
+        resultados = []
+        try:
+            for producto_id, cantidad in cantidades.items():
+                if cantidad == 0:
+                    continue
+                stmt = (
+                    update(Producto)
+                    .where(Producto.id == producto_id, Producto.stock + cantidad >= 0)
+                    .values(stock=Producto.stock + cantidad)
+                    .returning(Producto.stock)
+                )
+                stock_nuevo = self.db.execute(stmt, execution_options={"synchronize_session": False}).scalar()
+                if stock_nuevo is None:
+                    producto = self.db.get(Producto, producto_id)
+                    if not producto: raise ValueError(f"La variante de producto con ID {producto_id} no existe.")
+                    raise ValueError(f"Stock insuficiente para {producto.sku}. Disponible: {producto.stock}")
+                resultados.append({
+                    "producto_id": producto_id,
+                    "cantidad": cantidad,
+                    "stock_anterior": stock_nuevo - cantidad,
+                    "stock_nuevo": stock_nuevo,
+                })
+
+            if resultados:
+                valoracion.valorar_ajustes(self.db, resultados, costos)
+                self.db.execute(insert(MovimientoStock), [
+                    {
+                        "producto_id": r["producto_id"],
+                        "usuario_id": usuario_id,
+                        "fecha": datetime.now(timezone.utc),
+                        "tipo_ajuste": tipo_ajuste,
+                        "cantidad": r["cantidad"],
+                        "motivo": motivo.strip(),
+                        "stock_anterior": r["stock_anterior"],
+                        "stock_nuevo": r["stock_nuevo"],
+                        "costo_unitario": r["costo_unitario"],
+                        "costo_fifo": r["costo_fifo"],
+                    }
+                    for r in resultados
+                ])
+            self._expirar_stock_en_sesion({r["producto_id"] for r in resultados})
+            stock_kits.actualizar_kits_de_componentes(self.db, {r["producto_id"] for r in resultados})
+            if commit:
+                self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return resultados
+
+    def _expirar_stock_en_sesion(self, producto_ids: Set[int]) -> None:
+        """Marca como obsoleto el stock de los Producto ya cargados en la sesión tras un UPDATE directo."""
+        if not producto_ids: return
+        for obj in list(self.db.identity_map.values()):
+            if isinstance(obj, Producto) and obj.id in producto_ids:
+                self.db.expire(obj, ["stock", "historial_stock"])
+
+    def obtener_historial_stock(self, producto_id: int, desde: Optional[datetime] = None, limite: Optional[int] = None) -> List[MovimientoStock]:
+        """Movimientos de stock de una variante, del más reciente al más antiguo (usa el índice producto_id + fecha)."""
+        query = self.db.query(MovimientoStock).filter(MovimientoStock.producto_id == producto_id)
+        if desde:
+            query = query.filter(MovimientoStock.fecha >= desde)
+        query = query.order_by(MovimientoStock.fecha.desc())
+        if limite:
+            query = query.limit(limite)
+        return query.all()
+
+    # --- Stock a una fecha: cortes periódicos + movimientos ---
+
+    def obtener_stock_a_fecha(self, dia: date, producto_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        """
+        Stock de las variantes al final de 'dia' (UTC). Parte del punto conocido más
+        cercano: un corte anterior (o el inicio del historial, con todo a cero), al
+        que se suman los movimientos posteriores, o un corte posterior (o el stock
+        actual), al que se restan los movimientos hasta él. Cada lado es una sola
+        suma agrupada por variante sobre el rango de fechas.
+
+        :param producto_ids: Si se indica, devuelve todas esas variantes (también con 0);
+                             si no, todo el catálogo con stock distinto de cero.
+        """
+        ids = None if producto_ids is None else set(producto_ids)
+        limite = self._fin_del_dia(dia)
+        anterior, posterior = self._cortes_alrededor_de(dia)
+        dias_hasta_posterior = ((posterior.fecha_corte if posterior else datetime.now(timezone.utc).date()) - dia).days
+        if anterior:
+            dias_desde_anterior = (dia - anterior.fecha_corte).days
+        else:
+            primer_movimiento = self.db.scalar(select(func.min(MovimientoStock.fecha)))
+            dias_desde_anterior = (dia - primer_movimiento.date()).days if primer_movimiento else 0
+
+        if dias_desde_anterior <= dias_hasta_posterior:
+            existencias = self._existencias_de_corte(anterior.id, ids) if anterior else {}
+            desde = self._fin_del_dia(anterior.fecha_corte) if anterior else None
+            for producto_id, suma in self._sumar_movimientos(desde, limite, ids):
+                existencias[producto_id] = existencias.get(producto_id, 0) + suma
+        else:
+            existencias = self._existencias_de_corte(posterior.id, ids) if posterior else self._existencias_actuales(ids)
+            hasta = self._fin_del_dia(posterior.fecha_corte) if posterior else None
+            for producto_id, suma in self._sumar_movimientos(limite, hasta, ids):
+                existencias[producto_id] = existencias.get(producto_id, 0) - suma
+
+        if ids is not None:
+            return {producto_id: existencias.get(producto_id, 0) for producto_id in ids}
+        return {producto_id: stock for producto_id, stock in existencias.items() if stock != 0}
+
+    def obtener_stock_variante_a_fecha(self, producto_id: int, dia: date) -> int:
+        """Stock de una variante al final de 'dia' (ver obtener_stock_a_fecha)."""
+        return self.obtener_stock_a_fecha(dia, [producto_id])[producto_id]
+
+    def obtener_ultimo_corte_stock(self) -> Optional[CorteStock]:
+        return self.db.query(CorteStock).order_by(CorteStock.fecha_corte.desc()).first()
+
+    def crear_corte_stock(self, dia: Optional[date] = None) -> CorteStock:
+        """
+        Guarda la foto del stock de todas las variantes al final de 'dia' (por
+        defecto, ayer en UTC). Solo se guardan las variantes con stock distinto de
+        cero. El día tiene que haber terminado.
+        """
+        hoy = datetime.now(timezone.utc).date()
+        dia = dia or (hoy - timedelta(days=1))
+        if dia >= hoy: raise ValueError("Solo se puede hacer el corte de stock de un día ya terminado.")
+        if self.db.scalar(select(CorteStock.id).where(CorteStock.fecha_corte == dia)):
+            raise ValueError(f"Ya existe un corte de stock del {dia:%Y-%m-%d}.")
+
+        try:
+            existencias = self.obtener_stock_a_fecha(dia)
+            corte = CorteStock(fecha_corte=dia, cantidad_variantes=len(existencias))
+            self.db.add(corte)
+            self.db.flush()
+            filas = [{"corte_id": corte.id, "producto_id": pid, "stock": stock} for pid, stock in existencias.items()]
+            for inicio in range(0, len(filas), TAMANO_LOTE_CORTE_STOCK):
+                self.db.execute(insert(InstantaneaStock), filas[inicio:inicio + TAMANO_LOTE_CORTE_STOCK])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        print(f"📸 Corte de stock del {dia:%Y-%m-%d}: {corte.cantidad_variantes} variantes con existencias.")
+        return corte
+
+    def asegurar_cortes_stock(self, periodicidad: Optional[str] = None) -> List[CorteStock]:
+        """
+        Crea los cortes que falten según la periodicidad ("diaria": cada día;
+        "mensual": el último día de cada mes) desde el último corte hasta ayer. Sin
+        cortes previos solo se crea el más reciente. Devuelve los cortes creados.
+        """
+        periodicidad = periodicidad or cargar_seccion_config("inventario").get("periodicidad_cortes_stock", PERIODICIDAD_CORTES_STOCK)
+        if periodicidad == "ninguna":
+            return []
+        if periodicidad not in ("diaria", "mensual"):
+            raise ValueError(f"Periodicidad de cortes de stock desconocida: '{periodicidad}'.")
+
+        ayer = datetime.now(timezone.utc).date() - timedelta(days=1)
+        ultimo = self.obtener_ultimo_corte_stock()
+        fechas = []
+        dia = ayer
+        while not ultimo or dia > ultimo.fecha_corte:
+            if periodicidad == "diaria" or (dia + timedelta(days=1)).day == 1:
+                fechas.append(dia)
+                if not ultimo:
+                    break
+            dia -= timedelta(days=1)
+        # Del más antiguo al más reciente: cada corte parte del anterior
+        return [self.crear_corte_stock(dia) for dia in reversed(fechas)]
+
+    def _cortes_alrededor_de(self, dia: date):
+        """(id, fecha_corte) del último corte hasta 'dia' y del primero posterior, o None."""
+        columnas = select(CorteStock.id, CorteStock.fecha_corte)
+        anterior = self.db.execute(columnas.where(CorteStock.fecha_corte <= dia).order_by(CorteStock.fecha_corte.desc()).limit(1)).first()
+        posterior = self.db.execute(columnas.where(CorteStock.fecha_corte > dia).order_by(CorteStock.fecha_corte).limit(1)).first()
+        return anterior, posterior
+
+    @staticmethod
+    def _fin_del_dia(dia: date) -> datetime:
+        return datetime.combine(dia + timedelta(days=1), time.min, tzinfo=timezone.utc)
+
+    def _existencias_actuales(self, ids: Optional[Set[int]]) -> Dict[int, int]:
+        consulta = select(Producto.id, Producto.stock).where(Producto.stock != 0)
+        if ids is not None:
+            consulta = consulta.where(Producto.id.in_(ids))
+        return dict(self.db.execute(consulta).all())
+
+    def _existencias_de_corte(self, corte_id: int, ids: Optional[Set[int]]) -> Dict[int, int]:
+        consulta = select(InstantaneaStock.producto_id, InstantaneaStock.stock).where(InstantaneaStock.corte_id == corte_id)
+        if ids is not None:
+            consulta = consulta.where(InstantaneaStock.producto_id.in_(ids))
+        return dict(self.db.execute(consulta).all())
+
+    def _sumar_movimientos(self, desde: Optional[datetime], hasta: Optional[datetime], ids: Optional[Set[int]]):
+        """Suma de las cantidades por variante de los movimientos con desde <= fecha < hasta (None: sin límite)."""
+        consulta = select(MovimientoStock.producto_id, func.sum(MovimientoStock.cantidad))
+        if desde is not None:
+            consulta = consulta.where(MovimientoStock.fecha >= desde)
+        if hasta is not None:
+            consulta = consulta.where(MovimientoStock.fecha < hasta)
+        if ids is not None:
+            consulta = consulta.where(MovimientoStock.producto_id.in_(ids))
+        return self.db.execute(consulta.group_by(MovimientoStock.producto_id)).all()
+
+    # --- Valoración del inventario (costo medio y FIFO, ver valoracion.py) ---
+
+    def valorar_inventario(self, dia: Optional[date] = None) -> Dict[str, Any]:
+        """Valor del inventario al final de 'dia' (UTC), o el actual, por costo medio y por FIFO."""
+        return valoracion.valorar_inventario(self.db, self._fin_del_dia(dia) if dia else None)
+
+    def calcular_costo_de_ventas(self, fecha_inicio: date, fecha_fin: date) -> Dict[str, Any]:
+        """Costo de lo vendido entre 'fecha_inicio' y 'fecha_fin' (ambos incluidos, UTC) por costo medio y por FIFO."""
+        if fecha_fin < fecha_inicio: raise ValueError("La fecha final no puede ser anterior a la inicial.")
+        desde = datetime.combine(fecha_inicio, time.min, tzinfo=timezone.utc)
+        return valoracion.costo_de_ventas(self.db, desde, self._fin_del_dia(fecha_fin))
+
+    def reconstruir_valoracion(self) -> int:
+        """Recalcula desde el historial el costo medio y las capas FIFO de todas las variantes."""
+        try:
+            variantes = valoracion.reconstruir_valoracion(self.db)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        print(f"💰 Valoración reconstruida para {variantes} variantes.")
+        return variantes
+
     def obtener_variante_por_id(self, producto_id: int) -> Optional[Producto]:
         """Obtiene una variante específica por su ID, con sus relaciones."""
         return self.db.query(Producto).options(
@@ -58,15 +330,46 @@ class ProductoController:
             joinedload(Producto.valores).joinedload(AtributoValor.atributo)
         ).filter(Producto.id == producto_id).first()
 
-    def listar_todas_las_variantes(self, filtro: Optional[str] = None) -> List[Producto]:
-        """Devuelve una lista plana de todas las variantes/productos vendibles."""
-        query = self.db.query(Producto).options(joinedload(Producto.plantilla))
+    def buscar_por_codigo(self, codigo: str) -> Optional[Producto]:
+        """Variante por SKU, EAN o UPC exactos (índice en memoria, ver indice_codigos.py)."""
+        return indice_codigos.indice_para(self.db).buscar(self.db, codigo)
+
+    def listar_todas_las_variantes(self, filtro: Optional[str] = None, categoria_id: Optional[int] = None) -> List[Producto]:
+        """
+        Devuelve una lista plana de todas las variantes/productos vendibles.
+        Con 'categoria_id' se limita al subárbol de esa categoría mediante la tabla de clausura.
+        """
+        query = self.db.query(Producto).join(Producto.plantilla).options(
+            contains_eager(Producto.plantilla), selectinload(Producto.valores)
+        )
         if filtro:
             termino_busqueda = f"%{filtro.lower()}%"
-            query = query.join(Producto.plantilla).filter(
+            query = query.filter(
                 or_(
                     Producto.sku.ilike(termino_busqueda),
                     ProductoPlantilla.nombre.ilike(termino_busqueda)
                 )
             )
-        return query.order_by(Producto.sku).all()
\ No newline at end of file
+        if categoria_id:
+            query = query.join(CategoriaJerarquia, CategoriaJerarquia.descendiente_id == ProductoPlantilla.categoria_id).filter(CategoriaJerarquia.ancestro_id == categoria_id)
+        return query.order_by(Producto.sku).all()
+
+    def buscar_variantes(self, texto: Optional[str], categoria_id: Optional[int] = None, limite: int = LIMITE_BUSQUEDA_VARIANTES) -> List[Producto]:
+        """
+        Búsqueda por prefijos en el índice FTS5 (SKU, nombre, categoría, proveedor,
+        códigos de barras y atributos), ordenada por relevancia. Sin texto devuelve
+        el listado normal; sin índice FTS5 recurre al filtro ILIKE.
+        """
+        consulta_fts = indice_busqueda.construir_consulta_fts(texto)
+        if not consulta_fts:
+            return self.listar_todas_las_variantes(categoria_id=categoria_id)
+        if not indice_busqueda.indice_busqueda_disponible(self.db):
+            return self.listar_todas_las_variantes(filtro=texto, categoria_id=categoria_id)
+
+        coincidencias = indice_busqueda.subconsulta_coincidencias(consulta_fts)
+        query = self.db.query(Producto).join(coincidencias, coincidencias.c.producto_id == Producto.id).join(Producto.plantilla).options(
+            contains_eager(Producto.plantilla), selectinload(Producto.valores)
+        )
+        if categoria_id:
+            query = query.join(CategoriaJerarquia, CategoriaJerarquia.descendiente_id == ProductoPlantilla.categoria_id).filter(CategoriaJerarquia.ancestro_id == categoria_id)
+        return query.order_by(coincidencias.c.puntuacion, Producto.sku).limit(limite).all()
@@ -12,6 +12,7 @@ from PySide6.QtGui import QPixmap, QIcon, QFont, QColor
 from PySide6.QtCore import Qt, QSize
 from typing import Optional, List, Dict, Set
 
+from core.busqueda import ControladorBusqueda, fabrica_sesiones_para
 from modules.proveedores.proveedor_model import Proveedor
 from modules.categorias.categoria_model import Categoria
 from modules.variantes.variantes_model import Atributo, AtributoValor
@@ -19,6 +20,18 @@ from .models import ProductoPlantilla, ProductoImagen, Producto
 from .producto_controller import ProductoController
 from .plantilla_controller import PlantillaController
 
+def _buscar_variantes_componente(sesion, filtro: str) -> List[Dict]:
+    resultados = []
+    for variante in ProductoController(sesion).listar_todas_las_variantes(filtro):
+        nombre_variante = " / ".join(sorted([v.valor for v in variante.valores]))
+        resultados.append({
+            "id": variante.id,
+            "sku": variante.sku,
+            "plantilla_id": variante.plantilla_id,
+            "nombre": f"{variante.plantilla.nombre} ({nombre_variante})" if nombre_variante else variante.plantilla.nombre,
+        })
+    return resultados
+
 class ProductoEditorDialog(QDialog):
     def __init__(self, proveedores: List[Proveedor], categorias: List[Categoria], atributos: List[Atributo], producto_controller: ProductoController, plantilla_controller: PlantillaController, mode: str = "variantes", plantilla_a_editar: Optional[ProductoPlantilla] = None, parent=None):
         super().__init__(parent)
@@ -38,6 +51,10 @@ class ProductoEditorDialog(QDialog):
         self.imagenes_a_agregar = []
         self.imagenes_a_eliminar = []
 
+        self.busqueda_componentes = ControladorBusqueda(_buscar_variantes_componente, fabrica_sesiones_para(producto_controller.db), parent=self)
+        self.busqueda_componentes.resultados_listos.connect(self._mostrar_resultados_componentes)
+        self.finished.connect(lambda _: self.busqueda_componentes.cancelar())
+
         titulo = self._determinar_titulo()
         self.setWindowTitle(titulo)
         self.setMinimumSize(900, 600)
@@ -52,18 +69,16 @@ class ProductoEditorDialog(QDialog):
         if not item_seleccionado: return
         variante = item_seleccionado.data(Qt.ItemDataRole.UserRole)
         for row in range(self.tabla_componentes.rowCount()):
-            if self.tabla_componentes.item(row, 0).data(Qt.ItemDataRole.UserRole) == variante.id:
+            if self.tabla_componentes.item(row, 0).data(Qt.ItemDataRole.UserRole) == variante["id"]:
                 return
         row = self.tabla_componentes.rowCount()
         self.tabla_componentes.insertRow(row)
 
         self.tabla_componentes.setRowHeight(row, 40)
 
-        item_sku = QTableWidgetItem(variante.sku)
-        item_sku.setData(Qt.ItemDataRole.UserRole, variante.id)
-        nombre_variante = " / ".join(sorted([v.valor for v in variante.valores]))
-        texto_item = f"{variante.plantilla.nombre} ({nombre_variante})" if nombre_variante else variante.plantilla.nombre
-        item_nombre = QTableWidgetItem(texto_item)
+        item_sku = QTableWidgetItem(variante["sku"])
+        item_sku.setData(Qt.ItemDataRole.UserRole, variante["id"])
+        item_nombre = QTableWidgetItem(variante["nombre"])
         spin_cantidad = QSpinBox()
         spin_cantidad.setMinimum(1)
         spin_cantidad.setMaximum(9999)
@@ -90,7 +105,7 @@ class ProductoEditorDialog(QDialog):
                 self.input_precio_simple.setText(f"{variante_kit.precio_venta:.2f}")
                 self.input_costo_simple.setText(f"{variante_kit.costo_compra:.2f}" if variante_kit.costo_compra is not None else "0.00")
                 
-                stock_calculado = self.plantilla_controller.calcular_stock_disponible_kit(self.plantilla_existente.id)
+                stock_calculado = self.plantilla_controller.obtener_stock_kit(self.plantilla_existente.id)
                 self.input_stock_simple.setText(str(stock_calculado))
                 self.input_stock_simple.setReadOnly(True)
                 self.input_stock_simple.setToolTip("El stock de los kits es virtual y se calcula automáticamente en base al stock de sus componentes.")
@@ -319,15 +334,18 @@ class ProductoEditorDialog(QDialog):
             
     def _buscar_componentes(self):
         filtro = self.input_busqueda_comp.text()
+        if len(filtro) < 1:
+            self.busqueda_componentes.cancelar()
+            self.lista_resultados_comp.clear()
+            return
+        self.busqueda_componentes.solicitar(filtro)
+
+    def _mostrar_resultados_componentes(self, resultados: List[Dict], latencia_ms: float):
         self.lista_resultados_comp.clear()
-        if len(filtro) < 1: return
-        resultados = self.producto_controller.listar_todas_las_variantes(filtro)
         for variante in resultados:
-            if self.plantilla_existente and self.plantilla_existente.id == variante.plantilla_id:
+            if self.plantilla_existente and self.plantilla_existente.id == variante["plantilla_id"]:
                 continue
-            nombre_variante = " / ".join(sorted([v.valor for v in variante.valores]))
-            texto_item = f"{variante.plantilla.nombre} ({nombre_variante})" if nombre_variante else variante.plantilla.nombre
-            item = QListWidgetItem(f"{variante.sku} - {texto_item}")
+            item = QListWidgetItem(f"{variante['sku']} - {variante['nombre']}")
             item.setData(Qt.ItemDataRole.UserRole, variante)
             self.lista_resultados_comp.addItem(item)
             
@@ -1,9 +1,10 @@
 # src/modules/productos/producto_ui.py
 
 import os
+import itertools
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QTableWidget,
-    QTableWidgetItem, QMessageBox, QHeaderView, QAbstractItemView, QLabel,
+    QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QTableView,
+    QMessageBox, QHeaderView, QAbstractItemView, QLabel,
     QGroupBox, QFormLayout, QComboBox, QStackedWidget, QFileDialog, QDialog
 )
 from PySide6.QtGui import QFont, QPixmap
@@ -17,7 +18,11 @@ from .producto_editor_dialog import ProductoEditorDialog
 from .tipo_producto_dialog import TipoProductoDialog
 from .variantes_stock_dialog import VariantesStockDialog
 from .import_assistant_dialog import ImportAssistantDialog
+from .plantilla_table_model import PlantillaTableModel
+from .plantilla_controller import TAMANO_PAGINA_PLANTILLAS
 
+from core.config import cargar_seccion_config
+from core.busqueda import ControladorBusqueda, fabrica_sesiones_para
 from modules.proveedores.proveedor_controller import ProveedorController
 from modules.categorias.categoria_controller import CategoriaController
 from modules.variantes.variantes_controller import VariantesController
@@ -25,6 +30,12 @@ from .models import ProductoPlantilla
 from modules.categorias.categoria_model import Categoria
 
 
+def _buscar_primera_pagina(sesion, criterios: Tuple[str, Optional[int]]):
+    filtro, categoria_id = criterios
+    filas = PlantillaController(sesion).listar_plantillas_paginadas(filtro=filtro, categoria_id=categoria_id, limite=TAMANO_PAGINA_PLANTILLAS)
+    return filas, filtro, categoria_id
+
+
 class ProductoWidget(QWidget):
     def __init__(self, plantilla_ctrl: PlantillaController, producto_ctrl: ProductoController, prov_ctrl: ProveedorController, cat_ctrl: CategoriaController, var_ctrl: VariantesController, usuario, parent=None):
         super().__init__(parent)
@@ -37,6 +48,9 @@ class ProductoWidget(QWidget):
         self.current_plantilla: Optional[ProductoPlantilla] = None
         self.current_image_index = 0
         self.ids_categorias_visibles = set()
+        self.busqueda = ControladorBusqueda(_buscar_primera_pagina, fabrica_sesiones_para(plantilla_ctrl.db), parent=self)
+        self.busqueda.resultados_listos.connect(self._mostrar_resultados_busqueda)
+        self.busqueda.busqueda_fallida.connect(lambda msg: QMessageBox.critical(self, "Error", f"No se pudo cargar la lista de productos: {msg}"))
         self._setup_ui()
         self.reset_view()
 
@@ -45,75 +59,66 @@ class ProductoWidget(QWidget):
 
         if ruta_archivo:
             try:
-                resultado_analisis = self.plantilla_controller.analizar_csv_para_importacion(ruta_archivo)
+                # La validación multiproceso es opcional: {"importacion": {"procesos_validacion": 4}} en config.json
+                procesos = int(cargar_seccion_config("importacion").get("procesos_validacion", 1))
+                lotes_analisis = self.plantilla_controller.analizar_csv_en_lotes(ruta_archivo, procesos=procesos)
+                primer_lote = next(lotes_analisis, None)
                 
-                if not resultado_analisis:
+                if not primer_lote:
                     QMessageBox.information(self, "Archivo Vacío", "El archivo CSV seleccionado está vacío o no tiene datos.")
                     return
 
-                dialogo_asistente = ImportAssistantDialog(resultado_analisis, self)
+                # El asistente consume el resto de los lotes conforme se analizan.
+                dialogo_asistente = ImportAssistantDialog(itertools.chain([primer_lote], lotes_analisis), self)
                 
                 if dialogo_asistente.exec() == QDialog.Accepted:
-                    filas_para_importar = dialogo_asistente.get_filas_validas()
-                    
-                    self.plantilla_controller.ejecutar_importacion(filas_para_importar, self.usuario_logueado.id)
+                    # El asistente no guarda las filas: se vuelve a leer el archivo en streaming
+                    estadisticas = self.plantilla_controller.importar_csv(ruta_archivo, self.usuario_logueado.id, procesos=procesos)
                     
-                    QMessageBox.information(self, "Éxito", "La importación de productos se ha completado correctamente.")
+                    QMessageBox.information(self, "Éxito", (
+                        "La importación de productos se ha completado correctamente.\n"
+                        f"{estadisticas['variantes_creadas']} variantes creadas, {estadisticas['variantes_actualizadas']} actualizadas "
+                        f"({estadisticas['filas_por_segundo']:,.0f} filas/seg)."
+                    ))
                     self.reset_view()
 
             except Exception as e:
                 QMessageBox.critical(self, "Error de Importación", f"Ocurrió un error al importar los datos:\n{e}")
 
-    # --- INICIO DE LA MODIFICACIÓN ---
     def _actualizar_lista_plantillas(self):
         """
-        Refresca la tabla de productos. Ahora calcula el stock de los kits
-        directamente con los datos pre-cargados para máxima eficiencia.
+        Refresca la tabla de productos. El modelo solo pide la primera página;
+        el resto se carga desde SQL conforme se hace scroll.
         """
         if not self.isEnabled(): return 
         filtro_texto = self.input_busqueda.text()
         categoria_id_seleccionada = self.combo_categorias.currentData()
+        plantilla_id_seleccionada = self.current_plantilla.id if self.current_plantilla else None
+        self.busqueda.cancelar()
         try:
-            plantillas = self.plantilla_controller.listar_plantillas(filtro=filtro_texto, categoria_id=categoria_id_seleccionada)
-            self.tabla_plantillas.setRowCount(len(plantillas))
+            self.modelo_plantillas.recargar(filtro=filtro_texto, categoria_id=categoria_id_seleccionada)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"No se pudo cargar la lista de productos: {e}")
+        self._restaurar_seleccion(plantilla_id_seleccionada)
 
-            for row, p in enumerate(plantillas):
-                stock_total_str = ""
-                # Si es un kit, calculamos su stock virtual desde el objeto ya cargado.
-                if p.componentes:
-                    if not p.componentes:
-                        stock_calculado = 0
-                    else:
-                        kits_posibles = []
-                        for item_kit in p.componentes:
-                            if not item_kit.componente or item_kit.cantidad <= 0:
-                                kits_posibles.append(0)
-                                break 
-                            
-                            stock_componente = item_kit.componente.stock
-                            cantidad_necesaria = item_kit.cantidad
-                            kits_posibles.append(stock_componente // cantidad_necesaria)
-                        
-                        stock_calculado = min(kits_posibles) if kits_posibles else 0
+    def _solicitar_busqueda(self):
+        """Búsqueda mientras se escribe: se consulta en segundo plano tras una pausa en el tecleo."""
+        if not self.isEnabled(): return
+        self.busqueda.solicitar((self.input_busqueda.text(), self.combo_categorias.currentData()))
 
-                    stock_total_str = f"{stock_calculado}*" # Añadimos un asterisco para indicar que es calculado
-                else:
-                    # Si no es un kit, sumamos el stock de sus variantes como antes.
-                    stock_total = sum(v.stock for v in p.variantes)
-                    stock_total_str = str(stock_total)
+    def _mostrar_resultados_busqueda(self, resultado, latencia_ms: float):
+        filas, filtro, categoria_id = resultado
+        plantilla_id_seleccionada = self.current_plantilla.id if self.current_plantilla else None
+        self.modelo_plantillas.cargar_primera_pagina(filas, filtro, categoria_id)
+        self._restaurar_seleccion(plantilla_id_seleccionada)
 
-                item_id = QTableWidgetItem(str(p.id))
-                item_id.setData(Qt.ItemDataRole.UserRole, p)
-                self.tabla_plantillas.setItem(row, 0, item_id)
-                self.tabla_plantillas.setItem(row, 1, QTableWidgetItem(p.nombre))
-                self.tabla_plantillas.setItem(row, 2, QTableWidgetItem(p.categoria.nombre if p.categoria else "N/A"))
-                self.tabla_plantillas.setItem(row, 3, QTableWidgetItem(stock_total_str))
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"No se pudo cargar la lista de productos: {e}")
-        
-        if not self.tabla_plantillas.selectedItems():
+    def _restaurar_seleccion(self, plantilla_id_seleccionada: Optional[int]):
+        # Conservamos la selección si la plantilla sigue entre las filas cargadas
+        fila = self.modelo_plantillas.fila_de_plantilla(plantilla_id_seleccionada) if plantilla_id_seleccionada else -1
+        if fila != -1:
+            self.tabla_plantillas.selectRow(fila)
+        else:
             self._limpiar_panel_detalles()
-    # --- FIN DE LA MODIFICACIÓN ---
 
     def _abrir_editor_plantilla(self, mode: str, plantilla: Optional[ProductoPlantilla] = None):
         try:
@@ -132,7 +137,7 @@ class ProductoWidget(QWidget):
                 datos_finales = dialogo.obtener_datos_finales()
                 if datos_finales:
                     if plantilla: 
-                        self.plantilla_controller.actualizar_plantilla_con_variantes(plantilla_id=plantilla.id, datos_plantilla=datos_finales["plantilla"], lista_variantes_ui=datos_finales["variantes"], componentes=datos_finales.get("componentes", []))
+                        self.plantilla_controller.actualizar_plantilla_con_variantes(plantilla_id=plantilla.id, datos_plantilla=datos_finales["plantilla"], lista_variantes_ui=datos_finales["variantes"], componentes=datos_finales.get("componentes", []), usuario_id=self.usuario_logueado.id)
                         QMessageBox.information(self, "Éxito", "Producto actualizado correctamente.")
                     else: 
                         self.plantilla_controller.crear_plantilla_con_variantes(datos_plantilla=datos_finales["plantilla"], lista_variantes=datos_finales["variantes"], usuario_id=self.usuario_logueado.id, componentes=datos_finales.get("componentes", []))
@@ -167,9 +172,9 @@ class ProductoWidget(QWidget):
         self.btn_ver_variantes.clicked.connect(self._abrir_dialogo_stock_variantes)
         self.btn_img_anterior.clicked.connect(lambda: self._navegar_imagen(-1))
         self.btn_img_siguiente.clicked.connect(lambda: self._navegar_imagen(1))
-        self.input_busqueda.textChanged.connect(self._actualizar_lista_plantillas)
-        self.combo_categorias.currentIndexChanged.connect(self._actualizar_lista_plantillas)
-        self.tabla_plantillas.itemSelectionChanged.connect(self._mostrar_detalles_plantilla)
+        self.input_busqueda.textChanged.connect(self._solicitar_busqueda)
+        self.combo_categorias.currentIndexChanged.connect(self._solicitar_busqueda)
+        self.tabla_plantillas.selectionModel().selectionChanged.connect(self._mostrar_detalles_plantilla)
     def reset_view(self):
         self.input_busqueda.clear()
         self._cargar_categorias_filtradas()
@@ -201,7 +206,7 @@ class ProductoWidget(QWidget):
         return widget
     def _exportar_productos(self):
         default_path = os.path.join(os.path.expanduser("~"), "Downloads", "catalogo_productos.csv")
-        ruta_archivo, _ = QFileDialog.getSaveFileName(self, "Exportar Catálogo a CSV", default_path, "Archivos CSV (*.csv)")
+        ruta_archivo, _ = QFileDialog.getSaveFileName(self, "Exportar Catálogo a CSV", default_path, "Archivos CSV (*.csv);;CSV comprimido (*.csv.gz)")
         if ruta_archivo:
             try:
                 self.plantilla_controller.exportar_plantillas_a_csv(ruta_archivo)
@@ -211,11 +216,13 @@ class ProductoWidget(QWidget):
     def _crear_panel_central(self) -> QGroupBox:
         grupo = QGroupBox("Productos")
         layout = QVBoxLayout(grupo)
-        self.tabla_plantillas = QTableWidget()
-        self.tabla_plantillas.setColumnCount(4)
-        self.tabla_plantillas.setHorizontalHeaderLabels(["ID", "Nombre del Producto", "Categoría", "Stock Total"])
+        self.modelo_plantillas = PlantillaTableModel(self.plantilla_controller, parent=self)
+        self.tabla_plantillas = QTableView()
+        self.tabla_plantillas.setModel(self.modelo_plantillas)
+        self.tabla_plantillas.verticalHeader().setVisible(False)
         self.tabla_plantillas.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
         self.tabla_plantillas.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.tabla_plantillas.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
         self.tabla_plantillas.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         layout.addWidget(self.tabla_plantillas)
         return grupo
@@ -280,13 +287,17 @@ class ProductoWidget(QWidget):
         self.details_stack.setCurrentIndex(0)
         self._actualizar_estado_botones()
     def _mostrar_detalles_plantilla(self):
-        items = self.tabla_plantillas.selectedItems()
-        if not items:
+        filas = self.tabla_plantillas.selectionModel().selectedRows()
+        if not filas:
+            self._limpiar_panel_detalles()
+            return
+        # Las relaciones se cargan solo para la fila seleccionada
+        plantilla_id = self.modelo_plantillas.plantilla_id_en(filas[0].row())
+        self.current_plantilla = self.plantilla_controller.obtener_plantilla_detalle(plantilla_id) if plantilla_id else None
+        if not self.current_plantilla:
             self._limpiar_panel_detalles()
             return
         self.details_stack.setCurrentIndex(1)
-        self.current_plantilla = self.tabla_plantillas.item(items[0].row(), 0).data(Qt.ItemDataRole.UserRole)
-        if not self.current_plantilla: return
         self.detalle_nombre.setText(self.current_plantilla.nombre)
         self.detalle_categoria.setText(self.current_plantilla.categoria.nombre if self.current_plantilla.categoria else "N/A")
         self.detalle_proveedor.setText(self.current_plantilla.proveedor.nombre_empresa if self.current_plantilla.proveedor else "N/A")
@@ -0,0 +1,176 @@
+# src/modules/productos/stock_kits.py
+"""
+Stock virtual de los kits.
+
+Un kit es una plantilla con KitComponente; su stock es el mínimo de
+stock_componente // cantidad de sus componentes, y si un componente es la
+variante de otro kit (kit de kits) cuenta el stock virtual de ese kit. El valor
+se guarda en ProductoPlantilla.kit_stock y se mantiene al cambiar el stock de una
+variante: con el índice inverso ix_kit_componentes_componente se localizan solo
+los kits que la usan (y los kits que usan a esos kits) y se recalculan esos.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from .models import KitComponente, Producto, ProductoPlantilla
+
+# Niveles máximos de anidamiento (kit dentro de kit) antes de considerarlo un ciclo.
+PROFUNDIDAD_MAXIMA_KITS = 32
+
+
+def _es_kit(plantilla_id_columna):
+    # kit_componentes nunca se correlaciona: la consulta exterior puede leer también de esa tabla
+    return select(KitComponente.id).where(KitComponente.kit_plantilla_id == plantilla_id_columna).correlate_except(KitComponente).exists()
+
+
+def calcular_stock_kit(db: Session, plantilla_id: int, memo: Optional[Dict[int, int]] = None, _camino: Optional[List[int]] = None) -> int:
+    """
+    Calcula desde la base el stock armable del kit. 'memo' guarda los kits ya
+    calculados (útil al recalcular varios kits que comparten subkits). Lanza
+    ValueError si la composición tiene un ciclo.
+    """
+    memo = {} if memo is None else memo
+    if plantilla_id in memo:
+        return memo[plantilla_id]
+    camino = (_camino or []) + [plantilla_id]
+    if plantilla_id in camino[:-1] or len(camino) > PROFUNDIDAD_MAXIMA_KITS:
+        raise ValueError("La composición de kits forma un ciclo (un kit se contiene a sí mismo).")
+
+    filas = db.execute(
+        select(KitComponente.cantidad, Producto.id, Producto.stock, Producto.plantilla_id, _es_kit(Producto.plantilla_id))
+        .outerjoin(Producto, Producto.id == KitComponente.componente_id)
+        .where(KitComponente.kit_plantilla_id == plantilla_id)
+    ).all()
+    if not filas:
+        memo[plantilla_id] = 0
+        return 0
+
+    posibles = []
+    for cantidad, producto_id, stock, plantilla_componente, componente_es_kit in filas:
+        # Componentes sin producto o con cantidad no positiva hacen el kit inarmable.
+        if producto_id is None or cantidad <= 0:
+            posibles.append(0)
+            continue
+        disponible = calcular_stock_kit(db, plantilla_componente, memo, camino) if componente_es_kit else stock
+        posibles.append(disponible // cantidad)
+    memo[plantilla_id] = min(posibles)
+    return memo[plantilla_id]
+
+
+def kits_afectados(db: Session, producto_ids: Iterable[int]) -> Set[int]:
+    """Kits que contienen esas variantes, directa o indirectamente (a través de otros kits)."""
+    pendientes, kits = set(producto_ids), set()
+    for _ in range(PROFUNDIDAD_MAXIMA_KITS):
+        if not pendientes:
+            break
+        nuevos = set(db.scalars(
+            select(KitComponente.kit_plantilla_id).where(KitComponente.componente_id.in_(pendientes)).distinct()
+        )) - kits
+        kits |= nuevos
+        # Las variantes de esos kits pueden ser, a su vez, componentes de otros kits
+        pendientes = set(db.scalars(select(Producto.id).where(Producto.plantilla_id.in_(nuevos)))) if nuevos else set()
+    return kits
+
+
+def guardar_stock_kits(db: Session, kit_ids: Iterable[int]) -> Dict[int, int]:
+    """Recalcula y guarda (sin commit) el kit_stock de esos kits. Devuelve {plantilla_id: stock}."""
+    memo: Dict[int, int] = {}
+    valores = {kit_id: calcular_stock_kit(db, kit_id, memo) for kit_id in sorted(set(kit_ids))}
+    if valores:
+        db.execute(update(ProductoPlantilla), [{"id": k, "kit_stock": v} for k, v in valores.items()])
+        for obj in list(db.identity_map.values()):
+            if isinstance(obj, ProductoPlantilla) and obj.id in valores:
+                db.expire(obj, ["kit_stock"])
+    return valores
+
+
+def actualizar_kits_de_componentes(db: Session, producto_ids: Iterable[int]) -> Dict[int, int]:
+    """Tras cambiar el stock de unas variantes, recalcula solo los kits que dependen de ellas."""
+    ids = set(producto_ids)
+    return guardar_stock_kits(db, kits_afectados(db, ids)) if ids else {}
+
+
+def actualizar_kit_y_dependientes(db: Session, plantilla_id: int) -> Dict[int, int]:
+    """Tras cambiar la composición de un kit: él mismo y los kits que lo contienen."""
+    variantes = set(db.scalars(select(Producto.id).where(Producto.plantilla_id == plantilla_id)))
+    es_kit = db.scalar(select(_es_kit(plantilla_id)))
+    if not es_kit:
+        db.execute(update(ProductoPlantilla).where(ProductoPlantilla.id == plantilla_id).values(kit_stock=None),
+                   execution_options={"synchronize_session": "fetch"})
+    return guardar_stock_kits(db, ({plantilla_id} if es_kit else set()) | kits_afectados(db, variantes))
+
+
+def reconstruir_stock_kits(db: Session) -> int:
+    """Recalcula el kit_stock de todos los kits (migraciones, reparaciones). Devuelve cuántos kits hay."""
+    db.execute(update(ProductoPlantilla).where(~_es_kit(ProductoPlantilla.id)).values(kit_stock=None),
+               execution_options={"synchronize_session": False})
+    kits = db.scalars(select(KitComponente.kit_plantilla_id).distinct()).all()
+    guardar_stock_kits(db, kits)
+    return len(kits)
+
+
+def es_variante_de_kit(db: Session, producto_id: int) -> bool:
+    """True si la variante pertenece a un kit: su stock no se ajusta, sale de sus componentes."""
+    return db.scalar(select(Producto.id).where(Producto.id == producto_id, _es_kit(Producto.plantilla_id))) is not None
+
+
+def stock_disponible(producto: Producto) -> int:
+    """Unidades vendibles de una variante: las armables si es la variante de un kit, su stock si no."""
+    kit_stock = producto.plantilla.kit_stock if producto.plantilla is not None else None
+    return producto.stock if kit_stock is None else kit_stock
+
+
+def componentes_por_unidad(db: Session, producto_id: int, memo: Optional[Dict[int, Dict[int, int]]] = None, _camino: Optional[List[int]] = None) -> Dict[int, int]:
+    """
+    Variantes físicas (no kits) y cantidades que consume una unidad de la variante:
+    {producto_id: 1} si no es un kit; los componentes, desglosados hasta el
+    último nivel, si lo es.
+    """
+    memo = {} if memo is None else memo
+    if producto_id in memo:
+        return memo[producto_id]
+    camino = (_camino or []) + [producto_id]
+    if producto_id in camino[:-1] or len(camino) > PROFUNDIDAD_MAXIMA_KITS:
+        raise ValueError("La composición de kits forma un ciclo (un kit se contiene a sí mismo).")
+
+    filas = db.execute(
+        select(KitComponente.componente_id, KitComponente.cantidad)
+        .join(Producto, Producto.plantilla_id == KitComponente.kit_plantilla_id)
+        .where(Producto.id == producto_id)
+    ).all()
+    if not filas:
+        memo[producto_id] = {producto_id: 1}
+        return memo[producto_id]
+
+    consumo: Dict[int, int] = {}
+    for componente_id, cantidad in filas:
+        for fisico_id, por_unidad in componentes_por_unidad(db, componente_id, memo, camino).items():
+            consumo[fisico_id] = consumo.get(fisico_id, 0) + por_unidad * cantidad
+    memo[producto_id] = consumo
+    return consumo
+
+
+def expandir_kits(db: Session, ajustes: List[Dict[str, int]]) -> List[Dict[str, int]]:
+    """
+    Sustituye las líneas de variantes de kit por las de sus componentes físicos
+    (cantidad del kit × cantidad del componente), para descontarlas en un solo lote.
+    Si ninguna línea es un kit devuelve la lista tal cual.
+    """
+    ids = {ajuste["producto_id"] for ajuste in ajustes}
+    variantes_de_kit = set(db.scalars(
+        select(Producto.id).where(Producto.id.in_(ids), _es_kit(Producto.plantilla_id))
+    )) if ids else set()
+    if not variantes_de_kit:
+        return ajustes
+
+    # Las variantes que no son kits no necesitan consulta
+    memo: Dict[int, Dict[int, int]] = {pid: {pid: 1} for pid in ids - variantes_de_kit}
+    expandidos: "OrderedDict[int, int]" = OrderedDict()
+    for ajuste in ajustes:
+        for producto_id, por_unidad in componentes_por_unidad(db, ajuste["producto_id"], memo).items():
+            expandidos[producto_id] = expandidos.get(producto_id, 0) + por_unidad * int(ajuste["cantidad"])
+    return [{"producto_id": pid, "cantidad": cantidad} for pid, cantidad in expandidos.items()]
@@ -0,0 +1,370 @@
+# src/modules/productos/valoracion.py
+"""
+Valoración del inventario por costo medio ponderado y por FIFO.
+
+Estado incremental. Cada ajuste de stock (ProductoController.ajustar_stock y
+ajustar_stock_lote) pasa por valorar_ajustes, que sin recorrer el historial:
+- en una entrada recalcula Producto.costo_promedio y abre una CapaCosto con el
+  costo de la unidad: el de la orden de compra en ENTRADA_COMPRA y el costo medio
+  vigente en las demás entradas (devoluciones, sobrantes), que así no lo alteran;
+- en una salida consume las capas más antiguas y guarda en el movimiento el costo
+  medio aplicado (costo_unitario) y el importe de las capas gastadas (costo_fifo).
+El stock sin capa (anterior a la valoración o creado sin pasar por aquí) cuenta
+como la capa más antigua, al costo_compra de la variante.
+
+Libro de movimientos. valorar_libro reproduce las mismas reglas sobre todo el
+historial con pasadas vectorizadas de NumPy, sin bucles por variante ni por
+movimiento: el costo medio es una composición de funciones afines
+(x -> w·x + u en cada entrada) que se resuelve con un barrido prefijo en log2(n)
+pasadas, y el costo FIFO de cada salida es la diferencia de la curva de costo
+acumulado de las entradas (np.interp) entre las unidades salidas antes y después.
+Con él se valora el inventario a una fecha, se calcula el costo de lo vendido de
+un periodo y se reconstruye el estado incremental (migración, importación CSV).
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import and_, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from .models import CapaCosto, MovimientoStock, Producto, TipoAjusteStock
+
+# Filas del libro de movimientos que se traen de SQLite por bloque.
+FILAS_POR_LOTE_VALORACION = 100_000
+# Variantes por consulta IN y filas por executemany al reconstruir.
+TAMANO_LOTE_VALORACION = 5000
+
+
+def _en_lotes(valores: List, tamano: int = TAMANO_LOTE_VALORACION):
+    for i in range(0, len(valores), tamano):
+        yield valores[i:i + tamano]
+
+
+# --- Estado incremental ---
+
+def valorar_ajustes(db: Session, ajustes: List[Dict[str, Any]], costos: Optional[Dict[int, float]] = None) -> None:
+    """
+    Aplica (sin commit) al costo medio y a las capas FIFO unos ajustes de stock
+    ya aplicados. Cada ajuste es un dict con producto_id, cantidad, stock_anterior
+    y stock_nuevo; se le añaden costo_unitario y costo_fifo para el MovimientoStock.
+    'costos' da el costo unitario de las entradas ({producto_id: costo}); las que no
+    lo tienen entran al costo medio vigente.
+    """
+    ids = {a["producto_id"] for a in ajustes}
+    if not ids:
+        return
+    costos = costos or {}
+    estado = {
+        pid: [promedio, compra or 0.0]
+        for pid, promedio, compra in db.execute(select(Producto.id, Producto.costo_promedio, Producto.costo_compra).where(Producto.id.in_(ids)))
+    }
+    capas: Dict[int, List[list]] = {pid: [] for pid in ids}
+    # Las entradas solo añaden capas: basta leer las de las variantes que tienen salidas
+    con_salidas = {a["producto_id"] for a in ajustes if a["cantidad"] < 0}
+    for capa_id, pid, restante, costo in db.execute(
+        select(CapaCosto.id, CapaCosto.producto_id, CapaCosto.cantidad_restante, CapaCosto.costo_unitario)
+        .where(CapaCosto.producto_id.in_(con_salidas)).order_by(CapaCosto.producto_id, CapaCosto.id)
+    ) if con_salidas else ():
+        capas[pid].append([capa_id, restante, costo, restante])  # la última columna es la cantidad leída
+
+    promedios_nuevos: Dict[int, float] = {}
+    for ajuste in ajustes:
+        pid, cantidad = ajuste["producto_id"], ajuste["cantidad"]
+        promedio, base = estado[pid]
+        promedio = base if promedio is None else promedio
+        if cantidad > 0:
+            costo = costos.get(pid)
+            costo = promedio if costo is None else float(costo)
+            # Un stock negativo (datos antiguos o editados a mano) no pesa en el medio: la entrada lo repone a su costo
+            en_mano = max(ajuste["stock_anterior"], 0)
+            estado[pid][0] = promedios_nuevos[pid] = (en_mano * promedio + cantidad * costo) / (en_mano + cantidad)
+            capas[pid].append([None, cantidad, costo, 0])
+            ajuste["costo_unitario"], ajuste["costo_fifo"] = costo, None
+        else:
+            ajuste["costo_unitario"] = promedio
+            ajuste["costo_fifo"] = _consumir_capas(capas[pid], -cantidad, ajuste["stock_anterior"], base)
+
+    if promedios_nuevos:
+        db.execute(update(Producto), [{"id": pid, "costo_promedio": c} for pid, c in promedios_nuevos.items()])
+        for obj in list(db.identity_map.values()):
+            if isinstance(obj, Producto) and obj.id in promedios_nuevos:
+                db.expire(obj, ["costo_promedio"])
+    agotadas = [c[0] for lista in capas.values() for c in lista if c[0] is not None and c[1] <= 0]
+    if agotadas:
+        db.execute(delete(CapaCosto).where(CapaCosto.id.in_(agotadas)))
+    cambiadas = [{"id": c[0], "cantidad_restante": c[1]} for lista in capas.values() for c in lista if c[0] is not None and 0 < c[1] != c[3]]
+    if cambiadas:
+        db.execute(update(CapaCosto), cambiadas)
+    nuevas = [{"producto_id": pid, "cantidad_restante": c[1], "costo_unitario": c[2]} for pid, lista in capas.items() for c in lista if c[0] is None and c[1] > 0]
+    if nuevas:
+        db.execute(insert(CapaCosto), nuevas)
+
+
+def _consumir_capas(capas: List[list], unidades: int, stock_anterior: int, costo_base: float) -> float:
+    """Gasta 'unidades' de las capas en orden (primero el stock sin capa) y devuelve su importe."""
+    en_capas = sum(c[1] for c in capas)
+    sin_capa = max(0, stock_anterior - en_capas)
+    # Capas de más (stock cambiado sin pasar por aquí): se descartan las más antiguas
+    sobrante = max(0, en_capas - stock_anterior)
+    desde_sin_capa = min(unidades, sin_capa)
+    importe, pendiente = desde_sin_capa * costo_base, unidades - desde_sin_capa
+    for capa in capas:
+        if sobrante and capa[1] > 0:
+            gasto = min(sobrante, capa[1])
+            capa[1] -= gasto
+            sobrante -= gasto
+        if pendiente and capa[1] > 0:
+            gasto = min(pendiente, capa[1])
+            capa[1] -= gasto
+            pendiente -= gasto
+            importe += gasto * capa[2]
+        if not sobrante and not pendiente:
+            break
+    return importe
+
+
+# --- Libro de movimientos (NumPy) ---
+
+def _barrido_afin(w: np.ndarray, u: np.ndarray) -> np.ndarray:
+    """
+    Resultado de aplicar en orden x -> w[j]·x + u[j] para j = 0..i, en cada i
+    (barrido de Hillis-Steele). Un w = 0 reinicia el valor, así que el resultado
+    no depende de las filas anteriores a él.
+    """
+    w, u = w.copy(), u.copy()
+    salto = 1
+    while salto < len(w) and w[salto:].any():
+        u[salto:] += w[salto:] * u[:-salto]
+        w[salto:] *= w[:-salto]
+        salto *= 2
+    return u
+
+
+def valorar_libro(producto: np.ndarray, cantidad: np.ndarray, stock_anterior: np.ndarray, costo: np.ndarray,
+                  costo_base: np.ndarray, venta: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Valora un libro de movimientos ordenado por (producto, id). Cada array tiene
+    una fila por movimiento: costo es su costo_unitario (NaN si no lo tiene),
+    costo_base el costo de partida de su variante y venta marca las salidas cuyo
+    costo entra en el costo de lo vendido.
+
+    Devuelve, por variante (en orden de producto): producto_id, stock,
+    costo_promedio, valor_promedio, valor_fifo, unidades_vendidas,
+    costo_ventas_promedio y costo_ventas_fifo; por movimiento (en el orden de
+    entrada): costo_unitario y costo_fifo; y las capas FIFO que quedan:
+    capa_producto_id, capa_cantidad y capa_costo.
+    """
+    n = len(producto)
+    venta = np.zeros(n, dtype=bool) if venta is None else venta
+    if not n:
+        vacio = np.zeros(0)
+        return {clave: vacio for clave in ("producto_id", "stock", "costo_promedio", "valor_promedio", "valor_fifo",
+                                           "unidades_vendidas", "costo_ventas_promedio", "costo_ventas_fifo", "costo_unitario",
+                                           "costo_fifo", "capa_producto_id", "capa_cantidad", "capa_costo")}
+
+    # Una fila de apertura por variante: el stock previo a su primer movimiento entra al costo base.
+    # (Las máscaras se convierten en índices o en factores 0/1: np.where y los filtros booleanos
+    # cuestan varias veces más por elemento que una multiplicación o una indexación entera.)
+    inicio = np.r_[True, producto[1:] != producto[:-1]]
+    primeras = np.flatnonzero(inicio)
+    aperturas = primeras + np.arange(len(primeras))
+    filas = np.arange(n) + np.cumsum(inicio)  # posición de cada movimiento tras insertar las aperturas
+    P = np.insert(producto, primeras, producto[primeras])
+    Q = np.insert(cantidad, primeras, np.maximum(stock_anterior[primeras], 0)).astype(np.float64)
+    S0 = np.insert(stock_anterior, primeras, 0).astype(np.float64)
+    C = np.insert(costo, primeras, costo_base[primeras]).astype(np.float64)
+    V = np.insert(venta, primeras, False)
+    grupo = np.cumsum(np.insert(np.zeros(n, dtype=np.int64), primeras, 1)) - 1
+    ultimas = np.r_[aperturas[1:] - 1, len(P) - 1]
+    S1 = S0 + Q
+
+    # Costo medio: cada entrada con costo es x -> (S0·x + Q·C) / (S0 + Q), con S0 acotado a 0 como en
+    # valorar_ajustes; la apertura lo fija al costo base
+    sin_costo = np.isnan(C)
+    C0 = np.nan_to_num(C)
+    entrada = Q > 0
+    con_costo = entrada & ~sin_costo
+    en_mano = np.maximum(S0, 0.0)
+    divisor = np.maximum(en_mano + Q, 1.0)
+    w = 1.0 + con_costo * (en_mano / divisor - 1.0)
+    u = con_costo * Q * C0 / divisor
+    w[aperturas], u[aperturas] = 0.0, C0[aperturas]
+    promedio = _barrido_afin(w, u)
+    promedio_previo = np.r_[0.0, promedio[:-1]]
+
+    # FIFO: las entradas sin costo entran al costo medio vigente
+    costo_entrada = C0 + sin_costo * promedio_previo
+    unidades_entrada = np.maximum(Q, 0.0)
+    unidades_salida = np.maximum(-Q, 0.0)
+    E = np.cumsum(unidades_entrada)
+    S = np.cumsum(unidades_salida)
+    valor_entradas = np.cumsum(unidades_entrada * costo_entrada)
+    # Las salidas de cada variante se sitúan sobre el eje de sus entradas (acotadas a ellas)
+    desplazamiento = (E - unidades_entrada)[aperturas] - (S - unidades_salida)[aperturas]
+    e_final = E[ultimas]
+    indices_entrada = np.flatnonzero(entrada)
+    eje, curva = np.r_[0.0, E[indices_entrada]], np.r_[0.0, valor_entradas[indices_entrada]]
+    salida = np.flatnonzero(Q < 0)
+    grupo_salida = grupo[salida]
+    x_fin = np.minimum(desplazamiento[grupo_salida] + S[salida], e_final[grupo_salida])
+    x_ini = np.minimum(x_fin, desplazamiento[grupo_salida] + S[salida] - unidades_salida[salida])
+    costo_fifo = np.zeros(len(P))
+    costo_fifo[salida] = np.interp(x_fin, eje, curva) - np.interp(x_ini, eje, curva)
+
+    consumido = np.minimum(desplazamiento + S[ultimas], e_final)
+    restante = np.clip(E[indices_entrada] - consumido[grupo[indices_entrada]], 0.0, unidades_entrada[indices_entrada])
+    con_resto = restante > 0
+    quedan = indices_entrada[con_resto]
+    num_variantes = len(ultimas)
+    vendidas = unidades_salida * V
+    costo_fifo_movimiento = np.full(len(P), np.nan)
+    costo_fifo_movimiento[salida] = costo_fifo[salida]
+    return {
+        "producto_id": P[ultimas],
+        "stock": S1[ultimas],
+        "costo_promedio": promedio[ultimas],
+        "valor_promedio": S1[ultimas] * promedio[ultimas],
+        "valor_fifo": valor_entradas[ultimas] - np.interp(consumido, eje, curva),
+        "unidades_vendidas": np.bincount(grupo, vendidas, minlength=num_variantes),
+        "costo_ventas_promedio": np.bincount(grupo, vendidas * promedio_previo, minlength=num_variantes),
+        "costo_ventas_fifo": np.bincount(grupo, costo_fifo * V, minlength=num_variantes),
+        "costo_unitario": (promedio_previo + entrada * (costo_entrada - promedio_previo))[filas],
+        "costo_fifo": costo_fifo_movimiento[filas],
+        "capa_producto_id": P[quedan],
+        "capa_cantidad": restante[con_resto],
+        "capa_costo": costo_entrada[quedan],
+    }
+
+def cargar_libro(db: Session, hasta: Optional[datetime] = None, desde: Optional[datetime] = None,
+                 producto_ids: Optional[Iterable[int]] = None) -> Dict[str, np.ndarray]:
+    """
+    Movimientos anteriores a 'hasta' (todos si es None), de esas variantes o de
+    todas, ordenados por (producto, id) y con el costo base de su variante.
+    'venta' marca las SALIDA_VENTA desde 'desde'.
+    """
+    es_venta = MovimientoStock.tipo_ajuste == TipoAjusteStock.SALIDA_VENTA
+    if desde is not None:
+        es_venta = and_(es_venta, MovimientoStock.fecha >= desde)
+    consulta = select(MovimientoStock.id, MovimientoStock.producto_id, MovimientoStock.cantidad,
+                      MovimientoStock.stock_anterior, MovimientoStock.costo_unitario, es_venta)
+    if hasta is not None:
+        consulta = consulta.where(MovimientoStock.fecha < hasta)
+
+    ids = None if producto_ids is None else sorted(set(producto_ids))
+    consultas = [consulta] if ids is None else [consulta.where(MovimientoStock.producto_id.in_(lote)) for lote in _en_lotes(ids)]
+    # Core (sin la capa ORM) y tuplas: NumPy no tiene que inspeccionar cada Row
+    conexion = db.connection()
+    bloques = [
+        np.array([tuple(fila) for fila in parte], dtype=np.float64)
+        for c in consultas
+        for parte in conexion.execute(c.execution_options(yield_per=FILAS_POR_LOTE_VALORACION)).partitions()
+    ]
+    filas = np.concatenate(bloques) if bloques else np.zeros((0, 6))
+    orden = np.lexsort((filas[:, 0], filas[:, 1]))
+    filas = filas[orden]
+    producto = filas[:, 1].astype(np.int64)
+
+    # Costo base (costo_compra) de cada variante del libro
+    variantes = np.unique(producto)
+    base: Dict[int, Optional[float]] = {}
+    for lote in _en_lotes(variantes.tolist()):
+        base.update(db.execute(select(Producto.id, Producto.costo_compra).where(Producto.id.in_(lote))).all())
+    costo_base_variante = np.array([base.get(pid) or 0.0 for pid in variantes.tolist()], dtype=np.float64)
+    return {
+        "id": filas[:, 0].astype(np.int64),
+        "producto": producto,
+        "cantidad": filas[:, 2].astype(np.int64),
+        "stock_anterior": filas[:, 3].astype(np.int64),
+        "costo": filas[:, 4],
+        "venta": filas[:, 5] == 1,
+        "costo_base": costo_base_variante[np.searchsorted(variantes, producto)],
+    }
+
+
+def valorar_movimientos(db: Session, hasta: Optional[datetime] = None, desde: Optional[datetime] = None,
+                        producto_ids: Optional[Iterable[int]] = None) -> Dict[str, np.ndarray]:
+    """valorar_libro sobre el libro de la base (ver cargar_libro); añade 'id' con el id de cada movimiento."""
+    libro = cargar_libro(db, hasta, desde, producto_ids)
+    resultado = valorar_libro(libro["producto"], libro["cantidad"], libro["stock_anterior"], libro["costo"],
+                              libro["costo_base"], libro["venta"])
+    resultado["id"] = libro["id"]
+    return resultado
+
+
+def valorar_inventario(db: Session, hasta: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Valor del inventario antes de 'hasta' (el actual si es None) por costo medio y
+    por FIFO: {"promedio", "fifo", "unidades", "variantes": {producto_id: (stock,
+    valor_promedio, valor_fifo)}}. En el inventario actual, las variantes con stock
+    y sin ningún movimiento se valoran a su costo_compra.
+    """
+    r = valorar_movimientos(db, hasta)
+    variantes = {
+        pid: (stock, promedio, fifo)
+        for pid, stock, promedio, fifo in zip(r["producto_id"].tolist(), r["stock"].tolist(), r["valor_promedio"].tolist(), r["valor_fifo"].tolist())
+        if stock
+    }
+    if hasta is None:
+        sin_movimientos = select(Producto.id, Producto.stock, Producto.costo_compra).where(
+            Producto.stock > 0, ~select(MovimientoStock.id).where(MovimientoStock.producto_id == Producto.id).exists())
+        for pid, stock, costo in db.execute(sin_movimientos):
+            variantes[pid] = (stock, stock * (costo or 0.0), stock * (costo or 0.0))
+    return {
+        "promedio": sum(v[1] for v in variantes.values()),
+        "fifo": sum(v[2] for v in variantes.values()),
+        "unidades": int(sum(v[0] for v in variantes.values())),
+        "variantes": variantes,
+    }
+
+
+def costo_de_ventas(db: Session, desde: datetime, hasta: datetime) -> Dict[str, Any]:
+    """
+    Costo de lo vendido (salidas SALIDA_VENTA) en [desde, hasta) por costo medio y
+    por FIFO: {"promedio", "fifo", "unidades", "variantes": {producto_id:
+    (unidades, costo_promedio, costo_fifo)}}.
+    """
+    r = valorar_movimientos(db, hasta, desde)
+    vendidas = r["unidades_vendidas"] > 0
+    variantes = {
+        pid: (int(unidades), promedio, fifo)
+        for pid, unidades, promedio, fifo in zip(r["producto_id"][vendidas].tolist(), r["unidades_vendidas"][vendidas].tolist(),
+                                                 r["costo_ventas_promedio"][vendidas].tolist(), r["costo_ventas_fifo"][vendidas].tolist())
+    }
+    return {
+        "promedio": float(r["costo_ventas_promedio"].sum()),
+        "fifo": float(r["costo_ventas_fifo"].sum()),
+        "unidades": int(r["unidades_vendidas"].sum()),
+        "variantes": variantes,
+    }
+
+
+def reconstruir_valoracion(db: Session, producto_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recalcula desde el libro (sin commit) el costo medio y las capas FIFO de esas
+    variantes o de todas (migraciones, importación CSV, reparaciones). Los
+    movimientos ya guardados no se modifican. Devuelve cuántas variantes valoró.
+    """
+    ids = None if producto_ids is None else sorted(set(producto_ids))
+    if ids is not None and not ids:
+        return 0
+    r = valorar_movimientos(db, producto_ids=ids)
+    if ids is None:
+        db.execute(delete(CapaCosto))
+    else:
+        for lote in _en_lotes(ids):
+            db.execute(delete(CapaCosto).where(CapaCosto.producto_id.in_(lote)))
+    promedios = [{"id": pid, "costo_promedio": c} for pid, c in zip(r["producto_id"].tolist(), r["costo_promedio"].tolist())]
+    for lote in _en_lotes(promedios):
+        db.execute(update(Producto), lote)
+    capas = [
+        {"producto_id": pid, "cantidad_restante": int(cantidad), "costo_unitario": costo}
+        for pid, cantidad, costo in zip(r["capa_producto_id"].tolist(), r["capa_cantidad"].tolist(), r["capa_costo"].tolist())
+    ]
+    for lote in _en_lotes(capas):
+        db.execute(insert(CapaCosto), lote)
+    for obj in list(db.identity_map.values()):
+        if isinstance(obj, Producto):
+            db.expire(obj, ["costo_promedio"])
+    return len(promedios)
@@ -1,59 +1,183 @@
 # src/modules/reportes/reportes_controller.py
-from datetime import datetime
-from typing import Dict, List, Any
+import enum
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Any, Iterator, Optional
+
+from sqlalchemy import select, func, literal
+from sqlalchemy.orm import Session
 
 from modules.ventas.ventas_controller import VentasController
+from modules.ventas.ventas_model import Venta, VentaDetalle, VentaPago, EstadoVenta
 # --- INICIO DE LA CORRECCIÓN ---
 from modules.productos.producto_controller import ProductoController
 # --- FIN DE LA CORRECCIÓN ---
+from modules.productos.models import Producto, ProductoPlantilla
+from modules.clientes.cliente_model import Cliente
+from modules.categorias.categoria_model import Categoria
+from modules.categorias.categoria_controller import CategoriaController
+from modules.proveedores.proveedor_model import Proveedor
 from modules.empresa.empresa_controller import EmpresaController
 
+# Filas que se traen de SQLite por lote al recorrer un reporte.
+FILAS_POR_LOTE_REPORTE = 1000
+
+# Agrupaciones disponibles para el reporte de ventas (clave de filtros["agrupar_por"]).
+AGRUPACIONES_VENTAS = {
+    "dia": "Por día",
+    "sku": "Por SKU",
+    "categoria": "Por categoría",
+    "metodo_pago": "Por método de pago",
+}
+
 class ReportesController:
     # --- INICIO DE LA CORRECCIÓN ---
     def __init__(self, ventas_ctrl: VentasController, producto_ctrl: ProductoController, empresa_ctrl: EmpresaController):
         self.ventas_ctrl = ventas_ctrl
         self.producto_ctrl = producto_ctrl
         self.empresa_ctrl = empresa_ctrl
+        self.db = ventas_ctrl.db
     # --- FIN DE LA CORRECCIÓN ---
 
-    def obtener_datos_para_reporte(self, tipo_reporte: str, filtros: Dict) -> Dict[str, Any]:
+    def obtener_datos_para_reporte(self, tipo_reporte: str, filtros: Dict, en_flujo: bool = False,
+                                   sesion: Optional[Session] = None) -> Dict[str, Any]:
+        """
+        Devuelve título, encabezados y filas del reporte, calculados con una sola
+        consulta SQL. Con en_flujo=True, "data" es un generador que trae las filas
+        por lotes conforme el exportador las pide ("total_filas" indica cuántas
+        se esperan). 'sesion' permite recorrerlo desde un hilo de trabajo.
+
+        Filtros admitidos: fecha_inicio y fecha_fin ("AAAA-MM-DD", ambos incluidos),
+        cliente_id, categoria_id (incluye subcategorías), usuario_id, estado
+        (por defecto solo ventas completadas; None para todas) y agrupar_por
+        (ver AGRUPACIONES_VENTAS).
+        """
         print(f"Obteniendo datos para reporte tipo '{tipo_reporte}'...")
+        sesion = sesion or self.db
         if tipo_reporte == "ventas":
-            return self._preparar_reporte_ventas(filtros)
+            reporte = self._preparar_reporte_ventas(filtros)
         # --- INICIO DE LA CORRECCIÓN ---
         elif tipo_reporte == "productos":
         # --- FIN DE LA CORRECCIÓN ---
-            return self._preparar_reporte_productos(filtros)
+            reporte = self._preparar_reporte_productos(filtros)
         else:
             raise ValueError(f"El tipo de reporte '{tipo_reporte}' no es reconocido.")
 
+        consulta = reporte.pop("consulta")
+        mensaje_vacio = reporte.pop("mensaje_vacio")
+        reporte["total_filas"] = sesion.execute(select(func.count()).select_from(consulta.subquery())).scalar()
+        if not reporte["total_filas"]:
+            raise ValueError(mensaje_vacio)
+        reporte["data"] = self._recorrer(sesion, consulta)
+        if not en_flujo:
+            reporte["data"] = list(reporte["data"])
+        return reporte
+
+    @staticmethod
+    def _recorrer(sesion: Session, consulta) -> Iterator[list]:
+        resultado = sesion.execute(consulta.execution_options(yield_per=FILAS_POR_LOTE_REPORTE))
+        for fila in resultado:
+            yield [valor.value if isinstance(valor, enum.Enum) else valor for valor in fila]
+
+    # --- Ventas ---
+
     def _preparar_reporte_ventas(self, filtros: Dict) -> Dict[str, Any]:
-        ventas = self.ventas_ctrl.listar_ventas()
-        if not ventas: raise ValueError("No hay ventas para generar el reporte.")
-        titulo = "Reporte de Ventas"
-        headers = ["ID Venta", "Fecha", "Cliente", "Producto", "Cantidad", "Total"]
-        data_rows = []
-        for venta in ventas:
-            cliente_nombre = venta.cliente.nombre_completo if venta.cliente else "Público General"
-            producto_nombre = venta.producto.nombre if venta.producto else "N/A"
-            data_rows.append([
-                venta.id, venta.fecha_venta.strftime('%Y-%m-%d %H:%M'),
-                cliente_nombre, producto_nombre, venta.cantidad, f"${venta.total_venta:,.2f}"
-            ])
-        return {"titulo": titulo, "headers": headers, "data": data_rows}
+        agrupar_por = filtros.get("agrupar_por")
+        if agrupar_por and agrupar_por not in AGRUPACIONES_VENTAS:
+            raise ValueError(f"No se puede agrupar el reporte de ventas por '{agrupar_por}'.")
+
+        titulo = "Reporte de Ventas" + (f" ({AGRUPACIONES_VENTAS[agrupar_por]})" if agrupar_por else "")
+        unidades = func.sum(VentaDetalle.cantidad)
+        importe = func.sum(VentaDetalle.subtotal_linea)
+        num_ventas = func.count(func.distinct(Venta.id))
+        categoria = func.coalesce(Categoria.nombre, "Sin categoría")
+
+        if agrupar_por == "metodo_pago":
+            # Los pagos no cuelgan de las líneas: se suman aparte para no duplicarlos.
+            consulta = (
+                select(VentaPago.metodo_pago, num_ventas, func.sum(VentaPago.monto))
+                .join(Venta, Venta.id == VentaPago.venta_id)
+                .where(*self._condiciones_ventas(filtros, incluir_categoria=False))
+                .group_by(VentaPago.metodo_pago).order_by(VentaPago.metodo_pago)
+            )
+            if filtros.get("categoria_id"):
+                consulta = consulta.where(Venta.id.in_(
+                    self._lineas_de_ventas(VentaDetalle.venta_id)
+                    .where(ProductoPlantilla.categoria_id.in_(CategoriaController.subconsulta_subarbol(filtros["categoria_id"])))
+                ))
+            headers, columnas_total, columnas_moneda = ["Método de Pago", "Ventas", "Importe"], [1, 2], [2]
+        else:
+            if agrupar_por == "dia":
+                dia = func.date(Venta.fecha)
+                columnas, grupo = [dia, num_ventas, unidades, importe], [dia]
+                headers = ["Día", "Ventas", "Unidades", "Importe"]
+            elif agrupar_por == "sku":
+                columnas, grupo = [Producto.sku, ProductoPlantilla.nombre, unidades, importe], [Producto.sku, ProductoPlantilla.nombre]
+                headers = ["SKU", "Producto", "Unidades", "Importe"]
+            elif agrupar_por == "categoria":
+                columnas, grupo = [categoria, num_ventas, unidades, importe], [categoria]
+                headers = ["Categoría", "Ventas", "Unidades", "Importe"]
+            else:
+                columnas, grupo = [
+                    Venta.id, Venta.fecha, func.coalesce(Cliente.nombre_completo, "Público General"),
+                    Producto.sku, ProductoPlantilla.nombre, VentaDetalle.cantidad, VentaDetalle.precio_unitario, VentaDetalle.subtotal_linea,
+                ], None
+                headers = ["ID Venta", "Fecha", "Cliente", "SKU", "Producto", "Cantidad", "Precio Unit.", "Importe"]
+
+            consulta = self._lineas_de_ventas(*columnas).where(*self._condiciones_ventas(filtros))
+            if grupo:
+                consulta = consulta.group_by(*grupo).order_by(*grupo)
+            else:
+                consulta = consulta.order_by(Venta.fecha, Venta.id, VentaDetalle.id)
+            columnas_total = [i for i, h in enumerate(headers) if h in ("Ventas", "Unidades", "Cantidad", "Importe")]
+            columnas_moneda = [i for i, h in enumerate(headers) if h in ("Precio Unit.", "Importe")]
+
+        return {"titulo": titulo, "headers": headers, "consulta": consulta, "mensaje_vacio": "No hay ventas para generar el reporte.",
+                "columnas_total": columnas_total, "columnas_moneda": columnas_moneda}
+
+    @staticmethod
+    def _lineas_de_ventas(*columnas):
+        """SELECT de 'columnas' sobre las líneas de venta unidas con su venta, variante, plantilla, categoría y cliente."""
+        return (
+            select(*columnas).select_from(VentaDetalle)
+            .join(Venta, Venta.id == VentaDetalle.venta_id)
+            .join(Producto, Producto.id == VentaDetalle.producto_id)
+            .join(ProductoPlantilla, ProductoPlantilla.id == Producto.plantilla_id)
+            .outerjoin(Categoria, Categoria.id == ProductoPlantilla.categoria_id)
+            .outerjoin(Cliente, Cliente.id == Venta.cliente_id)
+        )
+
+    @staticmethod
+    def _condiciones_ventas(filtros: Dict, incluir_categoria: bool = True) -> List:
+        condiciones = []
+        estado = filtros.get("estado", EstadoVenta.COMPLETADA)
+        if estado:
+            condiciones.append(Venta.estado == EstadoVenta(estado))
+        if filtros.get("fecha_inicio"):
+            condiciones.append(Venta.fecha >= datetime.combine(date.fromisoformat(filtros["fecha_inicio"]), datetime.min.time()))
+        if filtros.get("fecha_fin"):
+            # La fecha final se incluye completa
+            condiciones.append(Venta.fecha < datetime.combine(date.fromisoformat(filtros["fecha_fin"]) + timedelta(days=1), datetime.min.time()))
+        if filtros.get("cliente_id"):
+            condiciones.append(Venta.cliente_id == filtros["cliente_id"])
+        if filtros.get("usuario_id"):
+            condiciones.append(Venta.usuario_id == filtros["usuario_id"])
+        if incluir_categoria and filtros.get("categoria_id"):
+            condiciones.append(ProductoPlantilla.categoria_id.in_(CategoriaController.subconsulta_subarbol(filtros["categoria_id"])))
+        return condiciones
+
+    # --- Productos ---
 
     def _preparar_reporte_productos(self, filtros: Dict) -> Dict[str, Any]:
-        # --- INICIO DE LA CORRECCIÓN ---
-        productos = self.producto_ctrl.listar_productos()
-        # --- FIN DE LA CORRECCIÓN ---
-        if not productos: raise ValueError("No hay productos para generar el reporte.")
         titulo = "Reporte de Productos"
-        headers = ["ID", "Nombre", "Descripción", "Stock", "Precio Venta", "Proveedor"]
-        data_rows = []
-        for producto in productos:
-            proveedor_nombre = producto.proveedor.nombre_empresa if producto.proveedor else "N/A"
-            data_rows.append([
-                producto.id, producto.nombre, producto.descripcion or "",
-                producto.stock, f"${producto.precio_venta:,.2f}", proveedor_nombre
-            ])
-        return {"titulo": titulo, "headers": headers, "data": data_rows}
\ No newline at end of file
+        headers = ["ID", "Nombre", "SKU", "Stock", "Precio Venta", "Proveedor"]
+        consulta = (
+            select(Producto.id, ProductoPlantilla.nombre, Producto.sku, Producto.stock, Producto.precio_venta,
+                   func.coalesce(Proveedor.nombre_empresa, literal("N/A")))
+            .join(ProductoPlantilla, ProductoPlantilla.id == Producto.plantilla_id)
+            .outerjoin(Proveedor, Proveedor.id == ProductoPlantilla.proveedor_id)
+            .order_by(ProductoPlantilla.nombre, Producto.sku)
+        )
+        if filtros.get("categoria_id"):
+            consulta = consulta.where(ProductoPlantilla.categoria_id.in_(CategoriaController.subconsulta_subarbol(filtros["categoria_id"])))
+        return {"titulo": titulo, "headers": headers, "consulta": consulta, "mensaje_vacio": "No hay productos para generar el reporte.",
+                "columnas_total": [3], "columnas_moneda": [4]}
@@ -2,17 +2,20 @@
 
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QGridLayout, QPushButton, QMessageBox,
-    QLabel, QGroupBox, QComboBox, QFileDialog, QDateEdit, QHBoxLayout
+    QLabel, QGroupBox, QComboBox, QFileDialog, QDateEdit, QHBoxLayout, QProgressDialog
 )
 from PySide6.QtCore import QDate, Qt
-from .reportes_controller import ReportesController
-from utils.reporter import generar_reporte_ventas_pdf
+from .reportes_controller import ReportesController, AGRUPACIONES_VENTAS
+from core.busqueda import fabrica_sesiones_para
+from core.tareas import TareaSegundoPlano
+from utils.reporter import escribir_reporte_pdf
 from utils.excel_reporter import generar_reporte_excel
 
 class ReportesWidget(QWidget):
     def __init__(self, controller: ReportesController, parent=None):
         super().__init__(parent)
         self.controller = controller
+        self.tarea_exportacion = None
         self._setup_ui()
     
     def actualizar_vista(self):
@@ -32,9 +35,18 @@ class ReportesWidget(QWidget):
         config_layout.addWidget(QLabel("Tipo de Reporte:"), 0, 0)
         self.combo_tipo_reporte = QComboBox()
         self.combo_tipo_reporte.addItem("Reporte de Ventas", "ventas")
-        self.combo_tipo_reporte.addItem("Reporte de Inventario", "inventario")
+        self.combo_tipo_reporte.addItem("Reporte de Inventario", "productos")
         config_layout.addWidget(self.combo_tipo_reporte, 0, 1)
 
+        config_layout.addWidget(QLabel("Agrupar ventas:"), 3, 0)
+        self.combo_agrupar = QComboBox()
+        self.combo_agrupar.addItem("Detalle (sin agrupar)", None)
+        for clave, etiqueta in AGRUPACIONES_VENTAS.items():
+            self.combo_agrupar.addItem(etiqueta, clave)
+        config_layout.addWidget(self.combo_agrupar, 3, 1)
+        self.combo_tipo_reporte.currentIndexChanged.connect(
+            lambda: self.combo_agrupar.setEnabled(self.combo_tipo_reporte.currentData() == "ventas"))
+
         config_layout.addWidget(QLabel("Desde:"), 1, 0)
         self.fecha_desde = QDateEdit(QDate.currentDate().addMonths(-1))
         self.fecha_desde.setCalendarPopup(True)
@@ -63,28 +75,49 @@ class ReportesWidget(QWidget):
         filtros = {
             "fecha_inicio": self.fecha_desde.date().toString("yyyy-MM-dd"),
             "fecha_fin": self.fecha_hasta.date().toString("yyyy-MM-dd"),
+            "agrupar_por": self.combo_agrupar.currentData(),
         }
         return tipo_reporte, filtros
 
+    def _abrir_reporte(self, tipo_reporte: str, filtros: dict):
+        """
+        Prepara el reporte en flujo sobre una sesión propia: las filas se leen
+        en el hilo de trabajo que escribe el archivo, que cierra la sesión al acabar.
+        """
+        sesion = fabrica_sesiones_para(self.controller.db)()
+        try:
+            return sesion, self.controller.obtener_datos_para_reporte(tipo_reporte, filtros, en_flujo=True, sesion=sesion)
+        except Exception:
+            sesion.close()
+            raise
+
     def _exportar_a_pdf(self):
         tipo_reporte, filtros = self._obtener_configuracion_reporte()
-        if tipo_reporte != "ventas":
-            QMessageBox.information(self, "Función no disponible", f"La exportación a PDF para '{tipo_reporte}' aún no está implementada.")
-            return
-
-        ruta_sugerida = f"reporte_ventas_{QDate.currentDate().toString('yyyyMMdd')}.pdf"
+        ruta_sugerida = f"reporte_{tipo_reporte}_{QDate.currentDate().toString('yyyyMMdd')}.pdf"
         ruta_archivo, _ = QFileDialog.getSaveFileName(self, "Guardar Reporte en PDF", ruta_sugerida, "Archivos PDF (*.pdf)")
         if not ruta_archivo: return
         
         try:
-            reporte_data = self.controller.obtener_datos_para_reporte(tipo_reporte, filtros)
             empresa_data = self.controller.empresa_ctrl.obtener_datos_empresa()
             empresa_dict = empresa_data.__dict__ if empresa_data else {}
-
-            generar_reporte_ventas_pdf(ruta_archivo, reporte_data["data"], empresa_dict)
-            QMessageBox.information(self, "Éxito", f"Reporte PDF guardado en:\n{ruta_archivo}")
+            sesion, reporte_data = self._abrir_reporte(tipo_reporte, filtros)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"No se pudo generar el PDF: {e}")
+            return
+
+        def generar(progreso, cancelado):
+            try:
+                return escribir_reporte_pdf(
+                    ruta_archivo, reporte_data["titulo"], reporte_data["headers"], reporte_data["data"],
+                    columnas_total=reporte_data.get("columnas_total", ()), columnas_moneda=reporte_data.get("columnas_moneda", ()),
+                    datos_empresa=empresa_dict, total_filas=reporte_data.get("total_filas"), progreso=progreso, cancelado=cancelado,
+                )
+            finally:
+                sesion.close()
+        self._exportar_en_segundo_plano(
+            "PDF", generar, reporte_data.get("total_filas") or 0,
+            lambda resultado: f"Reporte PDF guardado en:\n{ruta_archivo}\n({resultado['paginas']} páginas)",
+        )
 
     def _exportar_a_excel(self):
         tipo_reporte, filtros = self._obtener_configuracion_reporte()
@@ -93,8 +126,49 @@ class ReportesWidget(QWidget):
         if not ruta_archivo: return
 
         try:
-            reporte_data = self.controller.obtener_datos_para_reporte(tipo_reporte, filtros)
-            generar_reporte_excel(ruta_archivo, reporte_data["titulo"], reporte_data["headers"], reporte_data["data"])
-            QMessageBox.information(self, "Éxito", f"Reporte Excel guardado en:\n{ruta_archivo}")
+            sesion, reporte_data = self._abrir_reporte(tipo_reporte, filtros)
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"No se pudo generar el reporte Excel: {e}")
\ No newline at end of file
+            QMessageBox.critical(self, "Error", f"No se pudo generar el reporte Excel: {e}")
+            return
+
+        def generar(progreso, cancelado):
+            try:
+                return generar_reporte_excel(
+                    ruta_archivo, reporte_data["titulo"], reporte_data["headers"], reporte_data["data"],
+                    columnas_moneda=reporte_data.get("columnas_moneda", ()), total_filas=reporte_data.get("total_filas"),
+                    progreso=progreso, cancelado=cancelado,
+                )
+            finally:
+                sesion.close()
+        self._exportar_en_segundo_plano(
+            "Excel", generar, reporte_data.get("total_filas") or 0,
+            lambda resultado: f"Reporte Excel guardado en:\n{ruta_archivo}\n({resultado['filas']:,} filas en {resultado['hojas']} hoja(s))",
+        )
+
+    def _exportar_en_segundo_plano(self, formato: str, generar, total_filas: int, mensaje_exito):
+        """Escribe el archivo en un hilo de trabajo, con diálogo de progreso y opción de cancelar."""
+        dialogo = QProgressDialog(f"Generando reporte {formato}...", "Cancelar", 0, total_filas, self)
+        dialogo.setWindowTitle(f"Exportar a {formato}")
+        dialogo.setWindowModality(Qt.WindowModality.WindowModal)
+        dialogo.setMinimumDuration(300)
+
+        def terminar(resultado=None, error=None):
+            dialogo.canceled.disconnect()
+            dialogo.close()
+            self.boton_pdf.setEnabled(True)
+            self.boton_excel.setEnabled(True)
+            self.tarea_exportacion = None
+            if error:
+                QMessageBox.critical(self, "Error", f"No se pudo generar el reporte {formato}: {error}")
+            elif resultado:
+                QMessageBox.information(self, "Éxito", mensaje_exito(resultado))
+
+        self.tarea_exportacion = TareaSegundoPlano(generar)
+        self.tarea_exportacion.senales.progreso.connect(lambda hechos, _total: dialogo.setValue(hechos))
+        self.tarea_exportacion.senales.terminada.connect(lambda resultado: terminar(resultado))
+        self.tarea_exportacion.senales.fallida.connect(lambda mensaje: terminar(error=mensaje))
+        self.tarea_exportacion.senales.cancelada.connect(lambda: terminar())
+        dialogo.canceled.connect(self.tarea_exportacion.cancelar)
+        self.boton_pdf.setEnabled(False)
+        self.boton_excel.setEnabled(False)
+        self.tarea_exportacion.iniciar()
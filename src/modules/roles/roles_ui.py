@@ -7,6 +7,8 @@ from .reasignar_rol_dialog import ReasignarRolDialog
 import json
 
 # --- INICIO DE LA MODIFICACIÓN ---
+# Al añadir un módulo, registra una migración en core/migraciones.py: el arranque
+# solo sincroniza los permisos del rol Admin cuando aplica alguna.
 MODULOS_DISPONIBLES = ["dashboard", "empresa", "productos", "categorias", "variantes", "ventas", "contabilidad", "reportes", "clientes", "proveedores", "compras", "perfil", "usuarios", "roles"]
 # --- FIN DE LA MODIFICACIÓN ---
 
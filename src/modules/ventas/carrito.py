@@ -0,0 +1,148 @@
+# src/modules/ventas/carrito.py
+"""
+Ticket en curso en memoria.
+
+Mientras el cajero escanea, las líneas y los totales viven en un Carrito y no en
+la base: cada cambio solo reescribe una instantánea JSON del carrito (un archivo
+pequeño por cajero), de modo que si el programa se cierra de golpe el ticket se
+recupera al volver a abrirlo. Las filas Venta/VentaDetalle se escriben al cobrar
+o al aparcar el ticket (ver VentasController).
+"""
+
+import os
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from core.config import cargar_seccion_config
+
+# Carpeta de las instantáneas (relativa al directorio de trabajo, como sibors.db).
+DIRECTORIO_CARRITOS = "carritos_abiertos"
+
+# Versión del formato de las instantáneas; las de otra versión se ignoran.
+VERSION_INSTANTANEA = 1
+
+
+@dataclass
+class LineaCarrito:
+    producto_id: int
+    sku: str
+    descripcion: str
+    cantidad: int
+    precio_unitario: float
+    descuento_linea: float = 0.0
+
+    @property
+    def subtotal_linea(self) -> float:
+        return self.precio_unitario * self.cantidad - (self.descuento_linea or 0.0)
+
+
+@dataclass
+class Carrito:
+    usuario_id: int
+    cliente_id: Optional[int] = None
+    # Venta aparcada de la que procede el carrito (se reutiliza su fila al cobrar)
+    venta_id: Optional[int] = None
+    creado: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    lineas: Dict[int, LineaCarrito] = field(default_factory=dict)  # por producto_id, en orden de escaneo
+
+    @property
+    def detalles(self) -> List[LineaCarrito]:
+        return list(self.lineas.values())
+
+    @property
+    def subtotal(self) -> float:
+        return sum(l.subtotal_linea for l in self.lineas.values())
+
+    @property
+    def descuento_total(self) -> float:
+        return 0.0
+
+    @property
+    def impuestos(self) -> float:
+        return 0.0
+
+    @property
+    def total(self) -> float:
+        return self.subtotal
+
+    def a_dict(self) -> Dict:
+        return {
+            "version": VERSION_INSTANTANEA,
+            "usuario_id": self.usuario_id,
+            "cliente_id": self.cliente_id,
+            "venta_id": self.venta_id,
+            "creado": self.creado,
+            "lineas": [
+                {"producto_id": l.producto_id, "sku": l.sku, "descripcion": l.descripcion, "cantidad": l.cantidad,
+                 "precio_unitario": l.precio_unitario, "descuento_linea": l.descuento_linea}
+                for l in self.lineas.values()
+            ],
+        }
+
+    @classmethod
+    def desde_dict(cls, datos: Dict) -> "Carrito":
+        carrito = cls(usuario_id=datos["usuario_id"], cliente_id=datos.get("cliente_id"),
+                      venta_id=datos.get("venta_id"), creado=datos.get("creado") or datetime.now(timezone.utc).isoformat())
+        for linea in datos.get("lineas", []):
+            carrito.lineas[linea["producto_id"]] = LineaCarrito(**linea)
+        return carrito
+
+
+class AlmacenCarritos:
+    """
+    Instantáneas de los carritos abiertos, un JSON por cajero. Se escriben a un
+    archivo temporal y se renombran (os.replace), así que tras un cierre
+    inesperado queda la versión anterior o la nueva, nunca un archivo a medias.
+    Con "sincronizar_disco" también se hace fsync (sobrevive a un corte de luz a
+    cambio de una escritura a disco por escaneo).
+    """
+
+    def __init__(self, directorio: Optional[str] = None, sincronizar_disco: Optional[bool] = None):
+        config = cargar_seccion_config("ventas")
+        self.directorio = directorio or config.get("directorio_carritos", DIRECTORIO_CARRITOS)
+        self.sincronizar_disco = bool(config.get("sincronizar_carritos", False)) if sincronizar_disco is None else sincronizar_disco
+
+    def _ruta(self, usuario_id: int) -> str:
+        return os.path.join(self.directorio, f"carrito_{int(usuario_id)}.json")
+
+    def guardar(self, carrito: Carrito) -> None:
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = self._ruta(carrito.usuario_id)
+        temporal = ruta + ".tmp"
+        # json.dumps usa el codificador en C; json.dump escribe por fragmentos desde Python.
+        contenido = json.dumps(carrito.a_dict(), ensure_ascii=False)
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(contenido)
+            if self.sincronizar_disco:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+
+    def borrar(self, usuario_id: int) -> None:
+        try:
+            os.remove(self._ruta(usuario_id))
+        except FileNotFoundError:
+            pass
+
+    def cargar_todos(self) -> List[Carrito]:
+        """Carritos de todas las instantáneas válidas; las dañadas se apartan con extensión .danado."""
+        if not os.path.isdir(self.directorio):
+            return []
+        carritos = []
+        for nombre in sorted(os.listdir(self.directorio)):
+            if not (nombre.startswith("carrito_") and nombre.endswith(".json")):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    datos = json.load(f)
+                if datos.get("version") != VERSION_INSTANTANEA:
+                    print(f"⚠️ Instantánea de carrito con formato desconocido, se ignora: {ruta}")
+                    continue
+                carritos.append(Carrito.desde_dict(datos))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"⚠️ No se pudo leer la instantánea {ruta}: {e}")
+                os.replace(ruta, ruta + ".danado")
+        return carritos
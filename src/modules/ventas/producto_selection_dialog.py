@@ -6,12 +6,29 @@ from PySide6.QtWidgets import (
     QMessageBox
 )
 from PySide6.QtCore import Qt, Signal
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
+from core.busqueda import ControladorBusqueda, fabrica_sesiones_para
 from modules.productos.producto_controller import ProductoController
 from modules.categorias.categoria_controller import CategoriaController
 from modules.productos.models import Producto, ProductoPlantilla
 
+def _buscar_variantes(sesion, criterios: Tuple[str, Optional[int]]) -> List[dict]:
+    filtro, categoria_id = criterios
+    # Búsqueda por relevancia en el índice FTS5; la categoría (con subcategorías) se filtra en la misma consulta.
+    variantes = ProductoController(sesion).buscar_variantes(filtro, categoria_id=categoria_id)
+    filas = []
+    for p in variantes:
+        nombre_variante = " / ".join(v.valor for v in p.valores)
+        filas.append({
+            "id": p.id,
+            "sku": p.sku,
+            "nombre": f"{p.plantilla.nombre} ({nombre_variante})" if nombre_variante else p.plantilla.nombre,
+            "precio_venta": p.precio_venta,
+            "stock": p.stock,
+        })
+    return filas
+
 class ProductoSelectionDialog(QDialog):
     producto_seleccionado = Signal(Producto)
 
@@ -23,10 +40,14 @@ class ProductoSelectionDialog(QDialog):
         self.setWindowTitle("Seleccionar Producto para la Venta")
         self.setMinimumSize(800, 600)
         self.setModal(True)
+
+        self.busqueda = ControladorBusqueda(_buscar_variantes, fabrica_sesiones_para(producto_ctrl.db), parent=self)
+        self.busqueda.resultados_listos.connect(self._cargar_tabla_productos)
+        self.busqueda.busqueda_fallida.connect(lambda msg: QMessageBox.critical(self, "Error", f"No se pudo buscar productos: {msg}"))
         
         self._setup_ui()
         self._cargar_categorias()
-        self._actualizar_lista_productos()
+        self.busqueda.buscar_ahora(self._criterios_busqueda())
 
     def _setup_ui(self):
         layout = QVBoxLayout(self)
@@ -58,40 +79,28 @@ class ProductoSelectionDialog(QDialog):
         
         self.combo_categorias.currentIndexChanged.connect(self._actualizar_lista_productos)
         self.input_busqueda.textChanged.connect(self._actualizar_lista_productos)
+        self.finished.connect(lambda _: self.busqueda.cancelar())
 
     def _cargar_categorias(self):
         categorias = self.categoria_controller.obtener_todas_las_categorias()
         for cat in sorted(categorias, key=lambda x: x.nombre):
             self.combo_categorias.addItem(cat.nombre, userData=cat.id)
 
+    def _criterios_busqueda(self) -> Tuple[str, Optional[int]]:
+        return self.input_busqueda.text(), self.combo_categorias.currentData()
+
     def _actualizar_lista_productos(self):
-        filtro_texto = self.input_busqueda.text()
-        cat_id = self.combo_categorias.currentData()
-        
-        productos_raw = self.producto_controller.listar_todas_las_variantes(filtro=filtro_texto)
-        
-        productos_filtrados = []
-        if cat_id is not None:
-            # Si se selecciona una categoría, filtramos los productos
-            ids_categorias_hijas = self.categoria_controller._get_all_child_category_ids(cat_id)
-            for p in productos_raw:
-                if p.plantilla.categoria_id in ids_categorias_hijas:
-                    productos_filtrados.append(p)
-        else:
-            productos_filtrados = productos_raw
+        self.busqueda.solicitar(self._criterios_busqueda())
 
-        self.tabla_productos.setRowCount(len(productos_filtrados))
-        for row, p in enumerate(productos_filtrados):
-            item_sku = QTableWidgetItem(p.sku)
-            item_sku.setData(Qt.ItemDataRole.UserRole, p)
+    def _cargar_tabla_productos(self, filas: List[dict], latencia_ms: float = 0.0):
+        self.tabla_productos.setRowCount(len(filas))
+        for row, fila in enumerate(filas):
+            item_sku = QTableWidgetItem(fila["sku"])
+            item_sku.setData(Qt.ItemDataRole.UserRole, fila["id"])
             self.tabla_productos.setItem(row, 0, item_sku)
-
-            nombre_variante = " / ".join(v.valor for v in p.valores)
-            nombre_display = f"{p.plantilla.nombre} ({nombre_variante})" if nombre_variante else p.plantilla.nombre
-            self.tabla_productos.setItem(row, 1, QTableWidgetItem(nombre_display))
-            
-            self.tabla_productos.setItem(row, 2, QTableWidgetItem(f"${p.precio_venta:,.2f}"))
-            self.tabla_productos.setItem(row, 3, QTableWidgetItem(str(p.stock)))
+            self.tabla_productos.setItem(row, 1, QTableWidgetItem(fila["nombre"]))
+            self.tabla_productos.setItem(row, 2, QTableWidgetItem(f"${fila['precio_venta']:,.2f}"))
+            self.tabla_productos.setItem(row, 3, QTableWidgetItem(str(fila["stock"])))
 
     def _aceptar_seleccion(self):
         selected_items = self.tabla_productos.selectedItems()
@@ -99,6 +108,11 @@ class ProductoSelectionDialog(QDialog):
             QMessageBox.warning(self, "Selección Requerida", "Por favor, selecciona un producto de la lista.")
             return
             
-        producto_obj = self.tabla_productos.item(selected_items[0].row(), 0).data(Qt.ItemDataRole.UserRole)
+        producto_id = self.tabla_productos.item(selected_items[0].row(), 0).data(Qt.ItemDataRole.UserRole)
+        # Los resultados vienen de la sesión del hilo de búsqueda; emitimos el objeto de la sesión del diálogo.
+        producto_obj = self.producto_controller.obtener_variante_por_id(producto_id)
+        if not producto_obj:
+            QMessageBox.warning(self, "Producto no disponible", "El producto seleccionado ya no existe.")
+            return
         self.producto_seleccionado.emit(producto_obj)
         self.accept()
\ No newline at end of file
@@ -1,105 +1,237 @@
-# src/modules/ventas/ventas_controller.py (v2.2 - Sincronización Forzada)
+# src/modules/ventas/ventas_controller.py (v2.3 - Carrito en memoria)
 
 from typing import List, Dict, Optional
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import update
+from sqlalchemy.orm import Session
 from datetime import datetime, timezone
 
 from .ventas_model import Venta, VentaDetalle, VentaPago, EstadoVenta, MetodoPago
+from .carrito import Carrito, LineaCarrito, AlmacenCarritos
 from modules.productos.producto_controller import ProductoController
 from modules.contabilidad.contabilidad_controller import ContabilidadController
 from modules.clientes.cliente_controller import ClienteController
 from modules.contabilidad.contabilidad_model import TipoMovimiento
 from modules.productos.models import Producto, TipoAjusteStock
+from modules.productos import stock_kits
 
 class VentasController:
-    def __init__(self, db_session: Session, producto_ctrl: ProductoController, contabilidad_ctrl: ContabilidadController, cliente_ctrl: ClienteController):
+    """
+    El ticket en curso de cada cajero es un Carrito en memoria (ver carrito.py):
+    añadir o quitar productos no toca la base, solo la instantánea del carrito.
+    La venta se escribe al cobrarla (finalizar_venta) o al aparcarla (aparcar_venta).
+    """
+    def __init__(self, db_session: Session, producto_ctrl: ProductoController, contabilidad_ctrl: ContabilidadController, cliente_ctrl: ClienteController, almacen_carritos: Optional[AlmacenCarritos] = None):
         self.db = db_session
         self.producto_ctrl = producto_ctrl
         self.contabilidad_ctrl = contabilidad_ctrl
         self.cliente_ctrl = cliente_ctrl
+        self.almacen_carritos = almacen_carritos or AlmacenCarritos()
+        self._carritos: Dict[int, Carrito] = {}  # por usuario_id
 
-    def crear_nueva_venta(self, usuario_id: int, cliente_id: Optional[int] = None) -> Venta:
-        venta_existente = self.obtener_venta_activa(usuario_id)
-        if venta_existente:
-            self.cancelar_venta(venta_existente)
-        
-        nueva_venta = Venta(usuario_id=usuario_id, cliente_id=cliente_id)
-        self.db.add(nueva_venta)
-        self.db.commit()
-        self.db.refresh(nueva_venta)
-        return nueva_venta
-
-    def obtener_venta_activa(self, usuario_id: int) -> Optional[Venta]:
-        return self.db.query(Venta).options(
-            joinedload(Venta.detalles).joinedload(VentaDetalle.producto).joinedload(Producto.plantilla)
-        ).filter_by(usuario_id=usuario_id, estado=EstadoVenta.EN_PROGRESO).first()
-
-    def agregar_item(self, venta: Venta, producto_id: int, cantidad: int) -> Venta:
+    def recuperar_carritos(self) -> int:
+        """
+        Al arrancar: vuelve a abrir los carritos de las instantáneas y las ventas
+        que quedaron 'En Progreso' en la base (versiones anteriores). Devuelve
+        cuántos carritos hay abiertos.
+        """
+        for carrito in self.almacen_carritos.cargar_todos():
+            validas = {pid for (pid,) in self.db.query(Producto.id).filter(Producto.id.in_(list(carrito.lineas)))}
+            for producto_id in [pid for pid in carrito.lineas if pid not in validas]:
+                print(f"⚠️ El producto {producto_id} del carrito recuperado ya no existe; se quita la línea.")
+                del carrito.lineas[producto_id]
+            self._carritos[carrito.usuario_id] = carrito
+        for venta in self.db.query(Venta).filter_by(estado=EstadoVenta.EN_PROGRESO).all():
+            if venta.usuario_id not in self._carritos:
+                self._guardar_carrito(self._carrito_desde_venta(venta))
+        if self._carritos:
+            print(f"♻️ Carritos abiertos recuperados: {len(self._carritos)}")
+        return len(self._carritos)
+
+    def crear_nueva_venta(self, usuario_id: int, cliente_id: Optional[int] = None) -> Carrito:
+        carrito_existente = self.obtener_venta_activa(usuario_id)
+        if carrito_existente:
+            self.cancelar_venta(carrito_existente)
+        carrito = Carrito(usuario_id=usuario_id, cliente_id=cliente_id)
+        self._guardar_carrito(carrito)
+        return carrito
+
+    def obtener_venta_activa(self, usuario_id: int) -> Optional[Carrito]:
+        return self._carritos.get(usuario_id)
+
+    def agregar_item(self, carrito: Carrito, producto_id: int, cantidad: int) -> Carrito:
         producto = self.db.get(Producto, producto_id)
         if not producto: raise ValueError("Producto no encontrado.")
         if cantidad <= 0: raise ValueError("La cantidad debe ser positiva.")
-        if producto.stock < cantidad: raise ValueError(f"Stock insuficiente para {producto.sku}. Disponible: {producto.stock}")
+        linea = carrito.lineas.get(producto_id)
+        cantidad_total = cantidad + (linea.cantidad if linea else 0)
+        disponible = stock_kits.stock_disponible(producto)
+        if disponible < cantidad_total: raise ValueError(f"Stock insuficiente para {producto.sku}. Disponible: {disponible}")
 
-        detalle_existente = next((d for d in venta.detalles if d.producto_id == producto_id), None)
-
-        if detalle_existente:
-            detalle_existente.cantidad += cantidad
+        if linea:
+            linea.cantidad = cantidad_total
         else:
-            detalle_nuevo = VentaDetalle(
-                venta_id=venta.id,
+            carrito.lineas[producto_id] = LineaCarrito(
                 producto_id=producto.id,
+                sku=producto.sku,
+                descripcion=self._descripcion(producto),
                 cantidad=cantidad,
                 precio_unitario=producto.precio_venta
             )
-            venta.detalles.append(detalle_nuevo)
-        
-        self._recalcular_y_guardar_totales(venta)
-        self.db.refresh(venta)
-        return venta
+        self._guardar_carrito(carrito)
+        return carrito
 
-    def quitar_item(self, venta: Venta, detalle_id: int) -> Optional[Venta]:
-        detalle = self.db.get(VentaDetalle, detalle_id)
-        if not detalle or detalle.venta_id != venta.id:
+    def escanear_item(self, carrito: Carrito, codigo: str, cantidad: int = 1) -> Carrito:
+        """Añade al ticket la variante con ese SKU o código de barras, sin pasar por el diálogo de selección."""
+        producto = self.producto_ctrl.buscar_por_codigo(codigo)
+        if not producto: raise ValueError(f"No hay ningún producto con el código '{codigo.strip()}'.")
+        return self.agregar_item(carrito, producto.id, cantidad)
+
+    def quitar_item(self, carrito: Carrito, producto_id: int) -> Optional[Carrito]:
+        if producto_id not in carrito.lineas:
             raise ValueError("El item no pertenece a esta venta.")
-        
-        venta.detalles.remove(detalle)
-        self.db.delete(detalle)
-        
-        if not venta.detalles:
-            self.cancelar_venta(venta)
+        del carrito.lineas[producto_id]
+
+        if not carrito.lineas:
+            self.cancelar_venta(carrito)
             return None
-        
-        self._recalcular_y_guardar_totales(venta)
-        self.db.refresh(venta)
+        self._guardar_carrito(carrito)
+        return carrito
+
+    def aparcar_venta(self, carrito: Carrito) -> Venta:
+        """Guarda el ticket como venta 'En Espera' y libera la caja para otro cliente."""
+        if not carrito.lineas: raise ValueError("No se puede aparcar una venta vacía.")
+        try:
+            venta = self._volcar_carrito(carrito, EstadoVenta.EN_ESPERA)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        self._descartar_carrito(carrito)
         return venta
 
-    def _recalcular_y_guardar_totales(self, venta: Venta):
-        subtotal = sum(d.precio_unitario * d.cantidad for d in venta.detalles)
-        venta.subtotal = subtotal
-        venta.total = subtotal
-        self.db.commit()
+    def listar_ventas_en_espera(self, usuario_id: Optional[int] = None) -> List[Venta]:
+        query = self.db.query(Venta).filter(Venta.estado == EstadoVenta.EN_ESPERA)
+        if usuario_id is not None:
+            query = query.filter(Venta.usuario_id == usuario_id)
+        # Por id (orden de alta): lo resuelve el índice (usuario_id, estado) sin ordenar aparte
+        return query.order_by(Venta.id).all()
 
-    def finalizar_venta(self, venta: Venta, pagos: List[Dict]):
-        if not venta.detalles: raise ValueError("No se puede finalizar una venta vacía.")
+    def reanudar_venta(self, venta_id: int, usuario_id: int) -> Carrito:
+        """
+        Vuelve a abrir una venta aparcada como carrito del cajero. La fila pasa a
+        'En Progreso' con un UPDATE condicionado al estado, así otra caja (u otra
+        instancia) no puede reanudarla a la vez. La fila se reutiliza al cobrar.
+        """
+        actual = self.obtener_venta_activa(usuario_id)
+        if actual and actual.lineas: raise ValueError("Aparca o cancela el ticket actual antes de reanudar otro.")
+        try:
+            reclamada = self.db.execute(
+                update(Venta).where(Venta.id == venta_id, Venta.estado == EstadoVenta.EN_ESPERA)
+                .values(estado=EstadoVenta.EN_PROGRESO, usuario_id=usuario_id)
+            ).rowcount
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        if not reclamada: raise ValueError("La venta no está en espera.")
+        venta = self.db.get(Venta, venta_id)
+        carrito = self._carrito_desde_venta(venta)
+        carrito.usuario_id = usuario_id
+        self._guardar_carrito(carrito)
+        return carrito
+
+    def finalizar_venta(self, carrito: Carrito, pagos: List[Dict]) -> Venta:
+        """
+        Cierra la venta en una única transacción: escribe la Venta y sus
+        detalles, descuenta el stock de todas las líneas (ajustar_stock_lote; las
+        de un kit se descuentan de sus componentes), registra pagos y el ingreso
+        contable, y hace un solo commit. Si algo falla no queda ningún cambio
+        aplicado y el carrito sigue abierto.
+        """
+        if not carrito.lineas: raise ValueError("No se puede finalizar una venta vacía.")
         total_pagado = sum(p['monto'] for p in pagos)
-        if total_pagado < venta.total: raise ValueError("El monto pagado es insuficiente.")
-        for detalle in venta.detalles:
-            self.producto_ctrl.ajustar_stock(
-                producto_id=detalle.producto_id,
-                cantidad_ajuste=-detalle.cantidad,
+        if total_pagado < carrito.total: raise ValueError("El monto pagado es insuficiente.")
+        try:
+            venta = self._volcar_carrito(carrito, EstadoVenta.COMPLETADA)
+            self.producto_ctrl.ajustar_stock_lote(
+                [{"producto_id": l.producto_id, "cantidad": -l.cantidad} for l in carrito.lineas.values()],
                 tipo_ajuste=TipoAjusteStock.SALIDA_VENTA,
                 motivo=f"Venta #{venta.id}",
-                usuario_id=venta.usuario_id
+                usuario_id=venta.usuario_id,
+                commit=False
+            )
+            for pago_data in pagos:
+                pago = VentaPago(venta_id=venta.id, metodo_pago=MetodoPago(pago_data['metodo']), monto=pago_data['monto'])
+                self.db.add(pago)
+            if venta.total > 0:
+                self.contabilidad_ctrl.agregar_movimiento(tipo=TipoMovimiento.INGRESO, concepto=f"Ingreso por Venta #{venta.id}", monto=venta.total, commit=False)
+            venta.fecha = datetime.now(timezone.utc)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        self._descartar_carrito(carrito)
+        return venta
+
+    def cancelar_venta(self, carrito: Carrito):
+        if carrito.venta_id:
+            venta = self.db.get(Venta, carrito.venta_id)
+            if venta:
+                venta.estado = EstadoVenta.CANCELADA
+                self.db.commit()
+        self._descartar_carrito(carrito)
+
+    # --- Internos ---
+
+    def _guardar_carrito(self, carrito: Carrito) -> None:
+        self._carritos[carrito.usuario_id] = carrito
+        self.almacen_carritos.guardar(carrito)
+
+    def _descartar_carrito(self, carrito: Carrito) -> None:
+        if self._carritos.get(carrito.usuario_id) is carrito:
+            del self._carritos[carrito.usuario_id]
+            self.almacen_carritos.borrar(carrito.usuario_id)
+
+    @staticmethod
+    def _descripcion(producto: Producto) -> str:
+        nombre_variante = " / ".join(v.valor for v in producto.valores)
+        return f"{producto.plantilla.nombre} ({nombre_variante})" if nombre_variante else producto.plantilla.nombre
+
+    def _volcar_carrito(self, carrito: Carrito, estado: EstadoVenta) -> Venta:
+        """Escribe (sin commit) la Venta del carrito con sus detalles; reutiliza la fila si el carrito viene de una venta aparcada."""
+        venta = self.db.get(Venta, carrito.venta_id) if carrito.venta_id else None
+        if venta is not None and venta.estado not in (EstadoVenta.EN_PROGRESO, EstadoVenta.EN_ESPERA):
+            raise ValueError(f"La venta #{venta.id} ya está {venta.estado.value.lower()}; no se puede volver a guardar.")
+        if venta is None:
+            venta = Venta(usuario_id=carrito.usuario_id)
+            self.db.add(venta)
+        else:
+            venta.detalles.clear()
+        venta.usuario_id = carrito.usuario_id
+        venta.cliente_id = carrito.cliente_id
+        for linea in carrito.lineas.values():
+            venta.detalles.append(VentaDetalle(
+                producto_id=linea.producto_id,
+                cantidad=linea.cantidad,
+                precio_unitario=linea.precio_unitario,
+                descuento_linea=linea.descuento_linea,
+                subtotal_linea=linea.subtotal_linea
+            ))
+        venta.subtotal = carrito.subtotal
+        venta.total = carrito.total
+        venta.estado = estado
+        self.db.flush()
+        return venta
+
+    def _carrito_desde_venta(self, venta: Venta) -> Carrito:
+        carrito = Carrito(usuario_id=venta.usuario_id, cliente_id=venta.cliente_id, venta_id=venta.id)
+        for d in sorted(venta.detalles, key=lambda d: d.id):
+            carrito.lineas[d.producto_id] = LineaCarrito(
+                producto_id=d.producto_id,
+                sku=d.producto.sku,
+                descripcion=self._descripcion(d.producto),
+                cantidad=d.cantidad,
+                precio_unitario=d.precio_unitario,
+                descuento_linea=d.descuento_linea or 0.0
             )
-        for pago_data in pagos:
-            pago = VentaPago(venta_id=venta.id, metodo_pago=MetodoPago(pago_data['metodo']), monto=pago_data['monto'])
-            self.db.add(pago)
-        if venta.total > 0:
-            self.contabilidad_ctrl.agregar_movimiento(tipo=TipoMovimiento.INGRESO, concepto=f"Ingreso por Venta #{venta.id}", monto=venta.total)
-        venta.estado = EstadoVenta.COMPLETADA
-        venta.fecha = datetime.now(timezone.utc)
-        self.db.commit()
-
-    def cancelar_venta(self, venta: Venta):
-        venta.estado = EstadoVenta.CANCELADA
-        self.db.commit()
\ No newline at end of file
+        return carrito
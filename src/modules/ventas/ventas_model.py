@@ -1,7 +1,7 @@
 # src/modules/ventas/ventas_model.py (v2.0 - Reescritura completa)
 
 import enum
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 
@@ -52,6 +52,13 @@ class Venta(Base):
     detalles = relationship("VentaDetalle", back_populates="venta", cascade="all, delete-orphan")
     pagos = relationship("VentaPago", back_populates="venta", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Venta activa de un cajero (obtener_venta_activa)
+        Index("ix_ventas_usuario_estado", "usuario_id", "estado"),
+        # KPIs y reportes: ventas completadas en un rango de fechas
+        Index("ix_ventas_estado_fecha", "estado", "fecha"),
+    )
+
     def __repr__(self):
         return f"<Venta(id={self.id}, total={self.total}, estado='{self.estado.value}')>"
 
@@ -74,6 +81,11 @@ class VentaDetalle(Base):
     venta = relationship("Venta", back_populates="detalles")
     producto = relationship("Producto")
 
+    __table_args__ = (
+        Index("ix_venta_detalles_venta", "venta_id"),
+        Index("ix_venta_detalles_producto", "producto_id"),
+    )
+
 class VentaPago(Base):
     """
     Registra los pagos aplicados a una Venta.
@@ -85,4 +97,8 @@ class VentaPago(Base):
     metodo_pago = Column(Enum(MetodoPago), nullable=False)
     monto = Column(Float, nullable=False)
     
-    venta = relationship("Venta", back_populates="pagos")
\ No newline at end of file
+    venta = relationship("Venta", back_populates="pagos")
+
+    __table_args__ = (
+        Index("ix_venta_pagos_venta", "venta_id"),
+    )
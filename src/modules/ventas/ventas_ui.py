@@ -1,9 +1,9 @@
-# src/modules/ventas/ventas_ui.py (v2.2 - Sincronización Forzada)
+# src/modules/ventas/ventas_ui.py (v2.3 - Carrito en memoria)
 
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget,
     QTableWidgetItem, QMessageBox, QHeaderView, QAbstractItemView, QLabel,
-    QGroupBox, QFormLayout, QGridLayout
+    QGroupBox, QFormLayout, QGridLayout, QLineEdit, QApplication, QInputDialog
 )
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QFont
@@ -14,6 +14,8 @@ from modules.productos.producto_controller import ProductoController
 from modules.categorias.categoria_controller import CategoriaController
 from .producto_selection_dialog import ProductoSelectionDialog
 from modules.productos.models import Producto
+from modules.productos import indice_codigos
+from core.tareas import TareaSegundoPlano
 
 class VentasWidget(QWidget):
     def __init__(self, ventas_ctrl: VentasController, cliente_ctrl: ClienteController, producto_ctrl: ProductoController, categoria_ctrl: CategoriaController, usuario, parent=None):
@@ -24,16 +26,19 @@ class VentasWidget(QWidget):
         self.categoria_controller = categoria_ctrl
         self.usuario_logueado = usuario
         self.current_venta = None
+        self.tarea_indice = None
         
         self._setup_ui()
         self.actualizar_vista()
+        self._precargar_indice_codigos()
 
     def actualizar_vista(self):
-        """Punto de entrada para refrescar toda la UI. Carga la venta activa y actualiza los componentes."""
+        """Punto de entrada para refrescar toda la UI. Toma el carrito activo (en memoria) y actualiza los componentes."""
         self.current_venta = self.ventas_controller.obtener_venta_activa(self.usuario_logueado.id)
         self._refrescar_carrito()
         self._refrescar_totales()
         self._actualizar_estado_botones()
+        self.input_escaneo.setFocus()
 
     def _setup_ui(self):
         main_layout = QHBoxLayout(self)
@@ -57,6 +62,14 @@ class VentasWidget(QWidget):
     def _crear_grupo_carrito(self) -> QGroupBox:
         grupo = QGroupBox("Ticket de Venta Actual")
         layout = QVBoxLayout(grupo)
+        escaneo_layout = QHBoxLayout()
+        self.input_escaneo = QLineEdit()
+        self.input_escaneo.setPlaceholderText("Escanear código de barras o SKU y pulsar Enter...")
+        self.input_escaneo.returnPressed.connect(self._escanear_codigo)
+        self.label_escaneo = QLabel("")
+        escaneo_layout.addWidget(self.input_escaneo, 1)
+        escaneo_layout.addWidget(self.label_escaneo)
+        layout.addLayout(escaneo_layout)
         self.tabla_carrito = QTableWidget()
         self.tabla_carrito.setColumnCount(5)
         self.tabla_carrito.setHorizontalHeaderLabels(["SKU", "Producto", "Cantidad", "Precio Unitario", "Subtotal"])
@@ -95,18 +108,24 @@ class VentasWidget(QWidget):
         self.btn_anadir_producto = QPushButton("📦 Añadir Producto...")
         self.btn_quitar_producto = QPushButton("➖ Quitar Producto")
         self.btn_cancelar_venta = QPushButton("❌ Cancelar Venta")
+        self.btn_aparcar = QPushButton("⏸️ Aparcar Venta")
+        self.btn_reanudar = QPushButton("▶️ Reanudar Venta...")
         self.btn_cobrar = QPushButton("💵 Cobrar")
         self.btn_cobrar.setObjectName("cobrarButton")
         self.btn_nueva_venta.clicked.connect(self._iniciar_nueva_venta)
         self.btn_anadir_producto.clicked.connect(self._abrir_dialogo_seleccion_producto)
         self.btn_quitar_producto.clicked.connect(self._quitar_producto_del_carrito)
         self.btn_cancelar_venta.clicked.connect(self._cancelar_venta_actual)
+        self.btn_aparcar.clicked.connect(self._aparcar_venta_actual)
+        self.btn_reanudar.clicked.connect(self._reanudar_venta)
         self.btn_cobrar.clicked.connect(self._finalizar_venta)
         grid_layout.addWidget(self.btn_nueva_venta, 0, 0)
         grid_layout.addWidget(self.btn_cancelar_venta, 0, 1)
         grid_layout.addWidget(self.btn_anadir_producto, 1, 0)
         grid_layout.addWidget(self.btn_quitar_producto, 1, 1)
-        grid_layout.addWidget(self.btn_cobrar, 2, 0, 1, 2)
+        grid_layout.addWidget(self.btn_aparcar, 2, 0)
+        grid_layout.addWidget(self.btn_reanudar, 2, 1)
+        grid_layout.addWidget(self.btn_cobrar, 3, 0, 1, 2)
         return grupo
 
     def _iniciar_nueva_venta(self):
@@ -116,19 +135,16 @@ class VentasWidget(QWidget):
     def _refrescar_carrito(self):
         self.tabla_carrito.setRowCount(0)
         if not self.current_venta or not self.current_venta.detalles: return
-        detalles_ordenados = sorted(self.current_venta.detalles, key=lambda d: d.id if d.id is not None else -1)
-        self.tabla_carrito.setRowCount(len(detalles_ordenados))
-        for row, detalle in enumerate(detalles_ordenados):
-            p = detalle.producto
-            nombre_variante = " / ".join(v.valor for v in p.valores)
-            nombre_display = f"{p.plantilla.nombre} ({nombre_variante})" if nombre_variante else p.plantilla.nombre
-            item_sku = QTableWidgetItem(p.sku)
-            item_sku.setData(Qt.ItemDataRole.UserRole, detalle.id)
+        lineas = self.current_venta.detalles
+        self.tabla_carrito.setRowCount(len(lineas))
+        for row, linea in enumerate(lineas):
+            item_sku = QTableWidgetItem(linea.sku)
+            item_sku.setData(Qt.ItemDataRole.UserRole, linea.producto_id)
             self.tabla_carrito.setItem(row, 0, item_sku)
-            self.tabla_carrito.setItem(row, 1, QTableWidgetItem(nombre_display))
-            self.tabla_carrito.setItem(row, 2, QTableWidgetItem(str(detalle.cantidad)))
-            self.tabla_carrito.setItem(row, 3, QTableWidgetItem(f"${detalle.precio_unitario:,.2f}"))
-            self.tabla_carrito.setItem(row, 4, QTableWidgetItem(f"${detalle.subtotal_linea:,.2f}"))
+            self.tabla_carrito.setItem(row, 1, QTableWidgetItem(linea.descripcion))
+            self.tabla_carrito.setItem(row, 2, QTableWidgetItem(str(linea.cantidad)))
+            self.tabla_carrito.setItem(row, 3, QTableWidgetItem(f"${linea.precio_unitario:,.2f}"))
+            self.tabla_carrito.setItem(row, 4, QTableWidgetItem(f"${linea.subtotal_linea:,.2f}"))
 
     def _refrescar_totales(self):
         if self.current_venta:
@@ -146,6 +162,7 @@ class VentasWidget(QWidget):
         self.btn_cancelar_venta.setEnabled(hay_transaccion_activa)
         hay_items = hay_transaccion_activa and len(self.current_venta.detalles) > 0
         self.btn_quitar_producto.setEnabled(hay_items)
+        self.btn_aparcar.setEnabled(hay_items)
         self.btn_cobrar.setEnabled(hay_items)
 
     def _abrir_dialogo_seleccion_producto(self):
@@ -164,15 +181,46 @@ class VentasWidget(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "Error", str(e))
 
+    def _precargar_indice_codigos(self):
+        """Carga el índice de códigos en segundo plano para que el primer escaneo no espere a leer todas las variantes."""
+        indice = indice_codigos.indice_para(self.producto_controller.db)
+        if indice.cargado(): return
+        engine = self.producto_controller.db.get_bind()
+
+        def cargar(progreso, cancelado):
+            with engine.connect() as conexion:
+                return indice.cargar(conexion)
+
+        self.tarea_indice = TareaSegundoPlano(cargar)
+        self.tarea_indice.senales.terminada.connect(lambda total: print(f"🏷️ Índice de códigos cargado: {total} códigos."))
+        self.tarea_indice.iniciar()
+
+    def _escanear_codigo(self):
+        codigo = self.input_escaneo.text().strip()
+        self.input_escaneo.clear()
+        if not codigo: return
+        if not self.current_venta:
+            self.current_venta = self.ventas_controller.crear_nueva_venta(self.usuario_logueado.id)
+        try:
+            self.current_venta = self.ventas_controller.escanear_item(self.current_venta, codigo)
+        except ValueError as e:
+            # Sin diálogo: el cajero sigue escaneando y ve el error junto al campo.
+            QApplication.beep()
+            self.label_escaneo.setText(f"❌ {e}")
+            self.actualizar_vista()
+            return
+        self.label_escaneo.setText(f"✅ {codigo}")
+        self.actualizar_vista()
+
     def _quitar_producto_del_carrito(self):
         selected_items = self.tabla_carrito.selectedItems()
         if not selected_items:
             QMessageBox.warning(self, "Selección Requerida", "Selecciona un producto del carrito para quitarlo.")
             return
-        detalle_id = selected_items[0].data(Qt.ItemDataRole.UserRole)
-        if not detalle_id: return
+        producto_id = selected_items[0].data(Qt.ItemDataRole.UserRole)
+        if not producto_id: return
         try:
-            self.current_venta = self.ventas_controller.quitar_item(self.current_venta, detalle_id)
+            self.current_venta = self.ventas_controller.quitar_item(self.current_venta, producto_id)
             self.actualizar_vista()
         except Exception as e:
             QMessageBox.critical(self, "Error", str(e))
@@ -185,6 +233,31 @@ class VentasWidget(QWidget):
                 self.current_venta = None
                 self.actualizar_vista()
 
+    def _aparcar_venta_actual(self):
+        if not self.current_venta: return
+        try:
+            venta = self.ventas_controller.aparcar_venta(self.current_venta)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", str(e))
+            return
+        self.current_venta = None
+        self.label_escaneo.setText(f"⏸️ Venta #{venta.id} en espera")
+        self.actualizar_vista()
+
+    def _reanudar_venta(self):
+        en_espera = self.ventas_controller.listar_ventas_en_espera(self.usuario_logueado.id)
+        if not en_espera:
+            QMessageBox.information(self, "Reanudar Venta", "No hay ventas en espera.")
+            return
+        opciones = [f"#{v.id} - {len(v.detalles)} productos - ${v.total:,.2f}" for v in en_espera]
+        opcion, ok = QInputDialog.getItem(self, "Reanudar Venta", "Venta en espera:", opciones, 0, False)
+        if not ok: return
+        try:
+            self.current_venta = self.ventas_controller.reanudar_venta(en_espera[opciones.index(opcion)].id, self.usuario_logueado.id)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", str(e))
+        self.actualizar_vista()
+
     def _finalizar_venta(self):
         if self.current_venta:
             total = self.current_venta.total
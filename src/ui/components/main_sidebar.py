@@ -16,9 +16,6 @@ class MainSidebar(QWidget):
         self.setFixedWidth(240)
 
         self._setup_ui()
-        
-        if self.stack:
-            self.stack.currentChanged.connect(self.on_view_changed)
 
     def _setup_ui(self):
         layout = QVBoxLayout(self)
@@ -37,13 +34,3 @@ class MainSidebar(QWidget):
             layout.addWidget(button)
             
         layout.addSpacerItem(QSpacerItem(20, 40, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding))
-
-    def on_view_changed(self, index: int):
-        """
-        Cada vez que el usuario cambia de módulo, llama al método 'actualizar_vista' del widget
-        correspondiente si este existe.
-        """
-        widget_actual = self.stack.widget(index)
-        if hasattr(widget_actual, 'actualizar_vista'):
-            print(f"Refrescando vista para: {widget_actual.__class__.__name__}")
-            widget_actual.actualizar_vista()
\ No newline at end of file
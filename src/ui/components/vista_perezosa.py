@@ -0,0 +1,43 @@
+# src/ui/components/vista_perezosa.py
+
+import time
+from typing import Callable, Optional
+
+from PySide6.QtWidgets import QWidget, QVBoxLayout
+from PySide6.QtCore import Signal
+
+
+class VistaPerezosa(QWidget):
+    """
+    Hueco del QStackedWidget para la vista de un módulo. La vista real (y las
+    consultas que hace al crearse) se construye la primera vez que se muestra
+    o se precalienta, no al iniciar sesión.
+    """
+    construida = Signal(str, float)  # nombre del módulo, milisegundos
+
+    def __init__(self, nombre: str, fabrica: Callable[[], QWidget], parent=None):
+        super().__init__(parent)
+        self.nombre = nombre
+        self._fabrica = fabrica
+        self._vista: Optional[QWidget] = None
+
+        self._layout = QVBoxLayout(self)
+        self._layout.setContentsMargins(0, 0, 0, 0)
+
+    @property
+    def vista(self) -> Optional[QWidget]:
+        return self._vista
+
+    def esta_construida(self) -> bool:
+        return self._vista is not None
+
+    def construir(self) -> QWidget:
+        """Crea la vista si aún no existe y la devuelve."""
+        if self._vista is None:
+            inicio = time.perf_counter()
+            self._vista = self._fabrica()
+            self._layout.addWidget(self._vista)
+            ms = (time.perf_counter() - inicio) * 1000
+            print(f"🧩 Vista '{self.nombre}' construida en {ms:.0f} ms")
+            self.construida.emit(self.nombre, ms)
+        return self._vista
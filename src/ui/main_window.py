@@ -1,7 +1,15 @@
 # src/ui/main_window.py
+import time
+from typing import Dict
+
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QStackedWidget
+from PySide6.QtCore import QTimer, Signal
 from sqlalchemy.orm import Session as SQLAlchemySession
 
+from core.config import cargar_seccion_config
+from core.busqueda import fabrica_sesiones_para
+from core.tareas import TareaSegundoPlano
+
 from modules.categorias.categoria_controller import CategoriaController
 from modules.roles.roles_controller import RolesController
 from modules.usuarios.usuarios_controller import UsuariosController
@@ -38,14 +46,31 @@ from modules.variantes.variantes_ui import VariantesWidget
 from ui.components.main_sidebar import MainSidebar
 from ui.components.main_header import MainHeader
 from ui.components.main_content import MainContent
+from ui.components.vista_perezosa import VistaPerezosa
+
+# Módulos más usados que se construyen en los ratos libres tras el login (si el
+# usuario tiene permiso). Configurable en config.json: "interfaz"."precalentar_modulos".
+MODULOS_PRECALENTAR = ["ventas", "productos", "dashboard"]
+# Espera tras mostrar la ventana antes de precalentar y entre una vista y la siguiente.
+RETARDO_PRECALENTAMIENTO_MS = 300
 
 class MainWindow(QWidget):
+    # Milisegundos desde el login hasta que la ventana está pintada y atiende eventos.
+    interactiva = Signal(float)
+
     def __init__(self, usuario, db_session: SQLAlchemySession):
         super().__init__()
+        self._inicio = time.perf_counter()
+        self.tiempo_hasta_interactivo_ms = None
         self.usuario = usuario
         self.setWindowTitle("S.I.B.O.R.S. - Sistema Integral de Operaciones")
         self.db_session = db_session
-        
+
+        config = cargar_seccion_config("interfaz")
+        self.modulos_precalentar = list(config.get("precalentar_modulos", MODULOS_PRECALENTAR))
+        self.retardo_precalentamiento_ms = int(config.get("retardo_precalentamiento_ms", RETARDO_PRECALENTAMIENTO_MS))
+        self._pendientes_precalentar = []
+
         self._inicializar_controladores()
         self._setup_ui()
         
@@ -60,6 +85,7 @@ class MainWindow(QWidget):
         self.variantes_ctrl = VariantesController(self.db_session)
         self.contabilidad_ctrl = ContabilidadController(self.db_session)
         self.ventas_ctrl = VentasController(self.db_session, self.producto_ctrl, self.contabilidad_ctrl, self.cliente_ctrl)
+        self.ventas_ctrl.recuperar_carritos()
         self.compra_ctrl = CompraController(self.db_session, self.producto_ctrl, self.contabilidad_ctrl)
         self.dashboard_ctrl = DashboardController(self.contabilidad_ctrl, self.ventas_ctrl, self.producto_ctrl)
         self.empresa_ctrl = EmpresaController(self.db_session)
@@ -75,8 +101,9 @@ class MainWindow(QWidget):
         self.stack = self.content_area.get_stack()
         
         self.vistas_permitidas = []
-        self.vistas_creadas = {}
-        
+        self.vistas: Dict[str, VistaPerezosa] = {}
+
+        # Único punto que construye y refresca las vistas al navegar.
         self.stack.currentChanged.connect(self._on_view_changed)
 
         self._crear_vistas_modulos()
@@ -115,13 +142,14 @@ class MainWindow(QWidget):
             "perfil": {"label": "👤 Mi Perfil", "creator": lambda: PerfilWidget(self.perfil_ctrl, self.usuario)},
         }
         
+        # Solo se registran las fábricas: cada vista se construye al visitarla o al precalentarla.
         for nombre_permiso in MODULOS_DISPONIBLES:
             if nombre_permiso in permisos_usuario and nombre_permiso in modulos_config:
                 config = modulos_config[nombre_permiso]
-                if nombre_permiso not in self.vistas_creadas:
-                    vista_widget = config["creator"]()
-                    self.vistas_creadas[nombre_permiso] = {"widget": vista_widget, "nombre": nombre_permiso}
-                    index = self.stack.addWidget(vista_widget)
+                if nombre_permiso not in self.vistas:
+                    contenedor = VistaPerezosa(nombre_permiso, config["creator"])
+                    self.vistas[nombre_permiso] = contenedor
+                    index = self.stack.addWidget(contenedor)
                     self.vistas_permitidas.append((config["label"], "", index, nombre_permiso))
 
     def cambiar_vista_a(self, nombre_modulo: str):
@@ -131,16 +159,11 @@ class MainWindow(QWidget):
                 return
 
     def _on_view_changed(self, index):
-        widget_actual_info = None
-        for info in self.vistas_creadas.values():
-            if self.stack.widget(index) == info["widget"]:
-                widget_actual_info = info
-                break
-        
-        if widget_actual_info:
-            nombre_modulo = widget_actual_info["nombre"]
-            widget = widget_actual_info["widget"]
-            
+        contenedor = self.stack.widget(index)
+        if isinstance(contenedor, VistaPerezosa):
+            nombre_modulo = contenedor.nombre
+            widget = contenedor.construir()
+
             if hasattr(widget, 'reset_view'):
                 print(f"INFO: Reseteando vista para el módulo '{nombre_modulo}'.")
                 widget.reset_view()
@@ -148,6 +171,48 @@ class MainWindow(QWidget):
                 print(f"INFO: Actualizando vista para el módulo '{nombre_modulo}'.")
                 widget.actualizar_vista()
 
+    # --- Tiempo hasta interactivo y precalentamiento ---
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.tiempo_hasta_interactivo_ms is None:
+            # El temporizador a 0 ms se atiende cuando el bucle de eventos ya procesó el primer pintado.
+            QTimer.singleShot(0, self._marcar_interactiva)
+
+    def _marcar_interactiva(self):
+        if self.tiempo_hasta_interactivo_ms is not None:
+            return
+        self.tiempo_hasta_interactivo_ms = (time.perf_counter() - self._inicio) * 1000
+        print(f"⏱️ Ventana principal interactiva {self.tiempo_hasta_interactivo_ms:.0f} ms después del login.")
+        self.interactiva.emit(self.tiempo_hasta_interactivo_ms)
+
+        self._pendientes_precalentar = [self.vistas[nombre] for nombre in self.modulos_precalentar if nombre in self.vistas]
+        if self._pendientes_precalentar:
+            QTimer.singleShot(self.retardo_precalentamiento_ms, self._precalentar_siguiente)
+        self._asegurar_cortes_stock()
+
+    def _asegurar_cortes_stock(self):
+        """Crea en segundo plano, con su propia sesión, los cortes de stock periódicos que falten."""
+        fabrica = fabrica_sesiones_para(self.db_session)
+
+        def asegurar(_progreso, _cancelado):
+            with fabrica() as sesion:
+                return len(ProductoController(sesion).asegurar_cortes_stock())
+
+        self.tarea_cortes_stock = TareaSegundoPlano(asegurar)
+        self.tarea_cortes_stock.iniciar()
+
+    def _precalentar_siguiente(self):
+        """Construye una vista pendiente por turno del bucle de eventos, para no bloquear la interfaz."""
+        while self._pendientes_precalentar:
+            contenedor = self._pendientes_precalentar.pop(0)
+            if not contenedor.esta_construida():
+                contenedor.construir()
+                break
+        if self._pendientes_precalentar:
+            QTimer.singleShot(self.retardo_precalentamiento_ms, self._precalentar_siguiente)
+
     def closeEvent(self, event):
         print("INFO: MainWindow cerrándose.")
+        self._pendientes_precalentar = []
         super().closeEvent(event)
\ No newline at end of file
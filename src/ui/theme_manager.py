@@ -60,8 +60,14 @@ class ThemeManager:
     def save_theme_preference(self):
         """Guarda el tema seleccionado en un archivo de configuración."""
         try:
+            # Conservamos las demás secciones (p. ej. "db") del archivo de configuración.
+            config = {}
+            if os.path.exists(self.CONFIG_FILE):
+                with open(self.CONFIG_FILE, 'r') as f:
+                    config = json.load(f)
+            config["theme"] = self.current_theme
             with open(self.CONFIG_FILE, 'w') as f:
-                json.dump({"theme": self.current_theme}, f)
+                json.dump(config, f)
         except Exception as e:
             print(f"Error al guardar la preferencia de tema: {e}")
 
@@ -1,23 +1,71 @@
 # src/utils/excel_reporter.py
 
+import os
+import itertools
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 
-def generar_reporte_excel(ruta_archivo: str, titulo: str, headers: list, data: list):
+from core.tareas import TareaCancelada
+
+# Filas que admite una hoja de Excel; las dos primeras son el título y el encabezado.
+MAX_FILAS_HOJA = 1_048_576
+# Filas que se miran para estimar el ancho de cada columna.
+FILAS_MUESTRA_ANCHO = 500
+# Límites del ancho estimado, en caracteres.
+ANCHO_MINIMO, ANCHO_MAXIMO = 8, 60
+# Cada cuántas filas se informa el progreso y se comprueba la cancelación.
+FILAS_POR_AVISO = 5000
+
+FORMATO_MONEDA = '"$"#,##0.00'
+
+
+def _texto_celda(valor) -> str:
+    if isinstance(valor, float):
+        return f"{valor:,.2f}"
+    return "" if valor is None else str(valor)
+
+
+def estimar_anchos(headers: Sequence[str], muestra: List[Sequence]) -> List[float]:
+    """Ancho de cada columna según el texto más largo del encabezado y de la muestra."""
+    anchos = []
+    for columna, header in enumerate(headers):
+        mas_largo = max([len(str(header))] + [len(_texto_celda(fila[columna])) for fila in muestra if columna < len(fila)])
+        anchos.append(min(max(mas_largo + 2, ANCHO_MINIMO), ANCHO_MAXIMO))
+    return anchos
+
+
+def generar_reporte_excel(ruta_archivo: str, titulo: str, headers: list, data: Iterable[Sequence],
+                          columnas_moneda: Sequence[int] = (), total_filas: Optional[int] = None,
+                          progreso: Optional[Callable[[int, int], None]] = None,
+                          cancelado: Optional[Callable[[], bool]] = None,
+                          filas_por_hoja: int = MAX_FILAS_HOJA - 2) -> Dict[str, int]:
     """
-    Genera un reporte en formato .xlsx.
+    Genera un reporte en formato .xlsx escribiendo las filas en flujo.
+
+    Usa hojas de solo escritura de openpyxl: cada fila se serializa al disco al
+    añadirla, así que la memoria no crece con el número de filas. Si los datos
+    no caben en una hoja se continúa en "Reporte (2)", "Reporte (3)"...
 
     Args:
         ruta_archivo (str): Ruta completa donde se guardará el archivo.
-        titulo (str): El título que aparecerá en la primera fila.
+        titulo (str): El título que aparecerá en la primera fila de cada hoja.
         headers (list): Una lista con los nombres de las columnas.
-        data (list): Una lista de listas, donde cada lista interna es una fila de datos.
+        data (iterable): Filas de datos (listas); puede ser un generador y se recorre una sola vez.
+        columnas_moneda (list): Índices de las columnas con formato de importe.
+        total_filas (int, optional): Número de filas esperado, solo para informar el progreso.
+        progreso (callable, optional): Se llama con (filas_escritas, total_filas o 0).
+        cancelado (callable, optional): Si devuelve True se aborta, se borra el archivo y se lanza TareaCancelada.
+        filas_por_hoja (int): Filas de datos por hoja (por defecto, el máximo de Excel).
+
+    Returns:
+        dict: {"filas": filas escritas, "hojas": hojas creadas}
     """
-    # Crear un nuevo libro de trabajo y seleccionar la hoja activa
-    workbook = openpyxl.Workbook()
-    sheet = workbook.active
-    sheet.title = "Reporte"
+    workbook = openpyxl.Workbook(write_only=True)
+    columnas_moneda = set(columnas_moneda)
 
     # --- Estilos ---
     header_font = Font(bold=True, color="FFFFFF")
@@ -25,30 +73,80 @@ def generar_reporte_excel(ruta_archivo: str, titulo: str, headers: list, data: l
     center_align = Alignment(horizontal='center', vertical='center')
     thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
 
-    # --- Título del Reporte ---
-    sheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(headers))
-    title_cell = sheet.cell(row=1, column=1, value=titulo)
-    title_cell.font = Font(bold=True, size=16)
-    title_cell.alignment = center_align
-
-    # --- Encabezados de la Tabla ---
-    sheet.append(headers) # Añade los encabezados en la siguiente fila disponible (fila 2)
-    for col_num, header_title in enumerate(headers, 1):
-        cell = sheet.cell(row=2, column=col_num)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = center_align
-        cell.border = thin_border
+    # --- Ancho de columnas a partir de una muestra (las hojas de solo escritura no admiten autosize) ---
+    filas = iter(data)
+    muestra = list(itertools.islice(filas, FILAS_MUESTRA_ANCHO))
+    anchos = estimar_anchos(headers, muestra)
+    filas = itertools.chain(muestra, filas)
+
+    def nueva_hoja(numero: int):
+        sheet = workbook.create_sheet("Reporte" if numero == 1 else f"Reporte ({numero})")
+        for col_num, ancho in enumerate(anchos, 1):
+            sheet.column_dimensions[get_column_letter(col_num)].width = ancho
+        sheet.freeze_panes = "A3"
+
+        # --- Título del Reporte ---
+        title_cell = WriteOnlyCell(sheet, value=titulo)
+        title_cell.font = Font(bold=True, size=16)
+        title_cell.alignment = center_align
+        sheet.append([title_cell])
+        sheet.merged_cells.add(f"A1:{get_column_letter(len(headers))}1")
+
+        # --- Encabezados de la Tabla ---
+        encabezado = []
+        for header_title in headers:
+            cell = WriteOnlyCell(sheet, value=header_title)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = center_align
+            cell.border = thin_border
+            encabezado.append(cell)
+        sheet.append(encabezado)
+        return sheet
+
+    def celda_moneda(sheet, valor):
+        cell = WriteOnlyCell(sheet, value=valor)
+        cell.number_format = FORMATO_MONEDA
+        return cell
 
     # --- Datos de la Tabla ---
-    for row_data in data:
-        sheet.append(row_data)
+    hojas, escritas = 1, 0
+    sheet = nueva_hoja(hojas)
+    try:
+        for row_data in filas:
+            if escritas and escritas % filas_por_hoja == 0:
+                hojas += 1
+                sheet = nueva_hoja(hojas)
+            if columnas_moneda:
+                row_data = [celda_moneda(sheet, v) if i in columnas_moneda else v for i, v in enumerate(row_data)]
+            sheet.append(row_data)
+            escritas += 1
+            if escritas % FILAS_POR_AVISO == 0:
+                if cancelado and cancelado():
+                    raise TareaCancelada()
+                if progreso:
+                    progreso(escritas, total_filas or 0)
+
+        # Guardar el libro de trabajo
+        workbook.save(ruta_archivo)
+    except BaseException:
+        _descartar_hojas(workbook)
+        if os.path.exists(ruta_archivo):
+            os.remove(ruta_archivo)
+        raise
+    if progreso:
+        progreso(escritas, total_filas or 0)
+    print(f"📄 Reporte Excel generado en: {ruta_archivo} ({escritas:,} filas, {hojas} hoja(s))")
+    return {"filas": escritas, "hojas": hojas}
 
-    # --- Ajuste de Ancho de Columnas ---
-    for col_num, _ in enumerate(headers, 1):
-        column_letter = get_column_letter(col_num)
-        sheet.column_dimensions[column_letter].autosize = True
 
-    # Guardar el libro de trabajo
-    workbook.save(ruta_archivo)
-    print(f"📄 Reporte Excel generado en: {ruta_archivo}")
\ No newline at end of file
+def _descartar_hojas(workbook) -> None:
+    """Cierra las hojas de solo escritura a medio escribir y borra sus archivos temporales."""
+    for sheet in workbook.worksheets:
+        try:
+            if not sheet.closed:
+                sheet.close()
+            if sheet._writer is not None and os.path.exists(sheet._writer.out):
+                sheet._writer.cleanup()
+        except Exception as e:
+            print(f"⚠️ No se pudo descartar la hoja '{sheet.title}': {e}")
@@ -1,66 +1,195 @@
 # src/utils/reporter.py
 
+import os
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence
+
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, LongTable, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from datetime import datetime
 
-def generar_reporte_ventas_pdf(ruta_archivo: str, ventas: list, datos_empresa: dict = None):
+from core.tareas import TareaCancelada
+
+# Filas de datos por tabla: lo que cabe aproximadamente en una página carta.
+FILAS_POR_BLOQUE = 40
+
+ESTILO_BLOQUE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+ESTILO_BLOQUE_CON_ACUMULADO = TableStyle(list(ESTILO_BLOQUE.getCommands()) + [
+    ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+])
+
+
+# Flowables que se piden al generador por adelantado: el que se maqueta y el siguiente.
+FLOWABLES_EN_ESPERA = 2
+
+
+class _DocumentoPorBloques(SimpleDocTemplate):
     """
-    Genera un reporte en PDF del historial de ventas.
+    SimpleDocTemplate que recibe los flowables de un generador. build() recorre
+    una lista normal y, tras cada handle_flowable (el punto de extensión público
+    de BaseDocTemplate), la rellenamos desde el generador. Así nunca hay en
+    memoria más de un par de bloques de la tabla.
+    """
+
+    def construir(self, generador: Iterator):
+        self._pendientes = generador
+        self._flowables: list = []
+        self._rellenar(self._flowables)
+        self.build(self._flowables)
+
+    def handle_flowable(self, flowables):
+        super().handle_flowable(flowables)
+        if flowables is self._flowables:  # reportlab también lo llama con sus listas internas
+            self._rellenar(flowables)
+
+    def _rellenar(self, flowables: list):
+        while len(flowables) < FLOWABLES_EN_ESPERA and self._pendientes is not None:
+            siguiente = next(self._pendientes, None)
+            if siguiente is None:
+                self._pendientes = None
+            else:
+                flowables.append(siguiente)
+
+
+def _formatear_celda(valor, es_moneda: bool) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M')
+    if es_moneda and isinstance(valor, (int, float)):
+        return f"${valor:,.2f}"
+    if isinstance(valor, float):
+        return f"{valor:,.2f}"
+    return str(valor)
+
+
+def escribir_reporte_pdf(ruta_archivo: str, titulo: str, headers: Sequence[str], filas: Iterable[Sequence],
+                         columnas_total: Sequence[int] = (), columnas_moneda: Sequence[int] = (),
+                         datos_empresa: dict = None, total_filas: Optional[int] = None,
+                         progreso: Optional[Callable[[int, int], None]] = None,
+                         cancelado: Optional[Callable[[], bool]] = None,
+                         filas_por_bloque: int = FILAS_POR_BLOQUE) -> Dict[str, int]:
+    """
+    Genera un reporte PDF tabular a partir de un iterador de filas, sin cargarlas todas.
+
+    Las filas se consumen en bloques de 'filas_por_bloque'; cada bloque es un
+    LongTable con el encabezado repetido y, si hay 'columnas_total', una fila con
+    los totales acumulados hasta ese punto. Al final se añade el total general.
 
     Args:
         ruta_archivo (str): La ruta completa donde se guardará el PDF.
-        ventas (list): Una lista de objetos de venta.
+        titulo (str): Título del reporte si no hay nombre de empresa.
+        headers (list): Nombres de las columnas.
+        filas (iterable): Filas de valores (números sin formatear en las columnas a totalizar).
+        columnas_total (list): Índices de las columnas que se suman.
+        columnas_moneda (list): Índices de las columnas que se muestran como importe.
         datos_empresa (dict, optional): Datos de la empresa para el encabezado.
+        total_filas (int, optional): Número de filas esperado, solo para informar el progreso.
+        progreso (callable, optional): Se llama con (filas_escritas, total_filas o 0) tras cada bloque.
+        cancelado (callable, optional): Si devuelve True se aborta, se borra el archivo y se lanza TareaCancelada.
+
+    Returns:
+        dict: {"filas": filas escritas, "paginas": páginas generadas}
     """
-    doc = SimpleDocTemplate(ruta_archivo, pagesize=letter)
-    story = []
     styles = getSampleStyleSheet()
+    columnas_moneda = set(columnas_moneda)
+    totales = {columna: 0.0 for columna in columnas_total}
+    escritas = 0
+
+    def generar_flowables():
+        nonlocal escritas
+        # --- Encabezado del Reporte ---
+        if datos_empresa and datos_empresa.get('nombre'):
+            yield Paragraph(datos_empresa['nombre'], styles['h1'])
+            yield Paragraph(titulo, styles['h2'])
+        else:
+            yield Paragraph(titulo, styles['h1'])
+        yield Paragraph(f"Fecha del reporte: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal'])
+        yield Spacer(1, 0.2 * inch)
+
+        # --- Tabla de Datos, por bloques ---
+        bloque = []
+        iterador = iter(filas)
+        while True:
+            fila = next(iterador, None)
+            if fila is not None:
+                for columna in totales:
+                    totales[columna] += fila[columna] or 0
+                bloque.append([_formatear_celda(v, i in columnas_moneda) for i, v in enumerate(fila)])
+            if bloque and (len(bloque) == filas_por_bloque or fila is None):
+                if cancelado and cancelado():
+                    raise TareaCancelada()
+                escritas += len(bloque)
+                yield _crear_bloque(headers, bloque, totales, columnas_moneda)
+                if progreso:
+                    progreso(escritas, total_filas or 0)
+                bloque = []
+            if fila is None:
+                break
+
+        # --- Pie con los totales ---
+        yield Spacer(1, 0.2 * inch)
+        yield Paragraph(f"<b>Total de registros:</b> {escritas:,}", styles['h3'])
+        for columna, total in totales.items():
+            yield Paragraph(f"<b>Total {headers[columna]}:</b> {_formatear_celda(total, columna in columnas_moneda)}", styles['h3'])
+
+    doc = _DocumentoPorBloques(ruta_archivo, pagesize=letter)
+    try:
+        doc.construir(generar_flowables())
+    except BaseException:
+        if os.path.exists(ruta_archivo):
+            os.remove(ruta_archivo)
+        raise
+    print(f"📄 Reporte PDF generado en: {ruta_archivo} ({escritas:,} filas, {doc.page} páginas)")
+    return {"filas": escritas, "paginas": doc.page}
 
-    # --- Encabezado del Reporte ---
-    if datos_empresa and datos_empresa.get('nombre'):
-        story.append(Paragraph(datos_empresa['nombre'], styles['h1']))
-    else:
-        story.append(Paragraph("Reporte de Ventas", styles['h1']))
 
-    fecha_reporte = f"Fecha del reporte: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    story.append(Paragraph(fecha_reporte, styles['Normal']))
-    story.append(Spacer(1, 0.2 * inch))
+def _crear_bloque(headers: Sequence[str], bloque: list, totales: Dict[int, float], columnas_moneda: set) -> LongTable:
+    datos = [list(headers)] + bloque
+    if totales:
+        acumulado = [""] * len(headers)
+        acumulado[0] = "Acumulado"
+        for columna, total in totales.items():
+            acumulado[columna] = _formatear_celda(total, columna in columnas_moneda)
+        datos.append(acumulado)
+    tabla = LongTable(datos, repeatRows=1)
+    tabla.setStyle(ESTILO_BLOQUE_CON_ACUMULADO if totales else ESTILO_BLOQUE)
+    return tabla
 
-    # --- Tabla de Datos ---
-    datos_tabla = [["ID", "Fecha", "Producto", "Cant.", "Precio Unit.", "Total"]]
-    total_general = 0.0
 
-    for venta in ventas:
-        total_general += venta.total_venta
-        datos_tabla.append([
+def generar_reporte_ventas_pdf(ruta_archivo: str, ventas: Iterable, datos_empresa: dict = None, **opciones) -> Dict[str, int]:
+    """
+    Genera un reporte en PDF del historial de ventas.
+
+    Args:
+        ruta_archivo (str): La ruta completa donde se guardará el PDF.
+        ventas (iterable): Objetos de venta; se recorren una sola vez.
+        datos_empresa (dict, optional): Datos de la empresa para el encabezado.
+        **opciones: progreso, cancelado, total_filas... (ver escribir_reporte_pdf).
+    """
+    filas = (
+        [
             str(venta.id),
-            venta.fecha_venta.strftime('%Y-%m-%d %H:%M'),
+            venta.fecha_venta,
             venta.producto.nombre if venta.producto else "N/A",
             str(venta.cantidad),
-            f"${venta.precio_unitario_venta:,.2f}",
-            f"${venta.total_venta:,.2f}"
-        ])
-
-    tabla = Table(datos_tabla)
-    estilo_tabla = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ])
-    tabla.setStyle(estilo_tabla)
-    story.append(tabla)
-    story.append(Spacer(1, 0.2 * inch))
-
-    # --- Pie de página con el total ---
-    story.append(Paragraph(f"<b>Total General de Ventas:</b> ${total_general:,.2f}", styles['h3']))
-
-    # Construir el PDF
-    doc.build(story)
\ No newline at end of file
+            venta.precio_unitario_venta,
+            venta.total_venta,
+        ]
+        for venta in ventas
+    )
+    return escribir_reporte_pdf(
+        ruta_archivo, "Reporte de Ventas", ["ID", "Fecha", "Producto", "Cant.", "Precio Unit.", "Total"], filas,
+        columnas_total=[5], columnas_moneda=[4, 5], datos_empresa=datos_empresa, **opciones
+    )
@@ -46,7 +46,8 @@ def db_session(engine, tables) -> Generator[Session, None, None]:
     connection = engine.connect()
     transaction = connection.begin()
     
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=connection)
+    # create_savepoint: los rollback() de los controladores solo deshacen su propio trabajo.
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=connection, join_transaction_mode="create_savepoint")
     session = SessionLocal()
     
     yield session
@@ -0,0 +1,79 @@
+# tests/test_busqueda.py
+
+import time
+import pytest
+from PySide6.QtCore import QCoreApplication, QElapsedTimer
+
+from core.busqueda import ControladorBusqueda
+
+
+class SesionFalsa:
+    def __init__(self, registro):
+        self.registro = registro
+
+    def close(self):
+        self.registro.append("cerrada")
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def procesar_eventos_hasta(condicion, timeout_ms=3000):
+    reloj = QElapsedTimer()
+    reloj.start()
+    while not condicion() and reloj.elapsed() < timeout_ms:
+        QCoreApplication.processEvents()
+        time.sleep(0.005)
+    return condicion()
+
+
+def test_debounce_agrupa_las_pulsaciones(app):
+    consultas, sesiones, recibidos = [], [], []
+    def buscar(sesion, texto):
+        consultas.append(texto)
+        return texto.upper()
+
+    controlador = ControladorBusqueda(buscar, lambda: SesionFalsa(sesiones), retardo_ms=50)
+    controlador.resultados_listos.connect(lambda resultado, latencia: recibidos.append((resultado, latencia)))
+    for texto in ["c", "ca", "cam", "cami"]:
+        controlador.solicitar(texto)
+
+    assert procesar_eventos_hasta(lambda: recibidos)
+    assert consultas == ["cami"]
+    assert recibidos[0][0] == "CAMI" and recibidos[0][1] >= 0
+    assert sesiones == ["cerrada"]
+    assert controlador.ultima_latencia_ms is not None
+
+
+def test_descarta_resultados_de_busquedas_reemplazadas(app):
+    recibidos = []
+    def buscar(sesion, texto):
+        if texto == "lenta":
+            time.sleep(0.2)
+        return texto
+
+    controlador = ControladorBusqueda(buscar, lambda: SesionFalsa([]), retardo_ms=0)
+    controlador.resultados_listos.connect(lambda resultado, _: recibidos.append(resultado))
+    controlador.buscar_ahora("lenta")
+    time.sleep(0.05)  # La consulta lenta ya está en marcha
+    controlador.buscar_ahora("rapida")
+
+    assert procesar_eventos_hasta(lambda: recibidos)
+    controlador.esperar()
+    QCoreApplication.processEvents()
+    assert recibidos == ["rapida"]
+
+
+def test_errores_se_notifican(app):
+    errores = []
+    def buscar(sesion, texto):
+        raise RuntimeError("base de datos bloqueada")
+
+    controlador = ControladorBusqueda(buscar, lambda: SesionFalsa([]))
+    controlador.busqueda_fallida.connect(errores.append)
+    controlador.buscar_ahora("x")
+
+    assert procesar_eventos_hasta(lambda: errores)
+    assert "bloqueada" in errores[0]
@@ -0,0 +1,69 @@
+# tests/test_categoria_controller.py
+
+import pytest
+from sqlalchemy.orm import Session
+from modules.categorias.categoria_controller import CategoriaController
+from modules.categorias.categoria_model import CategoriaJerarquia
+from modules.productos.plantilla_controller import PlantillaController
+from modules.productos.producto_controller import ProductoController
+from modules.usuarios.usuarios_model import Usuario
+
+@pytest.fixture
+def arbol(db_session: Session):
+    """Crea el árbol Ropa > Hombre > Camisas y la raíz independiente Hogar."""
+    ctrl = CategoriaController(db_session)
+    ropa = ctrl.crear_categoria("Ropa")
+    hombre = ctrl.crear_categoria("Hombre", padre_id=ropa.id)
+    camisas = ctrl.crear_categoria("Camisas", padre_id=hombre.id)
+    hogar = ctrl.crear_categoria("Hogar")
+    return ctrl, ropa, hombre, camisas, hogar
+
+def test_subarbol_y_ruta(arbol):
+    ctrl, ropa, hombre, camisas, hogar = arbol
+    assert sorted(ctrl.obtener_ids_subarbol(ropa.id)) == sorted([ropa.id, hombre.id, camisas.id])
+    assert ctrl.obtener_ruta_categoria(camisas.id) == "Ropa / Hombre / Camisas"
+    assert ctrl.es_descendiente(camisas.id, ropa.id)
+    assert not ctrl.es_descendiente(ropa.id, camisas.id)
+
+def test_mover_categoria_a_descendiente_falla(arbol):
+    ctrl, ropa, hombre, camisas, hogar = arbol
+    with pytest.raises(ValueError, match="propias subcategorías"):
+        ctrl.actualizar_categoria(ropa.id, padre_id=camisas.id)
+
+def test_mover_subarbol_actualiza_jerarquia(arbol):
+    ctrl, ropa, hombre, camisas, hogar = arbol
+    ctrl.actualizar_categoria(hombre.id, padre_id=hogar.id)
+
+    assert ctrl.obtener_ruta_categoria(camisas.id) == "Hogar / Hombre / Camisas"
+    assert sorted(ctrl.obtener_ids_subarbol(ropa.id)) == [ropa.id]
+    assert sorted(ctrl.obtener_ids_subarbol(hogar.id)) == sorted([hogar.id, hombre.id, camisas.id])
+
+    # Mover a la raíz elimina los enlaces con los ancestros anteriores
+    ctrl.actualizar_categoria(hombre.id, padre_id=None)
+    assert ctrl.obtener_ruta_categoria(camisas.id) == "Hombre / Camisas"
+    assert not ctrl.jerarquia_desincronizada()
+
+def test_reconstruir_jerarquia(db_session: Session, arbol):
+    ctrl, ropa, hombre, camisas, hogar = arbol
+    filas_originales = {(f.ancestro_id, f.descendiente_id, f.profundidad) for f in db_session.query(CategoriaJerarquia)}
+    db_session.query(CategoriaJerarquia).delete()
+    assert ctrl.jerarquia_desincronizada()
+
+    assert ctrl.reconstruir_jerarquia() == len(filas_originales)
+    assert {(f.ancestro_id, f.descendiente_id, f.profundidad) for f in db_session.query(CategoriaJerarquia)} == filas_originales
+
+def test_filtros_por_subarbol_en_productos(db_session: Session, test_usuario: Usuario, arbol):
+    ctrl, ropa, hombre, camisas, hogar = arbol
+    plantilla_ctrl = PlantillaController(db_session)
+    plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Camisa Oxford", "categoria_id": camisas.id}, [{"sku": "OXF-01", "precio_venta": 30.0}], test_usuario.id)
+    plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Cojin", "categoria_id": hogar.id}, [{"sku": "COJ-01", "precio_venta": 8.0}], test_usuario.id)
+
+    assert [p.nombre for p in plantilla_ctrl.listar_plantillas(categoria_id=ropa.id)] == ["Camisa Oxford"]
+    assert [p.sku for p in ProductoController(db_session).listar_todas_las_variantes(categoria_id=hogar.id)] == ["COJ-01"]
+    assert plantilla_ctrl.get_ids_de_categorias_relevantes() == {ropa.id, hombre.id, camisas.id, hogar.id}
+
+def test_buscar_ids_visibles_incluye_ancestros(arbol):
+    ctrl, ropa, hombre, camisas, hogar = arbol
+    assert ctrl.buscar_ids_visibles("camis") == {ropa.id, hombre.id, camisas.id}
+    assert ctrl.buscar_ids_visibles("HOG") == {hogar.id}
+    assert ctrl.buscar_ids_visibles("inexistente") == set()
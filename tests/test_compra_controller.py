@@ -9,7 +9,7 @@ from modules.contabilidad.contabilidad_controller import ContabilidadController
 from modules.proveedores.proveedor_controller import ProveedorController
 from modules.compras.compra_model import EstadoOrdenCompra
 from modules.contabilidad.contabilidad_model import MovimientoContable, TipoMovimiento
-from modules.productos.models import Producto, TipoAjusteStock
+from modules.productos.models import Producto, TipoAjusteStock, CapaCosto
 from modules.usuarios.usuarios_model import Usuario
 
 @pytest.fixture
@@ -84,4 +84,27 @@ def test_listar_ordenes_compra(setup_controllers, test_usuario: Usuario):
 
     detalles = [{"producto_id": producto1_id, "cantidad": 1, "costo_unitario": 200.0}]
     compra_ctrl.crear_orden_compra(proveedor_id=proveedor.id, detalles_data=detalles)
-    assert len(compra_ctrl.listar_ordenes_compra()) == 1
\ No newline at end of file
+    assert len(compra_ctrl.listar_ordenes_compra()) == 1
+
+def test_recepcion_actualiza_costo_medio_y_capas(setup_controllers, test_usuario: Usuario):
+    compra_ctrl, producto_ctrl, plantilla_ctrl, _, proveedor_ctrl = setup_controllers
+    proveedor = proveedor_ctrl.agregar_proveedor({"nombre_empresa": "ProveeTech", "email": "contact@proveetech.com"})
+    plantilla = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Toner"}, [{"sku": "TON-1", "precio_venta": 30.0, "costo_compra": 10.0}], test_usuario.id)
+    producto_id = plantilla.variantes[0].id
+
+    primera = compra_ctrl.crear_orden_compra(proveedor_id=proveedor.id, detalles_data=[{"producto_id": producto_id, "cantidad": 10, "costo_unitario": 10.0}])
+    compra_ctrl.marcar_orden_como_recibida(primera.id, test_usuario.id)
+    # Dos líneas del mismo producto: entra a su costo medio (4 x 14 + 6 x 17 = 158 -> 15.8)
+    segunda = compra_ctrl.crear_orden_compra(proveedor_id=proveedor.id, detalles_data=[
+        {"producto_id": producto_id, "cantidad": 4, "costo_unitario": 14.0},
+        {"producto_id": producto_id, "cantidad": 6, "costo_unitario": 17.0},
+    ])
+    compra_ctrl.marcar_orden_como_recibida(segunda.id, test_usuario.id)
+
+    producto = producto_ctrl.db.get(Producto, producto_id)
+    assert producto.stock == 20
+    assert producto.costo_promedio == pytest.approx(12.9)
+    assert producto.costo_compra == 10.0  # el costo de referencia no se sobrescribe
+    capas = producto_ctrl.db.query(CapaCosto).filter_by(producto_id=producto_id).order_by(CapaCosto.id).all()
+    assert [(c.cantidad_restante, c.costo_unitario) for c in capas] == [(10, 10.0), (10, pytest.approx(15.8))]
+    assert sorted(m.costo_unitario for m in producto.historial_stock) == [10.0, pytest.approx(15.8)]
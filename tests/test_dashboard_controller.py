@@ -3,6 +3,14 @@
 import pytest
 from unittest.mock import Mock
 from modules.dashboard.dashboard_controller import DashboardController
+from modules.dashboard.kpi_service import ServicioKPI
+from modules.ventas.ventas_controller import VentasController
+from modules.ventas.carrito import AlmacenCarritos
+from modules.productos.producto_controller import ProductoController
+from modules.productos.plantilla_controller import PlantillaController
+from modules.contabilidad.contabilidad_controller import ContabilidadController
+from modules.clientes.cliente_controller import ClienteController
+from modules.productos.models import Producto
 
 def test_obtener_kpis_principales_con_mocks():
     mock_contabilidad = Mock()
@@ -10,21 +18,16 @@ def test_obtener_kpis_principales_con_mocks():
     # --- INICIO DE LA CORRECCIÓN ---
     # Cambiamos el nombre del mock para que coincida con el nuevo controlador
     mock_producto = Mock()
-
-    mock_contabilidad.obtener_resumen.return_value = {"total_ingresos": 5000.0}
-    mock_ventas.listar_ventas.return_value = [Mock(), Mock(), Mock()]
-
-    producto_mock_1 = Mock()
-    producto_mock_1.stock = 10
-    producto_mock_2 = Mock()
-    producto_mock_2.stock = 25
-    mock_producto.listar_productos.return_value = [producto_mock_1, producto_mock_2]
+    # Los KPIs salen ahora de agregados SQL en ServicioKPI, no de listar ventas y productos.
+    mock_kpis = Mock()
+    mock_kpis.obtener_kpis.return_value = {"ingresos_totales": 5000.0, "ventas_totales": 3, "productos_en_stock": 35}
 
     # Creamos el controlador usando el nombre de argumento correcto: 'producto_ctrl'
     dashboard_ctrl = DashboardController(
         contabilidad_ctrl=mock_contabilidad,
         ventas_ctrl=mock_ventas,
-        producto_ctrl=mock_producto
+        producto_ctrl=mock_producto,
+        kpi_service=mock_kpis
     )
     # --- FIN DE LA CORRECCIÓN ---
     
@@ -32,4 +35,131 @@ def test_obtener_kpis_principales_con_mocks():
 
     assert kpis["ingresos_totales"] == 5000.0
     assert kpis["ventas_totales"] == 3
-    assert kpis["productos_en_stock"] == 35
\ No newline at end of file
+    assert kpis["productos_en_stock"] == 35
+    assert kpis["productos_stock_bajo"] == 0
+    mock_ventas.listar_ventas.assert_not_called()
+    mock_producto.listar_productos.assert_not_called()
+
+@pytest.fixture
+def tienda(db_session, test_usuario, tmp_path):
+    producto_ctrl = ProductoController(db_session)
+    contabilidad_ctrl = ContabilidadController(db_session)
+    ventas_ctrl = VentasController(db_session, producto_ctrl, contabilidad_ctrl, ClienteController(db_session), AlmacenCarritos(str(tmp_path)))
+    plantilla_ctrl = PlantillaController(db_session)
+    cuaderno = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Cuaderno"}, [{"sku": "CUA-01", "precio_venta": 20.0, "costo_compra": 12.0, "stock": 10}], test_usuario.id).variantes[0]
+    lapiz = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Lapiz"}, [{"sku": "LAP-01", "precio_venta": 5.0, "costo_compra": 2.0, "stock": 4}], test_usuario.id).variantes[0]
+    return ventas_ctrl, producto_ctrl, cuaderno, lapiz
+
+def _vender(ventas_ctrl, usuario_id, lineas):
+    venta = ventas_ctrl.crear_nueva_venta(usuario_id)
+    for producto_id, cantidad in lineas:
+        ventas_ctrl.agregar_item(venta, producto_id, cantidad)
+    ventas_ctrl.finalizar_venta(venta, [{"metodo": "Efectivo", "monto": venta.total}])
+    return venta
+
+def test_kpis_agregados_en_sql(db_session, test_usuario, tienda):
+    ventas_ctrl, _, cuaderno, lapiz = tienda
+    _vender(ventas_ctrl, test_usuario.id, [(cuaderno.id, 2), (lapiz.id, 4)])
+    _vender(ventas_ctrl, test_usuario.id, [(cuaderno.id, 1)])
+    ventas_ctrl.cancelar_venta(ventas_ctrl.crear_nueva_venta(test_usuario.id))
+
+    kpis = ServicioKPI(db_session, umbral_stock_bajo=5).obtener_kpis()
+
+    assert kpis["ventas_totales"] == 2  # la cancelada no cuenta
+    assert kpis["ingresos_totales"] == 80.0
+    assert kpis["ticket_promedio"] == 40.0
+    assert kpis["margen_bruto"] == pytest.approx(80.0 - (3 * 12.0 + 4 * 2.0))
+    assert kpis["productos_en_stock"] == 7
+    assert kpis["productos_stock_bajo"] == 1  # el lápiz se quedó sin stock
+
+def test_cache_se_invalida_solo_con_commits_relevantes(db_session, test_usuario, tienda):
+    ventas_ctrl, producto_ctrl, cuaderno, _ = tienda
+    servicio = ServicioKPI(db_session)
+    assert servicio.obtener_kpis()["ventas_totales"] == 0
+    assert servicio.obtener_kpis(dias=7)["ventas_totales"] == 0
+
+    # Sin commit sobre tablas vigiladas, la caché sigue sirviendo el valor anterior
+    db_session.get(Producto, cuaderno.id).stock = 50
+    assert servicio.obtener_kpis()["productos_en_stock"] == 14
+    db_session.rollback()
+
+    _vender(ventas_ctrl, test_usuario.id, [(cuaderno.id, 1)])
+    kpis = servicio.obtener_kpis()
+    assert kpis["ventas_totales"] == 1
+    assert kpis["productos_en_stock"] == 13
+    assert kpis["ingresos_totales"] == 20.0
+    assert servicio.obtener_kpis(dias=7)["ventas_totales"] == 1
+
+def test_obtener_datos_dashboard_con_otra_sesion(db_session, test_usuario, tienda):
+    ventas_ctrl, _, cuaderno, _ = tienda
+    _vender(ventas_ctrl, test_usuario.id, [(cuaderno.id, 1)])
+    dashboard_ctrl = DashboardController(ContabilidadController(db_session), ventas_ctrl, None)
+
+    datos = dashboard_ctrl.obtener_datos_dashboard(db_session, dias_grafico=7)
+
+    assert datos["kpis"]["ventas_totales"] == 1
+    assert len(datos["grafico"]) == 7
+    assert datos["grafico"][-1]["total_ingresos"] == 20.0
+
+def test_cache_no_guarda_resultados_invalidados_durante_el_calculo(db_session, tienda):
+    servicio = ServicioKPI(db_session)
+    calcular_original = servicio._kpis_inventario
+
+    def calcular_con_commit_concurrente(sesion):
+        valores = calcular_original(sesion)
+        servicio.invalidar({"inventario"})  # Un commit llega mientras se consultaba
+        return valores
+
+    servicio._kpis_inventario = calcular_con_commit_concurrente
+    servicio.obtener_kpis()
+    assert servicio._cache["inventario"] == {}
+
+def test_cache_ve_las_escrituras_de_otras_sesiones(tmp_path, monkeypatch):
+    """Otra caja sobre el mismo archivo no dispara los eventos de la sesión vigilada."""
+    from sqlalchemy import update
+    from sqlalchemy.orm import sessionmaker
+    from core.db import crear_engine
+    from core.migraciones import aplicar_migraciones
+    from modules.dashboard import kpi_service
+    from modules.productos.models import TipoAjusteStock
+
+    engine = crear_engine(f"sqlite:///{tmp_path / 'kpis.db'}", perfil="rendimiento", config={})
+    aplicar_migraciones(engine)
+    Sesion = sessionmaker(bind=engine, autoflush=False)
+    try:
+        with Sesion() as tablero, Sesion() as caja:
+            vela = PlantillaController(caja).crear_plantilla_con_variantes(
+                {"nombre": "Vela"}, [{"sku": "VELA-01", "precio_venta": 3.0, "costo_compra": 1.0, "stock": 10}], None).variantes[0]
+            servicio = ServicioKPI(tablero)
+            assert servicio.obtener_kpis()["productos_en_stock"] == 10
+
+            # Un nuevo movimiento de stock cambia la marca de cambios
+            ProductoController(caja).ajustar_stock(vela.id, -3, TipoAjusteStock.SALIDA_MERMA, "Merma", None)
+            tablero.rollback()  # Termina la lectura anterior para ver el commit de la otra caja
+            assert servicio.obtener_kpis()["productos_en_stock"] == 7
+
+            # Un cambio que no deja movimiento solo se ve cuando caduca la entrada
+            caja.execute(update(Producto).where(Producto.id == vela.id).values(stock=20))
+            caja.commit()
+            tablero.rollback()
+            assert servicio.obtener_kpis()["productos_en_stock"] == 7
+            monkeypatch.setattr(kpi_service, "TTL_CACHE_KPIS", 0)
+            assert servicio.obtener_kpis()["productos_en_stock"] == 20
+    finally:
+        engine.dispose()
+
+def test_servicio_descartado_deja_de_escuchar_la_sesion(db_session):
+    import gc
+    oyentes_previos = len(db_session.dispatch.after_commit)
+
+    servicio = ServicioKPI(db_session)
+    assert len(db_session.dispatch.after_commit) == oyentes_previos + 1
+    servicio.cerrar()
+    assert len(db_session.dispatch.after_commit) == oyentes_previos
+
+    ServicioKPI(db_session)  # Sin referencias: el recolector se lleva el servicio y sus oyentes
+    gc.collect()
+    assert len(db_session.dispatch.after_commit) == oyentes_previos
+    db_session.commit()
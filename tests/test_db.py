@@ -0,0 +1,37 @@
+# tests/test_db.py
+
+import json
+import pytest
+from sqlalchemy import text
+from core.db import crear_engine, resolver_pragmas, cargar_configuracion_db
+
+def test_perfil_rendimiento_aplica_pragmas(tmp_path):
+    """Verifica que el perfil 'rendimiento' active WAL y los demás PRAGMAs en cada conexión."""
+    engine = crear_engine(f"sqlite:///{tmp_path / 'perfil.db'}", perfil="rendimiento", config={})
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA foreign_keys")).scalar() == 0  # opcional: perfil "seguro"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    engine.dispose()
+
+def test_perfil_legacy_no_modifica_journal(tmp_path):
+    engine = crear_engine(f"sqlite:///{tmp_path / 'legacy.db'}", perfil="legacy", config={})
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "delete"
+    engine.dispose()
+
+def test_overrides_de_config(tmp_path):
+    ruta_config = tmp_path / "config.json"
+    ruta_config.write_text(json.dumps({"theme": "global", "db": {"perfil": "seguro", "pragmas": {"busy_timeout": 1234}}}))
+    config = cargar_configuracion_db(str(ruta_config))
+    engine = crear_engine(f"sqlite:///{tmp_path / 'cfg.db'}", config=config)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 2  # FULL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+        assert conn.execute(text("PRAGMA foreign_keys")).scalar() == 1
+    engine.dispose()
+
+def test_perfil_inexistente_falla():
+    with pytest.raises(ValueError, match="no existe"):
+        resolver_pragmas("turbo")
@@ -0,0 +1,39 @@
+# tests/test_excel_reporter.py
+
+import openpyxl
+import pytest
+from core.tareas import TareaCancelada
+from utils.excel_reporter import generar_reporte_excel, estimar_anchos
+
+HEADERS = ["ID", "Producto", "Total"]
+
+def _filas(n):
+    for i in range(n):
+        yield [i + 1, f"Producto {i}", 10.5]
+
+def test_divide_en_hojas_y_conserva_estilos(tmp_path):
+    ruta = tmp_path / "reporte.xlsx"
+
+    resultado = generar_reporte_excel(str(ruta), "Reporte de Ventas", HEADERS, _filas(10), columnas_moneda=[2], filas_por_hoja=4)
+
+    assert resultado == {"filas": 10, "hojas": 3}
+    libro = openpyxl.load_workbook(ruta)
+    assert libro.sheetnames == ["Reporte", "Reporte (2)", "Reporte (3)"]
+    hoja = libro["Reporte (2)"]
+    assert hoja["A1"].value == "Reporte de Ventas"
+    assert "A1:C1" in [str(rango) for rango in hoja.merged_cells.ranges]
+    assert hoja["A2"].value == "ID" and hoja["A2"].font.b
+    assert hoja["A3"].value == 5
+    assert hoja["C3"].number_format == '"$"#,##0.00'
+    assert libro["Reporte (3)"].max_row == 4
+
+def test_estimar_anchos_usa_la_muestra():
+    anchos = estimar_anchos(["ID", "Descripción"], [[1, "x" * 30], [2, None]])
+    assert anchos == [8, 32]
+
+def test_cancelar_borra_el_archivo(tmp_path, monkeypatch):
+    monkeypatch.setattr("utils.excel_reporter.FILAS_POR_AVISO", 10)
+    ruta = tmp_path / "reporte.xlsx"
+    with pytest.raises(TareaCancelada):
+        generar_reporte_excel(str(ruta), "Reporte", HEADERS, _filas(100), cancelado=lambda: True)
+    assert not ruta.exists()
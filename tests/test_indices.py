@@ -0,0 +1,193 @@
+# tests/test_indices.py
+"""
+Comprueba con EXPLAIN QUERY PLAN que las consultas frecuentes de los
+controladores usan índice. Se captura el SQL real que ejecuta cada método
+y se falla si alguna tabla caliente se recorre entera.
+"""
+
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from modules.productos.producto_controller import ProductoController
+from modules.productos.plantilla_controller import PlantillaController
+from modules.productos.models import TipoAjusteStock
+from modules.ventas.ventas_controller import VentasController
+from modules.ventas.carrito import AlmacenCarritos
+from modules.contabilidad.contabilidad_controller import ContabilidadController
+from modules.contabilidad.contabilidad_model import TipoMovimiento
+from modules.clientes.cliente_controller import ClienteController
+from modules.auditorias.auditoria_controller import AuditoriaController
+from modules.dashboard.kpi_service import ServicioKPI
+
+TABLAS_CALIENTES = {
+    "ventas", "venta_detalles", "venta_pagos", "productos", "producto_plantillas",
+    "movimientos_stock", "movimientos_contables", "auditoria_detalles", "kit_componentes", "capas_costo",
+}
+
+# "SCAN tabla" o "SCAN tabla AS alias" sin índice: recorrido completo.
+PATRON_RECORRIDO = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+@contextmanager
+def capturar_consultas(sesion):
+    """Guarda (sql, parámetros) de cada SELECT que se ejecute en la conexión de la sesión."""
+    consultas = []
+    conexion = sesion.connection()
+
+    def capturar(_conn, _cursor, sentencia, parametros, _contexto, _executemany):
+        if sentencia.lstrip().upper().startswith("SELECT"):
+            consultas.append((sentencia, parametros))
+
+    event.listen(conexion, "before_cursor_execute", capturar)
+    try:
+        yield consultas
+    finally:
+        event.remove(conexion, "before_cursor_execute", capturar)
+
+
+def plan(sesion, sentencia, parametros) -> list:
+    return [fila[3] for fila in sesion.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + sentencia, parametros)]
+
+
+def recorridos_completos(sesion, consultas) -> list:
+    """Pasos del plan que recorren enteras las tablas calientes (o las ordenan en un B-tree temporal)."""
+    problemas = []
+    for sentencia, parametros in consultas:
+        for paso in plan(sesion, sentencia, parametros):
+            recorrido = PATRON_RECORRIDO.match(paso)
+            if (recorrido and recorrido.group(1) in TABLAS_CALIENTES) or paso.startswith("USE TEMP B-TREE FOR ORDER BY"):
+                problemas.append(f"{paso}  <-  {' '.join(sentencia.split())[:120]}")
+    return problemas
+
+
+def assert_usa_indices(sesion, consultas):
+    assert consultas, "No se capturó ninguna consulta"
+    problemas = recorridos_completos(sesion, consultas)
+    assert not problemas, "Consultas con recorrido completo:\n" + "\n".join(problemas)
+
+
+@pytest.fixture
+def tienda(db_session, test_usuario, tmp_path):
+    producto_ctrl = ProductoController(db_session)
+    contabilidad_ctrl = ContabilidadController(db_session)
+    ventas_ctrl = VentasController(db_session, producto_ctrl, contabilidad_ctrl, ClienteController(db_session), AlmacenCarritos(str(tmp_path)))
+    plantilla_ctrl = PlantillaController(db_session)
+    variantes = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Camiseta"},
+        [{"sku": "CAM-S", "precio_venta": 10.0, "stock": 20}, {"sku": "CAM-M", "precio_venta": 10.0, "stock": 20}],
+        test_usuario.id,
+    ).variantes
+    plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Pack Camisetas"}, [{"sku": "PACK-01", "precio_venta": 18.0, "stock": 0}], test_usuario.id,
+        componentes=[{"componente_id": variantes[0].id, "cantidad": 1}, {"componente_id": variantes[1].id, "cantidad": 1}],
+    )
+    venta = ventas_ctrl.crear_nueva_venta(test_usuario.id)
+    ventas_ctrl.agregar_item(venta, variantes[0].id, 2)
+    ventas_ctrl.finalizar_venta(venta, [{"metodo": "Efectivo", "monto": venta.total}])
+    return {
+        "producto_ctrl": producto_ctrl, "plantilla_ctrl": plantilla_ctrl, "ventas_ctrl": ventas_ctrl,
+        "contabilidad_ctrl": contabilidad_ctrl, "variantes": variantes, "usuario": test_usuario,
+    }
+
+
+def test_ventas_en_espera_y_sus_lineas(db_session, tienda):
+    ventas_ctrl, usuario = tienda["ventas_ctrl"], tienda["usuario"]
+    carrito = ventas_ctrl.crear_nueva_venta(usuario.id)
+    ventas_ctrl.agregar_item(carrito, tienda["variantes"][1].id, 1)
+    ventas_ctrl.aparcar_venta(carrito)
+    db_session.expire_all()
+    with capturar_consultas(db_session) as consultas:
+        venta = ventas_ctrl.listar_ventas_en_espera(usuario.id)[0]
+        venta.detalles, venta.pagos
+    assert_usa_indices(db_session, consultas)
+
+
+def test_historial_de_stock_por_producto_y_fecha(db_session, tienda):
+    producto_ctrl, producto = tienda["producto_ctrl"], tienda["variantes"][1]
+    producto_ctrl.ajustar_stock(producto.id, 5, TipoAjusteStock.ENTRADA_MANUAL, "Reposición", tienda["usuario"].id)
+    with capturar_consultas(db_session) as consultas:
+        historial = producto_ctrl.obtener_historial_stock(producto.id, desde=datetime.now(timezone.utc) - timedelta(days=1))
+    assert [m.cantidad for m in historial] == [5, 20]
+    assert_usa_indices(db_session, consultas)
+
+
+def test_libro_contable_por_fecha(db_session, tienda):
+    with capturar_consultas(db_session) as consultas:
+        movimientos = tienda["contabilidad_ctrl"].obtener_todos_movimientos()
+    assert movimientos[0].tipo == TipoMovimiento.INGRESO
+    assert_usa_indices(db_session, consultas)
+
+
+def test_conteo_de_auditoria(db_session, tienda):
+    producto_ctrl, producto = tienda["producto_ctrl"], tienda["variantes"][1]
+    auditoria_ctrl = AuditoriaController(db_session, producto_ctrl)
+    auditoria = auditoria_ctrl.iniciar_nueva_auditoria(tienda["usuario"].id)
+    auditoria_ctrl.registrar_conteo_producto(auditoria.id, producto.id, 18)
+    with capturar_consultas(db_session) as consultas:
+        auditoria_ctrl.registrar_conteo_producto(auditoria.id, producto.id, 19)
+    assert_usa_indices(db_session, consultas)
+
+
+def test_sku_y_nombre_duplicados_sin_distinguir_mayusculas(db_session, tienda):
+    plantilla_ctrl, usuario = tienda["plantilla_ctrl"], tienda["usuario"]
+    with capturar_consultas(db_session) as consultas:
+        with pytest.raises(ValueError, match="Ya existe"):
+            plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "CAMISETA"}, [], usuario.id)
+        with pytest.raises(ValueError, match="ya está en uso"):
+            plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Otra"}, [{"sku": "cam-s", "precio_venta": 1.0}], usuario.id)
+    assert_usa_indices(db_session, consultas)
+    assert any("ix_productos_sku_nocase" in paso for s, p in consultas for paso in plan(db_session, s, p))
+
+
+def test_sku_con_comodines_no_coincide_con_otros(db_session, tienda):
+    """La comprobación de SKU es una igualdad: '_' y '%' no actúan como comodines."""
+    plantilla = tienda["plantilla_ctrl"].crear_plantilla_con_variantes(
+        {"nombre": "Gorra"}, [{"sku": "CAM_S", "precio_venta": 5.0}], tienda["usuario"].id)
+    assert plantilla.variantes[0].sku == "CAM_S"
+
+
+def test_pagina_de_plantillas_con_stock_de_kits(db_session, tienda):
+    with capturar_consultas(db_session) as consultas:
+        pagina = tienda["plantilla_ctrl"].listar_plantillas_paginadas()
+    assert {fila["nombre"]: fila["stock_total"] for fila in pagina} == {"Camiseta": 38, "Pack Camisetas": 18}
+    assert_usa_indices(db_session, consultas)
+
+
+def test_recalculo_de_kits_al_ajustar_un_componente(db_session, tienda):
+    producto_ctrl, producto = tienda["producto_ctrl"], tienda["variantes"][0]
+    with capturar_consultas(db_session) as consultas:
+        producto_ctrl.ajustar_stock(producto.id, -3, TipoAjusteStock.AJUSTE_CONTEO_NEGATIVO, "Conteo", tienda["usuario"].id)
+    assert tienda["plantilla_ctrl"].obtener_stock_kit(tienda["plantilla_ctrl"].listar_plantillas_paginadas(filtro="Pack")[0]["id"]) == 15
+    assert_usa_indices(db_session, consultas)
+    assert any("ix_kit_componentes_componente" in paso for s, p in consultas for paso in plan(db_session, s, p))
+
+
+def test_stock_a_fecha_desde_un_corte(db_session, tienda):
+    producto_ctrl, producto = tienda["producto_ctrl"], tienda["variantes"][1]
+    ayer = datetime.now(timezone.utc).date() - timedelta(days=1)
+    producto_ctrl.crear_corte_stock(ayer - timedelta(days=1))
+    with capturar_consultas(db_session) as consultas:
+        producto_ctrl.obtener_stock_a_fecha(ayer)
+        producto_ctrl.obtener_stock_variante_a_fecha(producto.id, ayer)
+    assert_usa_indices(db_session, consultas)
+    assert any("ix_movimientos_stock_fecha" in paso for s, p in consultas for paso in plan(db_session, s, p))
+
+
+def test_capas_fifo_de_una_venta(db_session, tienda):
+    producto_ctrl, variantes = tienda["producto_ctrl"], tienda["variantes"]
+    producto_ctrl.ajustar_stock(variantes[0].id, 4, TipoAjusteStock.ENTRADA_COMPRA, "Compra", tienda["usuario"].id, costo_unitario=3.0)
+    with capturar_consultas(db_session) as consultas:
+        producto_ctrl.ajustar_stock_lote([{"producto_id": v.id, "cantidad": -1} for v in variantes], TipoAjusteStock.SALIDA_VENTA, "Venta", tienda["usuario"].id)
+    assert_usa_indices(db_session, consultas)
+    assert any("ix_capas_costo_producto" in paso for s, p in consultas for paso in plan(db_session, s, p))
+
+
+def test_kpis_de_ventas_por_rango(db_session, tienda):
+    with capturar_consultas(db_session) as consultas:
+        kpis = ServicioKPI(db_session)._kpis_ventas(db_session, dias=30)
+    assert kpis["ventas_totales"] == 1
+    assert_usa_indices(db_session, consultas)
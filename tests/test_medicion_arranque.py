@@ -0,0 +1,62 @@
+# tests/test_medicion_arranque.py
+
+import sys
+import json
+
+from core import medicion_arranque
+from core.medicion_arranque import ruta_solicitada, quitar_banderas
+
+
+def test_bandera_y_variable_de_entorno():
+    assert ruta_solicitada(["main.py"], {}) is None
+    assert ruta_solicitada(["main.py", "--profile-startup=arranque.json"], {}) == "arranque.json"
+    assert ruta_solicitada(["main.py", "--profile-startup"], {}).startswith("informe_arranque_")
+    assert ruta_solicitada(["main.py"], {"SIBORS_PROFILE_STARTUP": "env.json"}) == "env.json"
+    assert ruta_solicitada(["main.py"], {"SIBORS_PROFILE_STARTUP": "0"}) is None
+    assert quitar_banderas(["main.py", "--profile-startup=x.json", "--profile-startup-quit", "-style"]) == ["main.py", "-style"]
+
+
+def test_informe_de_fases_e_importaciones(tmp_path, monkeypatch):
+    (tmp_path / "modulo_medido_hijo.py").write_text("VALOR = 1\n")
+    (tmp_path / "modulo_medido.py").write_text("import modulo_medido_hijo\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    ruta = tmp_path / "informe.json"
+
+    medicion_arranque.iniciar(str(ruta))
+    try:
+        with medicion_arranque.fase("init_db"):
+            with medicion_arranque.fase("create_all"):
+                datos = [0] * 100_000
+            import modulo_medido  # noqa: F401
+        medicion_arranque.hito("login interactivo")
+    finally:
+        informe = medicion_arranque.detener()
+        sys.modules.pop("modulo_medido", None)
+        sys.modules.pop("modulo_medido_hijo", None)
+
+    assert not any(type(b).__name__ == "_BuscadorMedido" for b in sys.meta_path)
+    assert medicion_arranque.medidor() is None
+    assert json.loads(ruta.read_text(encoding="utf-8"))["hitos"] == informe["hitos"]
+
+    fases = {f["ruta"]: f for f in informe["fases"]}
+    assert set(fases) == {"init_db", "init_db;create_all"}
+    assert fases["init_db;create_all"]["asignado_kb"] > 500  # la lista de 100.000 elementos
+    assert fases["init_db"]["duracion_ms"] >= fases["init_db;create_all"]["duracion_ms"]
+
+    importaciones = {i["modulo"]: i for i in informe["importaciones"]}
+    assert importaciones["modulo_medido"]["fase"] == "init_db"
+    assert importaciones["modulo_medido"]["acumulado_ms"] >= importaciones["modulo_medido_hijo"]["acumulado_ms"]
+    assert importaciones["modulo_medido_hijo"]["importado_por"] == ["modulo_medido"]
+
+    pilas = (tmp_path / "informe.folded").read_text(encoding="utf-8").splitlines()
+    assert any(l.startswith("init_db;create_all ") for l in pilas)
+    assert any(l.startswith("init_db;import modulo_medido;import modulo_medido_hijo ") for l in pilas)
+
+
+def test_sin_medicion_las_fases_no_hacen_nada():
+    assert medicion_arranque.medidor() is None
+    with medicion_arranque.fase("nada"):
+        pass
+    medicion_arranque.hito("nada")
+    assert medicion_arranque.guardar_informe() is None
+    assert medicion_arranque.detener() is None
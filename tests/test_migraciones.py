@@ -0,0 +1,143 @@
+# tests/test_migraciones.py
+
+import pytest
+from sqlalchemy import event, text
+
+from core.db import Base, crear_engine
+from core import migraciones
+from core.migraciones import aplicar_migraciones, agregar_columna, leer_version, version_esquema
+from modules.categorias.categoria_model import Categoria
+
+
+@pytest.fixture
+def engine_archivo(tmp_path):
+    engine = crear_engine(f"sqlite:///{tmp_path / 'migraciones.db'}", perfil="rendimiento", config={})
+    yield engine
+    engine.dispose()
+
+
+def _indices(engine) -> set:
+    with engine.connect() as conexion:
+        return set(conexion.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'").scalars())
+
+
+def test_base_nueva_queda_en_la_ultima_version(engine_archivo):
+    assert aplicar_migraciones(engine_archivo) == len(migraciones.MIGRACIONES)
+    assert leer_version(engine_archivo) == version_esquema()
+    assert "ix_ventas_usuario_estado" in _indices(engine_archivo)
+    with engine_archivo.connect() as conexion:
+        assert conexion.execute(text("SELECT count(*) FROM atributos")).scalar() == 2  # Color y Talla sembrados
+
+
+def test_base_al_dia_solo_lee_la_version(engine_archivo):
+    aplicar_migraciones(engine_archivo)
+    sentencias = []
+    event.listen(engine_archivo, "before_cursor_execute", lambda *args: sentencias.append(args[2]))
+
+    assert aplicar_migraciones(engine_archivo) == 0
+    assert sentencias == ["PRAGMA user_version"]
+
+
+def test_base_anterior_a_las_migraciones(engine_archivo):
+    """Una base creada con create_all (user_version 0) recibe índices, datos y tablas derivadas."""
+    Base.metadata.create_all(bind=engine_archivo)
+    with engine_archivo.begin() as conexion:
+        conexion.exec_driver_sql("DROP INDEX ix_productos_sku_nocase")
+        conexion.execute(Categoria.__table__.insert(), [{"id": 1, "nombre": "Papelería"}])
+
+    assert aplicar_migraciones(engine_archivo) == len(migraciones.MIGRACIONES)
+    assert leer_version(engine_archivo) == version_esquema()
+    assert "ix_productos_sku_nocase" in _indices(engine_archivo)
+    with engine_archivo.connect() as conexion:
+        assert conexion.execute(text("SELECT count(*) FROM atributos")).scalar() == 2
+        assert conexion.execute(text("SELECT count(*) FROM categoria_jerarquia WHERE descendiente_id = 1")).scalar() == 1
+
+
+def test_base_v3_recibe_el_stock_de_los_kits(engine_archivo):
+    aplicar_migraciones(engine_archivo)
+    with engine_archivo.begin() as conexion:
+        conexion.exec_driver_sql("ALTER TABLE producto_plantillas DROP COLUMN kit_stock")
+        conexion.exec_driver_sql("INSERT INTO producto_plantillas (id, nombre) VALUES (1, 'Vela'), (2, 'Pack Velas')")
+        conexion.exec_driver_sql("INSERT INTO productos (id, plantilla_id, sku, stock, precio_venta) VALUES (1, 1, 'VELA', 7, 1.0), (2, 2, 'PACK', 0, 3.0)")
+        conexion.exec_driver_sql("INSERT INTO kit_componentes (kit_plantilla_id, componente_id, cantidad) VALUES (2, 1, 3)")
+        conexion.exec_driver_sql("PRAGMA user_version = 3")
+
+    assert aplicar_migraciones(engine_archivo) == version_esquema() - 3
+    with engine_archivo.connect() as conexion:
+        assert conexion.execute(text("SELECT id, kit_stock FROM producto_plantillas ORDER BY id")).all() == [(1, None), (2, 2)]
+
+
+def test_base_v5_recibe_la_valoracion_del_inventario(engine_archivo):
+    aplicar_migraciones(engine_archivo)
+    with engine_archivo.begin() as conexion:
+        conexion.exec_driver_sql("DROP TABLE capas_costo")
+        conexion.exec_driver_sql("ALTER TABLE productos DROP COLUMN costo_promedio")
+        conexion.exec_driver_sql("INSERT INTO producto_plantillas (id, nombre) VALUES (1, 'Vela')")
+        conexion.exec_driver_sql("INSERT INTO productos (id, plantilla_id, sku, stock, precio_venta, costo_compra) VALUES (1, 1, 'VELA', 7, 1.0, 0.5)")
+        conexion.exec_driver_sql(
+            "INSERT INTO movimientos_stock (producto_id, fecha, tipo_ajuste, cantidad, stock_anterior, stock_nuevo) "
+            "VALUES (1, '2024-01-01 10:00:00', 'ENTRADA_MANUAL', 10, 0, 10), (1, '2024-01-02 10:00:00', 'SALIDA_VENTA', -3, 10, 7)")
+        conexion.exec_driver_sql("PRAGMA user_version = 5")
+
+    assert aplicar_migraciones(engine_archivo) == version_esquema() - 5
+    with engine_archivo.connect() as conexion:
+        assert conexion.execute(text("SELECT costo_promedio FROM productos")).scalar() == 0.5
+        assert conexion.execute(text("SELECT producto_id, cantidad_restante, costo_unitario FROM capas_costo")).all() == [(1, 7, 0.5)]
+
+
+def test_base_v6_recupera_los_triggers_de_alta_del_indice(engine_archivo):
+    aplicar_migraciones(engine_archivo)
+    with engine_archivo.begin() as conexion:
+        # Una importación que murió con los triggers de alta borrados
+        conexion.exec_driver_sql("DROP TRIGGER fts_productos_ai")
+        conexion.exec_driver_sql("INSERT INTO producto_plantillas (id, nombre) VALUES (1, 'Vela')")
+        conexion.exec_driver_sql("INSERT INTO productos (id, plantilla_id, sku, stock, precio_venta) VALUES (1, 1, 'VELA', 7, 1.0)")
+        conexion.exec_driver_sql("PRAGMA user_version = 6")
+
+    assert aplicar_migraciones(engine_archivo) == version_esquema() - 6
+    with engine_archivo.connect() as conexion:
+        sql = conexion.execute(text("SELECT sql FROM sqlite_master WHERE name = 'fts_productos_ai'")).scalar()
+        assert "fts_indexacion_diferida" in sql
+        assert conexion.execute(text("SELECT rowid FROM productos_fts WHERE productos_fts MATCH 'vela'")).scalars().all() == [1]
+
+
+def test_base_v7_informa_las_claves_foraneas_huerfanas(engine_archivo, capsys):
+    aplicar_migraciones(engine_archivo)
+    with engine_archivo.begin() as conexion:
+        # Una variante borrada cuando foreign_keys no se comprobaba
+        conexion.exec_driver_sql("INSERT INTO productos (id, plantilla_id, sku, stock, precio_venta) VALUES (1, 99, 'VELA', 0, 1.0)")
+        conexion.exec_driver_sql("PRAGMA user_version = 7")
+
+    assert aplicar_migraciones(engine_archivo) == version_esquema() - 7
+    assert "1 filas de productos -> producto_plantillas" in capsys.readouterr().out
+    with engine_archivo.connect() as conexion:
+        assert conexion.execute(text("SELECT count(*) FROM productos")).scalar() == 1  # no se borra nada
+
+
+def test_solo_se_aplican_las_migraciones_pendientes(engine_archivo, monkeypatch):
+    aplicar_migraciones(engine_archivo)
+    ejecutadas = []
+    siguiente = version_esquema() + 1
+    monkeypatch.setattr(migraciones, "MIGRACIONES", migraciones.MIGRACIONES + [
+        (siguiente, "Columna de prueba", lambda engine: ejecutadas.append(agregar_columna(engine, "clientes", "notas_prueba", "TEXT"))),
+    ])
+
+    assert aplicar_migraciones(engine_archivo) == 1
+    assert ejecutadas == [True]
+    assert leer_version(engine_archivo) == siguiente
+    # El paso se puede repetir sin error
+    assert agregar_columna(engine_archivo, "clientes", "notas_prueba", "TEXT") is False
+
+
+def test_base_de_una_version_mas_nueva_falla(engine_archivo):
+    aplicar_migraciones(engine_archivo)
+    with engine_archivo.begin() as conexion:
+        conexion.exec_driver_sql(f"PRAGMA user_version = {version_esquema() + 1}")
+    with pytest.raises(RuntimeError, match="más nuevo"):
+        aplicar_migraciones(engine_archivo)
+
+
+def test_las_versiones_deben_ser_consecutivas(monkeypatch):
+    monkeypatch.setattr(migraciones, "MIGRACIONES", list(migraciones.MIGRACIONES))
+    with pytest.raises(ValueError, match="no sigue"):
+        migraciones.migracion(version_esquema() + 2, "Salto")(lambda engine: None)
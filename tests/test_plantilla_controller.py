@@ -1,9 +1,11 @@
 # tests/test_plantilla_controller.py
 
 import pytest
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from modules.productos.plantilla_controller import PlantillaController
 from modules.productos.producto_controller import ProductoController
+from modules.productos.models import ProductoPlantilla, TipoAjusteStock
 from modules.usuarios.usuarios_model import Usuario
 
 # Asumimos que conftest.py provee las fixtures 'db_session' y 'test_usuario'
@@ -109,4 +111,286 @@ def test_eliminar_plantilla_con_stock_falla(db_session: Session, test_usuario: U
     # Actualizamos el texto del 'match' para que coincida con el nuevo y mejorado mensaje de error.
     with pytest.raises(ValueError, match="No se puede eliminar el producto porque una o más de sus variantes \(o componentes de kit\) tienen existencias en el inventario."):
         plantilla_ctrl.eliminar_plantilla(plantilla.id)
-    # --- FIN DE LA MODIFICACIÓN ---
\ No newline at end of file
+    # --- FIN DE LA MODIFICACIÓN ---
+
+def test_importacion_masiva_crea_y_actualiza(db_session: Session, test_usuario: Usuario, setup_atributos, tmp_path):
+    """
+    Verifica que la importación por lotes cree plantillas, variantes con sus atributos
+    y movimientos de stock, y que actualice las variantes existentes.
+    """
+    from modules.productos.models import Producto, MovimientoStock, TipoAjusteStock
+    plantilla_ctrl = PlantillaController(db_session)
+    plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Gorra"}, [{"sku": "GOR-01", "precio_venta": 10.0, "stock": 5}], test_usuario.id)
+
+    ruta_csv = tmp_path / "importar.csv"
+    ruta_csv.write_text(
+        "plantilla_nombre,categoria_ruta,proveedor_nombre,tipo_producto,variante_sku,variante_precio,variante_costo,variante_stock,variante_atributos,kit_componentes\n"
+        "Playera,,,Variante,PLA-S-RO,20,8,10,Talla:S | Color:Rojo,\n"
+        "Playera,,,Variante,PLA-M-AZ,20,8,0,Talla:M | Color:Azul,\n"
+        "gorra,,,Simple,GOR-01,12.5,,3,,\n",
+        encoding="utf-8"
+    )
+
+    analisis = plantilla_ctrl.analizar_csv_para_importacion(str(ruta_csv))
+    assert [r['estado'] for r in analisis] == ['OK_NUEVO', 'OK_NUEVO', 'OK_ACTUALIZAR']
+
+    stats = plantilla_ctrl.ejecutar_importacion(analisis, test_usuario.id)
+
+    assert stats["plantillas_creadas"] == 1
+    assert stats["variantes_creadas"] == 2
+    assert stats["variantes_actualizadas"] == 1
+    nueva = db_session.query(Producto).filter_by(sku="PLA-S-RO").one()
+    assert nueva.plantilla.nombre == "Playera"
+    assert sorted(v.valor for v in nueva.valores) == ["Rojo", "S"]
+    assert nueva.stock == 10
+    gorra = db_session.query(Producto).filter_by(sku="GOR-01").one()
+    assert gorra.precio_venta == 12.5
+    assert gorra.stock == 3
+    ajuste = db_session.query(MovimientoStock).filter_by(producto_id=gorra.id, tipo_ajuste=TipoAjusteStock.AJUSTE_CONTEO_NEGATIVO).one()
+    assert ajuste.cantidad == -2
+    # Las variantes importadas quedan en el índice de búsqueda con sus atributos
+    assert [p.sku for p in ProductoController(db_session).buscar_variantes("playera azul")] == ["PLA-M-AZ"]
+
+def test_importar_csv_en_streaming_por_bloques(db_session: Session, test_usuario: Usuario, setup_atributos, tmp_path, monkeypatch):
+    """
+    importar_csv vuelve a leer el archivo e importa por bloques sin cargar las
+    filas: una plantilla repartida en varios bloques se crea una sola vez y las
+    filas con error se saltan.
+    """
+    from modules.productos.models import Producto
+    en_lotes = PlantillaController._en_lotes
+    monkeypatch.setattr(PlantillaController, "_en_lotes", staticmethod(lambda filas, tamano=2: en_lotes(filas, 2)))
+    ruta_csv = tmp_path / "importar.csv"
+    ruta_csv.write_text(
+        "plantilla_nombre,categoria_ruta,proveedor_nombre,tipo_producto,variante_sku,variante_precio,variante_costo,variante_stock,variante_atributos,kit_componentes\n"
+        + "".join(f"Calcetín,,,Variante,CAL-{i},3,1,{i},,\n" for i in range(5))
+        + "Calcetín,,,Variante,CAL-X,abc,,1,,\n",
+        encoding="utf-8"
+    )
+
+    stats = PlantillaController(db_session).importar_csv(str(ruta_csv), test_usuario.id)
+
+    assert (stats["filas"], stats["plantillas_creadas"], stats["variantes_creadas"], stats["movimientos_stock"]) == (5, 1, 5, 4)
+    assert db_session.query(ProductoPlantilla).filter_by(nombre="Calcetín").count() == 1
+    assert sorted(p.sku for p in db_session.query(Producto)) == [f"CAL-{i}" for i in range(5)]
+
+def test_indexacion_diferida_no_toca_los_triggers_de_otras_conexiones(tmp_path):
+    """
+    La indexación diferida de una importación (aunque empiece sin haber escrito
+    nada) no deja sin indexar lo que escriben otras conexiones, ni queda puesta
+    tras un rollback.
+    """
+    from sqlalchemy import insert, text
+    from sqlalchemy.orm import sessionmaker
+    from core.db import crear_engine
+    from core.migraciones import aplicar_migraciones
+    from modules.productos import indice_busqueda
+    from modules.productos.models import Producto
+
+    engine = crear_engine(f"sqlite:///{tmp_path / 'fts.db'}", perfil="rendimiento", config={})
+    aplicar_migraciones(engine)
+    Sesion = sessionmaker(bind=engine, autoflush=False)
+    variante = lambda i: {"id": i, "plantilla_id": 1, "sku": f"VELA-{i}", "stock": 0, "precio_venta": 1.0}
+    triggers = lambda db: set(db.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'fts_%_ai'")).scalars())
+    try:
+        with Sesion() as importador, Sesion() as caja:
+            caja.execute(insert(ProductoPlantilla), [{"id": 1, "nombre": "Vela"}])
+            caja.commit()
+
+            with indice_busqueda.indexacion_diferida(importador) as variantes_a_indexar:
+                importador.execute(insert(Producto), [variante(1)])
+                variantes_a_indexar.add(1)
+                assert indice_busqueda.buscar_ids_productos(importador, "vela") == []  # aún sin indexar
+                assert triggers(caja) >= {"fts_productos_ai", "fts_valores_ai"}
+            importador.commit()
+            assert indice_busqueda.buscar_ids_productos(caja, "vela") == [1]
+
+            with pytest.raises(RuntimeError):
+                with indice_busqueda.indexacion_diferida(importador):
+                    importador.execute(insert(Producto), [variante(2)])
+                    raise RuntimeError("Importación interrumpida")
+            importador.rollback()
+            caja.execute(insert(Producto), [variante(3)])
+            caja.commit()
+            importador.execute(insert(Producto), [variante(4)])
+            importador.commit()
+            assert sorted(indice_busqueda.buscar_ids_productos(caja, "vela")) == [1, 3, 4]
+    finally:
+        engine.dispose()
+
+def test_analisis_csv_en_lotes(db_session: Session, test_usuario: Usuario, setup_atributos, tmp_path):
+    """
+    Verifica que el análisis en streaming entregue lotes del tamaño pedido y
+    conserve la numeración de filas del archivo.
+    """
+    plantilla_ctrl = PlantillaController(db_session)
+    plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Existente"}, [{"sku": "EX-01", "precio_venta": 1.0}], test_usuario.id)
+    lineas = ["plantilla_nombre,categoria_ruta,proveedor_nombre,tipo_producto,variante_sku,variante_precio,variante_costo,variante_stock,variante_atributos,kit_componentes"]
+    lineas += [f"Lote,,,Variante,LOT-{i},1,,1,Talla:S,\n".strip() for i in range(5)]
+    lineas += ["Existente,,,Simple,ex-01,2,,0,,", "Malo,,,Simple,MAL-01,1,,1,Talla:XXXL,"]
+    ruta_csv = tmp_path / "lotes.csv"
+    ruta_csv.write_text("\n".join(lineas) + "\n", encoding="utf-8")
+
+    lotes = list(plantilla_ctrl.analizar_csv_en_lotes(str(ruta_csv), tamano_lote=3))
+
+    assert [len(lote) for lote in lotes] == [3, 3, 1]
+    filas = [fila for lote in lotes for fila in lote]
+    assert [f["numero_fila"] for f in filas] == list(range(2, 9))
+    assert filas[5]["estado"] == "OK_ACTUALIZAR"
+    assert filas[6]["estado"] == "ERROR"
+    assert "no existe para el atributo" in filas[6]["errores"][0]
+
+def test_analisis_csv_en_paralelo_coincide_con_secuencial(db_session: Session, test_usuario: Usuario, setup_atributos, tmp_path):
+    """
+    El análisis multiproceso debe producir los mismos resultados, en el mismo orden
+    y con la misma numeración de filas, que el análisis secuencial.
+    """
+    plantilla_ctrl = PlantillaController(db_session)
+    plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Base"}, [{"sku": "PAR-3", "precio_venta": 1.0}], test_usuario.id)
+    lineas = ["plantilla_nombre,categoria_ruta,proveedor_nombre,tipo_producto,variante_sku,variante_precio,variante_costo,variante_stock,variante_atributos,kit_componentes"]
+    lineas += [f"Par {i // 4},,,Variante,PAR-{i},{i}.5,,{i},Talla:{'S' if i % 2 else 'M'},"for i in range(40)]
+    lineas[10] = "Par X,,,Variante,PAR-X,abc,,1,,"
+    ruta_csv = tmp_path / "paralelo.csv"
+    ruta_csv.write_text("\n".join(lineas) + "\n", encoding="utf-8-sig")
+
+    secuencial = plantilla_ctrl.analizar_csv_para_importacion(str(ruta_csv))
+    paralelo = [fila for lote in plantilla_ctrl.analizar_csv_en_paralelo(str(ruta_csv), procesos=2, tamano_rango=200) for fila in lote]
+
+    assert len(paralelo) == 40
+    assert paralelo == secuencial
+
+def test_analisis_en_paralelo_con_saltos_de_linea_entrecomillados(db_session: Session, test_usuario: Usuario, setup_atributos, tmp_path):
+    """
+    Un campo entrecomillado con saltos de línea no debe partirse entre rangos: el
+    análisis en paralelo pasa al secuencial y numera las filas igual que él.
+    """
+    plantilla_ctrl = PlantillaController(db_session)
+    lineas = ["plantilla_nombre,categoria_ruta,proveedor_nombre,tipo_producto,variante_sku,variante_precio,variante_costo,variante_stock,variante_atributos,kit_componentes"]
+    lineas += [f"Par {i},,,Variante,PAR-{i},{i}.5,,{i},," for i in range(20)]
+    descripcion = "\n".join(f"renglón {n} de la vela" for n in range(10))  # Más largo que un rango
+    lineas[5] = f'"Vela ""grande""\n{descripcion}",,,Variante,VELA-1,3.5,,2,,'
+    ruta_csv = tmp_path / "multilinea.csv"
+    ruta_csv.write_text("\n".join(lineas) + "\n", encoding="utf-8-sig")
+
+    secuencial = plantilla_ctrl.analizar_csv_para_importacion(str(ruta_csv))
+    paralelo = [fila for lote in plantilla_ctrl.analizar_csv_en_paralelo(str(ruta_csv), procesos=2, tamano_rango=60) for fila in lote]
+
+    assert paralelo == secuencial
+    assert len(paralelo) == 20
+    assert all(fila["estado"] == "OK_NUEVO" for fila in paralelo)
+    assert paralelo[4]["datos"]["plantilla_nombre"] == f'Vela "grande"\n{descripcion}'
+
+def test_exportar_catalogo_en_streaming(db_session: Session, test_usuario: Usuario, setup_atributos, tmp_path):
+    """
+    Verifica el contenido de la exportación plana (rutas de categoría, atributos,
+    kits) y que la salida comprimida con gzip sea equivalente.
+    """
+    import csv
+    import gzip
+    from modules.categorias.categoria_controller import CategoriaController
+    cat_ctrl = CategoriaController(db_session)
+    ropa = cat_ctrl.crear_categoria("Ropa")
+    playeras = cat_ctrl.crear_categoria("Playeras", padre_id=ropa.id)
+    talla_s_id, talla_m_id, color_rojo_id, _ = setup_atributos
+
+    plantilla_ctrl = PlantillaController(db_session)
+    playera = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Playera", "categoria_id": playeras.id},
+        [{"sku": "PLA-S", "precio_venta": 10.0, "stock": 3, "ids_valores": [talla_s_id, color_rojo_id]},
+         {"sku": "PLA-M", "precio_venta": 10.0, "stock": 0, "ids_valores": [talla_m_id]}],
+        test_usuario.id
+    )
+    plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Kit Playeras"}, [{"sku": "KIT-PLA", "precio_venta": 18.0}], test_usuario.id,
+        componentes=[{"componente_id": playera.variantes[0].id, "cantidad": 2}]
+    )
+
+    ruta = tmp_path / "catalogo.csv"
+    assert plantilla_ctrl.exportar_plantillas_a_csv(str(ruta), tamano_lote=1) == 3
+    with open(ruta, encoding="utf-8-sig", newline="") as f:
+        filas = list(csv.DictReader(f))
+
+    assert [f["variante_sku"] for f in filas] == ["KIT-PLA", "PLA-S", "PLA-M"]
+    kit, pla_s, pla_m = filas
+    assert kit["tipo_producto"] == "Kit" and kit["kit_componentes"] == "PLA-S:2"
+    assert pla_s["tipo_producto"] == "Variante"
+    assert pla_s["categoria_ruta"] == "Ropa / Playeras"
+    assert pla_s["variante_atributos"] == "Color:Rojo | Talla:S"
+    assert pla_m["variante_atributos"] == "Talla:M"
+
+    ruta_gz = tmp_path / "catalogo.csv.gz"
+    plantilla_ctrl.exportar_plantillas_a_csv(str(ruta_gz))
+    with gzip.open(ruta_gz, "rt", encoding="utf-8-sig", newline="") as f:
+        assert list(csv.DictReader(f)) == filas
+
+def test_listar_plantillas_paginadas_calcula_stock_en_sql(db_session: Session, test_usuario: Usuario):
+    """
+    Verifica la paginación por clave y el stock agregado en SQL (suma de variantes
+    para productos normales, mínimo de stock/cantidad para kits).
+    """
+    plantilla_ctrl = PlantillaController(db_session)
+    camisa = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Camisa"}, [{"sku": "CAM-S", "precio_venta": 10.0, "stock": 4}, {"sku": "CAM-M", "precio_venta": 10.0, "stock": 6}], test_usuario.id
+    )
+    vino = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Vino"}, [{"sku": "VINO", "precio_venta": 10.0, "stock": 7}], test_usuario.id)
+    plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Kit Vino"}, [{"sku": "KIT-VINO", "precio_venta": 30.0, "stock": 0}], test_usuario.id,
+        componentes=[{"componente_id": vino.variantes[0].id, "cantidad": 2}]
+    )
+    for i in range(3):
+        plantilla_ctrl.crear_plantilla_con_variantes({"nombre": f"Zapato {i}"}, [{"sku": f"ZAP-{i}", "precio_venta": 1.0}], test_usuario.id)
+
+    primera = plantilla_ctrl.listar_plantillas_paginadas(limite=4)
+    assert [f["nombre"] for f in primera] == ["Camisa", "Kit Vino", "Vino", "Zapato 0"]
+    ultima = primera[-1]
+    segunda = plantilla_ctrl.listar_plantillas_paginadas(despues_de=(ultima["nombre"], ultima["id"]), limite=4)
+    assert [f["nombre"] for f in segunda] == ["Zapato 1", "Zapato 2"]
+
+    por_nombre = {f["nombre"]: f for f in primera}
+    assert por_nombre["Camisa"]["stock_total"] == 10 and not por_nombre["Camisa"]["es_kit"]
+    assert por_nombre["Kit Vino"]["stock_total"] == 3 and por_nombre["Kit Vino"]["es_kit"]
+    assert plantilla_ctrl.calcular_stock_disponible_kit(por_nombre["Kit Vino"]["id"]) == 3
+
+    assert [f["nombre"] for f in plantilla_ctrl.listar_plantillas_paginadas(filtro="vino")] == ["Kit Vino", "Vino"]
+    assert sorted(v.sku for v in plantilla_ctrl.obtener_plantilla_detalle(camisa.id).variantes) == ["CAM-M", "CAM-S"]
+
+def test_stock_de_kits_anidados_se_mantiene_al_ajustar_componentes(db_session: Session, test_usuario: Usuario):
+    """
+    Un kit de kits usa el stock del kit interior; al ajustar un componente solo
+    se recalculan los kits que dependen de él (el resto conserva su kit_stock).
+    """
+    plantilla_ctrl = PlantillaController(db_session)
+    producto_ctrl = ProductoController(db_session)
+    copa = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Copa"}, [{"sku": "COPA", "precio_venta": 5.0, "stock": 10}], test_usuario.id).variantes[0]
+    vino = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Vino"}, [{"sku": "VINO", "precio_venta": 20.0, "stock": 7}], test_usuario.id).variantes[0]
+    caja = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Caja"}, [{"sku": "CAJA", "precio_venta": 1.0, "stock": 100}], test_usuario.id).variantes[0]
+    pack = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Pack Vino"}, [{"sku": "PACK-VINO", "precio_venta": 25.0, "stock": 0}], test_usuario.id,
+        componentes=[{"componente_id": copa.id, "cantidad": 2}, {"componente_id": vino.id, "cantidad": 1}]
+    )
+    regalo = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Regalo Doble"}, [{"sku": "REGALO", "precio_venta": 55.0, "stock": 0}], test_usuario.id,
+        componentes=[{"componente_id": pack.variantes[0].id, "cantidad": 2}, {"componente_id": caja.id, "cantidad": 1}]
+    )
+    otro = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Pack Caja"}, [{"sku": "PACK-CAJA", "precio_venta": 2.0, "stock": 0}], test_usuario.id,
+        componentes=[{"componente_id": caja.id, "cantidad": 10}]
+    )
+    assert (plantilla_ctrl.obtener_stock_kit(pack.id), plantilla_ctrl.obtener_stock_kit(regalo.id), plantilla_ctrl.obtener_stock_kit(otro.id)) == (5, 2, 10)
+
+    # Un valor imposible en un kit no relacionado: si se recalculara, volvería a 10
+    db_session.execute(update(ProductoPlantilla).where(ProductoPlantilla.id == otro.id).values(kit_stock=999))
+    producto_ctrl.ajustar_stock(copa.id, -4, TipoAjusteStock.SALIDA_VENTA, "Rotura", test_usuario.id)
+    assert (plantilla_ctrl.obtener_stock_kit(pack.id), plantilla_ctrl.obtener_stock_kit(regalo.id), plantilla_ctrl.obtener_stock_kit(otro.id)) == (3, 1, 999)
+    assert plantilla_ctrl.calcular_stock_disponible_kit(regalo.id) == 1
+
+    por_nombre = {f["nombre"]: f["stock_total"] for f in plantilla_ctrl.listar_plantillas_paginadas()}
+    assert por_nombre["Pack Vino"] == 3 and por_nombre["Regalo Doble"] == 1
+
+    # Un kit no puede contenerse a sí mismo, ni a través de otro kit
+    with pytest.raises(ValueError, match="ciclo"):
+        plantilla_ctrl.actualizar_plantilla_con_variantes(
+            pack.id, {"nombre": "Pack Vino"}, [{"id": pack.variantes[0].id, "sku": "PACK-VINO", "precio_venta": 25.0}],
+            componentes=[{"componente_id": copa.id, "cantidad": 2}, {"componente_id": regalo.variantes[0].id, "cantidad": 1}]
+        )
+    assert plantilla_ctrl.obtener_stock_kit(pack.id) == 3
@@ -1,10 +1,11 @@
 # tests/test_producto_controller.py
 
 import pytest
+from datetime import datetime, time, timedelta, timezone
 from sqlalchemy.orm import Session
 from modules.productos.producto_controller import ProductoController
 from modules.productos.plantilla_controller import PlantillaController
-from modules.productos.models import TipoAjusteStock
+from modules.productos.models import Producto, MovimientoStock, TipoAjusteStock, CapaCosto
 from modules.usuarios.usuarios_model import Usuario
 
 # Asumimos que conftest.py provee las fixtures 'db_session' y 'test_usuario'
@@ -85,4 +86,245 @@ def test_ajustar_stock_a_negativo_falla(db_session: Session, test_usuario: Usuar
             tipo_ajuste=TipoAjusteStock.SALIDA_ROTURA,
             motivo="Error de prueba",
             usuario_id=test_usuario.id
-        )
\ No newline at end of file
+        )
+
+def test_ajustar_stock_lote_agrupa_por_sku(db_session: Session, test_usuario: Usuario, producto_de_prueba):
+    """
+    Verifica que el ajuste en lote agrupe líneas del mismo SKU y registre un movimiento por SKU.
+    """
+    producto_ctrl = ProductoController(db_session)
+    producto_id = producto_de_prueba.id
+
+    resultados = producto_ctrl.ajustar_stock_lote(
+        [{"producto_id": producto_id, "cantidad": -3}, {"producto_id": producto_id, "cantidad": -2}],
+        TipoAjusteStock.SALIDA_VENTA, "Venta #1", test_usuario.id
+    )
+
+    assert len(resultados) == 1
+    assert resultados[0]["stock_anterior"] == 100
+    assert resultados[0]["stock_nuevo"] == 95
+    assert db_session.get(type(producto_de_prueba), producto_id).stock == 95
+    assert len(producto_de_prueba.historial_stock) == 2  # Stock inicial + venta
+
+def test_ajustar_stock_lote_sin_stock_hace_rollback(db_session: Session, test_usuario: Usuario, producto_de_prueba):
+    """
+    Si una línea no tiene stock suficiente, ninguna línea del lote debe aplicarse.
+    """
+    producto_ctrl = ProductoController(db_session)
+    plantilla_ctrl = PlantillaController(db_session)
+    otra = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Otro"}, [{"sku": "OTRO-01", "precio_venta": 5, "stock": 1}], test_usuario.id)
+    otra_id = otra.variantes[0].id
+
+    with pytest.raises(ValueError, match="Stock insuficiente para OTRO-01"):
+        producto_ctrl.ajustar_stock_lote(
+            [{"producto_id": producto_de_prueba.id, "cantidad": -10}, {"producto_id": otra_id, "cantidad": -2}],
+            TipoAjusteStock.SALIDA_VENTA, "Venta #2", test_usuario.id
+        )
+
+    assert db_session.get(type(producto_de_prueba), producto_de_prueba.id).stock == 100
+
+def test_ajustar_stock_de_un_kit_falla(db_session: Session, test_usuario: Usuario, producto_de_prueba):
+    """El stock de un kit sale de sus componentes: ajustar la variante del kit se rechaza."""
+    plantilla_ctrl = PlantillaController(db_session)
+    kit = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Pack"}, [{"sku": "PACK-01", "precio_venta": 90.0}], test_usuario.id,
+        componentes=[{"componente_id": producto_de_prueba.id, "cantidad": 2}]
+    ).variantes[0]
+    producto_ctrl = ProductoController(db_session)
+
+    with pytest.raises(ValueError, match="es un kit"):
+        producto_ctrl.ajustar_stock(kit.id, 5, TipoAjusteStock.ENTRADA_MANUAL, "Reposición", test_usuario.id)
+    assert db_session.get(Producto, kit.id).stock == 0
+    assert plantilla_ctrl.obtener_stock_kit(kit.plantilla_id) == 50
+    assert db_session.query(MovimientoStock).filter_by(producto_id=kit.id).count() == 0
+
+def test_buscar_variantes_por_prefijo_en_indice_fts(db_session: Session, test_usuario: Usuario, setup_atributos):
+    """
+    Verifica la búsqueda por prefijos en el índice FTS5 y que los triggers lo
+    mantengan al día al renombrar plantillas y mover categorías.
+    """
+    from modules.categorias.categoria_controller import CategoriaController
+    from modules.productos import indice_busqueda
+    talla_s_id, talla_m_id, color_rojo_id, color_azul_id = setup_atributos
+    cat_ctrl = CategoriaController(db_session)
+    ropa = cat_ctrl.crear_categoria("Ropa")
+    camisas = cat_ctrl.crear_categoria("Camisas", padre_id=ropa.id)
+    hogar = cat_ctrl.crear_categoria("Hogar")
+    plantilla_ctrl = PlantillaController(db_session)
+    camisa = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Camisa Oxford", "categoria_id": camisas.id},
+        [{"sku": "OXF-S-ROJ", "precio_venta": 30.0, "ids_valores": [talla_s_id, color_rojo_id]},
+         {"sku": "OXF-M-AZU", "precio_venta": 30.0, "ids_valores": [talla_m_id, color_azul_id]}],
+        test_usuario.id
+    )
+    plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Cojín Rojo", "categoria_id": hogar.id}, [{"sku": "COJ-01", "precio_venta": 8.0}], test_usuario.id)
+    producto_ctrl = ProductoController(db_session)
+
+    assert indice_busqueda.indice_busqueda_disponible(db_session)
+    assert [p.sku for p in producto_ctrl.buscar_variantes("oxf azu")] == ["OXF-M-AZU"]
+    # Un SKU exacto pesa más que una coincidencia en el nombre o en los atributos
+    assert [p.sku for p in producto_ctrl.buscar_variantes("rojo")][0] == "COJ-01"
+    assert {p.sku for p in producto_ctrl.buscar_variantes("rop")} == {"OXF-S-ROJ", "OXF-M-AZU"}
+    assert [p.sku for p in producto_ctrl.buscar_variantes("cojin")] == ["COJ-01"]  # sin acentos
+    assert [p.sku for p in producto_ctrl.buscar_variantes("rojo", categoria_id=ropa.id)] == ["OXF-S-ROJ"]
+
+    plantilla_ctrl.actualizar_plantilla_con_variantes(camisa.id, {"nombre": "Camisa Lino", "categoria_id": camisas.id}, [
+        {"id": v.id, "sku": v.sku, "precio_venta": v.precio_venta} for v in camisa.variantes
+    ])
+    assert producto_ctrl.buscar_variantes("oxford lino") == []
+    assert len(producto_ctrl.buscar_variantes("lino")) == 2
+
+    cat_ctrl.actualizar_categoria(camisas.id, padre_id=hogar.id)
+    assert producto_ctrl.buscar_variantes("ropa") == []
+    assert len(producto_ctrl.buscar_variantes("hogar lino")) == 2
+    assert not indice_busqueda.indice_busqueda_desincronizado(db_session)
+
+def test_buscar_por_codigo_con_indice_en_memoria(db_session: Session, test_usuario: Usuario, producto_de_prueba):
+    from sqlalchemy import event, update
+    from modules.productos.models import Producto
+    producto_ctrl = ProductoController(db_session)
+    producto_de_prueba.codigo_barras_ean = "7501234567890"
+    db_session.commit()
+
+    assert producto_ctrl.buscar_por_codigo(" adj-01 ").id == producto_de_prueba.id
+    sentencias = []
+    event.listen(db_session.connection(), "before_cursor_execute", lambda *args: sentencias.append(args[2]))
+    assert producto_ctrl.buscar_por_codigo("7501234567890").id == producto_de_prueba.id
+    assert sentencias == []  # acierto en el índice y variante ya en la sesión
+
+    # Cambios por el ORM: el índice se actualiza con los eventos del mapper
+    producto_de_prueba.sku = "ADJ-02"
+    db_session.commit()
+    assert producto_ctrl.buscar_por_codigo("ADJ-01") is None
+    assert producto_ctrl.buscar_por_codigo("ADJ-02").id == producto_de_prueba.id
+
+    # Cambios sin el ORM: el acierto obsoleto se descarta y se busca en la base
+    db_session.execute(update(Producto).where(Producto.id == producto_de_prueba.id).values(codigo_barras_ean="7509999999999"))
+    db_session.commit()
+    db_session.expire_all()
+    assert producto_ctrl.buscar_por_codigo("7501234567890") is None
+    assert producto_ctrl.buscar_por_codigo("7509999999999").id == producto_de_prueba.id
+
+def test_stock_a_fecha_con_cortes_y_movimientos(db_session: Session, test_usuario: Usuario, producto_de_prueba):
+    """
+    El stock al final de cada día es el mismo partiendo del stock actual (sin
+    cortes), de un corte anterior o de uno posterior.
+    """
+    producto_ctrl = ProductoController(db_session)
+    producto_id = producto_de_prueba.id
+    hoy = datetime.now(timezone.utc).date()
+    hace = lambda dias: hoy - timedelta(days=dias)
+
+    def fechar_ultimo_movimiento(dia):
+        ultimo = db_session.query(MovimientoStock).filter_by(producto_id=producto_id).order_by(MovimientoStock.id.desc()).first()
+        ultimo.fecha = datetime.combine(dia, time(12), tzinfo=timezone.utc)
+        db_session.commit()
+
+    fechar_ultimo_movimiento(hace(10))  # Stock inicial: 100
+    producto_ctrl.ajustar_stock(producto_id, -30, TipoAjusteStock.SALIDA_MERMA, "Merma", test_usuario.id)
+    fechar_ultimo_movimiento(hace(6))
+    producto_ctrl.ajustar_stock(producto_id, 5, TipoAjusteStock.ENTRADA_MANUAL, "Reposición", test_usuario.id)
+    fechar_ultimo_movimiento(hace(2))
+    producto_ctrl.ajustar_stock(producto_id, -1, TipoAjusteStock.SALIDA_MERMA, "Merma", test_usuario.id)
+
+    esperado = {hace(11): 0, hace(10): 100, hace(6): 70, hace(3): 70, hace(2): 75, hace(1): 75, hoy: 74}
+    stock_por_dia = lambda: {dia: producto_ctrl.obtener_stock_variante_a_fecha(producto_id, dia) for dia in esperado}
+    assert stock_por_dia() == esperado
+
+    corte = producto_ctrl.crear_corte_stock(hace(6))
+    assert corte.cantidad_variantes == 1
+    assert stock_por_dia() == esperado
+    assert producto_ctrl.obtener_stock_a_fecha(hace(3)) == {producto_id: 70}
+    assert producto_ctrl.obtener_stock_a_fecha(hace(11)) == {}
+
+    with pytest.raises(ValueError, match="Ya existe"):
+        producto_ctrl.crear_corte_stock(hace(6))
+    with pytest.raises(ValueError, match="ya terminado"):
+        producto_ctrl.crear_corte_stock(hoy)
+
+    creados = producto_ctrl.asegurar_cortes_stock("diaria")
+    assert [c.fecha_corte for c in creados] == [hace(5), hace(4), hace(3), hace(2), hace(1)]
+    assert producto_ctrl.asegurar_cortes_stock("diaria") == []
+    assert stock_por_dia() == esperado
+
+def test_stock_a_fecha_incluye_variantes_creadas_al_editar(db_session: Session, test_usuario: Usuario):
+    """
+    Una variante nueva con stock añadida desde el editor deja su movimiento de
+    entrada: sumar el historial desde cero y restarlo al stock actual coinciden.
+    """
+    plantilla_ctrl = PlantillaController(db_session)
+    producto_ctrl = ProductoController(db_session)
+    hoy = datetime.now(timezone.utc).date()
+    plantilla = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Agenda"}, [{"sku": "A1", "precio_venta": 10.0, "stock": 5}], test_usuario.id)
+    a1 = plantilla.variantes[0]
+    db_session.query(MovimientoStock).filter_by(producto_id=a1.id).update({"fecha": datetime.combine(hoy - timedelta(days=10), time(12), tzinfo=timezone.utc)})
+    db_session.commit()
+
+    plantilla_ctrl.actualizar_plantilla_con_variantes(plantilla.id, {"nombre": "Agenda"}, [
+        {"id": a1.id, "sku": "A1", "precio_venta": 10.0},
+        {"sku": "A2", "precio_venta": 10.0, "costo_compra": 4.0, "stock": 7},
+    ], usuario_id=test_usuario.id)
+    a2 = next(v for v in plantilla.variantes if v.sku == "A2")
+
+    movimiento = db_session.query(MovimientoStock).filter_by(producto_id=a2.id).one()
+    assert (movimiento.tipo_ajuste, movimiento.cantidad, movimiento.costo_unitario) == (TipoAjusteStock.ENTRADA_MANUAL, 7, 4.0)
+    assert dict(producto_ctrl._sumar_movimientos(None, None, None)) == producto_ctrl._existencias_actuales(None)
+    assert producto_ctrl.obtener_stock_a_fecha(hoy) == {a1.id: 5, a2.id: 7}
+    assert producto_ctrl.obtener_stock_a_fecha(hoy - timedelta(days=1)) == {a1.id: 5}  # hacia atrás desde el stock actual
+    assert producto_ctrl.obtener_stock_a_fecha(hoy - timedelta(days=9)) == {a1.id: 5}  # hacia delante desde cero
+    assert producto_ctrl.crear_corte_stock().cantidad_variantes == 1
+
+def test_valoracion_por_costo_medio_y_fifo(db_session: Session, test_usuario: Usuario):
+    """El estado incremental (costo medio, capas) coincide con la valoración vectorizada del historial."""
+    producto_ctrl = ProductoController(db_session)
+    plantilla = PlantillaController(db_session).crear_plantilla_con_variantes(
+        {"nombre": "Tinta"}, [{"sku": "TIN-01", "precio_venta": 20.0, "costo_compra": 8.0, "stock": 10}], test_usuario.id)
+    producto_id = plantilla.variantes[0].id
+    hoy = datetime.now(timezone.utc).date()
+
+    def fechar_ultimo_movimiento(dias):
+        ultimo = db_session.query(MovimientoStock).filter_by(producto_id=producto_id).order_by(MovimientoStock.id.desc()).first()
+        ultimo.fecha = datetime.combine(hoy - timedelta(days=dias), time(12), tzinfo=timezone.utc)
+        db_session.commit()
+
+    fechar_ultimo_movimiento(3)  # 10 uds. a 8
+    producto_ctrl.ajustar_stock(producto_id, 10, TipoAjusteStock.ENTRADA_COMPRA, "Compra", test_usuario.id, costo_unitario=12.0)
+    fechar_ultimo_movimiento(2)  # medio: 10
+    venta = producto_ctrl.ajustar_stock_lote([{"producto_id": producto_id, "cantidad": -15}], TipoAjusteStock.SALIDA_VENTA, "Venta", test_usuario.id)[0]
+    assert (venta["costo_unitario"], venta["costo_fifo"]) == (10.0, 140.0)  # FIFO: 10 x 8 + 5 x 12
+    # Una devolución sin costo entra al costo medio y no lo cambia
+    producto_ctrl.ajustar_stock(producto_id, 2, TipoAjusteStock.ENTRADA_DEVOLUCION, "Devolución", test_usuario.id)
+    assert producto_ctrl.obtener_variante_por_id(producto_id).costo_promedio == 10.0
+
+    costo_ventas = producto_ctrl.calcular_costo_de_ventas(hoy, hoy)
+    assert (costo_ventas["promedio"], costo_ventas["fifo"], costo_ventas["unidades"]) == (150.0, 140.0, 15)
+    assert costo_ventas["variantes"] == {producto_id: (15, 150.0, 140.0)}
+    assert producto_ctrl.calcular_costo_de_ventas(hoy - timedelta(days=3), hoy - timedelta(days=1))["unidades"] == 0
+
+    actual = producto_ctrl.valorar_inventario()
+    assert (actual["unidades"], actual["promedio"], actual["fifo"]) == (7, 70.0, 80.0)  # FIFO: 5 x 12 + 2 x 10
+    anteayer = producto_ctrl.valorar_inventario(hoy - timedelta(days=2))
+    assert (anteayer["unidades"], anteayer["promedio"], anteayer["fifo"]) == (20, 200.0, 200.0)
+
+    capas = lambda: [(c.cantidad_restante, c.costo_unitario) for c in db_session.query(CapaCosto).filter_by(producto_id=producto_id).order_by(CapaCosto.id)]
+    assert capas() == [(5, 12.0), (2, 10.0)]
+    assert producto_ctrl.reconstruir_valoracion() == 1
+    assert capas() == [(5, 12.0), (2, 10.0)]
+    assert producto_ctrl.obtener_variante_por_id(producto_id).costo_promedio == 10.0
+
+def test_entrada_sobre_stock_negativo_valora_igual_en_ambos_motores(db_session: Session, test_usuario: Usuario):
+    """Una entrada que lleva a 0 un stock negativo (datos antiguos) no divide entre cero y la reconstrucción coincide."""
+    producto_ctrl = ProductoController(db_session)
+    plantilla = PlantillaController(db_session).crear_plantilla_con_variantes(
+        {"nombre": "Cinta"}, [{"sku": "CIN-01", "precio_venta": 15.0, "costo_compra": 6.0}], test_usuario.id)
+    producto_id = plantilla.variantes[0].id
+    db_session.get(Producto, producto_id).stock = -3  # Editado a mano
+    db_session.commit()
+
+    producto_ctrl.ajustar_stock(producto_id, 3, TipoAjusteStock.ENTRADA_COMPRA, "Compra", test_usuario.id, costo_unitario=9.0)
+    assert producto_ctrl.obtener_variante_por_id(producto_id).costo_promedio == 9.0
+    producto_ctrl.ajustar_stock(producto_id, 2, TipoAjusteStock.ENTRADA_COMPRA, "Compra", test_usuario.id, costo_unitario=4.0)
+    assert producto_ctrl.obtener_variante_por_id(producto_id).costo_promedio == 4.0  # Las 3 primeras reponían el faltante
+
+    producto_ctrl.reconstruir_valoracion()
+    assert producto_ctrl.obtener_variante_por_id(producto_id).costo_promedio == 4.0
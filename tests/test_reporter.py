@@ -0,0 +1,90 @@
+# tests/test_reporter.py
+
+import time
+import pytest
+from PySide6.QtCore import QCoreApplication, QElapsedTimer
+from core.tareas import TareaCancelada, TareaSegundoPlano
+from utils.reporter import escribir_reporte_pdf
+
+HEADERS = ["ID", "Producto", "Cantidad", "Total"]
+
+def _filas(n):
+    for i in range(n):
+        yield [i + 1, f"Producto {i}", 1, 10.0]
+
+def test_escribe_por_bloques_con_progreso(tmp_path):
+    ruta = tmp_path / "reporte.pdf"
+    avances = []
+
+    resultado = escribir_reporte_pdf(
+        str(ruta), "Reporte de Ventas", HEADERS, _filas(200), columnas_total=[3], columnas_moneda=[3],
+        total_filas=200, progreso=lambda hechos, total: avances.append((hechos, total)), filas_por_bloque=40,
+    )
+
+    assert resultado["filas"] == 200
+    assert resultado["paginas"] >= 5
+    assert avances == [(40, 200), (80, 200), (120, 200), (160, 200), (200, 200)]
+    assert ruta.read_bytes().startswith(b"%PDF")
+
+def test_maqueta_cada_bloque_antes_de_leer_los_siguientes(tmp_path, monkeypatch):
+    """Fija que reportlab no pide todo el generador de golpe: como mucho hay un par de tablas esperando.
+    Un bloque que no cabe en la página se dibuja en varias partes, así que se cuentan partes dibujadas."""
+    from reportlab.platypus import LongTable
+    from utils import reporter
+    creadas, dibujadas, en_espera = [0], [0], []
+    crear_bloque = reporter._crear_bloque
+
+    def contar_creada(*args):
+        creadas[0] += 1
+        return crear_bloque(*args)
+
+    def contar_dibujada(doc, flowable):
+        if isinstance(flowable, LongTable):
+            dibujadas[0] += 1
+            en_espera.append(creadas[0] - dibujadas[0])
+
+    monkeypatch.setattr(reporter, "_crear_bloque", contar_creada)
+    monkeypatch.setattr(reporter._DocumentoPorBloques, "afterFlowable", contar_dibujada, raising=False)
+    resultado = escribir_reporte_pdf(str(tmp_path / "reporte.pdf"), "Reporte de Ventas", HEADERS, _filas(400), filas_por_bloque=40)
+
+    assert resultado["filas"] == 400
+    assert creadas[0] == 10
+    assert max(en_espera) <= reporter.FLOWABLES_EN_ESPERA
+
+def test_cancelar_aborta_y_borra_el_archivo(tmp_path):
+    ruta = tmp_path / "reporte.pdf"
+    avances = []
+
+    with pytest.raises(TareaCancelada):
+        escribir_reporte_pdf(
+            str(ruta), "Reporte de Ventas", HEADERS, _filas(1000), columnas_total=[3],
+            progreso=lambda hechos, total: avances.append(hechos), cancelado=lambda: len(avances) >= 2, filas_por_bloque=40,
+        )
+
+    assert avances == [40, 80]
+    assert not ruta.exists()
+
+def test_reporte_sin_filas(tmp_path):
+    ruta = tmp_path / "vacio.pdf"
+    resultado = escribir_reporte_pdf(str(ruta), "Reporte de Ventas", HEADERS, [], columnas_total=[3])
+    assert resultado == {"filas": 0, "paginas": 1}
+    assert ruta.exists()
+
+def test_tarea_en_segundo_plano_emite_progreso_y_resultado(tmp_path):
+    QCoreApplication.instance() or QCoreApplication([])
+    ruta = tmp_path / "reporte.pdf"
+    avances, resultados = [], []
+
+    tarea = TareaSegundoPlano(lambda progreso, cancelado: escribir_reporte_pdf(
+        str(ruta), "Reporte de Ventas", HEADERS, _filas(100), progreso=progreso, cancelado=cancelado, filas_por_bloque=50))
+    tarea.senales.progreso.connect(lambda hechos, total: avances.append(hechos))
+    tarea.senales.terminada.connect(resultados.append)
+    tarea.iniciar()
+
+    reloj = QElapsedTimer()
+    reloj.start()
+    while not resultados and reloj.elapsed() < 5000:
+        QCoreApplication.processEvents()
+        time.sleep(0.005)
+    assert resultados[0]["filas"] == 100
+    assert avances == [50, 100]
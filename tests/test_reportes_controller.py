@@ -1,42 +1,114 @@
 # tests/test_reportes_controller.py
 
 import pytest
+from datetime import datetime, timedelta, timezone
 from unittest.mock import Mock
 from modules.reportes.reportes_controller import ReportesController
+from modules.ventas.ventas_controller import VentasController
+from modules.ventas.carrito import AlmacenCarritos
+from modules.productos.producto_controller import ProductoController
+from modules.productos.plantilla_controller import PlantillaController
+from modules.contabilidad.contabilidad_controller import ContabilidadController
+from modules.clientes.cliente_controller import ClienteController
+from modules.categorias.categoria_controller import CategoriaController
+from modules.proveedores.proveedor_model import Proveedor
 
-def test_preparar_reporte_ventas():
-    # Esta prueba no tiene cambios y se omite por brevedad, pero debe permanecer
-    mock_ventas_ctrl = Mock()
-    mock_producto_ctrl = Mock()
-    mock_empresa_ctrl = Mock()
-    venta_mock_1 = Mock()
-    venta_mock_1.id = 1; venta_mock_1.fecha_venta.strftime.return_value = "2025-06-20 10:00"; venta_mock_1.cliente.nombre_completo = "Cliente de Prueba"; venta_mock_1.producto.nombre = "Producto A"; venta_mock_1.cantidad = 2; venta_mock_1.total_venta = 200.0
-    mock_ventas_ctrl.listar_ventas.return_value = [venta_mock_1]
-    reportes_ctrl = ReportesController(mock_ventas_ctrl, mock_producto_ctrl, mock_empresa_ctrl)
+@pytest.fixture
+def tienda(db_session, test_usuario, tmp_path):
+    """Dos ventas completadas (una con cliente), una cancelada y un catálogo con categorías."""
+    producto_ctrl = ProductoController(db_session)
+    cliente_ctrl = ClienteController(db_session)
+    ventas_ctrl = VentasController(db_session, producto_ctrl, ContabilidadController(db_session), cliente_ctrl, AlmacenCarritos(str(tmp_path)))
+    plantilla_ctrl = PlantillaController(db_session)
+    cat_ctrl = CategoriaController(db_session)
+    papeleria = cat_ctrl.crear_categoria("Papelería")
+    cuadernos = cat_ctrl.crear_categoria("Cuadernos", padre_id=papeleria.id)
+    proveedor = Proveedor(nombre_empresa="Proveedor Z")
+    db_session.add(proveedor)
+    db_session.commit()
+
+    cuaderno = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Cuaderno", "categoria_id": cuadernos.id, "proveedor_id": proveedor.id},
+        [{"sku": "CUA-01", "precio_venta": 20.0, "stock": 50}], test_usuario.id).variantes[0]
+    lapiz = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Lapiz"}, [{"sku": "LAP-01", "precio_venta": 5.0, "stock": 50}], test_usuario.id).variantes[0]
+    cliente = cliente_ctrl.agregar_cliente({"nombre_completo": "Cliente de Prueba", "email": "cliente@prueba.com"})
+
+    def vender(lineas, cliente_id=None, metodo="Efectivo"):
+        venta = ventas_ctrl.crear_nueva_venta(test_usuario.id, cliente_id)
+        for producto_id, cantidad in lineas:
+            ventas_ctrl.agregar_item(venta, producto_id, cantidad)
+        ventas_ctrl.finalizar_venta(venta, [{"metodo": metodo, "monto": venta.total}])
+        return venta
+
+    vender([(cuaderno.id, 2), (lapiz.id, 4)], cliente_id=cliente.id)
+    vender([(lapiz.id, 1)], metodo="Transferencia")
+    # Un ticket que no se cobra no llega a la base; la cancelada es una venta aparcada y descartada después.
+    cancelada = ventas_ctrl.crear_nueva_venta(test_usuario.id)
+    ventas_ctrl.agregar_item(cancelada, cuaderno.id, 1)
+    aparcada = ventas_ctrl.aparcar_venta(cancelada)
+    ventas_ctrl.cancelar_venta(ventas_ctrl.reanudar_venta(aparcada.id, test_usuario.id))
+
+    reportes_ctrl = ReportesController(ventas_ctrl, producto_ctrl, Mock())
+    return reportes_ctrl, {"papeleria": papeleria.id, "cliente": cliente.id}
+
+def test_preparar_reporte_ventas(tienda):
+    reportes_ctrl, _ = tienda
     reporte = reportes_ctrl.obtener_datos_para_reporte("ventas", {})
     assert reporte["titulo"] == "Reporte de Ventas"
-    assert len(reporte["data"]) == 1
+    assert len(reporte["data"]) == 3  # una fila por línea de las ventas completadas
+    assert reporte["data"][0][2] == "Cliente de Prueba"
+    assert reporte["data"][2][2] == "Público General"
+    assert sum(fila[7] for fila in reporte["data"]) == 65.0
 
-def test_preparar_reporte_productos(): # Cambiado el nombre de la prueba para reflejar la realidad
+def test_preparar_reporte_productos(tienda):
     """
     Prueba que el reporte de productos se formatee correctamente.
     """
-    mock_ventas_ctrl = Mock()
-    mock_producto_ctrl = Mock()
-    mock_empresa_ctrl = Mock()
-
-    producto_mock_1 = Mock()
-    producto_mock_1.id = 101; producto_mock_1.nombre = "Producto B"; producto_mock_1.descripcion = "Descripción B"; producto_mock_1.stock = 50; producto_mock_1.precio_venta = 25.50; producto_mock_1.proveedor.nombre_empresa = "Proveedor Z"
-    
-    mock_producto_ctrl.listar_productos.return_value = [producto_mock_1]
+    reportes_ctrl, _ = tienda
 
-    reportes_ctrl = ReportesController(mock_ventas_ctrl, mock_producto_ctrl, mock_empresa_ctrl)
-    
     # --- INICIO DE LA CORRECCIÓN ---
     # Pedimos el reporte 'productos' en lugar de 'inventario'
     reporte = reportes_ctrl.obtener_datos_para_reporte("productos", {})
     # --- FIN DE LA CORRECCIÓN ---
 
     assert reporte["titulo"] == "Reporte de Productos"
-    assert len(reporte["data"]) == 1
-    assert reporte["data"][0][1] == "Producto B"
\ No newline at end of file
+    assert len(reporte["data"]) == 2
+    assert reporte["data"][0][1] == "Cuaderno"
+    assert reporte["data"][0][5] == "Proveedor Z"
+    assert reporte["data"][1][5] == "N/A"
+
+def test_reporte_en_flujo_devuelve_un_generador(tienda):
+    reportes_ctrl, _ = tienda
+    reporte = reportes_ctrl.obtener_datos_para_reporte("productos", {}, en_flujo=True)
+
+    assert reporte["total_filas"] == 2
+    assert not isinstance(reporte["data"], list)
+    assert [fila[2] for fila in reporte["data"]] == ["CUA-01", "LAP-01"]
+
+def test_filtros_de_ventas(tienda):
+    reportes_ctrl, ids = tienda
+    assert len(reportes_ctrl.obtener_datos_para_reporte("ventas", {"cliente_id": ids["cliente"]})["data"]) == 2
+    # La categoría incluye sus subcategorías (Cuaderno está en Papelería > Cuadernos)
+    assert len(reportes_ctrl.obtener_datos_para_reporte("ventas", {"categoria_id": ids["papeleria"]})["data"]) == 1
+    assert len(reportes_ctrl.obtener_datos_para_reporte("ventas", {"estado": None})["data"]) == 4
+    manana = (datetime.now(timezone.utc) + timedelta(days=1)).date().isoformat()
+    with pytest.raises(ValueError, match="No hay ventas"):
+        reportes_ctrl.obtener_datos_para_reporte("ventas", {"fecha_inicio": manana})
+
+def test_agrupaciones_de_ventas(tienda):
+    reportes_ctrl, ids = tienda
+
+    por_sku = reportes_ctrl.obtener_datos_para_reporte("ventas", {"agrupar_por": "sku"})["data"]
+    assert por_sku == [["CUA-01", "Cuaderno", 2, 40.0], ["LAP-01", "Lapiz", 5, 25.0]]
+
+    por_categoria = reportes_ctrl.obtener_datos_para_reporte("ventas", {"agrupar_por": "categoria"})["data"]
+    assert por_categoria == [["Cuadernos", 1, 2, 40.0], ["Sin categoría", 2, 5, 25.0]]
+
+    por_dia = reportes_ctrl.obtener_datos_para_reporte("ventas", {"agrupar_por": "dia"})["data"]
+    assert len(por_dia) == 1 and por_dia[0][1:] == [2, 7, 65.0]
+
+    por_pago = reportes_ctrl.obtener_datos_para_reporte("ventas", {"agrupar_por": "metodo_pago"})["data"]
+    assert por_pago == [["Efectivo", 1, 60.0], ["Transferencia", 1, 5.0]]
+    por_pago_papeleria = reportes_ctrl.obtener_datos_para_reporte("ventas", {"agrupar_por": "metodo_pago", "categoria_id": ids["papeleria"]})["data"]
+    assert por_pago_papeleria == [["Efectivo", 1, 60.0]]
@@ -8,16 +8,22 @@ from modules.productos.plantilla_controller import PlantillaController
 from modules.contabilidad.contabilidad_controller import ContabilidadController
 from modules.clientes.cliente_controller import ClienteController
 from modules.contabilidad.contabilidad_model import MovimientoContable
-from modules.productos.models import Producto
+from modules.productos.models import Producto, MovimientoStock, TipoAjusteStock
 from modules.usuarios.usuarios_model import Usuario
+from modules.ventas.carrito import AlmacenCarritos
+from modules.ventas.ventas_model import Venta, VentaDetalle, EstadoVenta
 
 @pytest.fixture
-def setup_controllers(db_session: Session):
+def almacen_carritos(tmp_path) -> AlmacenCarritos:
+    return AlmacenCarritos(str(tmp_path / "carritos"))
+
+@pytest.fixture
+def setup_controllers(db_session: Session, almacen_carritos: AlmacenCarritos):
     producto_ctrl = ProductoController(db_session)
     plantilla_ctrl = PlantillaController(db_session)
     contabilidad_ctrl = ContabilidadController(db_session)
     cliente_ctrl = ClienteController(db_session)
-    ventas_ctrl = VentasController(db_session, producto_ctrl, contabilidad_ctrl, cliente_ctrl)
+    ventas_ctrl = VentasController(db_session, producto_ctrl, contabilidad_ctrl, cliente_ctrl, almacen_carritos)
     return ventas_ctrl, producto_ctrl, plantilla_ctrl, contabilidad_ctrl, cliente_ctrl
 
 def test_registrar_venta_exitosa(setup_controllers, test_usuario: Usuario):
@@ -56,4 +62,161 @@ def test_listar_ventas(setup_controllers, test_usuario: Usuario):
     producto = plantilla.variantes[0]
 
     ventas_ctrl.registrar_venta(producto_id=producto.id, cantidad=1)
-    assert len(ventas_ctrl.listar_ventas()) == 1
\ No newline at end of file
+    assert len(ventas_ctrl.listar_ventas()) == 1
+
+def test_finalizar_venta_en_una_transaccion(setup_controllers, test_usuario: Usuario):
+    ventas_ctrl, producto_ctrl, plantilla_ctrl, contabilidad_ctrl, _ = setup_controllers
+    p1 = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Cuaderno"}, [{"sku": "CUA-01", "precio_venta": 20.0, "stock": 10}], test_usuario.id).variantes[0]
+    p2 = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Lapiz"}, [{"sku": "LAP-01", "precio_venta": 5.0, "stock": 10}], test_usuario.id).variantes[0]
+
+    venta = ventas_ctrl.crear_nueva_venta(test_usuario.id)
+    ventas_ctrl.agregar_item(venta, p1.id, 2)
+    ventas_ctrl.agregar_item(venta, p2.id, 4)
+    venta = ventas_ctrl.finalizar_venta(venta, [{"metodo": "Efectivo", "monto": venta.total}])
+
+    db_session = producto_ctrl.db
+    assert db_session.get(Producto, p1.id).stock == 8
+    assert db_session.get(Producto, p2.id).stock == 6
+    assert venta.estado.value == "Completada"
+    assert sorted((d.producto_id, d.cantidad) for d in venta.detalles) == [(p1.id, 2), (p2.id, 4)]
+    assert ventas_ctrl.obtener_venta_activa(test_usuario.id) is None
+    movimientos = contabilidad_ctrl.obtener_todos_movimientos()
+    assert len(movimientos) == 1
+    assert movimientos[0].monto == 60.0
+
+def test_finalizar_venta_sin_stock_no_aplica_cambios(setup_controllers, test_usuario: Usuario):
+    ventas_ctrl, producto_ctrl, plantilla_ctrl, contabilidad_ctrl, _ = setup_controllers
+    p1 = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Goma"}, [{"sku": "GOM-01", "precio_venta": 3.0, "stock": 5}], test_usuario.id).variantes[0]
+    p2 = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Regla"}, [{"sku": "REG-01", "precio_venta": 8.0, "stock": 2}], test_usuario.id).variantes[0]
+
+    venta = ventas_ctrl.crear_nueva_venta(test_usuario.id)
+    ventas_ctrl.agregar_item(venta, p1.id, 1)
+    ventas_ctrl.agregar_item(venta, p2.id, 2)
+    # Otra caja vende las reglas antes de cobrar este ticket
+    producto_ctrl.ajustar_stock(p2.id, -2, TipoAjusteStock.SALIDA_VENTA, "Otra venta", test_usuario.id)
+
+    with pytest.raises(ValueError, match="Stock insuficiente"):
+        ventas_ctrl.finalizar_venta(venta, [{"metodo": "Efectivo", "monto": venta.total}])
+
+    db_session = producto_ctrl.db
+    assert db_session.get(Producto, p1.id).stock == 5
+    assert contabilidad_ctrl.obtener_todos_movimientos() == []
+    assert db_session.query(Venta).count() == 0
+    assert ventas_ctrl.obtener_venta_activa(test_usuario.id) is venta  # el ticket sigue abierto
+
+def test_escanear_item_por_sku_y_codigo_de_barras(setup_controllers, test_usuario: Usuario):
+    ventas_ctrl, producto_ctrl, plantilla_ctrl, _, _ = setup_controllers
+    p1 = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Borrador"}, [{"sku": "BOR-01", "precio_venta": 4.0, "stock": 10}], test_usuario.id).variantes[0]
+    p1.codigo_barras_upc = "012345678905"
+    producto_ctrl.db.commit()
+
+    venta = ventas_ctrl.crear_nueva_venta(test_usuario.id)
+    ventas_ctrl.escanear_item(venta, "bor-01")
+    venta = ventas_ctrl.escanear_item(venta, "012345678905")
+
+    assert [(d.producto_id, d.cantidad) for d in venta.detalles] == [(p1.id, 2)]
+    assert venta.total == 8.0
+    with pytest.raises(ValueError, match="ningún producto"):
+        ventas_ctrl.escanear_item(venta, "NO-EXISTE")
+
+def test_el_carrito_no_escribe_en_la_base_hasta_cobrar(setup_controllers, test_usuario: Usuario, almacen_carritos):
+    from sqlalchemy import event
+    ventas_ctrl, producto_ctrl, plantilla_ctrl, _, _ = setup_controllers
+    p1 = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Clip"}, [{"sku": "CLI-01", "precio_venta": 1.5, "stock": 50}], test_usuario.id).variantes[0]
+    db_session = producto_ctrl.db
+    producto_ctrl.buscar_por_codigo("CLI-01")  # carga el índice de códigos
+
+    sentencias = []
+    event.listen(db_session.connection(), "before_cursor_execute", lambda *args: sentencias.append(args[2]))
+    venta = ventas_ctrl.crear_nueva_venta(test_usuario.id)
+    for _ in range(3):
+        ventas_ctrl.escanear_item(venta, "CLI-01")
+    assert not [s for s in sentencias if not s.lstrip().upper().startswith("SELECT")]
+    assert venta.total == 4.5
+
+    # Instantánea: otro controlador (p. ej. tras un cierre inesperado) recupera el ticket
+    recuperado = VentasController(db_session, producto_ctrl, ventas_ctrl.contabilidad_ctrl, ventas_ctrl.cliente_ctrl, almacen_carritos)
+    assert recuperado.recuperar_carritos() == 1
+    carrito = recuperado.obtener_venta_activa(test_usuario.id)
+    assert [(l.producto_id, l.cantidad, l.descripcion) for l in carrito.detalles] == [(p1.id, 3, "Clip")]
+
+    recuperado.finalizar_venta(carrito, [{"metodo": "Efectivo", "monto": carrito.total}])
+    assert almacen_carritos.cargar_todos() == []
+
+def test_aparcar_y_reanudar_reutiliza_la_venta(setup_controllers, test_usuario: Usuario, tmp_path):
+    ventas_ctrl, producto_ctrl, plantilla_ctrl, _, _ = setup_controllers
+    p1 = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Tijeras"}, [{"sku": "TIJ-01", "precio_venta": 12.0, "stock": 5}], test_usuario.id).variantes[0]
+    db_session = producto_ctrl.db
+
+    venta = ventas_ctrl.crear_nueva_venta(test_usuario.id)
+    ventas_ctrl.agregar_item(venta, p1.id, 2)
+    aparcada = ventas_ctrl.aparcar_venta(venta)
+    assert aparcada.estado == EstadoVenta.EN_ESPERA
+    assert ventas_ctrl.obtener_venta_activa(test_usuario.id) is None
+    assert [v.id for v in ventas_ctrl.listar_ventas_en_espera(test_usuario.id)] == [aparcada.id]
+
+    carrito = ventas_ctrl.reanudar_venta(aparcada.id, test_usuario.id)
+    # Reanudada ya no está en espera: otra instancia no puede reanudarla también
+    otra_caja = VentasController(db_session, producto_ctrl, ventas_ctrl.contabilidad_ctrl, ventas_ctrl.cliente_ctrl, AlmacenCarritos(str(tmp_path / "otra")))
+    assert db_session.get(Venta, aparcada.id).estado == EstadoVenta.EN_PROGRESO
+    assert otra_caja.listar_ventas_en_espera() == []
+    with pytest.raises(ValueError, match="no está en espera"):
+        otra_caja.reanudar_venta(aparcada.id, test_usuario.id)
+    ventas_ctrl.agregar_item(carrito, p1.id, 1)
+    cobrada = ventas_ctrl.finalizar_venta(carrito, [{"metodo": "Efectivo", "monto": carrito.total}])
+
+    assert cobrada.id == aparcada.id
+    assert cobrada.total == 36.0
+    assert db_session.query(Venta).count() == 1
+    assert [(d.producto_id, d.cantidad) for d in db_session.query(VentaDetalle).all()] == [(p1.id, 3)]
+    assert db_session.get(Producto, p1.id).stock == 2
+
+    # Una copia del mismo carrito (otra instancia) no puede cobrar la venta otra vez
+    with pytest.raises(ValueError, match="ya está completada"):
+        ventas_ctrl.finalizar_venta(ventas_ctrl._carrito_desde_venta(cobrada), [{"metodo": "Efectivo", "monto": 36.0}])
+    assert db_session.get(Producto, p1.id).stock == 2
+    assert db_session.query(MovimientoStock).filter_by(tipo_ajuste=TipoAjusteStock.SALIDA_VENTA).count() == 1
+
+def test_recupera_ventas_en_progreso_de_versiones_anteriores(setup_controllers, test_usuario: Usuario):
+    ventas_ctrl, producto_ctrl, plantilla_ctrl, _, _ = setup_controllers
+    p1 = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Grapas"}, [{"sku": "GRA-01", "precio_venta": 2.0, "stock": 5}], test_usuario.id).variantes[0]
+    db_session = producto_ctrl.db
+    antigua = Venta(usuario_id=test_usuario.id, estado=EstadoVenta.EN_PROGRESO, subtotal=4.0, total=4.0)
+    antigua.detalles.append(VentaDetalle(producto_id=p1.id, cantidad=2, precio_unitario=2.0, subtotal_linea=4.0))
+    db_session.add(antigua)
+    db_session.commit()
+
+    assert ventas_ctrl.recuperar_carritos() == 1
+    carrito = ventas_ctrl.obtener_venta_activa(test_usuario.id)
+    assert carrito.venta_id == antigua.id and carrito.total == 4.0
+    ventas_ctrl.cancelar_venta(carrito)
+    assert db_session.get(Venta, antigua.id).estado == EstadoVenta.CANCELADA
+
+def test_vender_un_kit_descuenta_sus_componentes_en_un_lote(setup_controllers, test_usuario: Usuario):
+    ventas_ctrl, producto_ctrl, plantilla_ctrl, _, _ = setup_controllers
+    db_session = producto_ctrl.db
+    pila = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Pila"}, [{"sku": "PILA", "precio_venta": 1.0, "stock": 10}], test_usuario.id).variantes[0]
+    linterna = plantilla_ctrl.crear_plantilla_con_variantes({"nombre": "Linterna"}, [{"sku": "LINT", "precio_venta": 8.0, "stock": 5}], test_usuario.id).variantes[0]
+    kit = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Kit Linterna"}, [{"sku": "KIT-LINT", "precio_venta": 9.0, "stock": 0}], test_usuario.id,
+        componentes=[{"componente_id": linterna.id, "cantidad": 1}, {"componente_id": pila.id, "cantidad": 2}]
+    )
+    emergencia = plantilla_ctrl.crear_plantilla_con_variantes(
+        {"nombre": "Kit Emergencia"}, [{"sku": "KIT-EMER", "precio_venta": 20.0, "stock": 0}], test_usuario.id,
+        componentes=[{"componente_id": kit.variantes[0].id, "cantidad": 2}, {"componente_id": pila.id, "cantidad": 2}]
+    )
+    movimientos_previos = db_session.query(MovimientoStock).count()
+
+    carrito = ventas_ctrl.crear_nueva_venta(test_usuario.id)
+    ventas_ctrl.agregar_item(carrito, emergencia.variantes[0].id, 1)
+    ventas_ctrl.agregar_item(carrito, kit.variantes[0].id, 1)
+    with pytest.raises(ValueError, match="Stock insuficiente para KIT-EMER. Disponible: 2"):
+        ventas_ctrl.agregar_item(carrito, emergencia.variantes[0].id, 2)
+    venta = ventas_ctrl.finalizar_venta(carrito, [{"metodo": "Efectivo", "monto": carrito.total}])
+
+    # 1 emergencia = 2 kits (2 linternas + 4 pilas) + 2 pilas; 1 kit = 1 linterna + 2 pilas
+    assert (db_session.get(Producto, linterna.id).stock, db_session.get(Producto, pila.id).stock) == (2, 2)
+    assert sorted((d.producto_id, d.cantidad) for d in venta.detalles) == sorted([(emergencia.variantes[0].id, 1), (kit.variantes[0].id, 1)])
+    nuevos = db_session.query(MovimientoStock).filter(MovimientoStock.motivo == f"Venta #{venta.id}").all()
+    assert len(nuevos) == 2 and db_session.query(MovimientoStock).count() == movimientos_previos + 2
+    assert (plantilla_ctrl.obtener_stock_kit(kit.id), plantilla_ctrl.obtener_stock_kit(emergencia.id)) == (1, 0)
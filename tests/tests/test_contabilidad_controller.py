@@ -76,4 +76,70 @@ def test_obtener_resumen_contable(db_session: Session):
     # Assert
     assert resumen["total_ingresos"] == 1500.0
     assert resumen["total_egresos"] == 300.0
-    assert resumen["balance"] == 1200.0
\ No newline at end of file
+    assert resumen["balance"] == 1200.0
+
+def test_resumen_diario_se_mantiene_con_cada_movimiento(db_session: Session):
+    """
+    Verifica que agregar_movimiento acumule en el resumen diario y que la
+    gráfica de N días salga de él, con los días sin movimientos en cero.
+    """
+    from modules.contabilidad.contabilidad_model import ResumenContableDiario
+    controller = ContabilidadController(db_session)
+    controller.agregar_movimiento(TipoMovimiento.INGRESO, "Venta 1", 100, categoria="Ventas")
+    controller.agregar_movimiento(TipoMovimiento.INGRESO, "Venta 2", 50, categoria="Ventas")
+    controller.agregar_movimiento(TipoMovimiento.EGRESO, "Pago de luz", 30)
+
+    filas = {(f.tipo, f.categoria): (f.cantidad, f.total) for f in db_session.query(ResumenContableDiario)}
+    assert filas == {(TipoMovimiento.INGRESO, "Ventas"): (2, 150.0), (TipoMovimiento.EGRESO, ""): (1, 30.0)}
+
+    grafico = controller.obtener_resumen_diario(dias=7)
+    assert len(grafico) == 7
+    assert grafico[-1]["total_ingresos"] == 150.0 and grafico[-1]["total_egresos"] == 30.0
+    assert all(d["total_ingresos"] == 0.0 for d in grafico[:-1])
+
+def test_cierre_de_periodo_y_reconstruccion(db_session: Session):
+    """
+    Verifica que los totales combinen la foto del cierre con lo posterior y que
+    la reconstrucción desde los movimientos deje el resumen igual.
+    """
+    from datetime import datetime, timedelta, timezone
+    from modules.contabilidad.contabilidad_model import ResumenContableDiario
+    controller = ContabilidadController(db_session)
+    # Un movimiento de hace tres días, insertado sin pasar por el controlador
+    db_session.add(MovimientoContable(tipo=TipoMovimiento.INGRESO, concepto="Venta antigua", monto=400.0, fecha=datetime.now(timezone.utc) - timedelta(days=3)))
+    db_session.commit()
+    assert controller.resumen_diario_desincronizado()
+    assert controller.reconstruir_resumen_diario() == 1
+    assert not controller.resumen_diario_desincronizado()
+
+    cierre = controller.cerrar_periodo()
+    assert cierre.total_ingresos == 400.0 and cierre.cantidad_movimientos == 1
+    with pytest.raises(ValueError, match="ya está cerrado"):
+        controller.cerrar_periodo()
+
+    controller.agregar_movimiento(TipoMovimiento.INGRESO, "Venta de hoy", 100)
+    controller.agregar_movimiento(TipoMovimiento.EGRESO, "Compra de hoy", 25)
+    assert controller.obtener_resumen() == {"total_ingresos": 500.0, "total_egresos": 25.0, "balance": 475.0}
+
+    filas_antes = {(f.dia, f.tipo, f.categoria, f.cantidad, f.total) for f in db_session.query(ResumenContableDiario)}
+    controller.reconstruir_resumen_diario()
+    assert {(f.dia, f.tipo, f.categoria, f.cantidad, f.total) for f in db_session.query(ResumenContableDiario)} == filas_antes
+    assert controller.obtener_resumen()["balance"] == 475.0
+
+def test_cerrar_periodo_rechaza_dias_sin_terminar(db_session: Session):
+    """
+    Un cierre que incluye hoy o días futuros dejaría fuera de los totales los
+    movimientos que aún lleguen a esos días, así que se rechaza.
+    """
+    from datetime import datetime, timedelta, timezone
+    controller = ContabilidadController(db_session)
+    controller.agregar_movimiento(TipoMovimiento.INGRESO, "Venta de hoy", 10)
+    hoy = datetime.now(timezone.utc).date()
+
+    for hasta in (hoy, hoy + timedelta(days=2)):
+        with pytest.raises(ValueError, match="días ya terminados"):
+            controller.cerrar_periodo(hasta)
+    assert controller.obtener_ultimo_cierre() is None
+
+    controller.agregar_movimiento(TipoMovimiento.INGRESO, "Otra venta", 5)
+    assert controller.obtener_resumen()["total_ingresos"] == 15.0